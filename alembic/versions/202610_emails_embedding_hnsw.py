@@ -0,0 +1,38 @@
+"""
+Alembic миграция: HNSW индекс (cosine) на emails.embedding.
+
+Позволяет EmbeddingService.find_similar_emails (ORDER BY embedding <=> q LIMIT k)
+использовать ANN индекс вместо полного скана таблицы emails.
+Индекс частичный (category IS NOT NULL) - совпадает с фильтром запроса.
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '202610_emails_embedding_hnsw'
+down_revision = '202412_create_emailactions'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_emails_embedding_cosine'
+
+
+def upgrade() -> None:
+    """Создание HNSW индекса на emails.embedding."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS vector')
+
+    # CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME}
+            ON emails USING hnsw (embedding vector_cosine_ops)
+            WITH (m = 16, ef_construction = 64)
+            WHERE category IS NOT NULL
+            """
+        )
+
+
+def downgrade() -> None:
+    """Удаление HNSW индекса."""
+    with op.get_context().autocommit_block():
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}')
@@ -0,0 +1,60 @@
+"""
+Alembic миграция: версия проекции embedding (emails.embedding_version).
+
+emails.embedding становится vector без фиксированной размерности, чтобы
+во время перепроецирования в таблице сосуществовали векторы старой и новой
+версии. HNSW индекс пересоздается по выражению embedding::vector(768)
+только для raw векторов (embedding_version IS NULL); индексы проекций
+создает python -m app.services.embedding_backfill --reproject --create-index.
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '202611_emails_embedding_version'
+down_revision = '202610_emails_embedding_hnsw'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_emails_embedding_cosine'
+
+
+def upgrade() -> None:
+    """Добавление embedding_version и индекса по выражению."""
+    op.add_column('emails', sa.Column('embedding_version', sa.String(length=64), nullable=True))
+
+    with op.get_context().autocommit_block():
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}')
+
+    op.execute('ALTER TABLE emails ALTER COLUMN embedding TYPE vector')
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME}
+            ON emails USING hnsw ((embedding::vector(768)) vector_cosine_ops)
+            WITH (m = 16, ef_construction = 64)
+            WHERE category IS NOT NULL AND embedding_version IS NULL
+            """
+        )
+
+
+def downgrade() -> None:
+    """Возврат к vector(768): спроецированные векторы удаляются (нужен backfill)."""
+    with op.get_context().autocommit_block():
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}')
+
+    op.execute('UPDATE emails SET embedding = NULL WHERE embedding_version IS NOT NULL')
+    op.execute('ALTER TABLE emails ALTER COLUMN embedding TYPE vector(768)')
+    op.drop_column('emails', 'embedding_version')
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME}
+            ON emails USING hnsw (embedding vector_cosine_ops)
+            WITH (m = 16, ef_construction = 64)
+            WHERE category IS NOT NULL
+            """
+        )
@@ -0,0 +1,38 @@
+"""
+Alembic миграция: таблица email_threads (индекс тредов для классификации).
+
+Корень треда (первый Message-ID из References, иначе In-Reply-To) ->
+последняя классификация треда. EmailClassifierService наследует категорию
+для ответов в треде без rules/LLM; ThreadIndex держит горячую часть в LRU.
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '202612_email_threads'
+down_revision = '202611_emails_embedding_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Создание таблицы email_threads."""
+    op.create_table(
+        'email_threads',
+        sa.Column('thread_root', sa.Text(), nullable=False, comment='Message-ID корня треда'),
+        sa.Column('category', sa.String(50), nullable=False),
+        sa.Column('confidence', sa.Float(), nullable=False),
+        sa.Column('last_message_id', sa.Text(), nullable=True),
+        sa.Column('message_count', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('thread_root'),
+    )
+    # Очистка устаревших тредов: DELETE ... WHERE updated_at < now() - interval
+    op.create_index('ix_email_threads_updated_at', 'email_threads', ['updated_at'])
+
+
+def downgrade() -> None:
+    """Удаление таблицы email_threads."""
+    op.drop_index('ix_email_threads_updated_at', table_name='email_threads')
+    op.drop_table('email_threads')
@@ -16,6 +16,8 @@ from datetime import UTC, datetime
 
 from prometheus_client import Counter, Histogram
 
+from app.services.thread_index import thread_root
+
 logger = logging.getLogger(__name__)
 
 # Prometheus metrics
@@ -81,9 +83,17 @@ class EmailPipelineService:
                 },
             )
 
-            # 2. Classify email
+            # 2. Classify email (new content only: no quoted history or signature;
+            #    replies inherit their thread's category)
             classification = await self.classifier.classify(
-                email_event.body_text or "", email_event.subject
+                email_event.new_content or email_event.body_text or "",
+                email_event.subject,
+                thread_root=thread_root(
+                    email_event.message_id,
+                    email_event.in_reply_to,
+                    email_event.references,
+                ),
+                message_id=email_event.message_id,
             )
 
             logger.info(
@@ -112,8 +112,8 @@ class EmailConsumer:
         start_time = datetime.now(UTC)
 
         try:
-            # Parse message (EmailReceivedEvent JSON)
-            # event = EmailReceivedEvent.model_validate_json(message.value)
+            # Parse message (EmailReceivedEvent, binary event_codec or JSON)
+            # event = decode_email_received(message.value)
 
             logger.info(
                 "Processing email",
@@ -126,7 +126,7 @@ class EmailConsumer:
 
             # 1. Classify email
             # classification = await self.classifier.classify(
-            #     event.body_text or "",
+            #     event.new_content or event.body_text or "",
             #     event.subject
             # )
 
@@ -18,7 +18,10 @@ from pydantic import BaseModel
 
 # Import LLM services (TASK-EMAIL-003)
 from app.services.ollama_client import OllamaClient
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_projection import load_projection
 from app.services.embedding_service import EmbeddingService
+from app.services.vector_index import IVFFlatIndex, QuantizedIndex
 from app.services.llm_classifier import LLMClassifier
 from app.services.rules_loader import RulesConfiguration
 from app.services.rules_classifier import RulesEngine
@@ -182,13 +185,23 @@ async def lifespan(app: FastAPI):
     # Initialize Ollama Client (TASK-EMAIL-003)
     try:
         logger.info("🤖 Initializing Ollama client...")
+        # Каскад LLM моделей: маленькая → большая (пусто = только OLLAMA_MODEL)
+        cascade_models = [
+            m.strip() for m in os.getenv("LLM_CASCADE_MODELS", "").split(",") if m.strip()
+        ]
         ollama_client = OllamaClient(
             host=os.getenv("OLLAMA_HOST", "http://localhost:11434"),
             model=os.getenv("OLLAMA_MODEL", "mistral:7b"),
             timeout=30,
-            max_retries=3
+            max_retries=3,
+            embedding_model=os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text:latest"),
+            keep_alive=os.getenv("OLLAMA_KEEP_ALIVE") or None,
+            keep_warm_interval=int(os.getenv("OLLAMA_KEEP_WARM_INTERVAL", "0")),
+            extra_models=cascade_models
+        )
+        await ollama_client.init(
+            warmup=os.getenv("OLLAMA_WARMUP", "false").lower() == "true"
         )
-        await ollama_client.init()
         
         # Check Ollama health
         if await ollama_client.health_check():
@@ -196,12 +209,51 @@ async def lifespan(app: FastAPI):
             
             # Initialize embedding service (requires DB - stub for now)
             db_service = None  # TODO: Initialize actual DB service
-            embedding_service = EmbeddingService(db_service, ollama_client)
+            # "truncate:256" или путь к PCA .npz (embedding_projection fit)
+            projection = load_projection(os.getenv("EMBEDDING_PROJECTION"))
+            embedding_dims = projection.output_dim if projection else 768
+            embedding_cache = EmbeddingCache(
+                dimensions=embedding_dims,
+                max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")),
+                disk_path=os.getenv("EMBEDDING_CACHE_PATH") or None,
+                disk_capacity=int(os.getenv("EMBEDDING_CACHE_DISK_CAPACITY", "200000"))
+            )
+            hot_index_size = int(os.getenv("HOT_INDEX_SIZE", "20000"))
+            hot_index_quantization = os.getenv("HOT_INDEX_QUANTIZATION", "none")
+            if hot_index_size <= 0:
+                hot_index = None
+            elif hot_index_quantization == "none":
+                hot_index = IVFFlatIndex(dimensions=embedding_dims, capacity=hot_index_size)
+            else:
+                hot_index = QuantizedIndex(
+                    dimensions=embedding_dims,
+                    capacity=hot_index_size,
+                    mode=hot_index_quantization,
+                    rerank_candidates=int(os.getenv("HOT_INDEX_RERANK", "64"))
+                )
+            embedding_service = EmbeddingService(
+                db_service,
+                ollama_client,
+                cache=embedding_cache,
+                hot_index=hot_index,
+                ef_search=int(os.getenv("PGVECTOR_EF_SEARCH", "40")),
+                # Требует install_vector_codec(engine) при создании DB engine
+                binary_vectors=os.getenv("PGVECTOR_BINARY", "false").lower() == "true",
+                projection=projection
+            )
+            if db_service and embedding_service.hot_index is not None:
+                await embedding_service.load_hot_index()
             logger.info("✅ Embedding service initialized")
             
             # Initialize LLM classifier
-            llm_classifier = LLMClassifier(ollama_client, embedding_service)
+            llm_classifier = LLMClassifier(
+                ollama_client,
+                embedding_service,
+                models=cascade_models or None,
+                escalation_threshold=float(os.getenv("LLM_ESCALATION_THRESHOLD", "0.75"))
+            )
             logger.info("✅ LLM classifier ready (target: 95% accuracy, 700-800ms)")
+            logger.info(f"   Model cascade: {' → '.join(llm_classifier.models)}")
         else:
             logger.warning("⚠️ Ollama not available - LLM classifier disabled")
             logger.info("   Will use Rules classifier only (85% accuracy, <100ms)")
@@ -272,6 +324,10 @@ async def lifespan(app: FastAPI):
         logger.info("Closing Kafka producer...")
         await kafka_producer.close()
     
+    # Persist embedding cache
+    if embedding_service and embedding_service.cache:
+        embedding_service.cache.flush()
+    
     # Close Ollama client
     if ollama_client:
         await ollama_client.close()
@@ -342,6 +398,7 @@ async def readiness_check() -> ReadinessResponse:
     Readiness probe endpoint.
 
     Checks all dependencies (DB, Kafka, Redis) and returns detailed status.
+    When Ollama warm-up is enabled, also waits for the LLM models to be loaded.
     Used by Kubernetes readiness probe.
     """
     checks = {
@@ -356,6 +413,11 @@ async def readiness_check() -> ReadinessResponse:
         },
     }
 
+    if ollama_client and ollama_client.warmup_enabled:
+        checks["llm_models"] = {
+            "status": "healthy" if ollama_client.models_warm else "warming"
+        }
+
     # Overall status is healthy only if all checks pass
     all_healthy = all(
         check["status"] == "healthy" for check in checks.values()
@@ -26,9 +26,17 @@ class EmailDocument(BaseModel):
     to_email: str = Field(..., description="Recipient email address")
     subject: str = Field(default="", description="Email subject")
     body_text: str = Field(default="", description="Email body (plain text)")
+    new_content: Optional[str] = Field(
+        default=None, description="body_text без цитат, подписи и дисклеймера"
+    )
     size_bytes: int = Field(default=0, description="Email size in bytes")
     received_at: datetime = Field(..., description="When email was received")
 
+    @property
+    def content_text(self) -> str:
+        """Текст для анализа: new_content если выделен при приеме, иначе body_text"""
+        return self.new_content if self.new_content is not None else self.body_text
+
 
 class Classification(BaseModel):
     """Classification result"""
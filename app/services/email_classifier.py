@@ -1,6 +1,7 @@
 """
 Email Classification Service - Two-Stage Classifier
 
+Stage 0: Thread inheritance - replies keep their thread's category
 Stage 1: Rules-based classification (fast, 70% accuracy)
 Stage 2: LLM-based classification (accurate, 95% accuracy)
 
@@ -18,6 +19,8 @@ from typing import Any
 
 from pydantic import BaseModel, Field
 
+from app.services.thread_index import ThreadIndex
+
 logger = logging.getLogger(__name__)
 
 
@@ -38,7 +41,7 @@ class Classification(BaseModel):
 
     category: EmailCategory
     confidence: float = Field(..., ge=0.0, le=1.0)
-    method: str = Field(..., description="Classification method: rules or llm")
+    method: str = Field(..., description="Classification method: thread, rules or llm")
     entities: dict[str, Any] = Field(default_factory=dict, description="Extracted entities")
     requires_erp_action: bool = Field(
         default=False, description="Requires ERP action (order, invoice, etc)"
@@ -51,6 +54,7 @@ class EmailClassifierService:
     """
     Two-stage email classifier.
 
+    Stage 0: Category inherited from the thread (no rules, no LLM)
     Stage 1: Fast rules-based classification
     Stage 2: Accurate LLM-based classification
     """
@@ -112,24 +116,53 @@ class EmailClassifierService:
     # Confidence threshold for Stage 1 → skip Stage 2
     CONFIDENCE_THRESHOLD = 0.85
 
-    def __init__(self, llm_client=None, vector_store=None):
+    # Forwards start a new conversation even inside a thread
+    FORWARD_SUBJECT = re.compile(r"^\s*(?:fwd?|пересл)\s*:", re.IGNORECASE)
+
+    def __init__(
+        self,
+        llm_client=None,
+        vector_store=None,
+        thread_index: ThreadIndex | None = None,
+        thread_confidence_threshold: float | None = None,
+    ):
         """
         Initialize email classifier.
 
         Args:
             llm_client: Ollama client for LLM classification
             vector_store: pgvector store for few-shot learning
+            thread_index: Thread root → last classification (enables Stage 0)
+            thread_confidence_threshold: Min confidence of the thread's
+                classification to inherit it (default CONFIDENCE_THRESHOLD)
         """
         self.llm_client = llm_client
         self.vector_store = vector_store
+        self.thread_index = thread_index
+        self.thread_confidence_threshold = (
+            self.CONFIDENCE_THRESHOLD
+            if thread_confidence_threshold is None
+            else thread_confidence_threshold
+        )
+
+        self.stats = {"thread": 0, "rules": 0, "llm": 0}
 
-    async def classify(self, email_text: str, subject: str = "") -> Classification:
+    async def classify(
+        self,
+        email_text: str,
+        subject: str = "",
+        thread_root: str | None = None,
+        message_id: str | None = None,
+    ) -> Classification:
         """
         Classify email using two-stage approach.
 
         Args:
             email_text: Email body text
             subject: Email subject line
+            thread_root: Root Message-ID of the email's thread (see
+                thread_index.thread_root); enables inheritance and recording
+            message_id: Message-ID of the email (recorded in the thread)
 
         Returns:
             Classification result with category and confidence
@@ -137,6 +170,80 @@ class EmailClassifierService:
         # Combine subject and body for classification
         full_text = f"{subject}\n\n{email_text}"
 
+        # Stage 0: Thread inheritance
+        if thread_root and self.thread_index is not None:
+            inherited = await self.thread_classify(full_text, subject, thread_root)
+            if inherited is not None:
+                self.stats["thread"] += 1
+                await self.thread_index.record(
+                    thread_root, inherited.category.value, inherited.confidence, message_id
+                )
+                logger.info(
+                    "Email classified by thread",
+                    extra={
+                        "category": inherited.category,
+                        "confidence": inherited.confidence,
+                        "method": "thread",
+                    },
+                )
+                return inherited
+
+        result = await self._classify_stages(full_text, subject)
+        self.stats[result.method] += 1
+
+        if thread_root and self.thread_index is not None:
+            await self.thread_index.record(
+                thread_root, result.category.value, result.confidence, message_id
+            )
+        return result
+
+    async def thread_classify(
+        self, text: str, subject: str, thread_root: str
+    ) -> Classification | None:
+        """
+        Stage 0: Inherit the thread's category.
+
+        The thread's last classification is used if it is confident enough
+        and the email is not a forward. ERP action is only requested when
+        the reply itself carries entities (e.g. a new PO number), so
+        "thanks, received" follow-ups do not repeat the thread's action.
+
+        Args:
+            text: Email text (subject + body)
+            subject: Email subject
+            thread_root: Thread root Message-ID
+
+        Returns:
+            Classification with method "thread", or None to run Stage 1/2
+        """
+        if self.FORWARD_SUBJECT.match(subject or ""):
+            return None
+
+        thread = await self.thread_index.get(thread_root)
+        if thread is None or thread.confidence < self.thread_confidence_threshold:
+            return None
+
+        try:
+            category = EmailCategory(thread.category)
+        except ValueError:
+            return None
+        if category == EmailCategory.UNKNOWN:
+            return None
+
+        entities = self._extract_entities(text, category)
+        requires_erp, erp_action = self._erp_action(category) if entities else (False, None)
+
+        return Classification(
+            category=category,
+            confidence=thread.confidence,
+            method="thread",
+            entities=entities,
+            requires_erp_action=requires_erp,
+            erp_action_type=erp_action,
+        )
+
+    async def _classify_stages(self, full_text: str, subject: str) -> Classification:
+        """Stage 1 (rules), then Stage 2 (LLM) below the confidence threshold."""
         # Stage 1: Rules-based classification
         rules_result = self.rules_classify(full_text)
 
@@ -210,16 +317,7 @@ class EmailClassifierService:
             entities = self._extract_entities(text, best_category)
 
         # Determine if ERP action needed
-        requires_erp = best_category in [
-            EmailCategory.INVOICE,
-            EmailCategory.PURCHASE_ORDER,
-        ]
-        erp_action = None
-        if requires_erp:
-            if best_category == EmailCategory.PURCHASE_ORDER:
-                erp_action = "create_order"
-            elif best_category == EmailCategory.INVOICE:
-                erp_action = "update_invoice"
+        requires_erp, erp_action = self._erp_action(best_category)
 
         return Classification(
             category=best_category,
@@ -230,6 +328,15 @@ class EmailClassifierService:
             erp_action_type=erp_action,
         )
 
+    @staticmethod
+    def _erp_action(category: EmailCategory) -> tuple[bool, str | None]:
+        """(requires ERP action, action type) for a category."""
+        if category == EmailCategory.PURCHASE_ORDER:
+            return True, "create_order"
+        if category == EmailCategory.INVOICE:
+            return True, "update_invoice"
+        return False, None
+
     async def llm_classify(self, text: str, subject: str) -> Classification:
         """
         Stage 2: LLM-based classification with few-shot learning.
@@ -374,3 +481,10 @@ class EmailClassifierService:
         # TODO: Parse LLM response
         # Expected format: "invoice (confidence: 0.95)"
         return EmailCategory.UNKNOWN, 0.75
+
+    def get_stats(self) -> dict[str, Any]:
+        """Classifications per stage and thread index statistics."""
+        stats: dict[str, Any] = {"by_method": dict(self.stats)}
+        if self.thread_index is not None:
+            stats["thread_index"] = self.thread_index.get_stats()
+        return stats
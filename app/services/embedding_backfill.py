@@ -0,0 +1,379 @@
+"""
+Embedding Backfill Job
+Массовое заполнение emails.embedding для исторических писем
+
+Keyset-пагинация по emails.id (без OFFSET), batch embeddings с ограниченной
+конкурентностью, одна multi-row UPDATE на chunk, checkpoint на диске
+для продолжения после остановки.
+
+С --reproject перезаписывает уже сохраненные векторы другой версии
+проекции (см. embedding_projection): raw векторы проецируются локально,
+векторы другой проекции пересчитываются из текста.
+
+Запуск:
+    python -m app.services.embedding_backfill --chunk-size 512 --concurrency 4
+    python -m app.services.embedding_backfill --reproject --create-index
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any
+
+import numpy as np
+
+from app.services.embedding_projection import load_projection, vector_index_ddl
+from app.services.embedding_service import EmbeddingService
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackfillJob:
+    """
+    Resumable backfill embeddings для таблицы emails
+
+    Каждый chunk: SELECT (keyset) → embed_batch (concurrency batches
+    параллельно) → один UPDATE ... FROM (VALUES ...) → checkpoint.
+    Письма, для которых embedding не получен, пропускаются и остаются
+    с embedding IS NULL (подхватятся повторным запуском с --restart).
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        db_service,
+        chunk_size: int = 512,
+        batch_size: int = 32,
+        concurrency: int = 4,
+        checkpoint_path: str | None = None,
+        max_text_chars: int = 8000,
+        reproject: bool = False
+    ):
+        self.embedding = embedding_service
+        self.db = db_service
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.checkpoint_path = checkpoint_path
+        self.max_text_chars = max_text_chars
+        self.reproject = reproject
+
+        self.last_id = 0
+        self.stats = {
+            'chunks': 0,
+            'processed': 0,
+            'stored': 0,
+            'failed': 0,
+            'projected_locally': 0,
+            'embed_seconds': 0.0,
+            'write_seconds': 0.0
+        }
+        self.started_at: float | None = None
+        self.processed_at_start = 0
+
+    def load_checkpoint(self) -> bool:
+        """
+        Прочитать checkpoint (last_id + счетчики)
+
+        Returns:
+            True если checkpoint найден
+        """
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return False
+
+        with open(self.checkpoint_path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        self.last_id = data.get('last_id', 0)
+        for key in ('processed', 'stored', 'failed'):
+            self.stats[key] = data.get(key, 0)
+
+        logger.info(f"📍 Resuming backfill from id > {self.last_id} ({self.stats['stored']} stored)")
+        return True
+
+    def save_checkpoint(self):
+        """Атомарно записать checkpoint (tmp файл + rename)"""
+        if not self.checkpoint_path:
+            return
+
+        data = {
+            'last_id': self.last_id,
+            'processed': self.stats['processed'],
+            'stored': self.stats['stored'],
+            'failed': self.stats['failed'],
+            'updated_at': time.time()
+        }
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def reset_checkpoint(self):
+        """Начать с начала таблицы"""
+        self.last_id = 0
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    async def fetch_chunk(self) -> list[tuple[int, str, np.ndarray | None]]:
+        """
+        Следующий chunk писем (keyset pagination)
+
+        Backfill - письма без embedding; reproject - письма с embedding
+        другой версии проекции.
+
+        Returns:
+            Список (email_id, текст, raw вектор или None) по возрастанию id
+        """
+        params: dict[str, Any] = {'last_id': self.last_id, 'chunk_size': self.chunk_size}
+
+        if self.reproject:
+            where = "embedding IS NOT NULL AND embedding_version IS DISTINCT FROM :version"
+            params['version'] = self.embedding.embedding_version
+        else:
+            where = "embedding IS NULL"
+
+        async with self.db.get_session() as session:
+            from sqlalchemy import text
+
+            query = text(f"""
+                SELECT id, subject, body_text, embedding, embedding_version
+                FROM emails
+                WHERE {where}
+                  AND id > :last_id
+                ORDER BY id
+                LIMIT :chunk_size
+            """)
+
+            result = await session.execute(query, params)
+            rows = result.fetchall()
+
+        return [
+            (row[0], self._email_text(row[1], row[2]), self._raw_vector(row[3], row[4]))
+            for row in rows
+        ]
+
+    def _raw_vector(self, value, version: str | None) -> np.ndarray | None:
+        """
+        Сохраненный вектор, если его можно спроецировать без Ollama
+
+        Только raw векторы модели (version NULL) - PCA необратима, поэтому
+        векторы другой проекции пересчитываются из текста.
+        """
+        if value is None or version is not None or self.embedding.projection is None:
+            return None
+        return self.embedding._vector_from_db(value)
+
+    def _email_text(self, subject: str | None, body: str | None) -> str:
+        """Текст для embedding (как в EmailProcessor: subject + body)"""
+        return f"{subject or ''}\n\n{body or ''}"[:self.max_text_chars]
+
+    async def _embed_batch(self, texts: list[str]) -> list:
+        """Embed одного batch под семафором"""
+        async with self.semaphore:
+            return await self.embedding.embed_batch(texts, use_cache=False)
+
+    async def process_chunk(self, rows: list[tuple[int, str, np.ndarray | None]]) -> int:
+        """
+        Embed chunk и записать одним UPDATE
+
+        Returns:
+            Количество сохраненных embeddings
+        """
+        pairs = []
+
+        local = [(email_id, raw) for email_id, _, raw in rows if raw is not None]
+        if local:
+            projected = self.embedding.projection.apply(np.stack([raw for _, raw in local]))
+            pairs.extend(zip([email_id for email_id, _ in local], projected, strict=True))
+            self.stats['projected_locally'] += len(local)
+
+        to_embed = [(email_id, text) for email_id, text, raw in rows if raw is None]
+
+        embed_start = time.perf_counter()
+        batches = [
+            to_embed[i:i + self.batch_size]
+            for i in range(0, len(to_embed), self.batch_size)
+        ]
+        results = await asyncio.gather(
+            *[self._embed_batch([text for _, text in batch]) for batch in batches]
+        )
+        self.stats['embed_seconds'] += time.perf_counter() - embed_start
+
+        for batch, embeddings in zip(batches, results, strict=True):
+            for (email_id, _), embedding in zip(batch, embeddings, strict=True):
+                if embedding is None:
+                    self.stats['failed'] += 1
+                else:
+                    pairs.append((email_id, embedding))
+
+        write_start = time.perf_counter()
+        if pairs:
+            await self.embedding.store_embeddings_bulk(pairs)
+        self.stats['write_seconds'] += time.perf_counter() - write_start
+
+        self.stats['chunks'] += 1
+        self.stats['processed'] += len(rows)
+        self.stats['stored'] += len(pairs)
+        return len(pairs)
+
+    async def run(self, limit: int | None = None) -> dict[str, Any]:
+        """
+        Выполнить backfill
+
+        Args:
+            limit: Максимум писем за этот запуск (None = до конца таблицы)
+
+        Returns:
+            Итоговая статистика
+        """
+        self.started_at = time.perf_counter()
+        self.processed_at_start = self.stats['processed']
+
+        logger.info(
+            f"🚀 Embedding {'reprojection' if self.reproject else 'backfill'} started: "
+            f"chunk={self.chunk_size}, batch={self.batch_size}, "
+            f"version={self.embedding.embedding_version}, from id > {self.last_id}"
+        )
+
+        while True:
+            if limit is not None and self.stats['processed'] - self.processed_at_start >= limit:
+                break
+
+            rows = await self.fetch_chunk()
+            if not rows:
+                break
+
+            await self.process_chunk(rows)
+            self.last_id = rows[-1][0]
+            self.save_checkpoint()
+
+            progress = self.get_stats()
+            logger.info(
+                f"📈 Backfill: {progress['processed']} processed, "
+                f"{progress['stored']} stored, {progress['failed']} failed, "
+                f"{progress['emails_per_sec']} emails/s (last id {self.last_id})"
+            )
+
+        stats = self.get_stats()
+        logger.info(
+            f"✅ Embedding backfill finished: {stats['stored']} stored "
+            f"in {stats['elapsed_seconds']}s"
+        )
+        return stats
+
+    def get_stats(self) -> dict[str, Any]:
+        """Прогресс и throughput"""
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        run_processed = self.stats['processed'] - self.processed_at_start
+
+        return {
+            **{k: v for k, v in self.stats.items() if not k.endswith('_seconds')},
+            'last_id': self.last_id,
+            'elapsed_seconds': round(elapsed, 1),
+            'emails_per_sec': round(run_processed / elapsed, 1) if elapsed else 0,
+            'embed_seconds': round(self.stats['embed_seconds'], 2),
+            'write_seconds': round(self.stats['write_seconds'], 2)
+        }
+
+
+class _SessionFactory:
+    """Минимальный db_service (get_session) поверх AsyncEngine для CLI"""
+
+    def __init__(self, database_url: str, binary_vectors: bool):
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        self.engine = create_async_engine(database_url, pool_size=2)
+        if binary_vectors:
+            from app.services.vector_codec import install_vector_codec
+            install_vector_codec(self.engine)
+        self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def get_session(self):
+        async with self.sessionmaker() as session:
+            yield session
+
+
+async def main(argv: list[str] | None = None):
+    """CLI: python -m app.services.embedding_backfill"""
+    from app.services.ollama_client import OllamaClient
+
+    parser = argparse.ArgumentParser(description="Backfill emails.embedding")
+    parser.add_argument('--chunk-size', type=int, default=512)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--checkpoint', default=None)
+    parser.add_argument('--restart', action='store_true', help="Ignore checkpoint")
+    parser.add_argument(
+        '--reproject', action='store_true',
+        help="Rewrite stored vectors of other projection versions (EMBEDDING_PROJECTION)"
+    )
+    parser.add_argument(
+        '--create-index', action='store_true',
+        help="Create the HNSW index for the current projection version afterwards"
+    )
+    args = parser.parse_args(argv)
+    checkpoint = args.checkpoint or (
+        '.embedding_reproject.json' if args.reproject else '.embedding_backfill.json'
+    )
+
+    logging.basicConfig(level=logging.INFO)
+
+    binary_vectors = os.getenv("PGVECTOR_BINARY", "false").lower() == "true"
+    db = _SessionFactory(os.environ["DATABASE_URL"], binary_vectors)
+
+    ollama = OllamaClient(
+        host=os.getenv("OLLAMA_HOST", "http://localhost:11434"),
+        embedding_model=os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text:latest")
+    )
+    await ollama.init()
+
+    embedding_service = EmbeddingService(
+        db_service=db,
+        ollama_client=ollama,
+        max_batch_size=args.batch_size,
+        binary_vectors=binary_vectors,
+        projection=load_projection(os.getenv("EMBEDDING_PROJECTION"))
+    )
+    job = EmbeddingBackfillJob(
+        embedding_service,
+        db,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        checkpoint_path=checkpoint,
+        reproject=args.reproject
+    )
+
+    if args.restart:
+        job.reset_checkpoint()
+    else:
+        job.load_checkpoint()
+
+    try:
+        await job.run(limit=args.limit)
+
+        if args.create_index:
+            from sqlalchemy import text
+
+            ddl = vector_index_ddl(
+                embedding_service.embedding_version,
+                embedding_service.embedding_dimensions
+            )
+            # CREATE INDEX CONCURRENTLY - вне транзакции
+            async with db.engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                await conn.execute(text(ddl))
+            logger.info(f"✅ Vector index ready for version {embedding_service.embedding_version}")
+    finally:
+        await ollama.close()
+        await db.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
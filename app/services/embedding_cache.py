@@ -0,0 +1,247 @@
+"""
+Embedding Cache
+Кэш embeddings по хэшу нормализованного текста
+In-memory LRU (float16) + memory-mapped store на диске
+"""
+
+import hashlib
+import logging
+import os
+import unicodedata
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Слот дискового индекса: 16-байтный ключ + порядковый номер записи (0 = пусто)
+_INDEX_DTYPE = np.dtype([('key', 'V16'), ('seq', '<u8')])
+
+
+class DiskEmbeddingStore:
+    """
+    Memory-mapped кольцевой буфер float16 векторов
+
+    Два файла: vectors.f16 (capacity × dims) и index.bin (ключ + seq).
+    При переполнении перезаписываются самые старые записи. Если capacity
+    изменилась, файлы пересоздаются с новым размером и самыми новыми
+    записями.
+    """
+
+    def __init__(self, path: str, dimensions: int, capacity: int):
+        self.path = path
+        self.dimensions = dimensions
+        self.capacity = capacity
+
+        os.makedirs(path, exist_ok=True)
+        vectors_path = os.path.join(path, f"vectors_{dimensions}.f16")
+        index_path = os.path.join(path, f"index_{dimensions}.bin")
+        mode = 'w+'
+        if os.path.exists(vectors_path) and os.path.exists(index_path):
+            stored = os.path.getsize(index_path) // _INDEX_DTYPE.itemsize
+            if self._is_consistent(vectors_path, index_path, stored):
+                mode = 'r+'
+                if stored != capacity:
+                    self._resize(vectors_path, index_path, stored)
+            else:
+                logger.warning(f"⚠️ Embedding disk store at {path} is inconsistent, recreating")
+                os.remove(vectors_path)
+                os.remove(index_path)
+
+        self.vectors = np.memmap(
+            vectors_path, dtype=np.float16, mode=mode, shape=(capacity, dimensions)
+        )
+        self.index = np.memmap(index_path, dtype=_INDEX_DTYPE, mode=mode, shape=(capacity,))
+
+        # Восстановить key → slot и позицию записи
+        self.slots: dict[bytes, int] = {}
+        used = np.nonzero(self.index['seq'])[0]
+        for slot in used:
+            self.slots[bytes(self.index['key'][slot])] = int(slot)
+
+        if len(used):
+            last = int(used[np.argmax(self.index['seq'][used])])
+            self.seq = int(self.index['seq'][last])
+            self.next_slot = (last + 1) % capacity
+        else:
+            self.seq = 0
+            self.next_slot = 0
+
+        logger.info(f"💾 Embedding disk store: {len(self.slots)}/{capacity} vectors at {path}")
+
+    def _is_consistent(self, vectors_path: str, index_path: str, stored: int) -> bool:
+        """Размеры файлов соответствуют одному и тому же числу записей"""
+        vector_bytes = self.dimensions * np.dtype(np.float16).itemsize
+        return (
+            stored > 0
+            and os.path.getsize(index_path) == stored * _INDEX_DTYPE.itemsize
+            and os.path.getsize(vectors_path) == stored * vector_bytes
+        )
+
+    def _resize(self, vectors_path: str, index_path: str, stored: int):
+        """Переписать файлы под новую capacity (новые записи сохраняются)"""
+        old_vectors = np.memmap(vectors_path, dtype=np.float16, mode='r', shape=(stored, self.dimensions))
+        old_index = np.memmap(index_path, dtype=_INDEX_DTYPE, mode='r', shape=(stored,))
+        used = np.nonzero(old_index['seq'])[0]
+        # Самые новые записи, в порядке записи
+        keep = used[np.argsort(old_index['seq'][used])][-self.capacity:]
+
+        new_vectors = np.memmap(
+            vectors_path + ".tmp", dtype=np.float16, mode='w+', shape=(self.capacity, self.dimensions)
+        )
+        new_index = np.memmap(index_path + ".tmp", dtype=_INDEX_DTYPE, mode='w+', shape=(self.capacity,))
+        for start in range(0, len(keep), 10000):
+            chunk = keep[start:start + 10000]
+            new_vectors[start:start + len(chunk)] = old_vectors[chunk]
+            new_index['key'][start:start + len(chunk)] = old_index['key'][chunk]
+        new_index['seq'][:len(keep)] = np.arange(1, len(keep) + 1)
+        new_vectors.flush()
+        new_index.flush()
+        del old_vectors, old_index, new_vectors, new_index
+
+        os.replace(vectors_path + ".tmp", vectors_path)
+        os.replace(index_path + ".tmp", index_path)
+        logger.info(
+            f"💾 Embedding disk store resized {stored} → {self.capacity}, kept {len(keep)} vectors"
+        )
+
+    def get(self, key: bytes) -> np.ndarray | None:
+        """Прочитать вектор (копия из mmap) или None"""
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+        return np.array(self.vectors[slot])
+
+    def put(self, key: bytes, vector: np.ndarray):
+        """Записать вектор, вытеснив самый старый при переполнении"""
+        if key in self.slots:
+            return
+
+        slot = self.next_slot
+        if self.index['seq'][slot]:
+            self.slots.pop(bytes(self.index['key'][slot]), None)
+
+        self.seq += 1
+        self.vectors[slot] = vector
+        self.index[slot] = (key, self.seq)
+        self.slots[key] = slot
+        self.next_slot = (slot + 1) % self.capacity
+
+    def flush(self):
+        """Сбросить изменения на диск"""
+        self.vectors.flush()
+        self.index.flush()
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+
+class EmbeddingCache:
+    """
+    Кэш embeddings с ключом = хэш нормализованного текста
+
+    Векторы хранятся как float16 (768 dims = 1.5 KB вместо ~25 KB для
+    Python list из float). Горячие записи - в bounded LRU, остальные -
+    в memory-mapped store на диске (опционально).
+    """
+
+    def __init__(
+        self,
+        dimensions: int = 768,
+        max_entries: int = 10000,
+        disk_path: str | None = None,
+        disk_capacity: int = 200000
+    ):
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self.memory: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self.disk = (
+            DiskEmbeddingStore(disk_path, dimensions, disk_capacity)
+            if disk_path
+            else None
+        )
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Нормализовать текст: Unicode NFC + схлопнуть пробелы"""
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    @classmethod
+    def key_for(cls, text: str, model: str = "") -> bytes:
+        """Ключ кэша: 16-байтный хэш модели и нормализованного текста"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(model.encode('utf-8'))
+        digest.update(b"\0")
+        digest.update(cls.normalize(text).encode('utf-8'))
+        return digest.digest()
+
+    def get(self, key: bytes) -> np.ndarray | None:
+        """
+        Получить float16 вектор по ключу
+
+        Returns:
+            Вектор или None если промах
+        """
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.memory.move_to_end(key)
+            self.stats['memory_hits'] += 1
+            return vector
+
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                self.stats['disk_hits'] += 1
+                self._remember(key, vector)
+                return vector
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key: bytes, vector) -> np.ndarray:
+        """Сохранить вектор (конвертируется в float16)"""
+        compact = np.asarray(vector, dtype=np.float16)
+        self._remember(key, compact)
+
+        if self.disk is not None:
+            self.disk.put(key, compact)
+
+        return compact
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        """Положить в LRU, вытеснив самую старую запись"""
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def flush(self):
+        """Сбросить дисковый store"""
+        if self.disk is not None:
+            self.disk.flush()
+
+    def get_stats(self) -> dict[str, Any]:
+        """Получить статистику кэша"""
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        lookups = hits + self.stats['misses']
+
+        return {
+            'memory_entries': len(self.memory),
+            'disk_entries': len(self.disk) if self.disk is not None else 0,
+            'memory_hits': self.stats['memory_hits'],
+            'disk_hits': self.stats['disk_hits'],
+            'misses': self.stats['misses'],
+            'evictions': self.stats['evictions'],
+            'hit_rate': round(hits / lookups * 100, 1) if lookups else 0,
+            'memory_bytes': len(self.memory) * self.dimensions * 2
+        }
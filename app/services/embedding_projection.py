@@ -0,0 +1,310 @@
+"""
+Embedding Projection
+Понижение размерности embeddings перед хранением и поиском
+
+PCA (обучается offline на выборке embeddings) или Matryoshka-усечение
+(первые d компонент). Каждая проекция имеет версию, которая хранится
+в emails.embedding_version рядом с вектором.
+
+Команды:
+    python -m app.services.embedding_projection export-sample --out sample.npy
+    python -m app.services.embedding_projection evaluate --input sample.npy --dims 128 256 384
+    python -m app.services.embedding_projection fit --input sample.npy --dims 256 --out pca256.npz
+"""
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from typing import Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+_VERSION_RE = re.compile(r'^[a-z0-9_]{1,48}$')
+
+
+class EmbeddingProjection:
+    """
+    Линейная проекция input_dim → output_dim с L2-нормализацией
+
+    Вход нормализуется, центрируется (mean), умножается на components.T
+    и снова нормализуется - cosine similarity сохраняется приближенно.
+    """
+
+    KINDS = ('pca', 'truncate')
+
+    def __init__(
+        self,
+        kind: str,
+        input_dim: int,
+        output_dim: int,
+        components: np.ndarray | None = None,
+        mean: np.ndarray | None = None,
+        version: str | None = None
+    ):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown projection kind: {kind}")
+        if not 0 < output_dim <= input_dim:
+            raise ValueError(f"Invalid output_dim {output_dim} for input_dim {input_dim}")
+        if kind == 'pca' and (components is None or components.shape != (output_dim, input_dim)):
+            raise ValueError("PCA projection requires components of shape (output_dim, input_dim)")
+
+        self.kind = kind
+        self.input_dim = input_dim
+        self.output_dim = output_dim
+        self.components = None if components is None else components.astype(np.float32)
+        self.mean = None if mean is None else mean.astype(np.float32)
+        self.version = version or self._default_version()
+
+        if not _VERSION_RE.match(self.version):
+            raise ValueError(f"Invalid projection version: {self.version!r}")
+
+    def _default_version(self) -> str:
+        """trunc256 / pca256_<hash компонент>"""
+        if self.kind == 'truncate':
+            return f"trunc{self.output_dim}"
+
+        digest = hashlib.blake2b(digest_size=4)
+        digest.update(self.components.tobytes())
+        if self.mean is not None:
+            digest.update(self.mean.tobytes())
+        return f"pca{self.output_dim}_{digest.hexdigest()}"
+
+    @classmethod
+    def truncate(cls, input_dim: int, output_dim: int) -> "EmbeddingProjection":
+        """Matryoshka-усечение: первые output_dim компонент"""
+        return cls('truncate', input_dim, output_dim)
+
+    @classmethod
+    def fit_pca(cls, vectors: np.ndarray, output_dim: int) -> "EmbeddingProjection":
+        """
+        Обучить PCA на выборке embeddings
+
+        Args:
+            vectors: Матрица (n, input_dim), n >= output_dim
+            output_dim: Целевая размерность
+        """
+        data = _normalize(np.asarray(vectors, dtype=np.float32))
+        mean = data.mean(axis=0)
+        # Главные компоненты = правые сингулярные векторы центрированных данных
+        _, _, vt = np.linalg.svd(data - mean, full_matrices=False)
+
+        return cls('pca', data.shape[1], output_dim, components=vt[:output_dim], mean=mean)
+
+    def apply(self, vectors: np.ndarray | list[float]) -> np.ndarray:
+        """
+        Спроецировать вектор (input_dim,) или матрицу (n, input_dim)
+
+        Returns:
+            float32 L2-нормализованный результат той же формы (по строкам)
+        """
+        data = np.asarray(vectors, dtype=np.float32)
+        single = data.ndim == 1
+        data = _normalize(np.atleast_2d(data))
+
+        if self.kind == 'truncate':
+            projected = data[:, :self.output_dim]
+        else:
+            centered = data - self.mean if self.mean is not None else data
+            projected = centered @ self.components.T
+
+        projected = _normalize(projected)
+        return projected[0] if single else projected
+
+    def save(self, path: str):
+        """Сохранить проекцию в .npz"""
+        np.savez(
+            path,
+            kind=self.kind,
+            version=self.version,
+            input_dim=self.input_dim,
+            output_dim=self.output_dim,
+            components=self.components if self.components is not None else np.zeros(0),
+            mean=self.mean if self.mean is not None else np.zeros(0)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingProjection":
+        """Загрузить проекцию из .npz"""
+        with np.load(path) as data:
+            components = data['components']
+            mean = data['mean']
+            return cls(
+                str(data['kind']),
+                int(data['input_dim']),
+                int(data['output_dim']),
+                components=components if components.size else None,
+                mean=mean if mean.size else None,
+                version=str(data['version'])
+            )
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            'kind': self.kind,
+            'version': self.version,
+            'input_dim': self.input_dim,
+            'output_dim': self.output_dim
+        }
+
+
+def _normalize(data: np.ndarray) -> np.ndarray:
+    """L2-нормализация по строкам"""
+    norms = np.linalg.norm(data, axis=-1, keepdims=True)
+    return data / np.maximum(norms, 1e-12)
+
+
+def load_projection(spec: str | None, input_dim: int = 768) -> EmbeddingProjection | None:
+    """
+    Проекция из настройки EMBEDDING_PROJECTION
+
+    Args:
+        spec: "truncate:256", путь к .npz (PCA) или пусто (без проекции)
+    """
+    if not spec:
+        return None
+    if spec.startswith("truncate:"):
+        return EmbeddingProjection.truncate(input_dim, int(spec.split(":", 1)[1]))
+    return EmbeddingProjection.load(spec)
+
+
+def vector_index_ddl(version: str | None, dimensions: int) -> str:
+    """
+    HNSW индекс для векторов одной версии проекции
+
+    emails.embedding хранит векторы разной размерности, поэтому индекс -
+    по выражению embedding::vector(dims) с фильтром по embedding_version.
+    """
+    if version is None:
+        name = 'ix_emails_embedding_cosine'
+        predicate = 'embedding_version IS NULL'
+    else:
+        name = f'ix_emails_embedding_{version}'
+        predicate = f"embedding_version = '{version}'"
+
+    return f"""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}
+        ON emails USING hnsw ((embedding::vector({dimensions})) vector_cosine_ops)
+        WITH (m = 16, ef_construction = 64)
+        WHERE category IS NOT NULL AND {predicate}
+    """
+
+
+def evaluate_recall(
+    vectors: np.ndarray,
+    dims: list[int],
+    kind: str = 'pca',
+    k: int = 3,
+    n_queries: int = 200,
+    seed: int = 0
+) -> list[dict[str, Any]]:
+    """
+    Recall@k поиска в пространстве проекции относительно полной размерности
+
+    Выборка делится на corpus и queries; PCA обучается на corpus.
+
+    Returns:
+        Список {'dims', 'recall', 'bytes_per_vector'} по возрастанию dims
+    """
+    data = _normalize(np.asarray(vectors, dtype=np.float32))
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(data))
+    n_queries = min(n_queries, len(data) // 5)
+    queries, corpus = data[order[:n_queries]], data[order[n_queries:]]
+
+    exact = np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+    report = []
+    for d in sorted(dims):
+        if kind == 'pca':
+            projection = EmbeddingProjection.fit_pca(corpus, d)
+        else:
+            projection = EmbeddingProjection.truncate(data.shape[1], d)
+
+        approx = np.argsort(-(projection.apply(queries) @ projection.apply(corpus).T), axis=1)[:, :k]
+        hits = sum(len(set(e) & set(a)) for e, a in zip(exact.tolist(), approx.tolist(), strict=True))
+
+        report.append({
+            'dims': d,
+            'recall': round(hits / (n_queries * k), 3),
+            'bytes_per_vector': d * 4 + 8
+        })
+
+    return report
+
+
+async def _export_sample(limit: int) -> np.ndarray:
+    """Последние raw embeddings (без проекции) из emails"""
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app.services.vector_codec import parse_vector_text
+
+    engine = create_async_engine(os.environ["DATABASE_URL"])
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text("""
+                    SELECT embedding::text
+                    FROM emails
+                    WHERE embedding IS NOT NULL
+                    AND embedding_version IS NULL
+                    ORDER BY id DESC
+                    LIMIT :limit
+                """),
+                {"limit": limit}
+            )
+            return np.stack([parse_vector_text(row[0]) for row in result.fetchall()])
+    finally:
+        await engine.dispose()
+
+
+def main(argv: list[str] | None = None):
+    """CLI: export-sample / evaluate / fit"""
+    parser = argparse.ArgumentParser(description="Embedding dimensionality reduction")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export-sample', help="Dump raw embeddings from emails")
+    export.add_argument('--limit', type=int, default=20000)
+    export.add_argument('--out', required=True)
+
+    evaluate = commands.add_parser('evaluate', help="Recall@k versus dimension")
+    evaluate.add_argument('--input', required=True)
+    evaluate.add_argument('--dims', type=int, nargs='+', default=[64, 128, 256, 384, 512])
+    evaluate.add_argument('--kind', choices=EmbeddingProjection.KINDS, default='pca')
+    evaluate.add_argument('--k', type=int, default=3)
+
+    fit = commands.add_parser('fit', help="Fit and save a versioned projection")
+    fit.add_argument('--input', required=True)
+    fit.add_argument('--dims', type=int, required=True)
+    fit.add_argument('--out', required=True)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'export-sample':
+        sample = asyncio.run(_export_sample(args.limit))
+        np.save(args.out, sample)
+        print(f"Saved {len(sample)} embeddings to {args.out}")
+
+    elif args.command == 'evaluate':
+        vectors = np.load(args.input)
+        print(f"{len(vectors)} embeddings × {vectors.shape[1]} dims, {args.kind}")
+        print(f"{'dims':>6}{f'recall@{args.k}':>12}{'bytes':>8}")
+        for row in evaluate_recall(vectors, args.dims, kind=args.kind, k=args.k):
+            print(f"{row['dims']:>6}{row['recall']:>12.3f}{row['bytes_per_vector']:>8}")
+
+    elif args.command == 'fit':
+        projection = EmbeddingProjection.fit_pca(np.load(args.input), args.dims)
+        projection.save(args.out)
+        print(f"Saved projection {projection.version} to {args.out}")
+        print("Next: EMBEDDING_PROJECTION=<path> and re-project stored vectors with")
+        print("    python -m app.services.embedding_backfill --reproject --create-index")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,17 @@ Embedding & RAG Service
 Векторные embeddings + similarity search через pgvector
 """
 
+import asyncio
 import logging
 import numpy as np
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple, Optional, Dict, Any, Union
 from datetime import datetime
 
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_projection import EmbeddingProjection
+from app.services.vector_codec import format_vector_text, parse_vector_text
+from app.services.vector_index import IVFFlatIndex, QuantizedIndex
+
 logger = logging.getLogger(__name__)
 
 
@@ -17,71 +23,316 @@ class EmbeddingService:
     Использует pgvector для similarity search
     """
     
-    def __init__(self, db_service, ollama_client):
+    def __init__(
+        self,
+        db_service,
+        ollama_client,
+        max_batch_size: int = 32,
+        batch_window_ms: float = 5.0,
+        cache: Optional[EmbeddingCache] = None,
+        hot_index: Optional[Union[IVFFlatIndex, QuantizedIndex]] = None,
+        hot_index_min_size: int = 100,
+        ef_search: Optional[int] = 40,
+        ivfflat_probes: Optional[int] = None,
+        binary_vectors: bool = False,
+        projection: Optional[EmbeddingProjection] = None
+    ):
+        """
+        Args:
+            db_service: DB сервис с get_session()
+            ollama_client: OllamaClient (используется его pooled session)
+            max_batch_size: Максимум текстов в одном запросе /api/embed
+            batch_window_ms: Окно micro-batching для конкурентных embed_text
+                (0 = отправлять каждый текст сразу)
+            cache: Кэш embeddings по хэшу текста (опционально)
+            hot_index: In-process ANN индекс недавно классифицированных писем;
+                find_similar_emails обращается к pgvector только при промахе
+                (QuantizedIndex - int8 / 1-bit коды для миллионов писем в RAM)
+            hot_index_min_size: Минимальный размер hot_index, с которого он
+                используется (cold start → pgvector)
+            ef_search: hnsw.ef_search для pgvector запроса (None = default сервера)
+            ivfflat_probes: ivfflat.probes для pgvector запроса (если индекс IVFFlat)
+            binary_vectors: Передавать vector в БД как NumPy array (нужен
+                binary codec, см. vector_codec.install_vector_codec)
+            projection: Понижение размерности перед хранением и поиском
+                (версия пишется в emails.embedding_version)
+        """
         self.db = db_service
         self.ollama = ollama_client
-        self.embedding_model = "nomic-embed-text:latest"
-        self.embedding_dimensions = 768  # nomic-embed-text dimensions
+        self.embedding_model = ollama_client.embedding_model
+        self.model_dimensions = 768  # nomic-embed-text dimensions
+        self.projection = projection
+        self.embedding_dimensions = projection.output_dim if projection else self.model_dimensions
+        self.embedding_version = projection.version if projection else None
+        # Кэш хранит векторы после проекции - ключ зависит от ее версии
+        self.cache_namespace = (
+            f"{self.embedding_model}@{self.embedding_version}"
+            if self.embedding_version
+            else self.embedding_model
+        )
+        self.max_batch_size = max_batch_size
+        self.batch_window_ms = batch_window_ms
+        self.cache = cache
+        self.hot_index = hot_index
+        self.hot_index_min_size = hot_index_min_size
+        self.ef_search = ef_search
+        self.ivfflat_probes = ivfflat_probes
+        self.binary_vectors = binary_vectors
+        
+        # Micro-batching: ожидающие тексты конкурентных вызовов embed_text
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._batch_timer: Optional[asyncio.TimerHandle] = None
+        self._batch_tasks: set = set()
+        
+        self.stats = {
+            'texts_embedded': 0,
+            'requests': 0,
+            'failed': 0,
+            'hot_hits': 0,
+            'hot_misses': 0,
+            'db_searches': 0
+        }
     
-    async def embed_text(self, text: str) -> Optional[List[float]]:
+    async def embed_text(self, text: str) -> Optional[np.ndarray]:
         """
         Получить embedding для текста
         
+        Сначала проверяется кэш; конкурентные промахи в пределах
+        batch_window_ms объединяются в один запрос /api/embed.
+        
         Args:
             text: Текст для embedding (email subject + body)
             
         Returns:
-            Vector (768 dimensions) или None если ошибка
+            Vector float32 (embedding_dimensions) или None если ошибка
+        """
+        if self.cache is not None:
+            cached = self.cache.get(self.cache.key_for(text, self.cache_namespace))
+            if cached is not None:
+                return cached.astype(np.float32)
+        
+        if self.batch_window_ms <= 0:
+            return (await self._embed_uncached([text]))[0]
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch_pending()
+        elif self._batch_timer is None:
+            self._batch_timer = loop.call_later(
+                self.batch_window_ms / 1000,
+                self._dispatch_pending
+            )
+        
+        return await future
+    
+    def _dispatch_pending(self):
+        """Отправить накопленные тексты одним batch запросом"""
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        
+        task = asyncio.create_task(self._resolve_pending(pending))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+    
+    async def _resolve_pending(self, pending: List[Tuple[str, asyncio.Future]]):
+        """Выполнить batch и раздать результаты ожидающим вызовам"""
+        try:
+            embeddings = await self._embed_uncached([text for text, _ in pending])
+        except Exception as e:
+            logger.error(f"❌ Embedding micro-batch failed: {e}")
+            embeddings = [None] * len(pending)
+        
+        for (_, future), embedding in zip(pending, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+    
+    async def embed_batch(
+        self,
+        texts: List[str],
+        use_cache: bool = True
+    ) -> List[Optional[np.ndarray]]:
+        """
+        Получить embeddings для списка текстов
+        
+        Использует batch input /api/embed и pooled session OllamaClient.
+        Тексты из кэша и повторы внутри batch в запрос не попадают.
+        
+        Args:
+            texts: Тексты для embedding
+            use_cache: False для разовых массовых задач (backfill), чтобы
+                не вытеснять горячие записи кэша
+            
+        Returns:
+            Список float32 векторов в том же порядке (None для ошибочных)
         """
+        if self.cache is None or not use_cache:
+            return await self._embed_uncached(texts, use_cache=use_cache)
+        
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: Dict[bytes, List[int]] = {}
+        
+        for i, text in enumerate(texts):
+            key = self.cache.key_for(text, self.cache_namespace)
+            
+            if key in missing:
+                missing[key].append(i)
+                continue
+            
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[i] = cached.astype(np.float32)
+            else:
+                missing[key] = [i]
+        
+        if missing:
+            fresh = await self._embed_uncached([texts[idx[0]] for idx in missing.values()])
+            for indexes, embedding in zip(missing.values(), fresh):
+                for i in indexes:
+                    results[i] = embedding
+        
+        return results
+    
+    async def _embed_uncached(
+        self,
+        texts: List[str],
+        use_cache: bool = True
+    ) -> List[Optional[np.ndarray]]:
+        """Запросить embeddings у Ollama (chunks по max_batch_size) и закэшировать"""
+        results: List[Optional[np.ndarray]] = []
+        
+        for i in range(0, len(texts), self.max_batch_size):
+            chunk = texts[i:i + self.max_batch_size]
+            results.extend(await self._embed_request(chunk))
+        
+        if self.projection is not None:
+            results = self._project(results)
+        
+        if self.cache is not None and use_cache:
+            for text, embedding in zip(texts, results):
+                if embedding is not None:
+                    self.cache.put(self.cache.key_for(text, self.cache_namespace), embedding)
+        
+        return results
+    
+    def _project(self, vectors: List[Optional[np.ndarray]]) -> List[Optional[np.ndarray]]:
+        """Применить projection к успешным векторам (одной матричной операцией)"""
+        valid = [i for i, v in enumerate(vectors) if v is not None]
+        if not valid:
+            return vectors
+        
+        projected = self.projection.apply(np.stack([vectors[i] for i in valid]))
+        results = list(vectors)
+        for row, i in enumerate(valid):
+            results[i] = projected[row]
+        return results
+    
+    async def _embed_request(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Один запрос /api/embed для chunk текстов"""
+        failed: List[Optional[np.ndarray]] = [None] * len(texts)
+        
         try:
             # Truncate text если слишком длинный (max 8192 tokens)
-            text = text[:8000]
+            payload = {
+                "model": self.embedding_model,
+                "input": [text[:8000] for text in texts]
+            }
             
-            # Использовать встроенный embedding endpoint Ollama
-            import aiohttp
+            if self.ollama.keep_alive is not None:
+                payload["keep_alive"] = self.ollama.keep_alive
             
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "model": self.embedding_model,
-                    "prompt": text
-                }
+            self.stats['requests'] += 1
+            
+            async with self.ollama.session.post(
+                f"{self.ollama.host}/api/embed",
+                json=payload
+            ) as resp:
+                if resp.status != 200:
+                    logger.error(f"❌ Embedding error: {resp.status}")
+                    self.stats['failed'] += len(texts)
+                    return failed
+                
+                result = await resp.json()
+                embeddings = result.get("embeddings") or []
+                
+                if len(embeddings) != len(texts):
+                    logger.error(
+                        f"❌ Embedding count mismatch: {len(embeddings)} for {len(texts)} texts"
+                    )
+                    self.stats['failed'] += len(texts)
+                    return failed
                 
-                async with session.post(
-                    f"{self.ollama.host}/api/embeddings",
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as resp:
-                    if resp.status != 200:
-                        logger.error(f"❌ Embedding error: {resp.status}")
-                        return None
-                    
-                    result = await resp.json()
-                    embedding = result.get("embedding")
-                    
-                    if embedding and len(embedding) == self.embedding_dimensions:
-                        logger.debug(f"✅ Embedded text: {len(text)} chars → {len(embedding)} dims")
-                        return embedding
-                    
-                    logger.error(f"❌ Invalid embedding dimensions: {len(embedding) if embedding else 0}")
-                    return None
+                vectors: List[Optional[np.ndarray]] = []
+                for embedding in embeddings:
+                    if embedding and len(embedding) == self.model_dimensions:
+                        vectors.append(np.asarray(embedding, dtype=np.float32))
+                    else:
+                        logger.error(
+                            f"❌ Invalid embedding dimensions: {len(embedding) if embedding else 0}"
+                        )
+                        self.stats['failed'] += 1
+                        vectors.append(None)
+                
+                self.stats['texts_embedded'] += sum(1 for v in vectors if v is not None)
+                logger.debug(f"✅ Embedded {len(texts)} texts → {self.model_dimensions} dims")
+                return vectors
         
         except Exception as e:
             logger.error(f"❌ Embedding request failed: {e}")
-            return None
+            self.stats['failed'] += len(texts)
+            return failed
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Получить статистику embedding запросов"""
+        avg_batch_size = (
+            self.stats['texts_embedded'] / self.stats['requests']
+            if self.stats['requests'] > 0
+            else 0
+        )
+        
+        return {
+            'texts_embedded': self.stats['texts_embedded'],
+            'requests': self.stats['requests'],
+            'failed': self.stats['failed'],
+            'avg_batch_size': round(avg_batch_size, 1),
+            'cache': self.cache.get_stats() if self.cache is not None else None,
+            'projection': self.projection.describe() if self.projection is not None else None,
+            'similarity_search': {
+                'hot_index_size': len(self.hot_index) if self.hot_index is not None else 0,
+                'hot_index_bytes_per_vector': (
+                    self.hot_index.bytes_per_vector if self.hot_index is not None else 0
+                ),
+                'hot_hits': self.stats['hot_hits'],
+                'hot_misses': self.stats['hot_misses'],
+                'db_searches': self.stats['db_searches']
+            }
+        }
     
     async def find_similar_emails(
         self,
         email_text: str,
         k: int = 3,
-        threshold: float = 0.3
+        threshold: float = 0.3,
+        ef_search: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Найти похожие письма используя vector search
         
+        Сначала ищет в in-process hot_index; pgvector используется только
+        если индекс еще не прогрет или нашел меньше k писем выше threshold.
+        
         Args:
             email_text: Текст email для поиска (subject + body)
             k: Количество похожих примеров
             threshold: Минимальный similarity score (0.0-1.0)
+            ef_search: hnsw.ef_search для этого запроса (по умолчанию self.ef_search)
             
         Returns:
             List of similar emails с их классификацией
@@ -90,22 +341,223 @@ class EmbeddingService:
             # Получить embedding для входящего письма
             query_embedding = await self.embed_text(email_text)
             
-            if not query_embedding:
+            if query_embedding is None:
                 logger.warning("⚠️ Failed to embed query text")
                 return []
             
-            # Выполнить vector similarity search в PostgreSQL
-            # NOTE: Требует pgvector extension в PostgreSQL
+            if self.hot_index is not None and len(self.hot_index) >= self.hot_index_min_size:
+                hits = self.hot_index.search(query_embedding, k=k, threshold=threshold)
+                
+                if len(hits) >= k:
+                    self.stats['hot_hits'] += 1
+                    logger.debug(f"🔥 Found {len(hits)} similar emails in hot index")
+                    return [
+                        {**payload, 'similarity': round(similarity, 3)}
+                        for similarity, payload in hits
+                    ]
+                
+                self.stats['hot_misses'] += 1
+            
+            return await self._search_db(query_embedding, k, threshold, ef_search)
+        
+        except Exception as e:
+            logger.error(f"❌ Similarity search failed: {e}")
+            return []
+    
+    async def _search_db(
+        self,
+        query_embedding: np.ndarray,
+        k: int,
+        threshold: float,
+        ef_search: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Vector similarity search в PostgreSQL (pgvector)
+        
+        Запрос имеет форму ORDER BY embedding <=> q LIMIT k, чтобы Postgres
+        мог использовать HNSW/IVFFlat индекс ix_emails_embedding_cosine.
+        Threshold применяется к top-k после запроса - результат тот же,
+        что и с фильтром в WHERE, но без полного скана таблицы.
+        
+        Поиск идет только среди векторов текущей версии проекции;
+        выражение embedding::vector(dims) совпадает с индексом этой версии
+        (см. embedding_projection.vector_index_ddl).
+        """
+        self.stats['db_searches'] += 1
+        ef_search = ef_search or self.ef_search
+        
+        # Выполнить vector similarity search в PostgreSQL
+        # NOTE: Требует pgvector extension в PostgreSQL
+        async with self.db.get_session() as session:
+            from sqlalchemy import text
+            
+            # Параметры ANN индекса - только для текущей транзакции
+            if ef_search:
+                await session.execute(
+                    text("SELECT set_config('hnsw.ef_search', :value, true)"),
+                    {"value": str(max(ef_search, k))}
+                )
+            if self.ivfflat_probes:
+                await session.execute(
+                    text("SELECT set_config('ivfflat.probes', :value, true)"),
+                    {"value": str(self.ivfflat_probes)}
+                )
+            
+            # Raw SQL для vector search в pgvector
+            # Использует оператор <=> для cosine distance
+            sql = """
+                SELECT 
+                    id,
+                    message_id,
+                    from_email,
+                    subject,
+                    body_text,
+                    category,
+                    confidence_score,
+                    received_at,
+                    {vector} <=> CAST(:embedding AS vector({dims})) AS distance
+                FROM emails
+                WHERE category IS NOT NULL
+                AND embedding IS NOT NULL
+                AND {version}
+                ORDER BY {vector} <=> CAST(:embedding AS vector({dims}))
+                LIMIT :k
+            """.format(
+                vector=self._vector_column(),
+                dims=self.embedding_dimensions,
+                version=self._version_predicate()
+            )
+            
+            result = await session.execute(
+                text(sql),
+                {
+                    "embedding": self._vector_param(query_embedding),
+                    "k": k
+                }
+            )
+            
+            rows = result.fetchall()
+            
+            similar_emails = []
+            for row in rows:
+                similarity = 1 - row[8]
+                if similarity <= threshold:
+                    # Строки отсортированы по distance - дальше только хуже
+                    break
+                
+                similar_emails.append({
+                    **self._example_payload(*row[:8]),
+                    'similarity': round(similarity, 3)
+                })
+            
+            logger.info(f"📊 Found {len(similar_emails)} similar emails (threshold={threshold})")
+            return similar_emails
+    
+    @staticmethod
+    def _example_payload(
+        email_id: int,
+        message_id: str,
+        from_email: str,
+        subject: str,
+        body_text: Optional[str],
+        category: str,
+        confidence: Optional[float],
+        received_at: Optional[datetime]
+    ) -> Dict[str, Any]:
+        """Few-shot пример в формате find_similar_emails (без similarity)"""
+        return {
+            'id': email_id,
+            'message_id': message_id,
+            'from_email': from_email,
+            'subject': subject,
+            'body_text': (body_text or "")[:200],  # First 200 chars
+            'category': category,
+            'confidence': confidence,
+            'received_at': received_at
+        }
+    
+    def _vector_column(self) -> str:
+        """SQL выражение колонки embedding с размерностью текущей проекции"""
+        return f"CAST(embedding AS vector({self.embedding_dimensions}))"
+    
+    def _version_predicate(self) -> str:
+        """
+        Фильтр по emails.embedding_version
+        
+        Литерал, а не bind-параметр: иначе planner не сопоставит запрос
+        с частичным индексом версии. Версия валидируется EmbeddingProjection.
+        """
+        if self.embedding_version is None:
+            return "embedding_version IS NULL"
+        return f"embedding_version = '{self.embedding_version}'"
+    
+    def _vector_param(self, embedding) -> Any:
+        """Значение bind-параметра vector: NumPy array (binary codec) или текст"""
+        if self.binary_vectors:
+            return np.asarray(embedding, dtype=np.float32)
+        return format_vector_text(embedding)
+    
+    @staticmethod
+    def _vector_from_db(value) -> np.ndarray:
+        """vector из БД: NumPy array (binary codec) или текст "[...]" """
+        if isinstance(value, str):
+            return parse_vector_text(value)
+        return np.asarray(value, dtype=np.float32)
+    
+    def index_labelled_email(
+        self,
+        email_id: int,
+        embedding: np.ndarray,
+        email: Dict[str, Any]
+    ) -> bool:
+        """
+        Добавить классифицированное письмо в hot_index
+        
+        Args:
+            email_id: ID письма в БД
+            embedding: Vector embedding
+            email: message_id, from_email, subject, body_text, category,
+                confidence, received_at
+            
+        Returns:
+            True если добавлено
+        """
+        if self.hot_index is None or not email.get('category'):
+            return False
+        
+        payload = self._example_payload(
+            email_id,
+            email.get('message_id'),
+            email.get('from_email'),
+            email.get('subject'),
+            email.get('body_text'),
+            email['category'],
+            email.get('confidence'),
+            email.get('received_at')
+        )
+        return self.hot_index.add(email_id, embedding, payload)
+    
+    async def load_hot_index(self, limit: Optional[int] = None) -> int:
+        """
+        Заполнить hot_index недавно классифицированными письмами из БД
+        
+        Args:
+            limit: Сколько последних писем загрузить (по умолчанию - capacity индекса)
+            
+        Returns:
+            Количество загруженных писем
+        """
+        if self.hot_index is None:
+            return 0
+        
+        limit = limit or self.hot_index.capacity
+        
+        try:
             async with self.db.get_session() as session:
                 from sqlalchemy import text
                 
-                # Преобразовать embedding в PostgreSQL array format
-                embedding_str = f"[{','.join(map(str, query_embedding))}]"
-                
-                # Raw SQL для vector search в pgvector
-                # Использует оператор <=> для cosine distance
                 sql = """
-                    SELECT 
+                    SELECT
                         id,
                         message_id,
                         from_email,
@@ -114,51 +566,36 @@ class EmbeddingService:
                         category,
                         confidence_score,
                         received_at,
-                        1 - (embedding <=> :embedding::vector) as similarity
+                        embedding
                     FROM emails
                     WHERE category IS NOT NULL
                     AND embedding IS NOT NULL
-                    AND 1 - (embedding <=> :embedding::vector) > :threshold
-                    ORDER BY similarity DESC
-                    LIMIT :k
-                """
-                
-                result = await session.execute(
-                    text(sql),
-                    {
-                        "embedding": embedding_str,
-                        "threshold": threshold,
-                        "k": k
-                    }
-                )
+                    AND {version}
+                    ORDER BY received_at DESC
+                    LIMIT :limit
+                """.format(version=self._version_predicate())
                 
+                result = await session.execute(text(sql), {"limit": limit})
                 rows = result.fetchall()
-                
-                similar_emails = []
-                for row in rows:
-                    similar_emails.append({
-                        'id': row[0],
-                        'message_id': row[1],
-                        'from_email': row[2],
-                        'subject': row[3],
-                        'body_text': row[4][:200],  # First 200 chars
-                        'category': row[5],
-                        'confidence': row[6],
-                        'received_at': row[7],
-                        'similarity': round(row[8], 3)
-                    })
-                
-                logger.info(f"📊 Found {len(similar_emails)} similar emails (threshold={threshold})")
-                return similar_emails
+            
+            loaded = 0
+            # От старых к новым: при переполнении вытесняются старые
+            for row in reversed(rows):
+                embedding = self._vector_from_db(row[8])
+                if self.hot_index.add(row[0], embedding, self._example_payload(*row[:8])):
+                    loaded += 1
+            
+            logger.info(f"🔥 Hot index loaded: {loaded} labelled emails")
+            return loaded
         
         except Exception as e:
-            logger.error(f"❌ Similarity search failed: {e}")
-            return []
+            logger.error(f"❌ Failed to load hot index: {e}")
+            return 0
     
     async def store_embedding(
         self,
         email_id: int,
-        embedding: List[float]
+        embedding: np.ndarray
     ) -> bool:
         """
         Сохранить embedding в БД для будущего RAG
@@ -174,18 +611,18 @@ class EmbeddingService:
             async with self.db.get_session() as session:
                 from sqlalchemy import text
                 
-                embedding_str = f"[{','.join(map(str, embedding))}]"
-                
                 sql = """
                     UPDATE emails
-                    SET embedding = :embedding::vector
+                    SET embedding = CAST(:embedding AS vector),
+                        embedding_version = :version
                     WHERE id = :email_id
                 """
                 
                 await session.execute(
                     text(sql),
                     {
-                        "embedding": embedding_str,
+                        "embedding": self._vector_param(embedding),
+                        "version": self.embedding_version,
                         "email_id": email_id
                     }
                 )
@@ -199,10 +636,51 @@ class EmbeddingService:
             logger.error(f"❌ Failed to store embedding: {e}")
             return False
     
+    async def store_embeddings_bulk(
+        self,
+        embeddings: List[Tuple[int, np.ndarray]]
+    ) -> int:
+        """
+        Сохранить много embeddings одним UPDATE ... FROM (VALUES ...)
+        
+        Args:
+            embeddings: Пары (email_id, embedding)
+            
+        Returns:
+            Количество обновленных строк
+        """
+        if not embeddings:
+            return 0
+        
+        values = []
+        params: Dict[str, Any] = {"version": self.embedding_version}
+        for i, (email_id, embedding) in enumerate(embeddings):
+            values.append(f"(CAST(:id_{i} AS bigint), CAST(:embedding_{i} AS vector))")
+            params[f"id_{i}"] = email_id
+            params[f"embedding_{i}"] = self._vector_param(embedding)
+        
+        sql = f"""
+            UPDATE emails AS e
+            SET embedding = v.embedding,
+                embedding_version = :version
+            FROM (VALUES {', '.join(values)}) AS v(id, embedding)
+            WHERE e.id = v.id
+        """
+        
+        async with self.db.get_session() as session:
+            from sqlalchemy import text
+            
+            result = await session.execute(text(sql), params)
+            await session.commit()
+        
+        logger.debug(f"✅ Stored {len(embeddings)} embeddings in one statement")
+        return result.rowcount if result.rowcount is not None else len(embeddings)
+    
     async def embed_and_store(
         self,
         email_id: int,
-        email_text: str
+        email_text: str,
+        labelled: Optional[Dict[str, Any]] = None
     ) -> bool:
         """
         Создать embedding и сохранить в БД
@@ -210,13 +688,20 @@ class EmbeddingService:
         Args:
             email_id: ID письма
             email_text: Текст письма (subject + body)
+            labelled: Поля классифицированного письма (см. index_labelled_email) -
+                если переданы, письмо сразу попадает в hot_index
             
         Returns:
             True если успешно
         """
         embedding = await self.embed_text(email_text)
         
-        if not embedding:
+        if embedding is None:
             return False
         
-        return await self.store_embedding(email_id, embedding)
+        stored = await self.store_embedding(email_id, embedding)
+        
+        if stored and labelled:
+            self.index_labelled_email(email_id, embedding, labelled)
+        
+        return stored
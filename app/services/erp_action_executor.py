@@ -153,9 +153,14 @@ class ERPActionExecutor:
 
         attachments = context.get("attachments", [])
         for attachment in attachments:
-            filename = attachment.get("filename", "").lower()
-            content = attachment.get("content")
+            filename = (attachment.get("filename") or "").lower()
 
+            # Decide by name first: lazy attachments are only downloaded
+            # when a parser actually needs them
+            if not filename.endswith((".xlsx", ".xls", ".csv", ".pdf")):
+                continue
+
+            content = await self._attachment_content(attachment)
             if not content:
                 continue
 
@@ -168,6 +173,26 @@ class ERPActionExecutor:
 
         return items
 
+    async def _attachment_content(self, attachment: dict[str, Any]) -> bytes | None:
+        """
+        Attachment body: inline "content" or a lazy "handle" (AttachmentHandle).
+
+        Returns None if the body cannot be fetched.
+        """
+        content = attachment.get("content")
+        if content:
+            return content
+
+        handle = attachment.get("handle")
+        if handle is None:
+            return None
+
+        try:
+            return await handle.read()
+        except Exception as e:
+            logger.warning(f"Failed to fetch attachment {attachment.get('filename')}: {e}")
+            return None
+
     def _parse_from_text(self, text: str) -> list[OrderItem]:
         """Parse order items from email text."""
         items: list[OrderItem] = []
@@ -126,7 +126,7 @@ class ERPIntegrationService:
         # Извлечь данные счета
         extracted = self.invoice_extractor.extract(
             email_subject=email.subject or "",
-            email_body=email.body_text or "",
+            email_body=email.content_text or "",
             from_email=email.from_email,
             from_name=None
         )
@@ -212,7 +212,7 @@ class ERPIntegrationService:
         
         extracted = self.order_extractor.extract(
             email_subject=email.subject or "",
-            email_body=email.body_text or "",
+            email_body=email.content_text or "",
             from_email=email.from_email,
             from_name=None
         )
@@ -304,7 +304,7 @@ class ERPIntegrationService:
             )
             
             # Проверить на refund request
-            if self.config.auto_close_refund and self._is_refund_request(email.body_text or ""):
+            if self.config.auto_close_refund and self._is_refund_request(email.content_text or ""):
                 ticket.status = 'auto_closed'
                 ticket.resolution = "Refund processed automatically"
                 ticket.closed_at = datetime.utcnow()
@@ -0,0 +1,408 @@
+"""
+Email Event Binary Codec
+Компактная бинарная сериализация Kafka events (EmailEvent с EmailReceivedEvent
+в email_data) вместо pydantic JSON: без имен полей и строковых timestamp,
+с быстрым декодированием без повторной валидации модели
+
+Формат сообщения:
+    b"EV" | uint8 версия формата | uint8 компрессия | тело
+
+Тело - значение с 1-байтовым тегом типа. Ключи словарей из схемы (_KEYS)
+кодируются номером (1 байт), остальные - строкой. Timestamp поля (_TIMESTAMP_KEYS)
+хранятся как varint микросекунд, если строка восстанавливается без потерь.
+Сообщения без b"EV" декодируются как JSON (смешанный топик при миграции).
+
+Схема только дополняется: новые ключи в _KEYS требуют новой FORMAT_VERSION,
+старые версии читаются и дальше.
+"""
+
+import json
+import logging
+import struct
+import zlib
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta, timezone
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"EV"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct(">2sBB")
+
+# Компрессия тела; мелкие сообщения не сжимаются (флаг в заголовке = 0)
+COMPRESSION_IDS = {"none": 0, "zlib": 1, "zstd": 2, "lz4": 3}
+COMPRESS_MIN_BYTES = 256
+
+# Схема v1: ключи EmailEvent, metadata, EmailReceivedEvent и вложений
+_KEYS = (
+    # EmailEvent
+    "event_id", "timestamp", "source", "email_data", "metadata",
+    # metadata
+    "source_host", "from_email", "batch_size",
+    # EmailReceivedEvent
+    "message_id", "to_email", "subject", "body_text", "body_html", "new_content",
+    "attachments", "received_at", "raw_message", "raw_message_ref", "size_bytes",
+    "sent_at", "in_reply_to", "references",
+    # attachments (mime_worker, AttachmentHandle.ref(), blob store)
+    "filename", "content_type", "content", "ref", "blob",
+    "mailbox", "uidvalidity", "uid", "section", "encoding",
+    # legacy IMAP payload
+    "imap_id", "date",
+)
+_KEY_IDS = {key: i + 1 for i, key in enumerate(_KEYS)}
+assert len(_KEYS) < 0x80  # номер ключа - один байт
+_TIMESTAMP_KEYS = frozenset({"timestamp", "received_at", "sent_at", "date"})
+
+# Теги значений
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _BYTES, _LIST, _DICT, _TIMESTAMP = range(10)
+_DOUBLE = struct.Struct(">d")
+
+# Стиль строки timestamp: naive isoformat, "...Z" (pydantic JSON), "...+HH:MM"
+_TS_NAIVE, _TS_Z, _TS_OFFSET = range(3)
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_MINUTE = timedelta(minutes=1)
+
+
+# ==============================================================================
+# Varint / timestamps
+# ==============================================================================
+
+def _write_varint(out: bytearray, n: int):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _zigzag(n: int) -> int:
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+
+def _unzigzag(n: int) -> int:
+    return n // 2 if not n & 1 else -(n + 1) // 2
+
+
+def _format_timestamp(micros: int, style: int, offset: int) -> str:
+    text = (_EPOCH + micros * _MICROSECOND).isoformat()
+    if style == _TS_Z:
+        return text + "Z"
+    if style == _TS_OFFSET:
+        sign = "-" if offset < 0 else "+"
+        hours, minutes = divmod(abs(offset), 60)
+        return f"{text}{sign}{hours:02d}:{minutes:02d}"
+    return text
+
+
+def _timestamp_datetime(micros: int, style: int, offset: int) -> datetime:
+    value = _EPOCH + micros * _MICROSECOND
+    if style == _TS_NAIVE:
+        return value
+    return value.replace(tzinfo=UTC if offset == 0 else timezone(offset * _MINUTE))
+
+
+def _pack_timestamp(value: str) -> tuple[int, int, int] | None:
+    """
+    ISO строка → (микросекунды локального времени, стиль, смещение в минутах)
+    или None, если строку нельзя восстановить без потерь
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+    offset = 0
+    if parsed.tzinfo is None:
+        style = _TS_NAIVE
+    else:
+        style = _TS_Z if value.endswith("Z") else _TS_OFFSET
+        offset = parsed.utcoffset() // _MINUTE
+
+    micros = (parsed.replace(tzinfo=None) - _EPOCH) // _MICROSECOND
+    if _format_timestamp(micros, style, offset) != value:
+        return None
+    return micros, style, offset
+
+
+# ==============================================================================
+# Values
+# ==============================================================================
+
+def _encode_value(out: bytearray, value: Any, key: str | None = None):
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, str):
+        if key in _TIMESTAMP_KEYS:
+            packed = _pack_timestamp(value)
+            if packed is not None:
+                micros, style, offset = packed
+                out.append(_TIMESTAMP)
+                out.append(style)
+                if style == _TS_OFFSET:
+                    _write_varint(out, _zigzag(offset))
+                _write_varint(out, _zigzag(micros))
+                return
+        raw = value.encode("utf-8")
+        out.append(_STR)
+        if len(raw) < 0x80:
+            out.append(len(raw))
+        else:
+            _write_varint(out, len(raw))
+        out += raw
+    elif isinstance(value, int):
+        out.append(_INT)
+        _write_varint(out, _zigzag(value))
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _DOUBLE.pack(value)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        _write_varint(out, len(value))
+        for item_key, item in value.items():
+            key_id = _KEY_IDS.get(item_key)
+            if key_id is not None:
+                out.append(key_id)
+            else:
+                raw = str(item_key).encode("utf-8")
+                out.append(0)
+                _write_varint(out, len(raw))
+                out += raw
+            _encode_value(out, item, item_key)
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            _encode_value(out, item, key)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        out.append(_BYTES)
+        _write_varint(out, len(value))
+        out += value
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__} in email event")
+
+
+def _decode_value(data: bytes, pos: int, datetimes: bool) -> tuple[Any, int]:
+    tag = data[pos]
+    pos += 1
+
+    # Однобайтовые varint (короткие строки, ключи схемы) без вызова _read_varint
+    if tag == _STR:
+        length = data[pos]
+        if length < 0x80:
+            pos += 1
+        else:
+            length, pos = _read_varint(data, pos)
+        end = pos + length
+        return str(data[pos:end], "utf-8"), end
+    if tag == _DICT:
+        count, pos = _read_varint(data, pos)
+        result = {}
+        for _ in range(count):
+            key_id = data[pos]
+            pos += 1
+            if key_id:
+                key = _KEYS[key_id - 1]
+            else:
+                length, pos = _read_varint(data, pos)
+                key = str(data[pos:pos + length], "utf-8")
+                pos += length
+            result[key], pos = _decode_value(data, pos, datetimes)
+        return result, pos
+    if tag == _NONE:
+        return None, pos
+    if tag == _INT:
+        value, pos = _read_varint(data, pos)
+        return _unzigzag(value), pos
+    if tag == _TIMESTAMP:
+        style = data[pos]
+        pos += 1
+        offset = 0
+        if style == _TS_OFFSET:
+            offset, pos = _read_varint(data, pos)
+            offset = _unzigzag(offset)
+        value, pos = _read_varint(data, pos)
+        micros = _unzigzag(value)
+        if datetimes:
+            return _timestamp_datetime(micros, style, offset), pos
+        return _format_timestamp(micros, style, offset), pos
+    if tag == _LIST:
+        count, pos = _read_varint(data, pos)
+        result = []
+        for _ in range(count):
+            item, pos = _decode_value(data, pos, datetimes)
+            result.append(item)
+        return result, pos
+    if tag == _TRUE:
+        return True, pos
+    if tag == _FALSE:
+        return False, pos
+    if tag == _FLOAT:
+        return _DOUBLE.unpack_from(data, pos)[0], pos + _DOUBLE.size
+    if tag == _BYTES:
+        length, pos = _read_varint(data, pos)
+        return bytes(data[pos:pos + length]), pos + length
+    raise ValueError(f"Unknown value tag {tag} in email event")
+
+
+# ==============================================================================
+# Compression
+# ==============================================================================
+
+_zstd_compressors: dict[int, Any] = {}
+_zstd_decompressor = None
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("zstd event compression requires zstandard") from e
+    return zstandard
+
+
+def _lz4_frame():
+    try:
+        import lz4.frame
+    except ImportError as e:
+        raise RuntimeError("lz4 event compression requires lz4") from e
+    return lz4.frame
+
+
+def _compress(codec: int, payload: bytes, level: int | None) -> bytes:
+    if codec == 1:
+        return zlib.compress(payload, 6 if level is None else level)
+    if codec == 2:
+        level = 3 if level is None else level
+        compressor = _zstd_compressors.get(level)
+        if compressor is None:
+            compressor = _zstd_compressors[level] = _zstandard().ZstdCompressor(level=level)
+        return compressor.compress(payload)
+    if codec == 3:
+        return _lz4_frame().compress(payload, compression_level=level or 0)
+    return payload
+
+
+def _decompress(codec: int, payload: bytes) -> bytes:
+    global _zstd_decompressor
+    if codec == 0:
+        return payload
+    if codec == 1:
+        return zlib.decompress(payload)
+    if codec == 2:
+        if _zstd_decompressor is None:
+            _zstd_decompressor = _zstandard().ZstdDecompressor()
+        return _zstd_decompressor.decompress(payload)
+    if codec == 3:
+        return _lz4_frame().decompress(payload)
+    raise ValueError(f"Unknown event compression {codec}")
+
+
+# ==============================================================================
+# Public API
+# ==============================================================================
+
+def encode_event(event: dict[str, Any], compression: str = "none", level: int | None = None) -> bytes:
+    """
+    Event dict (EmailEvent.dict(), JSON-совместимые значения) → bytes
+
+    Args:
+        event: Событие
+        compression: none, zlib, zstd, lz4
+        level: Уровень компрессии (None - default кодека)
+    """
+    codec = COMPRESSION_IDS[compression]
+
+    body = bytearray()
+    _encode_value(body, event)
+
+    if codec and len(body) >= COMPRESS_MIN_BYTES:
+        payload = _compress(codec, bytes(body), level)
+    else:
+        codec, payload = 0, body
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, codec) + payload
+
+
+def is_binary_event(data: bytes) -> bool:
+    """Сообщение в бинарном формате (иначе JSON)"""
+    return data[:2] == MAGIC
+
+
+def decode_event(data: bytes, datetimes: bool = False) -> dict[str, Any]:
+    """
+    bytes → event dict
+
+    Без datetimes результат совпадает с json.loads JSON-сообщения.
+    JSON сообщения (без заголовка) декодируются через json.loads.
+
+    Args:
+        data: Значение Kafka сообщения
+        datetimes: Timestamp поля как datetime вместо ISO строк
+    """
+    if not is_binary_event(data):
+        return json.loads(data)
+
+    _, version, codec = _HEADER.unpack_from(data)
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unsupported email event format version {version}")
+
+    body = _decompress(codec, data[_HEADER.size:])
+    value, _ = _decode_value(body, 0, datetimes)
+    return value
+
+
+def decode_email_received(data: bytes):
+    """
+    Быстрый путь для consumer: Kafka сообщение → EmailReceivedEvent
+
+    Бинарные сообщения валидировал producer, поэтому модель собирается через
+    model_construct без повторной валидации (EmailStr, datetime парсинг).
+    JSON сообщения и raw_message в base64 проходят полную валидацию.
+    """
+    from app.services.imap_listener import EmailReceivedEvent
+
+    if is_binary_event(data):
+        email_data = decode_event(data, datetimes=True)["email_data"]
+        if not isinstance(email_data.get("raw_message"), str):
+            return EmailReceivedEvent.model_construct(**email_data)
+
+    email_data = decode_event(data)["email_data"]
+    return EmailReceivedEvent.model_validate_json(json.dumps(email_data))
+
+
+def event_serializer(serialization: str = "json", compression: str = "none") -> Callable[[dict[str, Any]], bytes]:
+    """
+    Сериализатор Kafka values для KafkaConfig.serialization
+
+    Args:
+        serialization: json или binary
+        compression: Компрессия binary сообщений (none, zlib, zstd, lz4)
+    """
+    if serialization == "json":
+        return lambda event: json.dumps(event).encode("utf-8")
+    if serialization == "binary":
+        if compression not in COMPRESSION_IDS:
+            raise ValueError(f"Unknown event compression: {compression}")
+        # Отсутствующая библиотека - ошибка при старте, а не на первом событии
+        if compression == "zstd":
+            _zstandard()
+        elif compression == "lz4":
+            _lz4_frame()
+        return lambda event: encode_event(event, compression)
+    raise ValueError(f"Unknown event serialization: {serialization}")
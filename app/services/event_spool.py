@@ -0,0 +1,408 @@
+"""
+Event Spool (write-ahead log)
+Append-only spool Kafka событий на диске: при недоступном брокере
+KafkaEmailProducer пишет события сюда, drainer отправляет их в порядке
+записи, когда брокер снова доступен
+
+Директория spool:
+    00000000000000000001.seg, ...   сегменты, записи подряд
+    cursor.json                     позиция первой неотправленной записи
+
+Запись: >IIdH (длина value, crc32, время записи, длина key) | key | value.
+append() возвращается после fsync (group commit: один fsync на группу
+записей, накопленных за время предыдущего fsync, fsync_interval_seconds
+или до fsync_batch записей). Оборванная
+запись в конце последнего сегмента отбрасывается при открытии.
+Доставка at-least-once: после сбоя между отправкой и сохранением cursor
+записи отправляются повторно.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+
+spool_depth = Gauge("kafka_spool_depth_events", "Events waiting in the on-disk Kafka spool")
+spool_bytes = Gauge("kafka_spool_bytes", "Bytes of events waiting in the on-disk Kafka spool")
+spool_oldest_age = Gauge(
+    "kafka_spool_oldest_age_seconds", "Age of the oldest event waiting in the on-disk Kafka spool"
+)
+spool_events_total = Counter("kafka_spool_events_total", "Events written to / drained from the spool", ["op"])
+
+_RECORD = struct.Struct(">IIdH")
+_SEGMENT_SUFFIX = ".seg"
+_CURSOR_FILE = "cursor.json"
+
+
+@dataclass
+class SpoolRecord:
+    """Запись spool и ее позиция"""
+    key: bytes
+    value: bytes
+    enqueued_at: float
+    segment: int
+    end: int
+
+    @property
+    def size(self) -> int:
+        return _RECORD.size + len(self.key) + len(self.value)
+
+
+def _crc(enqueued_at: float, key: bytes, value: bytes) -> int:
+    return zlib.crc32(value, zlib.crc32(key, zlib.crc32(struct.pack(">d", enqueued_at))))
+
+
+def _read_record(f, segment: int) -> SpoolRecord | None:
+    """Следующая запись файла или None (конец сегмента / оборванная запись)"""
+    header = f.read(_RECORD.size)
+    if len(header) < _RECORD.size:
+        return None
+    value_len, crc, enqueued_at, key_len = _RECORD.unpack(header)
+    key = f.read(key_len)
+    value = f.read(value_len)
+    if len(key) < key_len or len(value) < value_len or _crc(enqueued_at, key, value) != crc:
+        return None
+    return SpoolRecord(key, value, enqueued_at, segment, f.tell())
+
+
+class EventSpool:
+    """
+    Сегментированный WAL для Kafka событий
+
+    Пишет один asyncio процесс; drainer читает только записи, уже
+    сохраненные fsync.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_max_bytes: int = 64 * 1024 * 1024,
+        fsync_interval_seconds: float = 0.0,
+        fsync_batch: int = 256,
+    ):
+        """
+        Args:
+            directory: Директория spool (создается)
+            segment_max_bytes: Размер сегмента, после которого открывается новый
+            fsync_interval_seconds: Сколько копить группу записей до fsync
+                (0 - сразу; записи, пришедшие во время fsync, попадают
+                в следующую группу)
+            fsync_batch: fsync сразу, если в группе столько записей
+        """
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_interval_seconds = fsync_interval_seconds
+        self.fsync_batch = fsync_batch
+
+        self.depth = 0
+        self.bytes = 0
+        self._oldest_at: float | None = None
+
+        self._io_lock = asyncio.Lock()
+        self._group: asyncio.Future | None = None
+        self._group_size = 0
+        self._group_full = asyncio.Event()
+        self._group_task: asyncio.Task | None = None
+
+        self.stats = {
+            'appended': 0,
+            'drained': 0,
+            'fsyncs': 0,
+            'segments_deleted': 0,
+            'truncated_bytes': 0
+        }
+
+        os.makedirs(directory, exist_ok=True)
+        self._segments = sorted(
+            int(name[:-len(_SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.endswith(_SEGMENT_SUFFIX)
+        )
+        self._cursor = self._load_cursor()
+        self._recover()
+
+        if not self._segments:
+            self._cursor = (self._cursor[0], 0)
+            self._segments.append(self._cursor[0])
+        self._active_id = self._segments[-1]
+        self._fd = self._open_segment(self._active_id)
+        self._active_size = os.fstat(self._fd).st_size
+        self._durable = (self._active_id, self._active_size)
+        self._update_metrics()
+
+        if self.depth:
+            logger.info(f"📼 Spool {directory}: {self.depth} events ({self.bytes} bytes) pending from previous run")
+
+    # ==========================================================================
+    # Files
+    # ==========================================================================
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:020d}{_SEGMENT_SUFFIX}")
+
+    def _open_segment(self, segment: int) -> int:
+        return os.open(self._segment_path(segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def _load_cursor(self) -> tuple[int, int]:
+        path = os.path.join(self.directory, _CURSOR_FILE)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            return data['segment'], data['offset']
+        return (self._segments[0] if self._segments else 1), 0
+
+    def _save_cursor(self):
+        """Атомарно записать cursor (tmp файл + rename)"""
+        path = os.path.join(self.directory, _CURSOR_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'segment': self._cursor[0], 'offset': self._cursor[1]}, f)
+        os.replace(tmp_path, path)
+
+    def _recover(self):
+        """Посчитать неотправленные записи, отрезать оборванный хвост"""
+        segment, offset = self._cursor
+        for drained in [s for s in self._segments if s < segment]:
+            os.remove(self._segment_path(drained))
+        self._segments = [s for s in self._segments if s >= segment]
+
+        for i, segment_id in enumerate(self._segments):
+            path = self._segment_path(segment_id)
+            start = offset if segment_id == segment else 0
+            with open(path, 'rb') as f:
+                f.seek(start)
+                end = start
+                while (record := _read_record(f, segment_id)) is not None:
+                    self.depth += 1
+                    self.bytes += record.size
+                    if self._oldest_at is None:
+                        self._oldest_at = record.enqueued_at
+                    end = record.end
+                size = os.path.getsize(path)
+
+            if end < size:
+                if i == len(self._segments) - 1:
+                    logger.warning(f"⚠️ Spool segment {path}: truncating {size - end} bytes of torn write")
+                    os.truncate(path, end)
+                    self.stats['truncated_bytes'] += size - end
+                else:
+                    logger.error(f"❌ Spool segment {path}: corrupt record at {end}, rest of segment skipped")
+
+    # ==========================================================================
+    # Append (group commit)
+    # ==========================================================================
+
+    async def append(self, key: bytes, value: bytes):
+        """
+        Записать событие; возвращается после fsync
+
+        Args:
+            key: Kafka key
+            value: Kafka value (сериализованное событие)
+        """
+        await self._write(key, value)
+        await asyncio.shield(self._join_group(1))
+
+    async def append_many(self, records: list[tuple[bytes, bytes]]):
+        """
+        Записать события одной группой: один fsync на весь список
+
+        Args:
+            records: (key, value) в порядке записи
+        """
+        if not records:
+            return
+        for key, value in records:
+            await self._write(key, value)
+        await asyncio.shield(self._join_group(len(records)))
+
+    async def _write(self, key: bytes, value: bytes):
+        """Дописать запись в активный сегмент (без fsync)"""
+        enqueued_at = time.time()
+        record = _RECORD.pack(len(value), _crc(enqueued_at, key, value), enqueued_at, len(key)) + key + value
+
+        # Запись без блокировки: os.write в O_APPEND файл безопасна рядом с
+        # fsync в другом потоке; _io_lock нужен только sync() и _roll()
+        if self._active_size and self._active_size + len(record) > self.segment_max_bytes:
+            async with self._io_lock:
+                if self._active_size and self._active_size + len(record) > self.segment_max_bytes:
+                    await self._roll()
+        view = memoryview(record)
+        while view:
+            view = view[os.write(self._fd, view):]
+        self._active_size += len(record)
+
+        self.depth += 1
+        self.bytes += len(record)
+        if self._oldest_at is None:
+            self._oldest_at = enqueued_at
+        self.stats['appended'] += 1
+        spool_events_total.labels(op='appended').inc()
+        self._update_metrics()
+
+    def _join_group(self, records: int) -> asyncio.Future:
+        """Future fsync группы, в которую попадают только что записанные записи"""
+        if self._group is None:
+            self._group = asyncio.get_running_loop().create_future()
+            self._group_task = asyncio.create_task(self._group_commit())
+        self._group_size += records
+        if self._group_size >= self.fsync_batch:
+            self._group_full.set()
+        return self._group
+
+    async def _group_commit(self):
+        """fsync группы по интервалу или по заполнению"""
+        if self.fsync_interval_seconds > 0:
+            try:
+                await asyncio.wait_for(self._group_full.wait(), self.fsync_interval_seconds)
+            except TimeoutError:
+                pass
+        else:
+            # Собрать append() того же шага event loop
+            await asyncio.sleep(0)
+        await self.sync()
+
+    async def sync(self):
+        """fsync активного сегмента и разбудить ожидающих append()"""
+        group, self._group = self._group, None
+        self._group_size = 0
+        self._group_full.clear()
+
+        try:
+            async with self._io_lock:
+                segment, size = self._active_id, self._active_size
+                await asyncio.to_thread(os.fsync, self._fd)
+                self._durable = (segment, size)
+                self.stats['fsyncs'] += 1
+        except Exception as e:
+            logger.error(f"❌ Spool fsync failed: {e}")
+            if group is not None and not group.done():
+                group.set_exception(e)
+            return
+
+        if group is not None and not group.done():
+            group.set_result(None)
+
+    async def _roll(self):
+        """Открыть следующий сегмент, fsync и закрыть предыдущий; под _io_lock"""
+        previous = self._fd
+        self._active_id += 1
+        self._segments.append(self._active_id)
+        self._fd = self._open_segment(self._active_id)
+        self._active_size = 0
+
+        # Записи, сделанные во время fsync, уже идут в новый сегмент
+        await asyncio.to_thread(os.fsync, previous)
+        os.close(previous)
+        self._durable = (self._active_id, 0)
+        logger.debug(f"📼 Spool segment {self._active_id} opened")
+
+    # ==========================================================================
+    # Drain
+    # ==========================================================================
+
+    async def read_batch(self, max_records: int) -> list[SpoolRecord]:
+        """
+        Следующие записи после cursor (без удаления из spool)
+
+        Args:
+            max_records: Максимум записей
+        """
+        if not self.depth:
+            return []
+        return await asyncio.to_thread(self._read_sync, max_records, self._cursor, self._durable)
+
+    def _read_sync(self, max_records: int, cursor: tuple[int, int], durable: tuple[int, int]) -> list[SpoolRecord]:
+        records: list[SpoolRecord] = []
+        segment, offset = cursor
+        for segment_id in [s for s in self._segments if s >= segment]:
+            if segment_id > durable[0]:
+                break
+            limit = durable[1] if segment_id == durable[0] else None
+            with open(self._segment_path(segment_id), 'rb') as f:
+                f.seek(offset if segment_id == segment else 0)
+                while len(records) < max_records:
+                    if limit is not None and f.tell() >= limit:
+                        break
+                    record = _read_record(f, segment_id)
+                    if record is None:
+                        break
+                    records.append(record)
+            if len(records) >= max_records:
+                break
+        return records
+
+    async def commit(self, records: list[SpoolRecord]):
+        """
+        Отметить записи отправленными (префикс результата read_batch)
+
+        Сохраняет cursor и удаляет полностью отправленные сегменты.
+        """
+        if not records:
+            self._update_metrics()
+            return
+
+        last = records[-1]
+        self._cursor = (last.segment, last.end)
+        self.depth -= len(records)
+        self.bytes -= sum(record.size for record in records)
+        self.stats['drained'] += len(records)
+        spool_events_total.labels(op='drained').inc(len(records))
+
+        drained = [s for s in self._segments if s < last.segment]
+        for segment_id in drained:
+            os.remove(self._segment_path(segment_id))
+        self._segments = [s for s in self._segments if s >= last.segment]
+        self.stats['segments_deleted'] += len(drained)
+
+        await asyncio.to_thread(self._save_cursor)
+
+        if self.depth:
+            following = await self.read_batch(1)
+            self._oldest_at = following[0].enqueued_at if following else last.enqueued_at
+        else:
+            self._oldest_at = None
+        self._update_metrics()
+
+    # ==========================================================================
+    # Metrics
+    # ==========================================================================
+
+    def oldest_age(self) -> float:
+        """Возраст самой старой неотправленной записи, секунды"""
+        return time.time() - self._oldest_at if self._oldest_at is not None else 0.0
+
+    def _update_metrics(self):
+        spool_depth.set(self.depth)
+        spool_bytes.set(self.bytes)
+        spool_oldest_age.set(self.oldest_age())
+
+    async def close(self):
+        """fsync и закрыть активный сегмент"""
+        if self._group_task and not self._group_task.done():
+            self._group_full.set()
+            await self._group_task
+        async with self._io_lock:
+            await asyncio.to_thread(os.fsync, self._fd)
+            os.close(self._fd)
+
+    def get_stats(self) -> dict[str, Any]:
+        self._update_metrics()
+        return {
+            **self.stats,
+            'depth': self.depth,
+            'bytes': self.bytes,
+            'oldest_age_seconds': round(self.oldest_age(), 3),
+            'segments': len(self._segments),
+            'directory': self.directory
+        }
@@ -0,0 +1,171 @@
+"""
+HTML to plain text for HTML-only emails
+
+Classifiers and extractors read body_text only; marketing mail and many ERP
+notifications have no text/plain part. html_to_text() turns the HTML body
+into compact text during ingestion:
+- Streams the document through html.parser in chunks, stops at max_chars
+- Drops script/style/head, hidden elements (display:none, mso-hide:all,
+  preheader padding), images and conditional comments
+- Keeps block structure as line breaks, collapses whitespace
+
+Author: Email Intelligence Platform Team
+Version: 1.0.0
+"""
+
+import re
+from html.parser import HTMLParser
+
+from prometheus_client import Histogram
+
+html_to_text_seconds = Histogram(
+    "email_html_to_text_seconds",
+    "HTML body to text conversion time",
+    buckets=[0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1],
+)
+
+# Enough for rules and the LLM prompt (which uses the first 1000 chars)
+MAX_TEXT_CHARS = 20_000
+
+CHUNK_CHARS = 16_384
+
+# Content never shown as text
+_SKIP_TAGS = frozenset(
+    {"script", "style", "head", "title", "noscript", "template", "svg", "object", "iframe", "canvas", "map"}
+)
+_VOID_TAGS = frozenset(
+    {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+)
+_PARAGRAPH_TAGS = frozenset(
+    {"p", "h1", "h2", "h3", "h4", "h5", "h6", "table", "ul", "ol", "blockquote", "pre", "dl"}
+)
+_LINE_TAGS = frozenset(
+    {
+        "br", "div", "tr", "li", "hr", "dt", "dd", "section", "article", "header",
+        "footer", "nav", "aside", "address", "center", "form", "fieldset", "caption",
+    }
+)
+_CELL_TAGS = frozenset({"td", "th"})
+
+_HIDDEN_STYLE_RE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden|mso-hide\s*:\s*all", re.I)
+# Whitespace plus the zero-width characters used to pad preheaders
+_SPACE_RE = re.compile(r"[\s\u034f\u200b\u200c\u200d\u2060\ufeff]+")
+
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text; breaks are emitted lazily before the next text."""
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts: list[str] = []
+        self.length = 0
+        self.full = False
+        self.skip_tag: str | None = None
+        self.skip_depth = 0
+        self.pending_breaks = 0
+        self.pending_space = False
+
+    def _is_hidden(self, attrs: list[tuple[str, str | None]]) -> bool:
+        for name, value in attrs:
+            if name == "hidden":
+                return True
+            if name == "style" and value and _HIDDEN_STYLE_RE.search(value):
+                return True
+        return False
+
+    def _break(self, count: int):
+        self.pending_breaks = max(self.pending_breaks, count)
+        self.pending_space = False
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]):
+        if self.skip_tag is not None:
+            if tag == self.skip_tag:
+                self.skip_depth += 1
+            return
+
+        if tag in _SKIP_TAGS or (tag not in _VOID_TAGS and self._is_hidden(attrs)):
+            self.skip_tag = tag
+            self.skip_depth = 1
+            return
+
+        if tag in _PARAGRAPH_TAGS:
+            self._break(2)
+        elif tag in _LINE_TAGS:
+            self._break(1)
+        elif tag in _CELL_TAGS:
+            self.pending_space = True
+
+        if tag == "li":
+            self._emit("- ")
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]):
+        # <br/>, <img/>: never opens a skipped region
+        if self.skip_tag is None and tag in _LINE_TAGS:
+            self._break(1)
+
+    def handle_endtag(self, tag: str):
+        if self.skip_tag is not None:
+            if tag == self.skip_tag:
+                self.skip_depth -= 1
+                if self.skip_depth == 0:
+                    self.skip_tag = None
+            return
+
+        if tag in _PARAGRAPH_TAGS:
+            self._break(2)
+        elif tag in _LINE_TAGS:
+            self._break(1)
+        elif tag in _CELL_TAGS:
+            self.pending_space = True
+
+    def handle_data(self, data: str):
+        if self.skip_tag is not None or self.full:
+            return
+
+        collapsed = _SPACE_RE.sub(" ", data)
+        text = collapsed.strip(" ")
+        if collapsed[:1] == " ":
+            self.pending_space = True
+        if text:
+            self._emit(text)
+            self.pending_space = collapsed[-1:] == " "
+
+    def _emit(self, text: str):
+        if self.full:
+            return
+        if self.parts:
+            if self.pending_breaks:
+                text = "\n" * self.pending_breaks + text
+            elif self.pending_space:
+                text = " " + text
+        self.pending_breaks = 0
+        self.pending_space = False
+
+        remaining = self.max_chars - self.length
+        if len(text) >= remaining:
+            text = text[:remaining]
+            self.full = True
+        self.parts.append(text)
+        self.length += len(text)
+
+
+def html_to_text(html: str, max_chars: int = MAX_TEXT_CHARS) -> str:
+    """
+    Convert an HTML email body to plain text.
+
+    Args:
+        html: HTML document or fragment
+        max_chars: Output cap; parsing stops once it is reached
+
+    Returns:
+        Visible text with paragraphs separated by blank lines
+    """
+    extractor = _TextExtractor(max_chars)
+    for start in range(0, len(html), CHUNK_CHARS):
+        extractor.feed(html[start : start + CHUNK_CHARS])
+        if extractor.full:
+            break
+    else:
+        extractor.close()
+    return "".join(extractor.parts)
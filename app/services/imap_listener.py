@@ -3,10 +3,19 @@ IMAP Listener Service - Real-time email monitoring
 
 Listens to IMAP server using IDLE protocol and publishes new emails to Kafka.
 Supports:
-- Real-time email detection (IMAP IDLE)
-- MIME parsing with attachments
+- Real-time email detection (IMAP IDLE, polling fallback)
+- Persisted (UIDVALIDITY, last UID) checkpoint - no re-downloads after restart
+- Batched UID FETCH of new messages
+- BODYSTRUCTURE-first fetching with lazy attachment handles
+- Message-ID / content-hash deduplication before publishing
+- Claim check: raw messages and attachments go to a blob store, Kafka
+  events carry sha256 references
+- MIME parsing with attachments, optionally off the event loop (MimeParserPool)
+- body_text extracted from HTML for HTML-only emails
+- new_content: body without quoted replies, signature and disclaimer
+- In-Reply-To / References captured for thread-aware classification
 - Kafka producer with retry logic
-- Error handling and reconnection
+- Error handling and reconnection with jittered exponential backoff
 
 Author: Email Intelligence Platform Team
 Version: 1.0.0
@@ -14,34 +23,158 @@ Version: 1.0.0
 
 import asyncio
 import email
+import json
 import logging
+import os
+import random
+import re
+from collections.abc import Callable
 from datetime import UTC, datetime
 from email import policy
 from email.parser import BytesParser
-from typing import Any
-
-from pydantic import BaseModel, EmailStr, Field
+from typing import TYPE_CHECKING, Any
+
+import aioimaplib
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+
+from app.services.blob_store import BlobStore
+from app.services.dedup import EmailDeduplicator
+from app.services.html_text import html_to_text_seconds
+from app.services.reply_stripper import fill_new_content, observe_body_sizes
+from app.services.imap_structure import (
+    AttachmentHandle,
+    MimePart,
+    decode_text,
+    decode_transfer_encoding,
+    parse_bodystructure,
+    parse_fetch_response,
+)
+from app.services.mime_worker import (
+    MimeParserPool,
+    decoded_size,
+    fill_text_from_html,
+    header_addresses,
+    header_date,
+    header_threading,
+    parse_message,
+)
+
+if TYPE_CHECKING:
+    from app.services.imap_supervisor import IMAPConnectionPool
 
 logger = logging.getLogger(__name__)
 
+# RFC 2177: clients should re-issue IDLE at least every 29 minutes
+IDLE_TIMEOUT_SECONDS = 29 * 60
+
+_UIDVALIDITY_RE = re.compile(rb"\[UIDVALIDITY (\d+)\]")
+_UIDNEXT_RE = re.compile(rb"\[UIDNEXT (\d+)\]")
+
 
 class EmailReceivedEvent(BaseModel):
     """Event schema for new email received."""
 
+    # Raw bytes (only without a blob store) travel as base64 in JSON
+    model_config = ConfigDict(ser_json_bytes="base64", val_json_bytes="base64")
+
     message_id: str = Field(..., description="Unique message ID from email headers")
     from_email: EmailStr = Field(..., description="Sender email address")
     to_email: list[EmailStr] = Field(..., description="Recipient email addresses")
     subject: str = Field(..., description="Email subject")
     body_text: str | None = Field(None, description="Plain text body")
     body_html: str | None = Field(None, description="HTML body")
+    new_content: str | None = Field(
+        None, description="body_text without quoted replies, signature and disclaimer"
+    )
     attachments: list[dict[str, Any]] = Field(
         default_factory=list, description="List of attachments metadata"
     )
     received_at: datetime = Field(
         default_factory=lambda: datetime.now(UTC), description="Server receipt timestamp"
     )
-    raw_message: bytes = Field(..., description="Raw RFC822 message")
+    raw_message: bytes | None = Field(
+        None,
+        description="Raw RFC822 message (None when fetched via BODYSTRUCTURE or stored as a blob)",
+    )
+    raw_message_ref: str | None = Field(None, description="Blob store reference of the raw message")
     size_bytes: int = Field(..., description="Email size in bytes")
+    sent_at: datetime | None = Field(None, description="Date header timestamp")
+    in_reply_to: str | None = Field(None, description="In-Reply-To Message-ID")
+    references: list[str] = Field(
+        default_factory=list, description="References Message-IDs, thread root first"
+    )
+
+
+def reconnect_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """
+    Exponential backoff with full jitter.
+
+    Spreads reconnects of many mailboxes after a server restart instead of
+    having them all hit LOGIN at the same moment.
+    """
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class UIDCheckpointStore:
+    """
+    Persisted (UIDVALIDITY, last processed UID) per mailbox.
+
+    Stored as a small JSON file, written atomically (tmp file + rename).
+    Without a path the checkpoint lives only in memory.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.entries: dict[str, dict[str, int]] = {}
+
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def load(self, key: str) -> tuple[int, int] | None:
+        """
+        Get checkpoint for a mailbox.
+
+        Args:
+            key: Mailbox key (user@host/mailbox)
+
+        Returns:
+            (uidvalidity, last_uid) or None if unknown
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return entry["uidvalidity"], entry["last_uid"]
+
+    def save(self, key: str, uidvalidity: int, last_uid: int):
+        """Persist checkpoint for a mailbox."""
+        self.entries[key] = {"uidvalidity": uidvalidity, "last_uid": last_uid}
+
+        if not self.path:
+            return
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+def uid_set(uids: list[int]) -> str:
+    """
+    Compress sorted UIDs into an IMAP sequence set.
+
+    Example: [1, 2, 3, 7, 9, 10] -> "1:3,7,9:10"
+    """
+    ranges = []
+    start = prev = uids[0]
+    for uid in uids[1:]:
+        if uid == prev + 1:
+            prev = uid
+            continue
+        ranges.append(f"{start}:{prev}" if prev != start else str(start))
+        start = prev = uid
+    ranges.append(f"{start}:{prev}" if prev != start else str(start))
+    return ",".join(ranges)
 
 
 class IMAPListenerService:
@@ -60,6 +193,22 @@ class IMAPListenerService:
         password: str = "",
         kafka_producer=None,
         use_ssl: bool = True,
+        mailbox: str = "INBOX",
+        checkpoint_path: str | None = None,
+        checkpoints: UIDCheckpointStore | None = None,
+        fetch_batch_size: int = 50,
+        idle_timeout: float = IDLE_TIMEOUT_SECONDS,
+        poll_interval: float = 30.0,
+        initial_sync: str = "new",
+        timeout: float = 30.0,
+        lazy_attachments: bool = True,
+        connection_pool: "IMAPConnectionPool | None" = None,
+        reconnect_base: float = 1.0,
+        reconnect_max: float = 60.0,
+        on_fetched: Callable[[int], None] | None = None,
+        parser_pool: MimeParserPool | None = None,
+        blob_store: BlobStore | None = None,
+        deduplicator: EmailDeduplicator | None = None,
     ):
         """
         Initialize IMAP listener.
@@ -71,6 +220,28 @@ class IMAPListenerService:
             password: Email account password
             kafka_producer: Kafka producer instance
             use_ssl: Use SSL/TLS connection
+            mailbox: Mailbox to watch
+            checkpoint_path: JSON file for the (UIDVALIDITY, last UID) checkpoint
+            checkpoints: Checkpoint store shared between listeners writing the
+                same file; overrides checkpoint_path
+            fetch_batch_size: Max messages per UID FETCH command
+            idle_timeout: Re-issue IDLE after this many seconds
+            poll_interval: Polling interval if the server lacks IDLE
+            initial_sync: Without a valid checkpoint: "new" (only mail arriving
+                from now on) or "all" (the whole mailbox)
+            timeout: IMAP command timeout in seconds
+            lazy_attachments: Fetch BODYSTRUCTURE + text parts only; attachment
+                bodies are fetched on demand via open_attachment()
+            connection_pool: Per-server pool; a slot is held while connected
+            reconnect_base: First reconnect backoff in seconds (jittered)
+            reconnect_max: Reconnect backoff cap in seconds
+            on_fetched: Called with the message count after each catch-up
+            parser_pool: Parse full messages off the event loop (may be shared
+                between listeners)
+            blob_store: Claim-check store for raw messages and attachment
+                bodies of fully fetched messages
+            deduplicator: Drops events already published (may be shared
+                between listeners)
         """
         self.host = host
         self.port = port
@@ -78,32 +249,164 @@ class IMAPListenerService:
         self.password = password
         self.producer = kafka_producer
         self.use_ssl = use_ssl
+        self.mailbox = mailbox
+        self.fetch_batch_size = fetch_batch_size
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.initial_sync = initial_sync
+        self.timeout = timeout
+        self.lazy_attachments = lazy_attachments
+        self.connection_pool = connection_pool
+        self.reconnect_base = reconnect_base
+        self.reconnect_max = reconnect_max
+        self.on_fetched = on_fetched
+        self.parser_pool = parser_pool
+        self.blob_store = blob_store
+        self.deduplicator = deduplicator
         self.running = False
         self.imap_client = None
+        self._holds_slot = False
+        self._failures = 0
+        self._connection_lost = False
+
+        self.checkpoints = checkpoints or UIDCheckpointStore(checkpoint_path)
+        self.checkpoint_key = f"{user}@{host}/{mailbox}"
+        self.uidvalidity: int | None = None
+        self.last_uid = 0
+
+        self.stats = {
+            "emails_fetched": 0,
+            "fetch_commands": 0,
+            "bytes_fetched": 0,
+            "attachment_bytes_deferred": 0,
+            "attachments_fetched": 0,
+            "idle_wakeups": 0,
+            "connects": 0,
+            "errors": 0,
+            "backlog": 0,
+            "lag_seconds": None,
+            "kafka_payload_bytes": 0,
+            "blob_bytes_offloaded": 0,
+            "duplicates_dropped": 0,
+            "body_chars": 0,
+            "new_content_chars": 0,
+        }
 
     async def connect(self) -> bool:
         """
-        Connect to IMAP server.
+        Connect to IMAP server, select the mailbox and restore the UID checkpoint.
 
         Returns:
             bool: True if connected successfully
         """
+        if self.connection_pool is not None and not self._holds_slot:
+            await self.connection_pool.acquire()
+            self._holds_slot = True
+
         try:
-            # TODO: Implement aioimaplib connection
-            # self.imap_client = aioimaplib.IMAP4_SSL(self.host, self.port)
-            # await self.imap_client.login(self.user, self.password)
-            # await self.imap_client.select('INBOX')
+            self._connection_lost = False
+            if self.use_ssl:
+                client = aioimaplib.IMAP4_SSL(
+                    host=self.host,
+                    port=self.port,
+                    timeout=self.timeout,
+                    conn_lost_cb=self._on_connection_lost,
+                )
+            else:
+                client = aioimaplib.IMAP4(
+                    host=self.host,
+                    port=self.port,
+                    timeout=self.timeout,
+                    conn_lost_cb=self._on_connection_lost,
+                )
+
+            # aioimaplib never resolves the greeting if the TCP connect fails
+            await asyncio.wait_for(client.wait_hello_from_server(), self.timeout)
+
+            response = await client.login(self.user, self.password)
+            if response.result != "OK":
+                raise ConnectionError(f"LOGIN failed: {response.lines}")
+
+            response = await client.select(self.mailbox)
+            if response.result != "OK":
+                raise ConnectionError(f"SELECT {self.mailbox} failed: {response.lines}")
+
+            self.imap_client = client
+            await self._restore_checkpoint(response.lines)
+            self.stats["connects"] += 1
 
             logger.info(
                 "Connected to IMAP server",
-                extra={"host": self.host, "user": self.user, "port": self.port},
+                extra={
+                    "host": self.host,
+                    "user": self.user,
+                    "port": self.port,
+                    "uidvalidity": self.uidvalidity,
+                    "last_uid": self.last_uid,
+                },
             )
             return True
 
         except Exception as e:
             logger.error(f"Failed to connect to IMAP server: {e}")
+            self.imap_client = None
+            self._release_slot()
             return False
 
+    def _on_connection_lost(self, exc: Exception | None):
+        """Wake a pending IDLE so listen() reconnects instead of idling on a dead socket."""
+        self._connection_lost = True
+        if self.imap_client is not None:
+            self.imap_client.protocol.idle_queue.put_nowait(aioimaplib.STOP_WAIT_SERVER_PUSH)
+
+    async def _restore_checkpoint(self, select_lines: list[bytes]):
+        """
+        Restore last processed UID from the checkpoint.
+
+        The checkpoint is only valid for the same UIDVALIDITY; otherwise UIDs
+        were renumbered and the mailbox is re-synced per initial_sync.
+        """
+        select_text = b" ".join(bytes(line) for line in select_lines)
+        match = _UIDVALIDITY_RE.search(select_text)
+        uidvalidity = int(match.group(1)) if match else 0
+
+        stored = self.checkpoints.load(self.checkpoint_key)
+        if stored is not None and stored[0] == uidvalidity:
+            self.uidvalidity, self.last_uid = stored
+            return
+
+        if stored is not None:
+            logger.warning(
+                f"UIDVALIDITY changed for {self.mailbox} ({stored[0]} -> {uidvalidity}), resyncing"
+            )
+
+        if self.initial_sync == "all":
+            last_uid = 0
+        else:
+            match = _UIDNEXT_RE.search(select_text)
+            last_uid = int(match.group(1)) - 1 if match else await self._highest_uid()
+
+        self.uidvalidity = uidvalidity
+        self.last_uid = last_uid
+        self.checkpoints.save(self.checkpoint_key, uidvalidity, last_uid)
+
+    async def _highest_uid(self) -> int:
+        """Highest UID in the mailbox (fallback when SELECT has no UIDNEXT)."""
+        uids = await self._search_uids("1:*")
+        return max(uids) if uids else 0
+
+    async def _search_uids(self, uid_range: str) -> list[int]:
+        """UID SEARCH UID <range>."""
+        response = await self.imap_client.uid_search("UID", uid_range, charset=None)
+        if response.result != "OK":
+            raise RuntimeError(f"UID SEARCH failed: {response.lines}")
+
+        # aioimaplib strips the "SEARCH" keyword; the last line is the tagged status
+        uids = []
+        for line in response.lines[:-1]:
+            uids.extend(int(token) for token in line.split() if token.isdigit())
+        return uids
+
     async def listen(self):
         """
         Start IMAP IDLE listening for new emails.
@@ -120,24 +423,21 @@ class IMAPListenerService:
 
         while self.running:
             try:
-                # Connect if not connected
+                # Connect if not connected, then catch up from the checkpoint
                 if not self.imap_client:
                     connected = await self.connect()
                     if not connected:
-                        await asyncio.sleep(5)  # Retry after 5s
+                        await self.backoff()
                         continue
+                    await self.fetch_new_emails()
+                    self.reset_backoff()
 
-                # TODO: Implement IMAP IDLE protocol
-                # await self.imap_client.idle_start()
-                # response = await self.imap_client.wait_server_push()
-                #
-                # if 'EXISTS' in response:
-                #     # New email arrived
-                #     await self.fetch_new_emails()
-
-                # Stub: simulate checking every 10 seconds
-                await asyncio.sleep(10)
-                logger.debug("IMAP IDLE check (stub)")
+                if self.imap_client.has_capability("IDLE"):
+                    if await self.wait_for_new_mail():
+                        await self.fetch_new_emails()
+                else:
+                    await asyncio.sleep(self.poll_interval)
+                    await self.fetch_new_emails()
 
             except asyncio.CancelledError:
                 logger.info("IMAP listener cancelled")
@@ -146,31 +446,286 @@ class IMAPListenerService:
 
             except Exception as e:
                 logger.error(f"Error in IMAP listener loop: {e}")
-                await asyncio.sleep(5)  # Retry after error
+                self.stats["errors"] += 1
+                await self.disconnect()
+                await self.backoff()
 
         # Cleanup
         await self.disconnect()
 
-    async def fetch_new_emails(self):
+    def reset_backoff(self):
+        """Restart the reconnect backoff after a successful session."""
+        self._failures = 0
+
+    async def backoff(self):
+        """Sleep before the next reconnect attempt."""
+        delay = reconnect_delay(self._failures, self.reconnect_base, self.reconnect_max)
+        self._failures += 1
+        await asyncio.sleep(delay)
+
+    async def wait_for_new_mail(self) -> bool:
         """
-        Fetch new emails from IMAP server.
+        Run one IDLE cycle until the server pushes new mail or idle_timeout.
 
-        Called when IDLE detects new messages.
+        Returns:
+            bool: True if the server reported EXISTS/RECENT
         """
+        idle_task = await self.imap_client.idle_start(timeout=self.idle_timeout)
         try:
-            # TODO: Implement email fetching
-            # typ, data = await self.imap_client.search(None, 'UNSEEN')
-            # email_ids = data[0].split()
-            #
-            # for email_id in email_ids:
-            #     typ, msg_data = await self.imap_client.fetch(email_id, '(RFC822)')
-            #     raw_email = msg_data[0][1]
-            #     await self.process_email(raw_email)
+            push = await self.imap_client.wait_server_push(timeout=self.idle_timeout + 1)
+        except asyncio.TimeoutError:
+            push = []
+        finally:
+            if self._connection_lost:
+                idle_task.cancel()
+            else:
+                self.imap_client.idle_done()
+                await asyncio.wait_for(idle_task, self.timeout)
+
+        if self._connection_lost:
+            raise ConnectionError("IMAP connection lost during IDLE")
+
+        if push == aioimaplib.STOP_WAIT_SERVER_PUSH:
+            return False
 
-            logger.debug("Fetching new emails (stub)")
+        has_new_mail = any(b"EXISTS" in line or b"RECENT" in line for line in push)
+        if has_new_mail:
+            self.stats["idle_wakeups"] += 1
+        return has_new_mail
 
-        except Exception as e:
-            logger.error(f"Error fetching emails: {e}")
+    async def fetch_new_emails(self) -> int:
+        """
+        Fetch messages with UID above the checkpoint in batched UID FETCH commands.
+
+        The checkpoint is advanced and persisted after every batch, but only
+        through the last message that was published: if Kafka rejects a
+        message, the checkpoint stops before it and the error is raised so
+        the listener reconnects and fetches it again.
+
+        Returns:
+            int: Number of messages fetched
+        """
+        uids = sorted(uid for uid in await self._search_uids(f"{self.last_uid + 1}:*") if uid > self.last_uid)
+        self.stats["backlog"] = len(uids)
+        fetched = 0
+
+        for i in range(0, len(uids), self.fetch_batch_size):
+            batch = uids[i : i + self.fetch_batch_size]
+
+            if self.lazy_attachments:
+                events = await self._fetch_batch_structured(batch)
+            else:
+                messages = await self._fetch_batch(batch)
+                # With a parser pool the whole batch is parsed in parallel
+                parsed = await asyncio.gather(
+                    *(self.parse_email(raw_email) for _, raw_email in messages),
+                    return_exceptions=True,
+                )
+                events = [(uid, event) for (uid, _), event in zip(messages, parsed, strict=True)]
+            fetched += len(events)
+
+            for uid, event in events:
+                if isinstance(event, Exception):
+                    # Unparseable messages are skipped, not retried
+                    logger.error(f"Error parsing email UID {uid}: {event}")
+                    self.stats["errors"] += 1
+                elif not await self.process_event(event):
+                    self._save_checkpoint(uid - 1)
+                    raise RuntimeError(f"Kafka publish failed for UID {uid}, will refetch")
+
+            self._save_checkpoint(batch[-1])
+            self.stats["backlog"] = len(uids) - i - len(batch)
+
+        if fetched:
+            logger.info(f"Fetched {fetched} new emails (last UID {self.last_uid})")
+        if self.on_fetched is not None:
+            self.on_fetched(fetched)
+        return fetched
+
+    def _save_checkpoint(self, last_uid: int):
+        """Advance and persist the UID checkpoint (never moves it back)."""
+        if last_uid > self.last_uid:
+            self.last_uid = last_uid
+            self.checkpoints.save(self.checkpoint_key, self.uidvalidity, self.last_uid)
+
+    async def _uid_fetch(self, uids: list[int], items: str) -> dict[int, dict[str, Any]]:
+        """
+        One UID FETCH command.
+
+        Returns:
+            dict of uid -> parsed FETCH items (see parse_fetch_response)
+        """
+        self.stats["fetch_commands"] += 1
+        response = await self.imap_client.uid("fetch", uid_set(uids), items)
+        if response.result != "OK":
+            raise RuntimeError(f"UID FETCH failed: {response.lines}")
+
+        self.stats["bytes_fetched"] += sum(
+            len(line) for line in response.lines if isinstance(line, bytearray)
+        )
+        return {int(message["UID"]): message for message in parse_fetch_response(response.lines)}
+
+    async def _fetch_batch(self, uids: list[int]) -> list[tuple[int, bytes]]:
+        """
+        Fetch full RFC822 messages for a batch of UIDs.
+
+        Returns:
+            list of (uid, raw RFC822 bytes) sorted by UID
+        """
+        messages = await self._uid_fetch(uids, "(UID BODY.PEEK[])")
+        result = sorted((uid, bytes(message["BODY[]"])) for uid, message in messages.items())
+        self.stats["emails_fetched"] += len(result)
+        return result
+
+    async def _fetch_batch_structured(
+        self, uids: list[int]
+    ) -> list[tuple[int, EmailReceivedEvent | Exception]]:
+        """
+        Fetch headers + BODYSTRUCTURE, then only the text parts.
+
+        Messages with the same text section layout (e.g. "1" or "1.1 1.2")
+        share one UID FETCH; attachment bodies stay on the server.
+
+        Returns:
+            list of (uid, event or build error) sorted by UID
+        """
+        heads = await self._uid_fetch(uids, "(UID RFC822.SIZE BODYSTRUCTURE BODY.PEEK[HEADER])")
+
+        structures: dict[int, list[MimePart] | Exception] = {}
+        layouts: dict[tuple[str, ...], list[int]] = {}
+        for uid, message in heads.items():
+            try:
+                parts = parse_bodystructure(message["BODYSTRUCTURE"])
+            except Exception as e:
+                structures[uid] = e
+                continue
+            structures[uid] = parts
+            sections = tuple(part.section for part in parts if part.is_text)
+            if sections:
+                layouts.setdefault(sections, []).append(uid)
+
+        texts: dict[int, dict[str, Any]] = {}
+        for sections, layout_uids in layouts.items():
+            items = " ".join(f"BODY.PEEK[{section}]" for section in sections)
+            texts.update(await self._uid_fetch(sorted(layout_uids), f"(UID {items})"))
+
+        # A malformed message is returned as (uid, exception), like parse
+        # errors on the full-fetch path, so it cannot stall the checkpoint
+        events: list[tuple[int, EmailReceivedEvent | Exception]] = []
+        for uid in sorted(heads):
+            structure = structures[uid]
+            if isinstance(structure, Exception):
+                events.append((uid, structure))
+                continue
+            try:
+                event = self.build_event(
+                    uid,
+                    bytes(heads[uid]["BODY[HEADER]"]),
+                    structure,
+                    texts.get(uid, {}),
+                    int(heads[uid].get("RFC822.SIZE") or 0),
+                )
+            except Exception as e:
+                event = e
+            events.append((uid, event))
+
+        self.stats["emails_fetched"] += len(events)
+        return events
+
+    def build_event(
+        self,
+        uid: int,
+        header: bytes,
+        parts: list[MimePart],
+        sections: dict[str, Any],
+        size_bytes: int,
+    ) -> EmailReceivedEvent:
+        """
+        Build an event from headers, BODYSTRUCTURE and fetched text sections.
+
+        Args:
+            uid: Message UID
+            header: Raw header block
+            parts: Leaf parts from parse_bodystructure()
+            sections: FETCH items with "BODY[<section>]" bodies of text parts
+            size_bytes: RFC822.SIZE
+        """
+        msg = BytesParser(policy=policy.default).parsebytes(header, headersonly=True)
+
+        body_text = None
+        body_html = None
+        attachments = []
+
+        for part in parts:
+            if part.is_text:
+                data = sections.get(f"BODY[{part.section}]")
+                if data is None:
+                    continue
+                text = decode_text(decode_transfer_encoding(data, part.encoding), part.charset)
+                if part.content_type == "text/plain" and body_text is None:
+                    body_text = text
+                elif part.content_type == "text/html" and body_html is None:
+                    body_html = text
+
+            elif part.filename:
+                handle = AttachmentHandle(
+                    filename=part.filename,
+                    content_type=part.content_type,
+                    size_bytes=decoded_size(part.size, part.encoding),
+                    mailbox=self.mailbox,
+                    uidvalidity=self.uidvalidity,
+                    uid=uid,
+                    section=part.section,
+                    encoding=part.encoding,
+                )
+                attachments.append(handle.ref())
+                self.stats["attachment_bytes_deferred"] += part.size
+
+        parsed = {
+            "message_id": msg.get("Message-ID", "").strip("<>"),
+            "from_email": msg.get("From", ""),
+            "to_email": header_addresses(msg, "To"),
+            "subject": msg.get("Subject", ""),
+            "body_text": body_text,
+            "body_html": body_html,
+            "attachments": attachments,
+            "size_bytes": size_bytes,
+            "sent_at": header_date(msg),
+            **header_threading(msg),
+        }
+        fill_new_content(parsed)
+        self._text_from_html(parsed)
+        return EmailReceivedEvent(**parsed, raw_message=None)
+
+    def _text_from_html(self, parsed: dict[str, Any]):
+        """Fill body_text of an HTML-only email (inline, not in the parser pool)."""
+        html_seconds = fill_text_from_html(parsed)
+        if html_seconds:
+            html_to_text_seconds.observe(html_seconds)
+
+    def open_attachment(self, attachment: dict[str, Any]) -> AttachmentHandle:
+        """
+        Lazy handle for attachment metadata from an event.
+
+        The body is fetched over this listener's connection on handle.read().
+        """
+        return AttachmentHandle.from_ref(attachment, self._fetch_attachment)
+
+    async def _fetch_attachment(self, handle: AttachmentHandle) -> bytes:
+        """Fetch and decode one attachment section."""
+        if handle.mailbox != self.mailbox or handle.uidvalidity != self.uidvalidity:
+            raise LookupError(
+                f"Attachment {handle.filename} refers to {handle.mailbox} "
+                f"UIDVALIDITY {handle.uidvalidity}, not available on this connection"
+            )
+
+        messages = await self._uid_fetch([handle.uid], f"(UID BODY.PEEK[{handle.section}])")
+        message = messages.get(handle.uid)
+        if message is None or message.get(f"BODY[{handle.section}]") is None:
+            raise LookupError(f"Attachment {handle.filename} (UID {handle.uid}) no longer exists")
+
+        self.stats["attachments_fetched"] += 1
+        return decode_transfer_encoding(message[f"BODY[{handle.section}]"], handle.encoding)
 
     async def process_email(self, raw_email: bytes):
         """
@@ -182,85 +737,92 @@ class IMAPListenerService:
         try:
             # Parse email
             event = await self.parse_email(raw_email)
+            await self.process_event(event)
 
-            # Publish to Kafka
-            await self.publish_to_kafka(event)
+        except Exception as e:
+            logger.error(f"Error processing email: {e}")
 
-            logger.info(
-                "Email processed successfully",
-                extra={
-                    "message_id": event.message_id,
-                    "from": event.from_email,
-                    "subject": event.subject,
-                },
-            )
+    async def process_event(self, event: EmailReceivedEvent) -> bool:
+        """
+        Publish a parsed email event to Kafka (duplicates are dropped).
+
+        Args:
+            event: Parsed email event
 
+        Returns:
+            bool: False if the event could not be published
+        """
+        claim = None
+        if self.deduplicator is not None:
+            claim = self.deduplicator.claim(event)
+            if claim is None:
+                self.stats["duplicates_dropped"] += 1
+                return True
+
+        try:
+            await self.publish_to_kafka(event)
         except Exception as e:
-            logger.error(f"Error processing email: {e}")
+            if claim is not None:
+                self.deduplicator.release(claim)
+            logger.error(f"Error publishing email {event.message_id}: {e}")
+            self.stats["errors"] += 1
+            return False
+
+        if claim is not None:
+            self.deduplicator.commit(claim)
+
+        body_chars, new_content_chars = observe_body_sizes(event.body_text, event.new_content)
+        self.stats["body_chars"] += body_chars
+        self.stats["new_content_chars"] += new_content_chars
+
+        if event.sent_at is not None:
+            self.stats["lag_seconds"] = (datetime.now(UTC) - event.sent_at).total_seconds()
+
+        logger.info(
+            "Email processed successfully",
+            extra={
+                "message_id": event.message_id,
+                "from": event.from_email,
+                "subject": event.subject,
+            },
+        )
+        return True
 
     async def parse_email(self, raw_email: bytes) -> EmailReceivedEvent:
         """
         Parse raw email into EmailReceivedEvent.
 
+        Parsing runs in parser_pool if one is configured, otherwise inline.
+        HTML-only emails get body_text converted from body_html.
+        With a blob_store, the raw message and attachment bodies are stored
+        there and only their references are kept in the event.
+
         Args:
             raw_email: Raw RFC822 email bytes
 
         Returns:
             EmailReceivedEvent with parsed data
         """
-        # Parse using Python email library
-        msg = BytesParser(policy=policy.default).parsebytes(raw_email)
+        include_attachments = self.blob_store is not None
+        if self.parser_pool is not None:
+            parsed = await self.parser_pool.parse(raw_email, include_attachments)
+        else:
+            parsed = parse_message(raw_email, include_attachments)
+            self._text_from_html(parsed)
 
-        # Extract headers
-        message_id = msg.get("Message-ID", "").strip("<>")
-        from_email = msg.get("From", "")
-        to_emails = msg.get_all("To", [])
-        subject = msg.get("Subject", "")
+        if self.blob_store is None:
+            return EmailReceivedEvent(**parsed, raw_message=raw_email)
 
-        # Extract body
-        body_text = None
-        body_html = None
-        attachments = []
+        # Claim check: bodies go to the blob store, the event keeps references
+        for attachment in parsed["attachments"]:
+            content = attachment.pop("content", None)
+            if content is not None:
+                attachment["blob"] = await self.blob_store.put(content)
+                self.stats["blob_bytes_offloaded"] += len(content)
 
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition", ""))
-
-                # Plain text body
-                if content_type == "text/plain" and "attachment" not in content_disposition:
-                    body_text = part.get_payload(decode=True).decode("utf-8", errors="ignore")
-
-                # HTML body
-                elif content_type == "text/html" and "attachment" not in content_disposition:
-                    body_html = part.get_payload(decode=True).decode("utf-8", errors="ignore")
-
-                # Attachments
-                elif "attachment" in content_disposition:
-                    filename = part.get_filename()
-                    if filename:
-                        attachments.append(
-                            {
-                                "filename": filename,
-                                "content_type": content_type,
-                                "size_bytes": len(part.get_payload(decode=True)),
-                            }
-                        )
-        else:
-            # Single part email
-            body_text = msg.get_payload(decode=True).decode("utf-8", errors="ignore")
-
-        return EmailReceivedEvent(
-            message_id=message_id,
-            from_email=from_email,
-            to_email=to_emails,
-            subject=subject,
-            body_text=body_text,
-            body_html=body_html,
-            attachments=attachments,
-            raw_message=raw_email,
-            size_bytes=len(raw_email),
-        )
+        raw_message_ref = await self.blob_store.put(raw_email)
+        self.stats["blob_bytes_offloaded"] += len(raw_email)
+        return EmailReceivedEvent(**parsed, raw_message_ref=raw_message_ref)
 
     async def publish_to_kafka(self, event: EmailReceivedEvent, max_retries: int = 3):
         """
@@ -276,13 +838,10 @@ class IMAPListenerService:
         for attempt in range(max_retries):
             try:
                 if self.producer:
-                    # TODO: Implement actual Kafka publish
-                    # self.producer.send(
-                    #     topic='email.received',
-                    #     value=event.model_dump_json().encode('utf-8'),
-                    #     key=event.message_id.encode('utf-8')
-                    # )
-                    # await self.producer.flush()
+                    payload = event.model_dump(mode="json")
+                    if not await self.producer.publish(payload):
+                        raise RuntimeError("Kafka producer rejected the event")
+                    self.stats["kafka_payload_bytes"] += len(json.dumps(payload))
 
                     logger.info(
                         "Published to Kafka",
@@ -309,14 +868,34 @@ class IMAPListenerService:
     async def disconnect(self):
         """Disconnect from IMAP server."""
         try:
-            if self.imap_client:
-                # TODO: Implement disconnect
-                # await self.imap_client.logout()
+            if self.imap_client and not self._connection_lost:
+                await self.imap_client.logout()
                 logger.info("Disconnected from IMAP server")
         except Exception as e:
             logger.error(f"Error disconnecting from IMAP: {e}")
+        finally:
+            self.imap_client = None
+            self._release_slot()
+
+    def _release_slot(self):
+        """Return the connection slot to the pool."""
+        if self._holds_slot:
+            self._holds_slot = False
+            self.connection_pool.release()
 
     async def stop(self):
-        """Stop the listener service."""
+        """Stop the listener service (interrupts a pending IDLE)."""
         logger.info("Stopping IMAP listener service")
         self.running = False
+        if self.imap_client and self.imap_client.has_pending_idle():
+            await self.imap_client.stop_wait_server_push()
+
+    def get_stats(self) -> dict[str, Any]:
+        """Get listener statistics."""
+        return {
+            **self.stats,
+            "mailbox": self.mailbox,
+            "uidvalidity": self.uidvalidity,
+            "last_uid": self.last_uid,
+            "connected": self.imap_client is not None,
+        }
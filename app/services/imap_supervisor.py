@@ -0,0 +1,344 @@
+"""
+IMAP Supervisor - many mailboxes on one event loop
+
+Runs one IMAPListenerService per mailbox (sales@, invoices@, support@ ...
+across several domains) with:
+- Bounded connection pool per IMAP server
+- Jittered reconnect (see reconnect_delay)
+- Consistent-hash sharding of mailboxes across pods
+- Per-mailbox lag / backlog / throughput metrics
+
+Mailboxes of a server that fit into its pool keep an IDLE connection open.
+If a server has more mailboxes than connections, the overflow mailboxes are
+polled in turn over the remaining slot(s).
+
+Author: Email Intelligence Platform Team
+Version: 1.0.0
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import random
+import time
+from collections import deque
+from typing import Any
+
+from pydantic import BaseModel
+
+from app.services.imap_listener import IMAPListenerService, UIDCheckpointStore
+
+logger = logging.getLogger(__name__)
+
+# Throughput is reported over this sliding window
+THROUGHPUT_WINDOW_SECONDS = 60.0
+
+
+class MailboxConfig(BaseModel):
+    """One monitored mailbox."""
+
+    host: str
+    port: int = 993
+    user: str
+    password: str = ""
+    mailbox: str = "INBOX"
+    use_ssl: bool = True
+
+    @property
+    def key(self) -> str:
+        """Stable mailbox identity (also the UID checkpoint key)."""
+        return f"{self.user}@{self.host}/{self.mailbox}"
+
+    @property
+    def server(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+def load_mailboxes(path: str) -> list[MailboxConfig]:
+    """Load mailbox list from a JSON file (list of MailboxConfig dicts)."""
+    with open(path, encoding="utf-8") as f:
+        return [MailboxConfig(**entry) for entry in json.load(f)]
+
+
+class ConsistentHashRing:
+    """
+    Consistent hash ring with virtual nodes.
+
+    Adding or removing a pod moves only ~1/N of the mailboxes.
+    """
+
+    def __init__(self, nodes: list[str], replicas: int = 100):
+        if not nodes:
+            raise ValueError("ConsistentHashRing needs at least one node")
+
+        self.nodes = sorted(set(nodes))
+        self.replicas = replicas
+        self._ring = sorted(
+            (self._hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas)
+        )
+        self._hashes = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+    def node_for(self, key: str) -> str:
+        """Node that owns the key."""
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+class IMAPConnectionPool:
+    """Bounded number of concurrent connections to one IMAP server."""
+
+    def __init__(self, server: str, max_connections: int = 10):
+        if max_connections < 1:
+            raise ValueError("max_connections must be >= 1")
+
+        self.server = server
+        self.max_connections = max_connections
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self.stats = {"in_use": 0, "peak_in_use": 0, "waiting": 0, "acquired": 0}
+
+    async def acquire(self):
+        self.stats["waiting"] += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.stats["waiting"] -= 1
+
+        self.stats["in_use"] += 1
+        self.stats["acquired"] += 1
+        self.stats["peak_in_use"] = max(self.stats["peak_in_use"], self.stats["in_use"])
+
+    def release(self):
+        self.stats["in_use"] -= 1
+        self._semaphore.release()
+
+    def get_stats(self) -> dict[str, Any]:
+        return {**self.stats, "max_connections": self.max_connections}
+
+
+class MailboxMetrics:
+    """Per-mailbox throughput over a sliding window."""
+
+    def __init__(self, window: float = THROUGHPUT_WINDOW_SECONDS):
+        self.window = window
+        self.started_at = time.monotonic()
+        self.total = 0
+        self._events: deque[tuple[float, int]] = deque()
+
+    def record(self, count: int):
+        if count <= 0:
+            return
+        now = time.monotonic()
+        self.total += count
+        self._events.append((now, count))
+        self._trim(now)
+
+    def _trim(self, now: float):
+        while self._events and now - self._events[0][0] > self.window:
+            self._events.popleft()
+
+    def emails_per_sec(self) -> float:
+        now = time.monotonic()
+        self._trim(now)
+        span = min(self.window, max(now - self.started_at, 1e-9))
+        return sum(count for _, count in self._events) / span
+
+
+class IMAPSupervisor:
+    """
+    Supervisor for many IMAP listeners on one event loop.
+
+    Usage:
+        supervisor = IMAPSupervisor(
+            load_mailboxes("mailboxes.json"),
+            kafka_producer=producer,
+            node_id=os.environ["POD_NAME"],
+            nodes=["imap-listener-0", "imap-listener-1", "imap-listener-2"],
+        )
+        await supervisor.start()
+        ...
+        await supervisor.stop()
+    """
+
+    def __init__(
+        self,
+        mailboxes: list[MailboxConfig],
+        kafka_producer=None,
+        node_id: str | None = None,
+        nodes: list[str] | None = None,
+        max_connections_per_server: int = 10,
+        poll_interval: float = 30.0,
+        **listener_kwargs,
+    ):
+        """
+        Initialize supervisor.
+
+        Args:
+            mailboxes: All mailboxes of the deployment
+            kafka_producer: Shared Kafka producer
+            node_id: This pod's name; with nodes, only mailboxes owned by
+                node_id on the hash ring are run here
+            nodes: All pod names of the deployment
+            max_connections_per_server: Connection pool size per host:port
+            poll_interval: Polling interval for mailboxes without an IDLE slot
+                (and for servers without IDLE)
+            **listener_kwargs: Passed to every IMAPListenerService
+                (checkpoint_path, fetch_batch_size, initial_sync, ...);
+                checkpoint_path is opened once and shared by all listeners
+        """
+        self.node_id = node_id
+        self.ring = ConsistentHashRing(nodes) if nodes else None
+        if self.ring is not None and node_id not in self.ring.nodes:
+            raise ValueError(f"node_id {node_id!r} is not one of nodes {self.ring.nodes}")
+
+        self.mailboxes = sorted(
+            (m for m in mailboxes if self.owns(m)), key=lambda m: (m.server, m.key)
+        )
+        self.kafka_producer = kafka_producer
+        self.max_connections_per_server = max_connections_per_server
+        self.poll_interval = poll_interval
+        # One store per file: separate stores would overwrite each other's mailboxes
+        self.checkpoints = UIDCheckpointStore(listener_kwargs.pop("checkpoint_path", None))
+        self.listener_kwargs = listener_kwargs
+
+        self.pools: dict[str, IMAPConnectionPool] = {}
+        self.listeners: dict[str, IMAPListenerService] = {}
+        self.modes: dict[str, str] = {}
+        self.metrics: dict[str, MailboxMetrics] = {}
+        self.tasks: list[asyncio.Task] = []
+        self.running = False
+
+        self._plan()
+
+    def owns(self, mailbox: MailboxConfig) -> bool:
+        """True if this pod's shard includes the mailbox."""
+        return self.ring is None or self.ring.node_for(mailbox.key) == self.node_id
+
+    def _plan(self):
+        """Create pools and listeners; decide IDLE vs poll per mailbox."""
+        by_server: dict[str, list[MailboxConfig]] = {}
+        for mailbox in self.mailboxes:
+            by_server.setdefault(mailbox.server, []).append(mailbox)
+
+        for server, mailboxes in by_server.items():
+            pool = IMAPConnectionPool(server, self.max_connections_per_server)
+            self.pools[server] = pool
+
+            # Keep one slot free for rotating pollers when IDLE can't cover all
+            if len(mailboxes) <= pool.max_connections:
+                idle_slots = len(mailboxes)
+            else:
+                idle_slots = pool.max_connections - 1
+
+            for index, mailbox in enumerate(mailboxes):
+                metrics = MailboxMetrics()
+                self.metrics[mailbox.key] = metrics
+                self.listeners[mailbox.key] = self._make_listener(mailbox, pool, metrics)
+                self.modes[mailbox.key] = "idle" if index < idle_slots else "poll"
+
+    def _make_listener(
+        self, mailbox: MailboxConfig, pool: IMAPConnectionPool, metrics: MailboxMetrics
+    ) -> IMAPListenerService:
+        return IMAPListenerService(
+            host=mailbox.host,
+            port=mailbox.port,
+            user=mailbox.user,
+            password=mailbox.password,
+            kafka_producer=self.kafka_producer,
+            use_ssl=mailbox.use_ssl,
+            mailbox=mailbox.mailbox,
+            poll_interval=self.poll_interval,
+            connection_pool=pool,
+            on_fetched=metrics.record,
+            checkpoints=self.checkpoints,
+            **self.listener_kwargs,
+        )
+
+    async def start(self):
+        """Start all mailbox workers as tasks on the running loop."""
+        self.running = True
+        for key, listener in self.listeners.items():
+            worker = self._run_idle if self.modes[key] == "idle" else self._run_poll
+            self.tasks.append(asyncio.create_task(worker(key, listener), name=f"imap:{key}"))
+
+        logger.info(
+            f"📬 IMAP supervisor started: {len(self.listeners)} mailboxes on "
+            f"{len(self.pools)} servers (node {self.node_id or '-'})"
+        )
+
+    async def _run_idle(self, key: str, listener: IMAPListenerService):
+        """Hold a connection and IDLE; reconnects with jittered backoff."""
+        await listener.listen()
+
+    async def _run_poll(self, key: str, listener: IMAPListenerService):
+        """Borrow a slot, catch up, give the slot back, sleep."""
+        listener.running = True
+        # Spread pollers over the interval instead of starting in lockstep
+        await asyncio.sleep(random.uniform(0, self.poll_interval))
+
+        while self.running and listener.running:
+            try:
+                if await listener.connect():
+                    listener.reset_backoff()
+                    await listener.fetch_new_emails()
+                else:
+                    await listener.backoff()
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Poll of {key} failed: {e}")
+                listener.stats["errors"] += 1
+            finally:
+                await listener.disconnect()
+
+            await asyncio.sleep(self.poll_interval * random.uniform(0.8, 1.2))
+
+    async def stop(self):
+        """Stop all workers and close their connections."""
+        self.running = False
+        for listener in self.listeners.values():
+            await listener.stop()
+
+        if self.tasks:
+            _, pending = await asyncio.wait(self.tasks, timeout=10)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        for listener in self.listeners.values():
+            await listener.disconnect()
+        self.tasks = []
+
+        logger.info("📪 IMAP supervisor stopped")
+
+    def get_stats(self) -> dict[str, Any]:
+        """Supervisor, pool and per-mailbox statistics."""
+        mailboxes = {}
+        for key, listener in self.listeners.items():
+            stats = listener.get_stats()
+            metrics = self.metrics[key]
+            mailboxes[key] = {
+                "mode": self.modes[key],
+                "connected": stats["connected"],
+                "emails": metrics.total,
+                "emails_per_sec": round(metrics.emails_per_sec(), 3),
+                "lag_seconds": stats["lag_seconds"],
+                "backlog": stats["backlog"],
+                "last_uid": stats["last_uid"],
+                "connects": stats["connects"],
+                "errors": stats["errors"],
+                "duplicates_dropped": stats["duplicates_dropped"],
+            }
+
+        return {
+            "node_id": self.node_id,
+            "mailboxes_total": len(self.listeners),
+            "pools": {server: pool.get_stats() for server, pool in self.pools.items()},
+            "mailboxes": mailboxes,
+        }
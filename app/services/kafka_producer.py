@@ -2,17 +2,21 @@
 Kafka Producer Service
 Асинхронный producer для публикации email events в Kafka
 Batch publishing с partitioning по from_email
+Flush без ожидания каждого события: send() для всего batch, затем gather
+Ограниченный буфер с backpressure, flush по числу событий, байтам и возрасту
 """
 
 import asyncio
-import json
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 from aiokafka import AIOKafkaProducer
 from pydantic import BaseModel, Field
 
+from app.services.event_codec import event_serializer
+from app.services.event_spool import EventSpool
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,8 +29,41 @@ class KafkaConfig(BaseModel):
     topic: str = Field(default="emails.raw", description="Topic name")
     batch_size: int = Field(default=100, description="Batch size for publishing")
     batch_timeout_seconds: int = Field(default=5, description="Batch timeout")
+    batch_max_bytes: int = Field(default=1_000_000, description="Flush when pending events reach this size")
+    max_buffered_events: int = Field(
+        default=10_000,
+        description="Pending + in-flight events before publish() blocks (>= batch_size)"
+    )
+    buffer_full_timeout_seconds: float = Field(
+        default=30.0,
+        description="How long publish() waits for buffer space before rejecting an event"
+    )
+    serialization: str = Field(default="json", description="Event encoding: json, binary (event_codec)")
+    event_compression: str = Field(
+        default="none",
+        description="Per-event compression of binary events: none, zlib, zstd, lz4"
+    )
+    spool_dir: Optional[str] = Field(
+        default=None,
+        description="On-disk spool for events Kafka did not accept (None - keep them in memory)"
+    )
+    spool_segment_bytes: int = Field(default=64 * 1024 * 1024, description="Spool segment size")
+    spool_fsync_interval_seconds: float = Field(
+        default=0.0,
+        description="Extra wait to group spool appends into one fsync"
+    )
+    spool_fsync_batch: int = Field(default=256, description="fsync the spool once a group has this many events")
+    spool_retry_seconds: float = Field(default=1.0, description="Initial spool drain retry delay (doubles up to 60s)")
     compression_type: str = Field(default="gzip", description="Compression: gzip, snappy, lz4")
     acks: str = Field(default="all", description="Acks: 0, 1, all")
+    enable_idempotence: bool = Field(
+        default=False,
+        description="Idempotent producer: broker drops duplicates of internally retried sends (acks=all)"
+    )
+    transactional_id: Optional[str] = Field(
+        default=None,
+        description="Transactional producer: each flush is one transaction (implies idempotence, acks=all)"
+    )
 
 
 class EmailEvent(BaseModel):
@@ -42,17 +79,66 @@ class KafkaEmailProducer:
     """
     Асинхронный Kafka producer для email events
     Поддержка batch publishing и partitioning
+
+    Буфер событий ограничен (max_buffered_events, включая события в полете):
+    при недоступном брокере publish ждет места до buffer_full_timeout_seconds
+    и возвращает False, вместо неограниченного роста памяти. Flush
+    запускается по числу событий, размеру в байтах или возрасту batch;
+    одновременно выполняется не больше одного flush.
+
+    serialization="binary" публикует события в компактном формате
+    event_codec (consumer: decode_event / decode_email_received).
+
+    С spool_dir события, которые брокер не принял, и новые события, пока
+    spool не пуст или буфер заполнен, пишутся в EventSpool на диске (publish
+    не ждет брокер и переживает рестарт). Фоновый drainer отправляет spool
+    в порядке записи, когда брокер снова доступен.
+
+    Режимы доставки: по умолчанию at-least-once (повтор после потерянного
+    ack дает дубликат). enable_idempotence убирает дубликаты внутренних
+    повторов aiokafka. С transactional_id каждый flush (и batch drainer'а)
+    отправляется одной транзакцией: при ошибке транзакция отменяется и
+    повторяется целиком, consumer'ы с isolation_level="read_committed" видят
+    каждое событие один раз. publish_transaction() - для consume-transform-
+    produce: события и offsets входного топика коммитятся атомарно.
     """
     
     def __init__(self, config: KafkaConfig):
+        if (config.enable_idempotence or config.transactional_id) and config.acks != 'all':
+            raise ValueError("Idempotent and transactional Kafka producers require acks='all'")
         self.config = config
         self.producer: Optional[AIOKafkaProducer] = None
+        # События сериализуются один раз в publish: размер для лимита batch
+        # и value для send()
+        self._serialize = event_serializer(config.serialization, config.event_compression)
         self.batch: List[EmailEvent] = []
+        self.batch_bytes = 0
+        self._batch_payloads: List[bytes] = []
+        self.in_flight = 0
         self.batch_timer: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._space = asyncio.Condition()
+        self.spool: Optional[EventSpool] = None
+        if config.spool_dir:
+            self.spool = EventSpool(
+                config.spool_dir,
+                segment_max_bytes=config.spool_segment_bytes,
+                fsync_interval_seconds=config.spool_fsync_interval_seconds,
+                fsync_batch=config.spool_fsync_batch
+            )
+        self.drainer: Optional[asyncio.Task] = None
+        # Одна открытая транзакция на producer (flush и drainer по очереди)
+        self._transaction_lock = asyncio.Lock()
         self.stats = {
             'events_published': 0,
             'batches_sent': 0,
             'errors': 0,
+            'events_requeued': 0,
+            'backpressure_waits': 0,
+            'rejected': 0,
+            'events_spooled': 0,
+            'transactions_committed': 0,
+            'transactions_aborted': 0,
             'total_bytes': 0
         }
         self.is_running = False
@@ -64,7 +150,8 @@ class KafkaEmailProducer:
                 bootstrap_servers=self.config.bootstrap_servers,
                 compression_type=self.config.compression_type,
                 acks=self.config.acks,
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+                enable_idempotence=self.config.enable_idempotence or bool(self.config.transactional_id),
+                transactional_id=self.config.transactional_id,
                 max_batch_size=1000000  # 1MB
             )
             
@@ -72,7 +159,15 @@ class KafkaEmailProducer:
             self.is_running = True
             logger.info(f"✅ Kafka producer initialized for topic: {self.config.topic}")
             logger.info(f"   Bootstrap servers: {self.config.bootstrap_servers}")
-            logger.info(f"   Batch: {self.config.batch_size} events or {self.config.batch_timeout_seconds}s")
+            logger.info(f"   Delivery: {self._delivery_mode()}")
+            logger.info(
+                f"   Batch: {self.config.batch_size} events, {self.config.batch_max_bytes} bytes "
+                f"or {self.config.batch_timeout_seconds}s; buffer {self.config.max_buffered_events} events"
+            )
+            
+            # События, оставшиеся в spool с прошлого запуска
+            if self.spool and self.spool.depth:
+                self._start_drainer()
             return True
         
         except Exception as e:
@@ -81,68 +176,134 @@ class KafkaEmailProducer:
     
     async def close(self):
         """Закрыть producer"""
-        if self.batch_timer and not self.batch_timer.done():
-            self.batch_timer.cancel()
-            try:
-                await self.batch_timer
-            except asyncio.CancelledError:
-                pass
+        self._cancel_batch_timer()
         
         if self.producer:
-            # Отправить оставшиеся события
+            # Отправить оставшиеся события (дождавшись flush в полете)
             if self.batch:
                 logger.info(f"📤 Flushing {len(self.batch)} remaining events before shutdown...")
-                await self._flush_batch()
+            await self._flush_batch(drain=True)
+            
+            # Таймер повтора, если часть событий не ушла
+            self._cancel_batch_timer()
+            
+            if self.drainer and not self.drainer.done():
+                self.drainer.cancel()
+                try:
+                    await self.drainer
+                except asyncio.CancelledError:
+                    pass
             
             await self.producer.stop()
             self.is_running = False
             logger.info("✅ Kafka producer closed")
+        
+        if self.spool:
+            await self.spool.close()
+            if self.spool.depth:
+                logger.info(f"📼 {self.spool.depth} events left in spool for the next start")
     
     async def publish(self, email_data: Dict[str, Any]) -> bool:
         """
         Добавить email event в batch для публикации
         
+        Если буфер заполнен, ждет, пока flush освободит место
+        (backpressure для IMAP listener). Со spool событие вместо этого
+        пишется на диск; так же, пока spool не пуст (порядок событий).
+        
         Args:
             email_data: Raw email data from IMAP
             
         Returns:
-            True если успешно добавлено в batch
+            True если успешно добавлено в batch, False при ошибке или если
+            место в буфере не освободилось за buffer_full_timeout_seconds
         """
         try:
-            import uuid
-            
-            # Создать event
-            event = EmailEvent(
-                event_id=str(uuid.uuid4()),
-                timestamp=datetime.utcnow().isoformat(),
-                email_data=email_data,
-                metadata={
-                    'source_host': self.config.bootstrap_servers[0] if self.config.bootstrap_servers else 'unknown',
-                    'from_email': email_data.get('from_email', 'unknown'),
-                    'batch_size': self.config.batch_size
-                }
-            )
-            
-            # Добавить в batch
-            self.batch.append(event)
-            
-            logger.debug(f"📥 Added to batch: {event.event_id} (batch size: {len(self.batch)})")
-            
-            # Проверить размер batch
-            if len(self.batch) >= self.config.batch_size:
-                logger.info(f"📦 Batch size limit reached ({len(self.batch)} events), flushing...")
-                await self._flush_batch()
-            
-            # Запустить таймер если это первое событие
-            elif len(self.batch) == 1:
-                self._start_batch_timer()
-            
-            return True
+            event, payload = self._make_event(email_data)
         
         except Exception as e:
             logger.error(f"❌ Error publishing event: {e}")
             self.stats['errors'] += 1
             return False
+        
+        if self.spool and (self.spool.depth or not self._has_space()):
+            try:
+                await self._spool_after_pending(event, payload)
+                return True
+            except Exception as e:
+                logger.error(f"❌ Error spooling event {event.event_id}: {e}")
+                self.stats['errors'] += 1
+                return False
+        
+        if not await self._wait_for_space():
+            logger.error(
+                f"❌ Kafka buffer full ({self.config.max_buffered_events} events) "
+                f"for {self.config.buffer_full_timeout_seconds}s, event rejected"
+            )
+            self.stats['rejected'] += 1
+            return False
+        
+        # Добавить в batch
+        self.batch.append(event)
+        self._batch_payloads.append(payload)
+        self.batch_bytes += len(payload)
+        
+        logger.debug(f"📥 Added to batch: {event.event_id} (batch size: {len(self.batch)})")
+        
+        # Проверить размер batch (число событий или байты)
+        if self._batch_full():
+            logger.info(
+                f"📦 Batch limit reached ({len(self.batch)} events, {self.batch_bytes} bytes), flushing..."
+            )
+            await self._flush_batch()
+        
+        # Запустить таймер если это первое событие
+        elif len(self.batch) == 1:
+            self._start_batch_timer()
+        
+        return True
+    
+    def _make_event(self, email_data: Dict[str, Any]) -> Tuple[EmailEvent, bytes]:
+        """Создать event и сериализовать его"""
+        import uuid
+        
+        event = EmailEvent(
+            event_id=str(uuid.uuid4()),
+            timestamp=datetime.utcnow().isoformat(),
+            email_data=email_data,
+            metadata={
+                'source_host': self.config.bootstrap_servers[0] if self.config.bootstrap_servers else 'unknown',
+                'from_email': email_data.get('from_email', 'unknown'),
+                'batch_size': self.config.batch_size
+            }
+        )
+        return event, self._serialize(event.dict())
+    
+    def _has_space(self) -> bool:
+        return len(self.batch) + self.in_flight < self.config.max_buffered_events
+    
+    def _batch_full(self) -> bool:
+        return (
+            len(self.batch) >= self.config.batch_size
+            or self.batch_bytes >= self.config.batch_max_bytes
+        )
+    
+    async def _wait_for_space(self) -> bool:
+        """Дождаться места в буфере"""
+        if self._has_space():
+            return True
+        
+        self.stats['backpressure_waits'] += 1
+        logger.warning(f"⏳ Kafka buffer full ({len(self.batch)} pending, {self.in_flight} in flight), waiting...")
+        try:
+            async with self._space:
+                await asyncio.wait_for(
+                    self._space.wait_for(self._has_space),
+                    timeout=self.config.buffer_full_timeout_seconds
+                )
+            return True
+        except asyncio.TimeoutError:
+            return False
     
     def _start_batch_timer(self):
         """Запустить таймер для отправки batch по timeout"""
@@ -155,62 +316,302 @@ class KafkaEmailProducer:
             except asyncio.CancelledError:
                 pass
         
-        if self.batch_timer and not self.batch_timer.done():
-            self.batch_timer.cancel()
-        
+        self._cancel_batch_timer()
         self.batch_timer = asyncio.create_task(timeout_handler())
     
-    async def _flush_batch(self):
-        """Отправить batch в Kafka"""
-        if not self.batch or not self.producer:
+    def _cancel_batch_timer(self):
+        # Таймер, запустивший flush, не отменяет сам себя
+        if (
+            self.batch_timer
+            and not self.batch_timer.done()
+            and self.batch_timer is not asyncio.current_task()
+        ):
+            self.batch_timer.cancel()
+    
+    async def _flush_batch(self, drain: bool = False):
+        """
+        Отправить batch в Kafka
+        
+        Одновременно выполняется один flush: если flush уже идет, вызов
+        возвращается сразу (тот flush после отправки сам проверит лимиты
+        batch и отправит следующий). Без ошибок отправки flush повторяется,
+        пока batch заполнен (drain=True: пока буфер не пуст).
+        
+        Args:
+            drain: Дождаться flush в полете и отправить все события (close)
+        """
+        if self._flush_lock.locked() and not drain:
             return
         
+        async with self._flush_lock:
+            while self.batch and self.producer:
+                self._cancel_batch_timer()
+                
+                count = min(len(self.batch), self.config.batch_size)
+                events, self.batch = self.batch[:count], self.batch[count:]
+                payloads, self._batch_payloads = self._batch_payloads[:count], self._batch_payloads[count:]
+                self.batch_bytes -= sum(map(len, payloads))
+                
+                self.in_flight = len(events)
+                try:
+                    sent_all = await self._send_batch(events, payloads)
+                finally:
+                    self.in_flight = 0
+                    async with self._space:
+                        self._space.notify_all()
+                
+                if not sent_all or not (drain or self._batch_full()):
+                    break
+            
+            # Остаток (или события для повтора) уйдет по таймеру
+            if self.batch and self.is_running:
+                self._start_batch_timer()
+    
+    async def _send_batch(self, events: List[EmailEvent], payloads: List[bytes]) -> bool:
+        """
+        Отправить события в Kafka
+        
+        Все события сначала ставятся в очередь producer'а (send), затем
+        delivery futures ожидаются вместе: aiokafka собирает записи в batch
+        по партициям, и отправка занимает ~1 RTT до брокера вместо RTT на
+        каждое событие. В batch возвращаются только неотправленные события.
+        
+        Returns:
+            True если отправлены все события
+        """
+        logger.info(f"📤 Flushing batch of {len(events)} emails to Kafka topic: {self.config.topic}")
+        
+        results = await self._deliver([self._partition_key(event) for event in events], payloads)
+        
+        failed, failed_payloads = [], []
+        for event, payload, result in zip(events, payloads, results):
+            if result is not None:
+                logger.error(f"❌ Error sending event {event.event_id}: {result}")
+                self.stats['errors'] += 1
+                failed.append(event)
+                failed_payloads.append(payload)
+                continue
+            
+            self.stats['total_bytes'] += len(payload)
+            self.stats['events_published'] += 1
+        
+        self.stats['batches_sent'] += 1
+        logger.info(
+            f"✅ Batch sent: {len(events) - len(failed)}/{len(events)} events, "
+            f"total {self.stats['total_bytes']} bytes"
+        )
+        
+        if failed and self.spool:
+            try:
+                await self._spool_events([self._partition_key(event) for event in failed], failed_payloads)
+                return False
+            except Exception as e:
+                logger.error(f"❌ Error spooling failed events: {e}")
+        
+        if failed:
+            # Вернуть в начало batch (порядок внутри отправителя); место под
+            # них в буфере зарезервировано как in_flight
+            self.batch[:0] = failed
+            self._batch_payloads[:0] = failed_payloads
+            self.batch_bytes += sum(map(len, failed_payloads))
+            self.stats['events_requeued'] += len(failed)
+            logger.warning(f"🔄 {len(failed)} events returned to batch for retry")
+        
+        return not failed
+    
+    @staticmethod
+    def _partition_key(event: EmailEvent) -> bytes:
+        # Partition key = from_email (for ordering within sender)
+        return event.email_data.get('from_email', 'unknown').encode('utf-8')
+    
+    async def _deliver(self, keys: List[bytes], payloads: List[bytes]) -> List[Optional[BaseException]]:
+        """
+        Отправить сообщения (в транзакционном режиме - одной транзакцией)
+        
+        Returns:
+            Ошибка доставки каждого сообщения (None - доставлено); отмененная
+            транзакция - ошибка у всех сообщений
+        """
+        if not self.config.transactional_id:
+            return await self._send_all(keys, payloads)
+        
+        try:
+            await self._send_transaction(keys, payloads)
+        except Exception as e:
+            # Отмененные сообщения не видны read_committed consumer'ам
+            logger.warning(f"⚠️ Kafka transaction aborted ({len(payloads)} events): {e}")
+            return [e] * len(payloads)
+        return [None] * len(payloads)
+    
+    async def _send_transaction(
+        self,
+        keys: List[bytes],
+        payloads: List[bytes],
+        offsets: Optional[Dict[Any, int]] = None,
+        group_id: Optional[str] = None
+    ):
+        """
+        Отправить сообщения (и offsets consumer group) одной транзакцией
+        
+        Raises:
+            Ошибка доставки любого сообщения - транзакция отменена целиком
+        """
+        async with self._transaction_lock:
+            try:
+                async with self.producer.transaction():
+                    results = await self._send_all(keys, payloads)
+                    error = next((result for result in results if result is not None), None)
+                    if error is not None:
+                        raise error
+                    if offsets:
+                        await self.producer.send_offsets_to_transaction(offsets, group_id)
+            except Exception:
+                self.stats['transactions_aborted'] += 1
+                raise
+        
+        self.stats['transactions_committed'] += 1
+    
+    async def _send_all(self, keys: List[bytes], payloads: List[bytes]) -> List[Optional[BaseException]]:
+        """Поставить все сообщения в очередь producer'а, затем дождаться доставки"""
+        deliveries = [await self._enqueue(key, payload) for key, payload in zip(keys, payloads)]
+        results = await asyncio.gather(*deliveries, return_exceptions=True)
+        return [result if isinstance(result, BaseException) else None for result in results]
+    
+    async def _enqueue(self, key: bytes, payload: bytes) -> asyncio.Future:
+        """
+        Поставить сообщение в очередь producer'а
+        
+        Returns:
+            Delivery future; ошибка постановки в очередь (переполнен буфер,
+            нет метаданных топика) возвращается как future с исключением
+        """
         try:
-            batch_to_send = self.batch.copy()
-            self.batch = []
+            return await self.producer.send(self.config.topic, value=payload, key=key)
+        except Exception as e:
+            failed = asyncio.get_running_loop().create_future()
+            failed.set_exception(e)
+            return failed
+    
+    # ==========================================================================
+    # Spool
+    # ==========================================================================
+    
+    async def _spool_after_pending(self, event: EmailEvent, payload: bytes):
+        """
+        Записать событие в spool после всех более ранних событий
+
+        Сначала дожидается flush в полете (его неотправленные события
+        попадают в spool первыми), затем переносит в spool batch из памяти
+        и само событие - spool воспроизводится в порядке publish.
+        """
+        async with self._flush_lock:
+            self._cancel_batch_timer()
+            keys = [self._partition_key(pending) for pending in self.batch]
+            keys.append(self._partition_key(event))
+            payloads = self._batch_payloads + [payload]
+
+            await self._spool_events(keys, payloads)
+
+            self.batch, self._batch_payloads, self.batch_bytes = [], [], 0
+            async with self._space:
+                self._space.notify_all()
+
+    async def _spool_events(self, keys: List[bytes], payloads: List[bytes]):
+        """Записать события в spool (один fsync на вызов) и запустить drainer"""
+        await self.spool.append_many(list(zip(keys, payloads, strict=True)))
+        self.stats['events_spooled'] += len(payloads)
+        logger.debug(f"📼 Spooled {len(payloads)} events (spool depth: {self.spool.depth})")
+        if self.is_running:
+            self._start_drainer()
+    
+    def _start_drainer(self):
+        if self.drainer is None or self.drainer.done():
+            self.drainer = asyncio.create_task(self._drain_spool())
+    
+    async def _drain_spool(self):
+        """
+        Отправлять spool в Kafka в порядке записи
+        
+        Отправляется по batch_size записей; cursor сдвигается до первой
+        неотправленной записи, она и следующие повторяются после паузы
+        (spool_retry_seconds, удваивается до 60s).
+        """
+        delay = self.config.spool_retry_seconds
+        logger.info(f"📼 Draining spool: {self.spool.depth} events")
+        
+        while self.spool.depth and self.producer:
+            records = await self.spool.read_batch(self.config.batch_size)
+            if not records:
+                # Последние записи еще ждут fsync
+                await asyncio.sleep(0.01)
+                continue
             
-            # Cancel timer
-            if self.batch_timer and not self.batch_timer.done():
-                self.batch_timer.cancel()
+            results = await self._deliver([record.key for record in records], [record.value for record in records])
+            sent = next((i for i, error in enumerate(results) if error is not None), len(records))
             
-            logger.info(f"📤 Flushing batch of {len(batch_to_send)} emails to Kafka topic: {self.config.topic}")
+            for record in records[:sent]:
+                self.stats['total_bytes'] += len(record.value)
+                self.stats['events_published'] += 1
+            await self.spool.commit(records[:sent])
             
-            # Отправить каждое событие
-            successful = 0
-            for event in batch_to_send:
-                try:
-                    # Partition key = from_email (for ordering within sender)
-                    partition_key = (
-                        event.email_data.get('from_email', 'unknown')
-                        .encode('utf-8')
-                    )
-                    
-                    future = await self.producer.send_and_wait(
-                        self.config.topic,
-                        value=event.dict(),
-                        key=partition_key
-                    )
-                    
-                    message_size = len(json.dumps(event.dict()).encode('utf-8'))
-                    self.stats['total_bytes'] += message_size
-                    self.stats['events_published'] += 1
-                    successful += 1
-                
-                except Exception as e:
-                    logger.error(f"❌ Error sending event {event.event_id}: {e}")
-                    self.stats['errors'] += 1
+            if sent < len(records):
+                self.stats['errors'] += 1
+                logger.warning(
+                    f"⚠️ Spool drain failed ({results[sent]}), {self.spool.depth} events pending, "
+                    f"oldest {self.spool.oldest_age():.0f}s; retry in {delay:.0f}s"
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+            else:
+                delay = self.config.spool_retry_seconds
+        
+        logger.info("✅ Spool drained")
+    
+    async def publish_transaction(
+        self,
+        emails: List[Dict[str, Any]],
+        offsets: Dict[Any, int],
+        group_id: str
+    ) -> bool:
+        """
+        Consume-transform-produce: опубликовать события и закоммитить offsets
+        входного топика одной транзакцией
+        
+        События отправляются сразу, мимо batch. Если транзакция отменена, не
+        видны ни события, ни offsets: consumer перечитает входные сообщения.
+        
+        Args:
+            emails: email_data результатов обработки
+            offsets: {TopicPartition: offset следующего сообщения} входного топика
+            group_id: Consumer group входного топика
             
-            self.stats['batches_sent'] += 1
-            logger.info(
-                f"✅ Batch sent: {successful}/{len(batch_to_send)} events, "
-                f"total {self.stats['total_bytes']} bytes"
-            )
+        Returns:
+            True если транзакция закоммичена
+        """
+        if not self.config.transactional_id:
+            raise RuntimeError("publish_transaction requires KafkaConfig.transactional_id")
         
+        events = [self._make_event(email_data) for email_data in emails]
+        keys = [self._partition_key(event) for event, _ in events]
+        payloads = [payload for _, payload in events]
+        
+        try:
+            await self._send_transaction(keys, payloads, offsets, group_id)
         except Exception as e:
-            logger.error(f"❌ Error flushing batch: {e}")
+            logger.error(f"❌ Kafka transaction aborted ({len(payloads)} events, group {group_id}): {e}")
             self.stats['errors'] += 1
-            # Re-add to batch for retry
-            self.batch.extend(batch_to_send)
+            return False
+        
+        self.stats['events_published'] += len(payloads)
+        self.stats['total_bytes'] += sum(map(len, payloads))
+        return True
+    
+    def _delivery_mode(self) -> str:
+        if self.config.transactional_id:
+            return 'transactional'
+        if self.config.enable_idempotence:
+            return 'idempotent'
+        return 'at-least-once'
     
     async def publish_batch(self, emails: List[Dict[str, Any]]) -> int:
         """
@@ -234,11 +635,24 @@ class KafkaEmailProducer:
             'events_published': self.stats['events_published'],
             'batches_sent': self.stats['batches_sent'],
             'errors': self.stats['errors'],
+            'events_requeued': self.stats['events_requeued'],
+            'backpressure_waits': self.stats['backpressure_waits'],
+            'rejected': self.stats['rejected'],
+            'events_spooled': self.stats['events_spooled'],
+            'transactions_committed': self.stats['transactions_committed'],
+            'transactions_aborted': self.stats['transactions_aborted'],
             'total_bytes': self.stats['total_bytes'],
             'pending_batch_size': len(self.batch),
+            'pending_batch_bytes': self.batch_bytes,
+            'in_flight': self.in_flight,
             'batch_config': {
                 'max_size': self.config.batch_size,
+                'max_bytes': self.config.batch_max_bytes,
+                'max_buffered_events': self.config.max_buffered_events,
                 'timeout_seconds': self.config.batch_timeout_seconds,
-                'compression': self.config.compression_type
-            }
+                'compression': self.config.compression_type,
+                'serialization': self.config.serialization,
+                'delivery': self._delivery_mode()
+            },
+            'spool': self.spool.get_stats() if self.spool else None
         }
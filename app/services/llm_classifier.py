@@ -6,7 +6,7 @@ Few-shot learning classifier через Ollama + Mistral 7B
 import json
 import logging
 import time
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 
 from app.models.email_models import (
@@ -30,10 +30,25 @@ class LLMClassifier:
     def __init__(
         self,
         ollama_client: OllamaClient,
-        embedding_service: EmbeddingService
+        embedding_service: EmbeddingService,
+        models: Optional[List[str]] = None,
+        escalation_threshold: float = 0.75
     ):
+        """
+        Args:
+            ollama_client: Ollama HTTP клиент
+            embedding_service: Embedding service для few-shot (RAG)
+            models: Каскад моделей от маленькой к большой. Следующая модель
+                вызывается только если confidence ниже escalation_threshold
+                или ответ не является валидным JSON. По умолчанию - одна
+                модель ollama_client.model.
+            escalation_threshold: Минимальный confidence для принятия ответа
+                без эскалации на следующую модель
+        """
         self.ollama = ollama_client
         self.embedding = embedding_service
+        self.models = models or [ollama_client.model]
+        self.escalation_threshold = escalation_threshold
         self.stats = {
             'total_classified': 0,
             'successful': 0,
@@ -41,6 +56,7 @@ class LLMClassifier:
             'confidence_scores': [],
             'processing_times': []
         }
+        self.model_stats = self._empty_model_stats()
     
     async def classify(
         self,
@@ -64,7 +80,7 @@ class LLMClassifier:
             # Получить контекст (похожие письма для few-shot)
             similar_emails = []
             if use_few_shot:
-                search_text = f"{email.subject} {email.body_text}"
+                search_text = f"{email.subject} {email.content_text}"
                 similar_emails = await self.embedding.find_similar_emails(
                     search_text,
                     k=3,
@@ -76,23 +92,11 @@ class LLMClassifier:
             prompt = self._build_prompt(email, similar_emails)
             system_prompt = self._build_system_prompt()
             
-            # Отправить в LLM
-            logger.debug("🤖 Sending request to LLM...")
-            response = await self.ollama.complete(
-                prompt=prompt,
-                system=system_prompt,
-                temperature=0.2,  # Low for consistency
-                max_tokens=300
+            # Отправить в LLM (каскад: маленькая модель → большая)
+            classification, model_used = await self._classify_cascade(
+                prompt, system_prompt, email
             )
             
-            if not response:
-                logger.warning("⚠️ LLM returned empty response")
-                self.stats['failed'] += 1
-                return None
-            
-            # Парсить JSON ответ
-            classification = self._parse_response(response, email)
-            
             if not classification:
                 self.stats['failed'] += 1
                 return None
@@ -106,7 +110,7 @@ class LLMClassifier:
             
             logger.info(
                 f"✅ LLM classified: {email.message_id} → {classification.category.value} "
-                f"({classification.confidence:.2f}) in {elapsed_ms:.0f}ms"
+                f"({classification.confidence:.2f}) by {model_used} in {elapsed_ms:.0f}ms"
             )
             
             return classification
@@ -116,6 +120,106 @@ class LLMClassifier:
             self.stats['failed'] += 1
             return None
     
+    async def _classify_cascade(
+        self,
+        prompt: str,
+        system_prompt: str,
+        email: EmailDocument
+    ) -> Tuple[Optional[Classification], Optional[str]]:
+        """
+        Прогнать prompt через каскад моделей
+        
+        Returns:
+            (classification, model) - ответ последней модели, вернувшей
+            валидный JSON, или (None, None)
+        """
+        result: Optional[Classification] = None
+        result_model: Optional[str] = None
+        
+        for i, model in enumerate(self.models):
+            is_last = i == len(self.models) - 1
+            model_start = time.time()
+            
+            logger.debug(f"🤖 Sending request to LLM ({model})...")
+            response = await self.ollama.complete(
+                prompt=prompt,
+                system=system_prompt,
+                temperature=0.2,  # Low for consistency
+                max_tokens=300,
+                model=model
+            )
+            
+            if not response:
+                logger.warning(f"⚠️ LLM {model} returned empty response")
+                candidate = None
+            else:
+                # Парсить JSON ответ
+                candidate = self._parse_response(response, email)
+            
+            accepted = candidate is not None and (
+                candidate.confidence >= self.escalation_threshold or is_last
+            )
+            self._record_model_call(
+                model,
+                (time.time() - model_start) * 1000,
+                valid=candidate is not None,
+                accepted=accepted
+            )
+            
+            if candidate:
+                result, result_model = candidate, model
+            
+            if accepted:
+                break
+            
+            if not is_last:
+                reason = (
+                    f"low confidence {candidate.confidence:.2f}" if candidate
+                    else "invalid response"
+                )
+                logger.info(f"⬆️ Escalating from {model} ({reason})")
+        
+        return result, result_model
+    
+    def _record_model_call(
+        self,
+        model: str,
+        elapsed_ms: float,
+        valid: bool,
+        accepted: bool
+    ):
+        """Учесть вызов одной модели каскада"""
+        stats = self.model_stats.setdefault(model, {
+            'requests': 0,
+            'accepted': 0,
+            'escalated': 0,
+            'invalid': 0,
+            'total_time_ms': 0
+        })
+        stats['requests'] += 1
+        stats['total_time_ms'] += elapsed_ms
+        
+        if not valid:
+            stats['invalid'] += 1
+        
+        if accepted:
+            stats['accepted'] += 1
+        elif model != self.models[-1]:
+            stats['escalated'] += 1
+    
+    def _empty_model_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Пустые счетчики по моделям каскада"""
+        return {
+            model: {
+                'requests': 0,
+                'accepted': 0,
+                'escalated': 0,
+                'invalid': 0,
+                'total_time_ms': 0
+            }
+            for model in self.models
+        }
+    
     def _build_system_prompt(self) -> str:
         """Построить system prompt для LLM"""
         return """You are an expert email classifier for a business ERP system.
@@ -163,8 +267,8 @@ SUBJECT: {sim_email['subject']}
 CLASSIFIED AS: {sim_email['category']} (confidence: {sim_email.get('confidence', 0.0):.2f})
 ---"""
         
-        # Truncate body для экономии tokens
-        body_truncated = email.body_text[:1000] if email.body_text else ""
+        # Только новый текст (без цитат), truncate для экономии tokens
+        body_truncated = email.content_text[:1000] if email.content_text else ""
         
         prompt = f"""CLASSIFY THIS EMAIL:
 
@@ -275,6 +379,17 @@ Classify this email into one of the 7 categories. Return JSON response only."""
         # Performance target: 700-800ms
         performance_ok = avg_processing_time < 1000
         
+        models = {}
+        for model, stats in self.model_stats.items():
+            requests = stats['requests']
+            models[model] = {
+                'requests': requests,
+                'hit_rate': round(stats['accepted'] / requests * 100, 1) if requests else 0,
+                'escalated': stats['escalated'],
+                'invalid': stats['invalid'],
+                'avg_latency_ms': round(stats['total_time_ms'] / requests, 1) if requests else 0
+            }
+        
         return {
             'total': self.stats['total_classified'],
             'successful': self.stats['successful'],
@@ -284,7 +399,9 @@ Classify this email into one of the 7 categories. Return JSON response only."""
             'avg_processing_time_ms': round(avg_processing_time, 1),
             'performance_ok': performance_ok,
             'target_latency': '700-800ms',
-            'target_accuracy': '95%+'
+            'target_accuracy': '95%+',
+            'escalation_threshold': self.escalation_threshold,
+            'models': models
         }
     
     def reset_stats(self):
@@ -296,4 +413,5 @@ Classify this email into one of the 7 categories. Return JSON response only."""
             'confidence_scores': [],
             'processing_times': []
         }
+        self.model_stats = self._empty_model_stats()
         logger.info("📊 LLM classifier stats reset")
@@ -6,7 +6,8 @@ Ollama HTTP Client Service
 import aiohttp
 import json
 import logging
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, AsyncIterator, List
 from datetime import datetime
 import asyncio
 
@@ -25,23 +26,52 @@ class OllamaClient:
         model: str = "mistral:7b",
         timeout: int = 30,
         max_retries: int = 3,
-        pool_size: int = 10
+        pool_size: int = 10,
+        embedding_model: str = "nomic-embed-text:latest",
+        keep_alive: Optional[str] = None,
+        keep_warm_interval: int = 0,
+        warmup_timeout: int = 120,
+        warmup_retry_seconds: float = 1.0,
+        extra_models: Optional[List[str]] = None
     ):
         self.host = host
         self.model = model
+        self.embedding_model = embedding_model
+        # Дополнительные chat модели (например, каскад LLMClassifier) для warm-up
+        self.extra_models = [m for m in (extra_models or []) if m != model]
         self.timeout = aiohttp.ClientTimeout(total=timeout)
         self.max_retries = max_retries
         self.pool_size = pool_size
         self.session: Optional[aiohttp.ClientSession] = None
+        
+        # Warm-up / keep-alive: keep_alive передается Ollama как есть ("30m", "24h", "-1m")
+        self.keep_alive = keep_alive
+        self.keep_warm_interval = keep_warm_interval
+        self.warmup_timeout = aiohttp.ClientTimeout(total=warmup_timeout)
+        # Неудачный warm-up (Ollama еще стартует) повторяется с backoff до 60s
+        self.warmup_retry_seconds = warmup_retry_seconds
+        self.warmup_enabled = False
+        self.models_warm = False
+        self.keep_warm_task: Optional[asyncio.Task] = None
         self.stats = {
             'total_requests': 0,
             'successful': 0,
             'failed': 0,
             'total_time_ms': 0
         }
+        self.stream_stats = self._empty_stream_stats()
     
-    async def init(self):
-        """Инициализировать HTTP сессию с connection pooling"""
+    async def init(self, warmup: bool = False):
+        """
+        Инициализировать HTTP сессию с connection pooling
+        
+        Args:
+            warmup: Загрузить chat и embedding модели в фоне. Пока модели
+                не загружены, models_warm = False (readiness не зеленый);
+                неудачный warm-up повторяется до успеха.
+                При keep_warm_interval > 0 модели периодически "пингуются",
+                чтобы Ollama не выгружала их в тихие часы.
+        """
         connector = aiohttp.TCPConnector(
             limit=self.pool_size,
             limit_per_host=self.pool_size // 2,
@@ -52,9 +82,20 @@ class OllamaClient:
             timeout=self.timeout
         )
         logger.info(f"✅ Ollama client initialized: {self.host}/{self.model}")
+        
+        if warmup:
+            self.warmup_enabled = True
+            self.keep_warm_task = asyncio.create_task(self._keep_warm_loop())
     
     async def close(self):
         """Закрыть HTTP сессию"""
+        if self.keep_warm_task and not self.keep_warm_task.done():
+            self.keep_warm_task.cancel()
+            try:
+                await self.keep_warm_task
+            except asyncio.CancelledError:
+                pass
+        
         if self.session:
             await self.session.close()
             logger.info("🛑 Ollama client session closed")
@@ -76,13 +117,96 @@ class OllamaClient:
             logger.warning(f"⚠️ Ollama health check failed: {e}")
             return False
     
+    async def warmup(self) -> bool:
+        """
+        Загрузить chat и embedding модели в память Ollama
+        
+        Returns:
+            True если обе модели загружены
+        """
+        start = time.time()
+        chat_models = [self.model] + self.extra_models
+        results = await asyncio.gather(
+            self._warm_model(
+                "/api/embed",
+                {"model": self.embedding_model, "input": "warmup"}
+            ),
+            *[
+                self._warm_model(
+                    "/api/generate",
+                    {"model": chat_model, "prompt": "", "stream": False}
+                )
+                for chat_model in chat_models
+            ]
+        )
+        
+        embed_ok, chat_ok = results[0], all(results[1:])
+        self.models_warm = chat_ok and embed_ok
+        elapsed_ms = (time.time() - start) * 1000
+        
+        if self.models_warm:
+            logger.info(
+                f"🔥 Ollama models warm: {', '.join(chat_models)}, "
+                f"{self.embedding_model} in {elapsed_ms:.0f}ms"
+            )
+        else:
+            logger.warning(
+                f"⚠️ Ollama warm-up incomplete (chat={chat_ok}, embedding={embed_ok})"
+            )
+        
+        return self.models_warm
+    
+    async def _warm_model(self, endpoint: str, payload: Dict[str, Any]) -> bool:
+        """Отправить warm-up запрос для одной модели"""
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        
+        try:
+            async with self.session.post(
+                f"{self.host}{endpoint}",
+                json=payload,
+                timeout=self.warmup_timeout
+            ) as resp:
+                if resp.status != 200:
+                    logger.warning(
+                        f"⚠️ Warm-up of {payload['model']} failed: {resp.status}"
+                    )
+                    return False
+                
+                await resp.read()
+                return True
+        
+        except Exception as e:
+            logger.warning(f"⚠️ Warm-up of {payload['model']} failed: {e}")
+            return False
+    
+    async def _keep_warm_loop(self):
+        """Прогреть модели и держать их загруженными"""
+        await self._warmup_until_ready()
+        
+        if self.keep_warm_interval <= 0:
+            return
+        
+        while True:
+            await asyncio.sleep(self.keep_warm_interval)
+            await self._warmup_until_ready()
+    
+    async def _warmup_until_ready(self):
+        """warmup() с exponential backoff, пока обе модели не загружены"""
+        delay = self.warmup_retry_seconds
+        while not await self.warmup():
+            logger.info(f"🔄 Retrying Ollama warm-up in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
+    
     async def complete(
         self,
         prompt: str,
         system: Optional[str] = None,
         temperature: float = 0.3,
         max_tokens: int = 500,
-        retry_count: int = 0
+        retry_count: int = 0,
+        model: Optional[str] = None
     ) -> Optional[str]:
         """
         Запросить completion у Ollama
@@ -93,6 +217,7 @@ class OllamaClient:
             temperature: 0.0-1.0 (lower = more deterministic)
             max_tokens: Max tokens in response
             retry_count: Internal retry counter
+            model: Модель для запроса (по умолчанию self.model)
             
         Returns:
             Generated text или None если ошибка
@@ -103,30 +228,17 @@ class OllamaClient:
             return None
         
         try:
-            import time
             start = time.time()
             
             # Построить request
-            messages = []
-            
-            if system:
-                messages.append({
-                    "role": "system",
-                    "content": system
-                })
-            
-            messages.append({
-                "role": "user",
-                "content": prompt
-            })
-            
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": temperature,
-                "stream": False,
-                "num_predict": max_tokens
-            }
+            payload = self._build_chat_payload(
+                prompt=prompt,
+                system=system,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=False,
+                model=model
+            )
             
             # Отправить запрос
             async with self.session.post(
@@ -146,7 +258,8 @@ class OllamaClient:
                         system=system,
                         temperature=temperature,
                         max_tokens=max_tokens,
-                        retry_count=retry_count + 1
+                        retry_count=retry_count + 1,
+                        model=model
                     )
                 
                 result = await resp.json()
@@ -172,7 +285,8 @@ class OllamaClient:
                 system=system,
                 temperature=temperature,
                 max_tokens=max_tokens,
-                retry_count=retry_count + 1
+                retry_count=retry_count + 1,
+                model=model
             )
         
         except Exception as e:
@@ -180,6 +294,185 @@ class OllamaClient:
             self.stats['failed'] += 1
             return None
     
+    async def complete_stream(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        temperature: float = 0.3,
+        max_tokens: int = 500,
+        model: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Запросить completion у Ollama в streaming режиме
+        
+        Токены отдаются по мере генерации. Чтобы остановить генерацию
+        досрочно, достаточно закрыть генератор (break + aclose() или
+        contextlib.aclosing) - HTTP ответ будет закрыт, и Ollama
+        прекратит генерацию.
+        
+        Args:
+            prompt: User prompt
+            system: System prompt (опционально)
+            temperature: 0.0-1.0 (lower = more deterministic)
+            max_tokens: Max tokens in response
+            model: Модель для запроса (по умолчанию self.model)
+            
+        Yields:
+            Фрагменты текста (tokens) по мере поступления
+        """
+        payload = self._build_chat_payload(
+            prompt=prompt,
+            system=system,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            model=model
+        )
+        
+        for attempt in range(self.max_retries):
+            start = time.time()
+            first_token_at: Optional[float] = None
+            tokens = 0
+            finished = False
+            
+            try:
+                async with self.session.post(
+                    f"{self.host}/api/chat",
+                    json=payload
+                ) as resp:
+                    if resp.status != 200:
+                        logger.error(f"❌ Ollama stream error: {resp.status}")
+                        wait_time = 2 ** attempt
+                        logger.info(f"🔄 Retrying in {wait_time}s (attempt {attempt + 1})")
+                        await asyncio.sleep(wait_time)
+                        continue
+                    
+                    self.stats['total_requests'] += 1
+                    self.stream_stats['streams'] += 1
+                    
+                    try:
+                        async for line in resp.content:
+                            line = line.strip()
+                            if not line:
+                                continue
+                            
+                            chunk = json.loads(line)
+                            token = chunk.get("message", {}).get("content", "")
+                            
+                            if token:
+                                if first_token_at is None:
+                                    first_token_at = time.time()
+                                    self.stream_stats['total_ttft_ms'] += (
+                                        (first_token_at - start) * 1000
+                                    )
+                                tokens += 1
+                                yield token
+                            
+                            if chunk.get("done"):
+                                finished = True
+                                break
+                    except GeneratorExit:
+                        # Генератор закрыт до конца ответа - рвем соединение,
+                        # чтобы Ollama не генерировала токены впустую
+                        resp.close()
+                        self.stream_stats['cancelled'] += 1
+                        raise
+                    finally:
+                        self._record_stream(start, first_token_at, tokens)
+                
+                if finished:
+                    self.stats['successful'] += 1
+                    logger.debug(
+                        f"✅ Ollama stream: {tokens} tokens in "
+                        f"{(time.time() - start) * 1000:.1f}ms"
+                    )
+                else:
+                    # Соединение оборвалось до chunk с done: true - ответ неполный
+                    self.stats['failed'] += 1
+                    self.stream_stats['truncated'] += 1
+                    logger.warning(f"⚠️ Ollama stream ended without done after {tokens} tokens")
+                return
+            
+            except asyncio.TimeoutError:
+                if first_token_at is not None:
+                    # Часть ответа уже отдана - повтор исказил бы вывод
+                    logger.warning("⏱️ Ollama stream timeout after first token")
+                    self.stats['failed'] += 1
+                    return
+                logger.warning(f"⏱️ Ollama stream timeout (attempt {attempt + 1})")
+                await asyncio.sleep(2 ** attempt)
+            
+            except Exception as e:
+                logger.error(f"❌ Ollama stream failed: {e}")
+                self.stats['failed'] += 1
+                return
+        
+        logger.error(f"❌ Max retries ({self.max_retries}) reached for Ollama stream")
+    
+    def _build_chat_payload(
+        self,
+        prompt: str,
+        system: Optional[str],
+        temperature: float,
+        max_tokens: int,
+        stream: bool,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Построить payload для /api/chat"""
+        messages: List[Dict[str, str]] = []
+        
+        if system:
+            messages.append({
+                "role": "system",
+                "content": system
+            })
+        
+        messages.append({
+            "role": "user",
+            "content": prompt
+        })
+        
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": stream,
+            "num_predict": max_tokens
+        }
+        
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        
+        return payload
+    
+    def _record_stream(
+        self,
+        start: float,
+        first_token_at: Optional[float],
+        tokens: int
+    ):
+        """Учесть метрики завершенного (или прерванного) stream"""
+        now = time.time()
+        self.stats['total_time_ms'] += (now - start) * 1000
+        
+        if first_token_at is not None:
+            self.stream_stats['tokens'] += tokens
+            self.stream_stats['generation_time_ms'] += (now - first_token_at) * 1000
+            self.stream_stats['streams_with_tokens'] += 1
+    
+    @staticmethod
+    def _empty_stream_stats() -> Dict[str, Any]:
+        """Пустые счетчики streaming метрик"""
+        return {
+            'streams': 0,
+            'streams_with_tokens': 0,
+            'cancelled': 0,
+            'truncated': 0,
+            'tokens': 0,
+            'total_ttft_ms': 0,
+            'generation_time_ms': 0
+        }
+    
     def get_stats(self) -> Dict[str, Any]:
         """Получить статистику запросов"""
         avg_time = (
@@ -194,12 +487,34 @@ class OllamaClient:
             else 0
         )
         
+        stream = self.stream_stats
+        avg_ttft = (
+            stream['total_ttft_ms'] / stream['streams_with_tokens']
+            if stream['streams_with_tokens'] > 0
+            else 0
+        )
+        
+        tokens_per_sec = (
+            stream['tokens'] / (stream['generation_time_ms'] / 1000)
+            if stream['generation_time_ms'] > 0
+            else 0
+        )
+        
         return {
             'total_requests': self.stats['total_requests'],
             'successful': self.stats['successful'],
             'failed': self.stats['failed'],
             'avg_time_ms': round(avg_time, 1),
-            'success_rate': round(success_rate, 1)
+            'success_rate': round(success_rate, 1),
+            'models_warm': self.models_warm,
+            'streaming': {
+                'streams': stream['streams'],
+                'cancelled': stream['cancelled'],
+                'truncated': stream['truncated'],
+                'tokens': stream['tokens'],
+                'avg_ttft_ms': round(avg_ttft, 1),
+                'tokens_per_sec': round(tokens_per_sec, 1)
+            }
         }
     
     def reset_stats(self):
@@ -210,4 +525,5 @@ class OllamaClient:
             'failed': 0,
             'total_time_ms': 0
         }
+        self.stream_stats = self._empty_stream_stats()
         logger.info("📊 Ollama stats reset")
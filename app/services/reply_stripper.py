@@ -0,0 +1,183 @@
+"""
+Quoted-reply and signature stripping
+
+Replies carry the whole conversation history, the sender's signature and
+legal disclaimers in body_text. strip_reply() keeps only the new content:
+- Drops ">"-quoted lines (interleaved answers between quotes are kept)
+- Cuts at reply headers: "On ... wrote:", "-----Original Message-----",
+  Outlook "From:/Sent:" blocks and their Russian equivalents
+- Cuts trailing signatures ("-- ", sign-offs such as "Best regards" /
+  "С уважением") and disclaimers
+
+Forwarded messages are left intact: for a forward the quoted message is
+the content. SignatureExtractor (response_generator) still reads the
+signature from the full body_text.
+
+Author: Email Intelligence Platform Team
+Version: 1.0.0
+"""
+
+import re
+from typing import Any
+
+from prometheus_client import Counter
+
+body_chars_total = Counter(
+    "email_body_chars_total",
+    "Email body characters before (body) and after (new_content) reply stripping",
+    ["stage"],
+)
+
+_QUOTE_RE = re.compile(r"^\s*>")
+
+# One-line reply headers; Gmail may wrap "On ... wrote:" over two lines
+_REPLY_HEADER_RES = [
+    re.compile(r"^\s*-{2,}\s*(?:Original Message|Исходное сообщение|Reply message)\s*-{2,}\s*$", re.I),
+    re.compile(r"^\s*On\b.{4,300}\bwrote:\s*$", re.I | re.S),
+    re.compile(r"^\s*Am\b.{4,300}\bschrieb\b.{0,100}:\s*$", re.I | re.S),
+    re.compile(r"^.{4,300}\b(?:пишет|написал|написала|написал\(а\))\s*:\s*$", re.I | re.S),
+    # Gmail RU: "пн, 19 окт. 2026 г. в 10:00, Иван <ivan@example.com>:"
+    re.compile(r"^.{0,80}\d{4}\s*г\.\s*в\s*\d{1,2}:\d{2}.{0,200}:\s*$", re.I | re.S),
+]
+
+# Outlook header block: From/От followed by Sent/Date/Отправлено within a few lines
+_FROM_RE = re.compile(r"^\s*\*?(?:From|От|Von)\s*:\*?\s+\S", re.I)
+_SENT_RE = re.compile(r"^\s*\*?(?:Sent|Date|Отправлено|Дата|Gesendet)\s*:\*?\s+\S", re.I)
+
+# Headers below a forward separator belong to the forwarded message
+_FORWARD_RE = re.compile(
+    r"^\s*(?:-{2,}\s*(?:forwarded message|пересланное сообщение)\s*-{2,}|begin forwarded message:)",
+    re.I,
+)
+
+_SIGNATURE_SEPARATOR_RE = re.compile(r"^--\s?$|^_{5,}\s*$")
+_SIGN_OFF_RE = re.compile(
+    r"^\s*(?:best regards|kind regards|regards|best wishes|best|cheers|thanks|thank you|"
+    r"sincerely|yours sincerely|с уважением|с наилучшими пожеланиями|всего доброго|"
+    r"спасибо|заранее спасибо|благодарю)\s*[,.!]?\s*$",
+    re.I,
+)
+_MOBILE_SIGNATURE_RE = re.compile(
+    r"^\s*(?:sent from my \w+|get outlook for \w+|отправлено (?:с|из) \w+)", re.I
+)
+_DISCLAIMER_RE = re.compile(
+    r"^\s*(?:confidentiality notice|disclaimer|this (?:e-?mail|message) (?:and any attachments )?"
+    r"(?:is|are|may|contains?)\b.{0,40}\b(?:confidential|privileged|intended)|"
+    r"конфиденциальн|данное (?:сообщение|письмо)\b.{0,60}\b(?:конфиденциальн|предназначен))",
+    re.I,
+)
+
+# A sign-off starts a signature only if every line after it is a name,
+# title or contact line (phone, email, URL); digits alone (invoice numbers,
+# amounts, dates) do not make a contact line
+MAX_SIGNATURE_LINES = 8
+MAX_SIGNATURE_LINE_WORDS = 8
+_CONTACT_RE = re.compile(
+    r"[\w.+-]+@[\w-]+\.\w|https?://|\bwww\.|(?:\+|\b)\d(?:[\s()-]*\d){9,}|"
+    r"^\s*(?:tel|phone|mobile|fax|тел|моб|факс)\w*\.?\s*:",
+    re.I,
+)
+
+
+def _reply_header_at(lines: list[str], i: int) -> int | None:
+    """Number of lines of the reply header starting at lines[i], or None."""
+    line = lines[i]
+    if not line.strip():
+        return None
+
+    for pattern in _REPLY_HEADER_RES:
+        if pattern.match(line):
+            return 1
+        if i + 1 < len(lines) and pattern.match(f"{line} {lines[i + 1].strip()}"):
+            return 2
+
+    if _FROM_RE.match(line):
+        for j in range(i + 1, min(i + 4, len(lines))):
+            if _SENT_RE.match(lines[j]):
+                return 1
+    return None
+
+
+def _cut_quotes(lines: list[str]) -> list[str]:
+    """Drop quoted history; keep answers interleaved with ">" quotes."""
+    for i in range(len(lines)):
+        if _FORWARD_RE.match(lines[i]):
+            break
+        header_lines = _reply_header_at(lines, i)
+        if header_lines is None:
+            continue
+
+        rest = [line for line in lines[i + header_lines :] if line.strip()]
+        quoted = sum(1 for line in rest if _QUOTE_RE.match(line))
+        if rest and quoted * 2 >= len(rest):
+            # Bottom-posting / inline answers: only the header goes
+            lines = lines[:i] + lines[i + header_lines :]
+        else:
+            # Top-posting: everything below the header is history
+            lines = lines[:i]
+        break
+
+    return [line for line in lines if not _QUOTE_RE.match(line)]
+
+
+def _is_signature_line(line: str) -> bool:
+    """A name, title or contact line rather than a sentence."""
+    line = line.strip()
+    if _CONTACT_RE.search(line):
+        return True
+    words = len(line.split())
+    is_sentence = line[-1:] in (".", "?", "!", ":", "…") and words >= 2
+    return not is_sentence and words <= MAX_SIGNATURE_LINE_WORDS
+
+
+def _cut_signature(lines: list[str]) -> list[str]:
+    """Cut a trailing signature or disclaimer (never the first line)."""
+    for i in range(1, len(lines)):
+        line = lines[i]
+        if _SIGNATURE_SEPARATOR_RE.match(line) or _MOBILE_SIGNATURE_RE.match(line):
+            return lines[:i]
+        if _DISCLAIMER_RE.match(line):
+            return lines[:i]
+        if _SIGN_OFF_RE.match(line):
+            tail = [rest for rest in lines[i + 1 :] if rest.strip()]
+            if len(tail) <= MAX_SIGNATURE_LINES and all(_is_signature_line(rest) for rest in tail):
+                return lines[:i]
+    return lines
+
+
+def strip_reply(body: str) -> str:
+    """
+    New content of an email body.
+
+    Args:
+        body: Plain text body
+
+    Returns:
+        Body without quoted history, signature and disclaimer; the whole
+        (trimmed) body if stripping would leave nothing
+    """
+    if not body:
+        return ""
+
+    lines = _cut_signature(_cut_quotes(body.splitlines()))
+    text = re.sub(r"\n{3,}", "\n\n", "\n".join(line.rstrip() for line in lines)).strip()
+    return text or body.strip()
+
+
+def fill_new_content(parsed: dict[str, Any]):
+    """Set parsed["new_content"] from parsed["body_text"]."""
+    parsed["new_content"] = strip_reply(parsed.get("body_text") or "") or None
+
+
+def observe_body_sizes(body_text: str | None, new_content: str | None) -> tuple[int, int]:
+    """
+    Count body sizes before and after stripping.
+
+    Returns:
+        (body chars, new content chars)
+    """
+    before = len(body_text or "")
+    after = len(new_content or "")
+    body_chars_total.labels(stage="body").inc(before)
+    body_chars_total.labels(stage="new_content").inc(after)
+    return before, after
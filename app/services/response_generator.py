@@ -182,8 +182,8 @@ class ResponseGenerator:
         
         try:
             # Определить язык и тональность
-            language = LanguageDetector.detect(email.body_text or "")
-            tone = ToneDetector.detect(email.subject or "", email.body_text or "")
+            language = LanguageDetector.detect(email.content_text or "")
+            tone = ToneDetector.detect(email.subject or "", email.content_text or "")
             
             # Получить категорию из классификации
             category = classification.category.value
@@ -442,7 +442,7 @@ Response format:
 Тема: {email.subject}
 
 Текст письма:
-{email.body_text[:500] if email.body_text else ''}
+{email.content_text[:500] if email.content_text else ''}
 
 Классификация: {classification.category}
 Confidence: {classification.confidence:.2f}
@@ -455,7 +455,7 @@ From: {email.from_email}
 Subject: {email.subject}
 
 Email body:
-{email.body_text[:500] if email.body_text else ''}
+{email.content_text[:500] if email.content_text else ''}
 
 Classification: {classification.category}
 Confidence: {classification.confidence:.2f}
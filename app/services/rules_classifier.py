@@ -119,7 +119,7 @@ class RulesEngine:
         """
         Подготовить текст для поиска
         
-        Объединяет subject + body в один текст
+        Объединяет subject + новый текст письма (без цитат и подписи)
         
         Args:
             email: EmailDocument
@@ -129,7 +129,7 @@ class RulesEngine:
         """
         text_parts = [
             email.subject or "",
-            email.body_text or "",
+            email.content_text or "",
         ]
         
         # Объединить части
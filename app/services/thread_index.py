@@ -0,0 +1,223 @@
+"""
+Thread index for classification inheritance
+
+Replies almost always keep the category of their thread. ThreadIndex maps a
+thread root (first Message-ID in References, else In-Reply-To) to the last
+classification of the thread:
+- Bounded LRU in memory for active threads
+- email_threads table (alembic 202612_email_threads) behind it, so
+  inheritance survives restarts and works across consumer instances
+
+Author: Email Intelligence Platform Team
+Version: 1.0.0
+"""
+
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_MESSAGE_ID_RE = re.compile(r"<([^<>\s]+)>")
+
+
+def parse_message_ids(value: str | None) -> list[str]:
+    """Message-IDs of an In-Reply-To / References header value, without <>."""
+    if not value:
+        return []
+    ids = _MESSAGE_ID_RE.findall(value)
+    if not ids and value.strip():
+        # Some clients omit the angle brackets
+        ids = value.split()
+    return ids
+
+
+def thread_root(message_id: str, in_reply_to: str | None = None, references: list[str] | None = None) -> str:
+    """
+    Root Message-ID of the thread an email belongs to.
+
+    References lists the thread oldest first (RFC 5322 3.6.4); clients that
+    send only In-Reply-To are rooted at the parent. A new thread is rooted
+    at the email itself.
+    """
+    if references:
+        return references[0]
+    return in_reply_to or message_id
+
+
+@dataclass
+class ThreadClassification:
+    """Last classification of a thread."""
+
+    category: str
+    confidence: float
+    last_message_id: str | None = None
+    message_count: int = 1
+    updated_at: datetime = field(default_factory=lambda: datetime.now(UTC))
+
+
+class ThreadIndex:
+    """
+    LRU of thread classifications backed by the email_threads table.
+
+    db is the same session provider EmbeddingService uses (get_session()
+    async context manager); without it the index is in-memory only. DB errors
+    are logged and treated as a miss: inheritance is an optimization, the
+    classifier then falls back to rules/LLM.
+    """
+
+    def __init__(self, capacity: int = 50_000, db=None, max_age_days: float = 30):
+        """
+        Initialize thread index.
+
+        Args:
+            capacity: Max threads kept in memory
+            db: Database service with get_session() (optional)
+            max_age_days: Threads idle for longer are not inherited from
+        """
+        self.capacity = capacity
+        self.db = db
+        self.max_age = timedelta(days=max_age_days)
+        self.threads: OrderedDict[str, ThreadClassification] = OrderedDict()
+
+        self.stats = {
+            "lookups": 0,
+            "hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "recorded": 0,
+            "evictions": 0,
+            "db_errors": 0,
+        }
+
+    async def get(self, root: str) -> ThreadClassification | None:
+        """
+        Classification of a thread (LRU first, then the DB).
+
+        Returns:
+            ThreadClassification or None if unknown or idle for too long
+        """
+        self.stats["lookups"] += 1
+
+        thread = self.threads.get(root)
+        if thread is not None:
+            self.threads.move_to_end(root)
+            self.stats["hits"] += 1
+        else:
+            thread = await self._load(root)
+            if thread is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["db_hits"] += 1
+            self._put(root, thread)
+
+        if datetime.now(UTC) - thread.updated_at > self.max_age:
+            self.stats["expired"] += 1
+            return None
+        return thread
+
+    async def record(self, root: str, category: str, confidence: float, message_id: str | None = None):
+        """
+        Store the latest classification of a thread.
+
+        Args:
+            root: Thread root Message-ID
+            category: Category value
+            confidence: Classification confidence
+            message_id: Message-ID of the classified email
+        """
+        previous = self.threads.get(root)
+        thread = ThreadClassification(
+            category=category,
+            confidence=confidence,
+            last_message_id=message_id,
+            message_count=previous.message_count + 1 if previous else 1,
+        )
+        self._put(root, thread)
+        self.stats["recorded"] += 1
+        await self._save(root, thread)
+
+    def _put(self, root: str, thread: ThreadClassification):
+        self.threads[root] = thread
+        self.threads.move_to_end(root)
+        while len(self.threads) > self.capacity:
+            self.threads.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    async def _load(self, root: str) -> ThreadClassification | None:
+        if self.db is None:
+            return None
+        try:
+            async with self.db.get_session() as session:
+                from sqlalchemy import text
+
+                result = await session.execute(
+                    text(
+                        """
+                        SELECT category, confidence, last_message_id, message_count, updated_at
+                        FROM email_threads
+                        WHERE thread_root = :root
+                        """
+                    ),
+                    {"root": root},
+                )
+                row = result.fetchone()
+        except Exception as e:
+            self.stats["db_errors"] += 1
+            logger.warning(f"⚠️ Thread lookup failed: {e}")
+            return None
+
+        if row is None:
+            return None
+        updated_at = row[4]
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=UTC)
+        return ThreadClassification(row[0], row[1], row[2], row[3], updated_at)
+
+    async def _save(self, root: str, thread: ThreadClassification):
+        if self.db is None:
+            return
+        try:
+            async with self.db.get_session() as session:
+                from sqlalchemy import text
+
+                await session.execute(
+                    text(
+                        """
+                        INSERT INTO email_threads
+                            (thread_root, category, confidence, last_message_id, message_count, updated_at)
+                        VALUES (:root, :category, :confidence, :message_id, 1, :updated_at)
+                        ON CONFLICT (thread_root) DO UPDATE SET
+                            category = EXCLUDED.category,
+                            confidence = EXCLUDED.confidence,
+                            last_message_id = EXCLUDED.last_message_id,
+                            message_count = email_threads.message_count + 1,
+                            updated_at = EXCLUDED.updated_at
+                        """
+                    ),
+                    {
+                        "root": root,
+                        "category": thread.category,
+                        "confidence": thread.confidence,
+                        "message_id": thread.last_message_id,
+                        "updated_at": thread.updated_at,
+                    },
+                )
+                await session.commit()
+        except Exception as e:
+            self.stats["db_errors"] += 1
+            logger.warning(f"⚠️ Thread update failed: {e}")
+
+    def get_stats(self) -> dict[str, Any]:
+        lookups = self.stats["lookups"]
+        inherited = self.stats["hits"] + self.stats["db_hits"] - self.stats["expired"]
+        return {
+            **self.stats,
+            "threads_cached": len(self.threads),
+            "capacity": self.capacity,
+            "hit_rate": round(inherited / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,74 @@
+"""
+pgvector Binary Codec
+Передача vector значений в бинарном формате через asyncpg (NumPy ↔ pgvector)
+вместо строк "[0.1,0.2,...]" и ::vector парсинга на сервере
+"""
+
+import logging
+import struct
+from typing import Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Binary wire format pgvector: uint16 dim, uint16 unused, dim × float4 (big-endian)
+_HEADER = struct.Struct('>HH')
+_WIRE_DTYPE = np.dtype('>f4')
+
+
+def encode_vector(vector: Any) -> bytes:
+    """NumPy array (или list) → binary pgvector"""
+    array = np.asarray(vector, dtype=_WIRE_DTYPE)
+    if array.ndim != 1:
+        raise ValueError(f"Expected 1-D vector, got shape {array.shape}")
+    return _HEADER.pack(array.shape[0], 0) + array.tobytes()
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    """Binary pgvector → NumPy float32 array"""
+    dim, _ = _HEADER.unpack_from(data)
+    return np.frombuffer(data, dtype=_WIRE_DTYPE, count=dim, offset=_HEADER.size).astype(np.float32)
+
+
+def format_vector_text(vector: Any) -> str:
+    """Текстовый формат pgvector "[...]" (fallback без binary codec)"""
+    return f"[{','.join(map(str, np.asarray(vector, dtype=np.float32).tolist()))}]"
+
+
+def parse_vector_text(value: str) -> np.ndarray:
+    """Текстовый формат pgvector "[...]" → NumPy float32 array"""
+    return np.array(value.strip("[]").split(","), dtype=np.float32)
+
+
+async def register_vector_codec(connection) -> None:
+    """
+    Зарегистрировать binary codec для типа vector на asyncpg соединении
+
+    Args:
+        connection: asyncpg.Connection
+    """
+    await connection.set_type_codec(
+        'vector',
+        schema='public',
+        encoder=encode_vector,
+        decoder=decode_vector,
+        format='binary'
+    )
+
+
+def install_vector_codec(engine) -> None:
+    """
+    Регистрировать codec на каждом новом соединении SQLAlchemy AsyncEngine (asyncpg)
+
+    Args:
+        engine: sqlalchemy.ext.asyncio.AsyncEngine
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.run_async(register_vector_codec)
+
+    logger.info("✅ pgvector binary codec installed")
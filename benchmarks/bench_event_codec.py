@@ -0,0 +1,103 @@
+"""
+Benchmark: pydantic JSON vs binary email event codec
+
+Сравнивает размер сообщения и CPU на событие для текущего пути
+(json.dumps → json.loads + EmailReceivedEvent.model_validate в consumer)
+и app.services.event_codec (encode_event / decode_email_received).
+
+Запуск:
+    python -m benchmarks.bench_event_codec
+"""
+
+import json
+import timeit
+import zlib
+from datetime import UTC, datetime, timedelta, timezone
+
+from app.services.event_codec import (
+    COMPRESSION_IDS,
+    decode_email_received,
+    decode_event,
+    encode_event,
+)
+from app.services.imap_listener import EmailReceivedEvent
+from app.services.kafka_producer import EmailEvent
+
+ITERATIONS = 5000
+
+
+def make_event(body: str) -> dict:
+    email = EmailReceivedEvent(
+        message_id="CAF3x9k2@mail.client.com",
+        from_email="anna.smirnova@client.com",
+        to_email=["billing@example.com"],
+        subject="Re: Счет INV-2026-0098",
+        body_text=body,
+        new_content=body[:200],
+        attachments=[{
+            "filename": "invoice.pdf",
+            "content_type": "application/pdf",
+            "size_bytes": 48213,
+            "blob": "sha256:" + "ab" * 32,
+        }],
+        received_at=datetime.now(UTC),
+        raw_message_ref="sha256:" + "cd" * 32,
+        size_bytes=len(body) + 2000,
+        sent_at=datetime.now(timezone(timedelta(hours=3))),
+        in_reply_to="CAF3x9k1@mail.example.com",
+        references=["CAF3x9k0@mail.client.com", "CAF3x9k1@mail.example.com"],
+    )
+    email_data = email.model_dump(mode="json")
+    return EmailEvent(
+        event_id="0b6f1f5e-3c1f-4c55-9a55-2f1c0c3b7e41",
+        timestamp=datetime.utcnow().isoformat(),
+        email_data=email_data,
+        metadata={"source_host": "kafka:9092", "from_email": email_data["from_email"], "batch_size": 100},
+    ).dict()
+
+
+def json_decode_model(data: bytes) -> EmailReceivedEvent:
+    return EmailReceivedEvent.model_validate_json(json.dumps(json.loads(data)["email_data"]))
+
+
+def timing_cases(event: dict, as_json: bytes, as_binary: bytes) -> dict:
+    """Замеряемые операции для одного события"""
+    return {
+        "json encode": lambda: json.dumps(event).encode("utf-8"),
+        "binary encode": lambda: encode_event(event),
+        "json decode (dict)": lambda: json.loads(as_json),
+        "binary decode (dict)": lambda: decode_event(as_binary),
+        "json decode + model_validate": lambda: json_decode_model(as_json),
+        "binary decode_email_received": lambda: decode_email_received(as_binary),
+    }
+
+
+def main():
+    bodies = {
+        "short reply": "Спасибо, оплатим в пятницу.\n",
+        "2 KB body": "Добрый день! Прошу выставить счет по заказу №55 на сумму 1500 EUR.\n" * 30,
+    }
+    compressions = [name for name in COMPRESSION_IDS if name != "none"]
+
+    for label, body in bodies.items():
+        event = make_event(body)
+        as_json = json.dumps(event).encode("utf-8")
+        as_binary = encode_event(event)
+
+        print(f"email event, {label}, {ITERATIONS} iterations")
+        print(f"  bytes: json {len(as_json)}, json+zlib {len(zlib.compress(as_json))}, binary {len(as_binary)}", end="")
+        for name in compressions:
+            try:
+                print(f", binary+{name} {len(encode_event(event, name))}", end="")
+            except RuntimeError:
+                pass
+        print("\n")
+
+        for name, fn in timing_cases(event, as_json, as_binary).items():
+            seconds = timeit.timeit(fn, number=ITERATIONS)
+            print(f"  {name:<32} {seconds / ITERATIONS * 1e6:8.1f} µs/event")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: sequential vs pipelined Kafka batch flush
+
+Сравнивает прежний цикл send_and_wait (ожидание подтверждения каждого
+события) с KafkaEmailProducer._flush_batch (send для всего batch, затем
+gather). Брокер моделируется как в aiokafka: записи копятся в accumulator,
+sender отправляет все накопленное одним запросом и ждет RTT; одновременно
+в полете один запрос.
+
+Запуск:
+    python -m benchmarks.bench_kafka_flush
+"""
+
+import asyncio
+import json
+import time
+
+from app.services.kafka_producer import KafkaConfig, KafkaEmailProducer
+
+BROKER_RTT_SECONDS = 0.002
+BATCH_SIZES = (10, 100, 500)
+ROUNDS = 3
+
+
+class SimulatedProducer:
+    """AIOKafkaProducer с accumulator и одним запросом в полете"""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.accumulator: list[asyncio.Future] = []
+        self.sender: asyncio.Task | None = None
+        self.requests = 0
+
+    async def send(self, topic, value=None, key=None):
+        future = asyncio.get_running_loop().create_future()
+        self.accumulator.append(future)
+        if self.sender is None or self.sender.done():
+            self.sender = asyncio.create_task(self._send_loop())
+        return future
+
+    async def send_and_wait(self, topic, value=None, key=None):
+        return await (await self.send(topic, value=value, key=key))
+
+    async def _send_loop(self):
+        while self.accumulator:
+            request, self.accumulator = self.accumulator, []
+            self.requests += 1
+            await asyncio.sleep(self.rtt)
+            for future in request:
+                future.set_result(None)
+
+
+async def sequential_flush(producer: KafkaEmailProducer):
+    """Прежний _flush_batch: send_and_wait на каждое событие"""
+    batch_to_send, producer.batch = producer.batch, []
+    for event in batch_to_send:
+        partition_key = event.email_data.get('from_email', 'unknown').encode('utf-8')
+        value = json.dumps(event.dict()).encode('utf-8')  # value_serializer
+        await producer.producer.send_and_wait(producer.config.topic, value=value, key=partition_key)
+        producer.stats['events_published'] += 1
+
+
+async def measure(flush, batch_size: int) -> tuple[float, int]:
+    producer = KafkaEmailProducer(KafkaConfig(batch_size=batch_size + 1))
+    producer.producer = SimulatedProducer(BROKER_RTT_SECONDS)
+    producer.is_running = True
+
+    for i in range(batch_size):
+        await producer.publish({
+            'message_id': f'<{i}@example.com>',
+            'from_email': f'sender{i % 20}@example.com',
+            'subject': f'Invoice INV-{i:06d}',
+            'imap_id': str(i),
+        })
+    producer.batch_timer.cancel()
+
+    started = time.perf_counter()
+    await flush(producer)
+    elapsed = time.perf_counter() - started
+
+    assert producer.stats['events_published'] == batch_size
+    return elapsed, producer.producer.requests
+
+
+async def main():
+    print(f"Kafka batch flush, simulated broker RTT {BROKER_RTT_SECONDS * 1000:.0f} ms, best of {ROUNDS}\n")
+    print(f"  {'events':>6}  {'mode':<10} {'latency':>10} {'throughput':>14} {'requests':>9}")
+
+    for batch_size in BATCH_SIZES:
+        for name, flush in (("sequential", sequential_flush), ("pipelined", KafkaEmailProducer._flush_batch)):
+            runs = [await measure(flush, batch_size) for _ in range(ROUNDS)]
+            elapsed, requests = min(runs)
+            print(
+                f"  {batch_size:>6}  {name:<10} {elapsed * 1000:>7.1f} ms "
+                f"{batch_size / elapsed:>9.0f} ev/s {requests:>9}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
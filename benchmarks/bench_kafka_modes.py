@@ -0,0 +1,82 @@
+"""
+Benchmark: Kafka delivery modes (at-least-once / idempotent / transactional)
+
+Тот же симулированный брокер, что в bench_kafka_flush (accumulator, один
+запрос в полете). Idempotence на стороне клиента бесплатна (sequence
+numbers в заголовке batch), но aiokafka ограничивает ее одним запросом в
+полете - как и модель брокера. Транзакция добавляет AddPartitionsToTxn
+перед первой записью и EndTxn (commit marker'ы) после: ~2 RTT на flush,
+поэтому цена транзакций падает с ростом batch.
+
+Запуск:
+    python -m benchmarks.bench_kafka_modes
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from app.services.kafka_producer import KafkaConfig, KafkaEmailProducer
+from benchmarks.bench_kafka_flush import BROKER_RTT_SECONDS, ROUNDS, SimulatedProducer
+
+EVENTS = 2000
+BATCH_SIZES = (10, 100, 500)
+MODES = {
+    "at-least-once": {},
+    "idempotent": {"enable_idempotence": True},
+    "transactional": {"transactional_id": "bench-0"},
+}
+
+
+class TransactionalSimulatedProducer(SimulatedProducer):
+    """SimulatedProducer с transaction(): AddPartitionsToTxn + EndTxn по RTT"""
+
+    @asynccontextmanager
+    async def transaction(self):
+        await asyncio.sleep(self.rtt)  # AddPartitionsToTxn
+        self.requests += 1
+        yield
+        await asyncio.sleep(self.rtt)  # EndTxn
+        self.requests += 1
+
+
+async def measure(mode_config: dict, batch_size: int) -> tuple[float, int]:
+    producer = KafkaEmailProducer(KafkaConfig(batch_size=batch_size, max_buffered_events=EVENTS, **mode_config))
+    producer.producer = TransactionalSimulatedProducer(BROKER_RTT_SECONDS)
+    producer.is_running = True
+
+    started = time.perf_counter()
+    for i in range(EVENTS):
+        await producer.publish({
+            'message_id': f'<{i}@example.com>',
+            'from_email': f'sender{i % 20}@example.com',
+            'subject': f'Invoice INV-{i:06d}',
+            'imap_id': str(i),
+        })
+    await producer._flush_batch(drain=True)
+    elapsed = time.perf_counter() - started
+    producer._cancel_batch_timer()
+
+    assert producer.stats['events_published'] == EVENTS
+    return elapsed, producer.producer.requests
+
+
+async def main():
+    print(
+        f"Kafka delivery modes, {EVENTS} events, simulated broker RTT "
+        f"{BROKER_RTT_SECONDS * 1000:.0f} ms, best of {ROUNDS}\n"
+    )
+    print(f"  {'batch':>5}  {'mode':<14} {'elapsed':>10} {'throughput':>14} {'requests':>9}")
+
+    for batch_size in BATCH_SIZES:
+        for name, mode_config in MODES.items():
+            runs = [await measure(mode_config, batch_size) for _ in range(ROUNDS)]
+            elapsed, requests = min(runs)
+            print(
+                f"  {batch_size:>5}  {name:<14} {elapsed * 1000:>7.1f} ms "
+                f"{EVENTS / elapsed:>9.0f} ev/s {requests:>9}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""
+Benchmark: квантованный hot tier (int8 / 1-bit + int8) против float32
+
+Для каждого режима: память на вектор, recall@3 относительно точного
+float32 поиска и латентность запроса. Данные - кластеризованные
+синтетические векторы (похожие письма образуют кластеры).
+
+При 768 dims: int8 - 772 B, binary+int8 - 868 B на вектор; меньше 800 B
+для binary+int8 - только с проекцией (EMBEDDING_PROJECTION=truncate:256
+дает 292 B).
+
+Запуск:
+    python -m benchmarks.bench_quantized_index [--size 50000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.services.vector_index import IVFFlatIndex, QuantizedIndex, recall_at_k
+
+DIMENSIONS = 768
+QUERIES = 200
+K = 3
+
+
+def clustered_vectors(n, n_clusters=200, noise=1.0, seed=0):
+    """Синтетические embeddings: центры кластеров + шум"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, DIMENSIONS)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    return centers[labels] + noise * rng.normal(size=(n, DIMENSIONS)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=50000)
+    args = parser.parse_args()
+
+    vectors = clustered_vectors(args.size)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(args.size, QUERIES, replace=False)]
+    queries = queries + 0.2 * rng.normal(size=queries.shape).astype(np.float32)
+
+    indexes = {
+        'float32 (brute-force)': IVFFlatIndex(
+            dimensions=DIMENSIONS, capacity=args.size, min_train_size=args.size + 1
+        ),
+        'int8': QuantizedIndex(dimensions=DIMENSIONS, capacity=args.size, mode='int8'),
+        'binary+int8': QuantizedIndex(dimensions=DIMENSIONS, capacity=args.size, mode='binary+int8'),
+    }
+
+    print(f"{args.size} vectors × {DIMENSIONS} dims, {QUERIES} queries")
+    print(f"{'mode':<24}{'bytes/vector':>14}{'recall@3':>10}{'ms/query':>10}")
+
+    for name, index in indexes.items():
+        for i, v in enumerate(vectors):
+            index.add(i, v, {'id': i})
+
+        start = time.perf_counter()
+        for query in queries:
+            index.search(query, k=K, threshold=-1.0)
+        elapsed_ms = (time.perf_counter() - start) * 1000 / QUERIES
+
+        recall = recall_at_k(index, vectors, queries, k=K)
+
+        print(f"{name:<24}{index.bytes_per_vector:>14}{recall:>10.3f}{elapsed_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
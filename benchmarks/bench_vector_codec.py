@@ -0,0 +1,50 @@
+"""
+Micro-benchmark: text vs binary pgvector transport
+
+Сравнивает путь "[...]" строк (форматирование на клиенте + парсинг
+на стороне сервера) с binary codec из app.services.vector_codec.
+
+Запуск:
+    python -m benchmarks.bench_vector_codec
+"""
+
+import timeit
+
+import numpy as np
+
+from app.services.vector_codec import (
+    decode_vector,
+    encode_vector,
+    format_vector_text,
+    parse_vector_text,
+)
+
+DIMENSIONS = 768
+ITERATIONS = 2000
+
+
+def main():
+    vector = np.random.default_rng(0).normal(size=DIMENSIONS).astype(np.float32)
+    as_list = vector.tolist()
+
+    text = f"[{','.join(map(str, as_list))}]"
+    binary = encode_vector(vector)
+
+    cases = {
+        "text encode (list → str)": lambda: f"[{','.join(map(str, as_list))}]",
+        "text encode (ndarray → str)": lambda: format_vector_text(vector),
+        "text decode (str → ndarray)": lambda: parse_vector_text(text),
+        "binary encode (ndarray → bytes)": lambda: encode_vector(vector),
+        "binary decode (bytes → ndarray)": lambda: decode_vector(binary),
+    }
+
+    print(f"pgvector transport, {DIMENSIONS} dims, {ITERATIONS} iterations")
+    print(f"  payload: text {len(text.encode())} B, binary {len(binary)} B\n")
+
+    for name, fn in cases.items():
+        seconds = timeit.timeit(fn, number=ITERATIONS)
+        print(f"  {name:<34} {seconds / ITERATIONS * 1e6:8.1f} µs/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Local IMAP stand-in for listener tests
+
+Minimal asyncio IMAP4rev1 server: LOGIN, SELECT (UIDVALIDITY/UIDNEXT),
+UID SEARCH, UID FETCH with literals (BODY[], BODY[HEADER], BODY[<section>],
+BODYSTRUCTURE, RFC822.SIZE), IDLE with EXISTS push, NOOP, LOGOUT.
+"""
+
+import asyncio
+import re
+from email import message_from_bytes, policy
+
+_FETCH_ITEM_RE = re.compile(r"BODY(?:\.PEEK)?\[([^\]]*)\]|RFC822\.SIZE|BODYSTRUCTURE|UID", re.I)
+
+
+def _quote(value) -> str:
+    return "NIL" if value is None else '"' + str(value).replace('"', '\\"') + '"'
+
+
+def _bodystructure(part) -> str:
+    """BODYSTRUCTURE of an email.message tree."""
+    if part.is_multipart():
+        children = "".join(_bodystructure(child) for child in part.get_payload())
+        return f"({children} {_quote(part.get_content_subtype().upper())})"
+
+    params = (part.get_params(header="content-type") or [("text/plain", ""), ("charset", "us-ascii")])[1:]
+    params_str = "(" + " ".join(f"{_quote(k.upper())} {_quote(v)}" for k, v in params) + ")" if params else "NIL"
+    payload = part.get_payload(decode=False).encode()
+    encoding = part.get("Content-Transfer-Encoding", "7bit")
+    fields = [
+        _quote(part.get_content_maintype().upper()),
+        _quote(part.get_content_subtype().upper()),
+        params_str,
+        "NIL",
+        "NIL",
+        _quote(str(encoding).upper()),
+        str(len(payload)),
+    ]
+    if part.get_content_maintype() == "text":
+        fields.append(str(payload.count(b"\n")))
+
+    disposition = part.get_content_disposition()
+    if disposition:
+        filename = part.get_filename()
+        disposition_params = f"({_quote('FILENAME')} {_quote(filename)})" if filename else "NIL"
+        fields += ["NIL", f"({_quote(disposition.upper())} {disposition_params})"]
+    return "(" + " ".join(fields) + ")"
+
+
+def _section(message, section: str) -> bytes:
+    """Raw (still transfer-encoded) body of a numbered section."""
+    if section == "":
+        return message.as_bytes()
+    if section.upper() == "HEADER":
+        raw = message.as_bytes()
+        return raw.split(b"\r\n\r\n", 1)[0] + b"\r\n\r\n" if b"\r\n\r\n" in raw else raw.split(b"\n\n", 1)[0] + b"\n\n"
+
+    part = message
+    for index in section.split("."):
+        if part.is_multipart():
+            part = part.get_payload()[int(index) - 1]
+    return part.get_payload(decode=False).encode()
+
+
+class IMAPStandIn:
+    """In-memory single-mailbox IMAP server."""
+
+    def __init__(self, user="user@example.com", password="secret", uidvalidity=1, idle=True):
+        self.user = user
+        self.password = password
+        self.uidvalidity = uidvalidity
+        self.idle = idle
+        self.messages: list[tuple[int, bytes]] = []
+        self.next_uid = 1
+        self.commands: list[str] = []
+        self.idlers: list[asyncio.StreamWriter] = []
+        self.connections = 0
+        self.peak_connections = 0
+        self.server = None
+        self.port = None
+
+    async def start(self, port: int = 0):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def add_message(self, raw: bytes) -> int:
+        """Store a message without notifying idling clients."""
+        uid = self.next_uid
+        self.next_uid += 1
+        self.messages.append((uid, raw))
+        return uid
+
+    async def deliver(self, raw: bytes) -> int:
+        """Store a message and push EXISTS to idling clients."""
+        uid = self.add_message(raw)
+        for writer in list(self.idlers):
+            writer.write(f"* {len(self.messages)} EXISTS\r\n".encode())
+            await writer.drain()
+        return uid
+
+    def reset_uidvalidity(self, uidvalidity: int):
+        """Simulate a mailbox rebuild: new UIDVALIDITY, UIDs renumbered from 1."""
+        self.uidvalidity = uidvalidity
+        self.messages = [(i + 1, raw) for i, (_, raw) in enumerate(self.messages)]
+        self.next_uid = len(self.messages) + 1
+
+    def fetch_commands(self) -> list[str]:
+        return [c for c in self.commands if c.upper().startswith("UID FETCH")]
+
+    def _uids_in_set(self, uid_set: str) -> list[int]:
+        highest = self.messages[-1][0] if self.messages else 0
+        result = set()
+        for part in uid_set.split(","):
+            if ":" in part:
+                low, high = part.split(":")
+                low = highest if low == "*" else int(low)
+                high = highest if high == "*" else int(high)
+                low, high = min(low, high), max(low, high)
+                result.update(uid for uid, _ in self.messages if low <= uid <= high)
+            else:
+                uid = highest if part == "*" else int(part)
+                result.update(u for u, _ in self.messages if u == uid)
+        return sorted(result)
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self.peak_connections = max(self.peak_connections, self.connections)
+        writer.write(b"* OK [CAPABILITY IMAP4rev1] stand-in ready\r\n")
+        await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode().rstrip("\r\n")
+                tag, _, command = line.partition(" ")
+                self.commands.append(command)
+                upper = command.upper()
+
+                if upper.startswith("CAPABILITY"):
+                    caps = "IMAP4rev1 IDLE" if self.idle else "IMAP4rev1"
+                    writer.write(f"* CAPABILITY {caps}\r\n{tag} OK CAPABILITY completed\r\n".encode())
+
+                elif upper.startswith("LOGIN"):
+                    _, user, password = command.split(" ", 2)
+                    if user == self.user and password.strip('"') == self.password:
+                        writer.write(f"{tag} OK LOGIN completed\r\n".encode())
+                    else:
+                        writer.write(f"{tag} NO [AUTHENTICATIONFAILED] Invalid credentials\r\n".encode())
+
+                elif upper.startswith("SELECT"):
+                    writer.write(
+                        (
+                            f"* {len(self.messages)} EXISTS\r\n"
+                            f"* OK [UIDVALIDITY {self.uidvalidity}] UIDs valid\r\n"
+                            f"* OK [UIDNEXT {self.next_uid}] Predicted next UID\r\n"
+                            f"{tag} OK [READ-WRITE] SELECT completed\r\n"
+                        ).encode()
+                    )
+
+                elif upper.startswith("UID SEARCH"):
+                    match = re.search(r"UID (\S+)", command[len("UID SEARCH"):], re.I)
+                    uid_set = match.group(1) if match else "1:*"
+                    uids = self._uids_in_set(uid_set)
+                    writer.write(
+                        f"* SEARCH {' '.join(map(str, uids))}\r\n{tag} OK SEARCH completed\r\n".encode()
+                    )
+
+                elif upper.startswith("UID FETCH"):
+                    _, _, uid_set, items = command.split(" ", 3)
+                    for uid in self._uids_in_set(uid_set):
+                        seq = next(i for i, (u, _) in enumerate(self.messages, 1) if u == uid)
+                        raw = dict(self.messages)[uid]
+                        message = message_from_bytes(raw, policy=policy.compat32)
+                        chunks = []
+                        for match in _FETCH_ITEM_RE.finditer(items):
+                            item = match.group(0).upper()
+                            if item == "UID":
+                                chunks.append(f"UID {uid}".encode())
+                            elif item == "RFC822.SIZE":
+                                chunks.append(f"RFC822.SIZE {len(raw)}".encode())
+                            elif item == "BODYSTRUCTURE":
+                                chunks.append(f"BODYSTRUCTURE {_bodystructure(message)}".encode())
+                            else:
+                                section = match.group(1)
+                                data = raw if section == "" else _section(message, section)
+                                chunks.append(f"BODY[{section}] {{{len(data)}}}\r\n".encode() + data)
+                        writer.write(f"* {seq} FETCH (".encode() + b" ".join(chunks) + b")\r\n")
+                    writer.write(f"{tag} OK FETCH completed\r\n".encode())
+
+                elif upper == "IDLE":
+                    self.idlers.append(writer)
+                    writer.write(b"+ idling\r\n")
+                    await writer.drain()
+                    done = await reader.readline()
+                    self.idlers.remove(writer)
+                    if not done:
+                        break
+                    writer.write(f"{tag} OK IDLE terminated\r\n".encode())
+
+                elif upper.startswith("LOGOUT"):
+                    writer.write(f"* BYE logging out\r\n{tag} OK LOGOUT completed\r\n".encode())
+                    await writer.drain()
+                    break
+
+                else:
+                    writer.write(f"{tag} OK {command.split(' ')[0]} completed\r\n".encode())
+
+                await writer.drain()
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if writer in self.idlers:
+                self.idlers.remove(writer)
+            self.connections -= 1
+            writer.close()
@@ -0,0 +1,141 @@
+"""
+In-memory Kafka broker stand-in for producer delivery-mode tests
+
+Implements the AIOKafkaProducer calls used by KafkaEmailProducer (start,
+stop, send, transaction, send_offsets_to_transaction) against a shared
+log, with fault injection:
+- "error":    the produce request fails, nothing is written
+- "ack_lost": the record is written but the ack is lost; the client retries
+  internally like aiokafka does, so the broker sees the batch twice and
+  drops the retry only for idempotent producers
+- "timeout":  the record is written but the send fails (delivery timeout)
+
+Records written inside a transaction are visible to read_committed
+readers only after commit; aborted records stay in the log like Kafka's
+aborted batches.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from itertools import count
+
+
+class StandInKafkaError(Exception):
+    """Retriable produce error."""
+
+
+@dataclass
+class LogRecord:
+    topic: str
+    partition: int
+    key: bytes
+    value: bytes
+    producer_id: int
+    sequence: int
+    status: str = "committed"  # committed | open | aborted
+
+
+class KafkaStandIn:
+    def __init__(self, partitions: int = 3):
+        self.partitions = partitions
+        self.log: list[LogRecord] = []
+        self.faults: list[str | None] = []
+        self.committed_offsets: dict[str, dict] = {}
+        self._producer_ids = count(1)
+
+    def fail_next(self, *faults: str | None):
+        """Queue faults for the next sends (None = no fault)."""
+        self.faults.extend(faults)
+
+    def producer(self, **config) -> "StandInProducer":
+        """Factory with the AIOKafkaProducer signature."""
+        return StandInProducer(self, **config)
+
+    def read(self, topic: str, isolation_level: str = "read_uncommitted") -> list[bytes]:
+        """Values in log order as a consumer with this isolation level sees them."""
+        visible = ("committed",) if isolation_level == "read_committed" else ("committed", "open", "aborted")
+        return [record.value for record in self.log if record.topic == topic and record.status in visible]
+
+    def _append(self, producer: "StandInProducer", record: LogRecord) -> bool:
+        if producer.idempotent:
+            for existing in self.log:
+                if (existing.producer_id, existing.partition, existing.sequence) == (
+                    record.producer_id, record.partition, record.sequence
+                ):
+                    return False
+        self.log.append(record)
+        return True
+
+
+class StandInProducer:
+    def __init__(self, broker: KafkaStandIn, enable_idempotence=False, transactional_id=None, **config):
+        self.broker = broker
+        self.config = config
+        self.transactional_id = transactional_id
+        self.idempotent = bool(enable_idempotence or transactional_id)
+        self.producer_id = next(broker._producer_ids)
+        self.sequences: dict[int, int] = {}
+        self.sends = 0
+        self.transaction_records: list[LogRecord] | None = None
+        self.transaction_offsets: tuple[dict, str] | None = None
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def send(self, topic, value=None, key=None, partition=None, timestamp_ms=None, headers=None):
+        if self.transactional_id and self.transaction_records is None:
+            raise RuntimeError("send() outside a transaction on a transactional producer")
+
+        self.sends += 1
+        partition = hash(key) % self.broker.partitions if partition is None else partition
+        sequence = self.sequences.get(partition, 0)
+        self.sequences[partition] = sequence + 1
+
+        future = asyncio.get_running_loop().create_future()
+        fault = self.broker.faults.pop(0) if self.broker.faults else None
+        if fault == "error":
+            future.set_exception(StandInKafkaError("NotLeaderForPartition"))
+            return future
+
+        status = "open" if self.transaction_records is not None else "committed"
+        for _ in range(2 if fault == "ack_lost" else 1):
+            record = LogRecord(topic, partition, key, value, self.producer_id, sequence, status)
+            if self.broker._append(self, record) and self.transaction_records is not None:
+                self.transaction_records.append(record)
+
+        if fault == "timeout":
+            future.set_exception(StandInKafkaError("KafkaTimeoutError"))
+        else:
+            future.set_result(None)
+        return future
+
+    async def send_offsets_to_transaction(self, offsets, group_id):
+        if self.transaction_records is None:
+            raise RuntimeError("send_offsets_to_transaction() outside a transaction")
+        self.transaction_offsets = (dict(offsets), group_id)
+
+    @asynccontextmanager
+    async def transaction(self):
+        if self.transaction_records is not None:
+            raise RuntimeError("Transaction already in progress")
+        self.transaction_records = []
+        self.transaction_offsets = None
+        try:
+            yield
+        except BaseException:
+            self._end_transaction("aborted")
+            raise
+        self._end_transaction("committed")
+
+    def _end_transaction(self, status: str):
+        for record in self.transaction_records:
+            record.status = status
+        if status == "committed" and self.transaction_offsets:
+            offsets, group_id = self.transaction_offsets
+            self.broker.committed_offsets.setdefault(group_id, {}).update(offsets)
+        self.transaction_records = None
+        self.transaction_offsets = None
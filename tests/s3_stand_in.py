@@ -0,0 +1,39 @@
+"""
+In-memory S3 stand-in for blob store tests
+
+Implements the boto3 client calls used by S3BlobStore (put_object,
+get_object, head_object) and raises boto-style errors for missing keys.
+"""
+
+import io
+
+
+class S3StandInError(Exception):
+    """Mimics botocore ClientError (error code in .response)."""
+
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class S3StandIn:
+    def __init__(self):
+        self.objects: dict[tuple[str, str], bytes] = {}
+        self.calls: list[str] = []
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes):
+        self.calls.append("put_object")
+        self.objects[(Bucket, Key)] = bytes(Body)
+        return {"ETag": '"stand-in"'}
+
+    def get_object(self, Bucket: str, Key: str):
+        self.calls.append("get_object")
+        if (Bucket, Key) not in self.objects:
+            raise S3StandInError("NoSuchKey")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def head_object(self, Bucket: str, Key: str):
+        self.calls.append("head_object")
+        if (Bucket, Key) not in self.objects:
+            raise S3StandInError("404")
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
@@ -0,0 +1,186 @@
+"""
+Tests for the claim-check blob store
+
+Tests:
+- SHA-256 addressing and deduplication (filesystem and S3 stand-in)
+- Lazy blob handles on the consumer side
+- IMAP listener offloading raw messages and attachments
+"""
+
+import os
+import sys
+from email.message import EmailMessage
+
+import pytest
+from imap_stand_in import IMAPStandIn
+from s3_stand_in import S3StandIn
+
+from app.services.blob_store import (
+    BlobNotFoundError,
+    FileBlobStore,
+    S3BlobStore,
+    bind_attachment_handles,
+    blob_ref,
+    blob_store_from_url,
+)
+from app.services.imap_listener import EmailReceivedEvent, IMAPListenerService
+
+
+class RecordingProducer:
+    """KafkaEmailProducer stand-in that keeps published payloads."""
+
+    def __init__(self):
+        self.payloads = []
+
+    async def publish(self, email_data):
+        self.payloads.append(email_data)
+        return True
+
+
+def make_message(i: int, attachment: bytes) -> bytes:
+    message = EmailMessage()
+    message["From"] = "customer@example.com"
+    message["To"] = "orders@example.com"
+    message["Subject"] = f"Order {i}"
+    message["Message-ID"] = f"<order{i}@example.com>"
+    message.set_content(f"Order {i}, see attachment.")
+    message.add_attachment(attachment, maintype="application", subtype="pdf", filename="order.pdf")
+    return message.as_bytes()
+
+
+@pytest.fixture(params=["file", "s3"])
+def store(request, tmp_path):
+    if request.param == "file":
+        return FileBlobStore(str(tmp_path / "blobs"))
+    return S3BlobStore(S3StandIn(), "email-blobs")
+
+
+class TestBlobStore:
+    """Test content addressing on both backends."""
+
+    @pytest.mark.asyncio
+    async def test_put_get_roundtrip(self, store):
+        """Test data is addressed by SHA-256 and read back unchanged."""
+        ref = await store.put(b"%PDF-1.4 invoice")
+
+        assert ref == blob_ref(b"%PDF-1.4 invoice")
+        assert ref.startswith("sha256:")
+        assert await store.get(ref) == b"%PDF-1.4 invoice"
+        assert await store.exists(ref)
+
+    @pytest.mark.asyncio
+    async def test_identical_content_stored_once(self, store):
+        """Test the second put of the same bytes is a dedup hit."""
+        first = await store.put(b"x" * 1000)
+        second = await store.put(b"x" * 1000)
+
+        stats = store.get_stats()
+        assert first == second
+        assert stats["puts"] == 2
+        assert stats["dedup_hits"] == 1
+        assert stats["bytes_written"] == 1000
+        assert stats["bytes_deduplicated"] == 1000
+
+    @pytest.mark.asyncio
+    async def test_missing_and_invalid_refs(self, store):
+        """Test unknown refs raise BlobNotFoundError, malformed ones ValueError."""
+        with pytest.raises(BlobNotFoundError):
+            await store.get(blob_ref(b"never stored"))
+        with pytest.raises(ValueError):
+            await store.get("sha256:../../etc/passwd")
+
+    @pytest.mark.asyncio
+    async def test_file_layout_is_fanned_out(self, tmp_path):
+        """Test blobs are spread over two directory levels, no temp files left."""
+        store = FileBlobStore(str(tmp_path))
+        ref = await store.put(b"data")
+        digest = ref.split(":")[1]
+
+        assert os.path.exists(tmp_path / digest[:2] / digest[2:4] / digest)
+        assert not [f for f in os.listdir(tmp_path / digest[:2] / digest[2:4]) if f.startswith(".tmp")]
+
+    def test_store_from_url(self, tmp_path, monkeypatch):
+        """Test BLOB_STORE_URL parsing; s3:// needs boto3."""
+        assert isinstance(blob_store_from_url(f"file://{tmp_path}"), FileBlobStore)
+
+        monkeypatch.setitem(sys.modules, "boto3", None)
+        with pytest.raises(RuntimeError):
+            blob_store_from_url("s3://email-blobs/prod/")
+        with pytest.raises(ValueError):
+            blob_store_from_url("ftp://example.com/blobs")
+
+    @pytest.mark.asyncio
+    async def test_bind_attachment_handles_reads_lazily(self, store):
+        """Test consumers get a handle that reads the blob only on demand."""
+        ref = await store.put(b"%PDF-1.4")
+        attachments = bind_attachment_handles([{"filename": "a.pdf", "blob": ref}, {"filename": "b.txt"}], store)
+
+        handle = attachments[0]["handle"]
+        assert "handle" not in attachments[1]
+        assert store.get_stats()["gets"] == 0
+        assert await handle.read() == b"%PDF-1.4"
+        await handle.read()
+        assert store.get_stats()["gets"] == 1
+
+
+class TestListenerClaimCheck:
+    """Test IMAPListenerService writing blobs and publishing references."""
+
+    async def fetch_all(self, server, **kwargs):
+        producer = RecordingProducer()
+        listener = IMAPListenerService(
+            host="127.0.0.1",
+            port=server.port,
+            user=server.user,
+            password=server.password,
+            use_ssl=False,
+            kafka_producer=producer,
+            initial_sync="all",
+            lazy_attachments=False,
+            **kwargs,
+        )
+        await listener.connect()
+        await listener.fetch_new_emails()
+        await listener.disconnect()
+        return listener, producer
+
+    @pytest.mark.asyncio
+    async def test_event_carries_references_only(self, tmp_path):
+        """Test Kafka payload shrinks to text + references, blobs are readable."""
+        attachment = os.urandom(200_000)
+        server = await IMAPStandIn().start()
+        server.add_message(make_message(1, attachment))
+        server.add_message(make_message(2, attachment))
+
+        try:
+            _, inline_producer = await self.fetch_all(server)
+            store = FileBlobStore(str(tmp_path))
+            listener, producer = await self.fetch_all(server, blob_store=store)
+        finally:
+            await server.stop()
+
+        payload = producer.payloads[0]
+        event = EmailReceivedEvent.model_validate(payload)
+        assert event.raw_message is None
+        assert event.body_text.strip() == "Order 1, see attachment."
+        assert await store.get(event.raw_message_ref) == server.messages[0][1]
+        assert await store.get(event.attachments[0]["blob"]) == attachment
+
+        inline_size = len(str(inline_producer.payloads[0]))
+        assert listener.get_stats()["kafka_payload_bytes"] < inline_size / 50
+        # Same attachment in both messages is stored once
+        assert store.get_stats()["bytes_deduplicated"] == len(attachment)
+
+    @pytest.mark.asyncio
+    async def test_inline_raw_message_roundtrips_as_base64(self):
+        """Test events without a blob store still serialize raw bytes to JSON."""
+        event = EmailReceivedEvent(
+            message_id="raw@example.com",
+            from_email="sender@example.com",
+            to_email=["recipient@example.com"],
+            subject="Raw",
+            raw_message=b"\xff\xfe binary",
+            size_bytes=10,
+        )
+
+        assert EmailReceivedEvent.model_validate_json(event.model_dump_json()).raw_message == b"\xff\xfe binary"
@@ -0,0 +1,182 @@
+"""
+Tests for email deduplication
+
+Tests:
+- Bloom filter sizing and false-positive rate
+- Time rotation of the Bloom filter and exact store expiry
+- Message-ID / content-hash keys, claim / commit / release
+- Listener integration (same email in two mailboxes)
+"""
+
+from datetime import UTC, datetime
+from unittest.mock import AsyncMock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.services.dedup import (
+    BloomFilter,
+    EmailDeduplicator,
+    RotatingBloomFilter,
+    _fingerprint,
+    dedup_key,
+)
+from app.services.imap_listener import EmailReceivedEvent, IMAPListenerService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_event(message_id: str = "order-1@example.com", **kwargs) -> EmailReceivedEvent:
+    fields = {
+        "message_id": message_id,
+        "from_email": "customer@example.com",
+        "to_email": ["sales@example.com"],
+        "subject": "Order",
+        "body_text": "Code: SKU-1, Quantity: 1, Price: 10.00",
+        "size_bytes": 100,
+        "sent_at": datetime(2026, 10, 19, 10, 0, tzinfo=UTC),
+    }
+    fields.update(kwargs)
+    return EmailReceivedEvent(**fields)
+
+
+class TestBloomFilter:
+    """Test Bloom filter sizing and rotation."""
+
+    def test_false_positive_rate_within_budget(self):
+        """Test measured FP rate stays near the configured rate at capacity."""
+        bloom = BloomFilter(capacity=10_000, error_rate=0.01)
+        for i in range(10_000):
+            bloom.add(_fingerprint(f"in-{i}"))
+
+        assert all(_fingerprint(f"in-{i}") in bloom for i in range(10_000))
+        false_positives = sum(_fingerprint(f"out-{i}") in bloom for i in range(20_000))
+        assert false_positives / 20_000 < 0.02
+        assert bloom.size_bits / 10_000 == pytest.approx(9.6, abs=0.1)
+
+    def test_rotation_forgets_after_window(self):
+        """Test keys survive one rotation and are gone after the window."""
+        clock = FakeClock()
+        bloom = RotatingBloomFilter(expected_per_day=1000, ttl_seconds=100, generations=2, clock=clock)
+        key = _fingerprint("message")
+        bloom.add(key)
+
+        clock.now = 150
+        assert key in bloom
+        clock.now = 250
+        assert key not in bloom
+        assert bloom.rotations == 2
+
+
+class TestDedupKey:
+    """Test dedup key selection."""
+
+    def test_message_id_is_normalized(self):
+        assert dedup_key(make_event("<Order-1@Example.COM>")) == ("message_id", "order-1@example.com")
+
+    def test_content_hash_fallback(self):
+        """Test events without Message-ID are keyed by content."""
+        first = dedup_key(make_event(""))
+        same = dedup_key(make_event("", to_email=["sales@example.com"]))
+        other = dedup_key(make_event("", body_text="different"))
+
+        assert first[0] == "content_hash"
+        assert first == same
+        assert first != other
+
+
+class TestEmailDeduplicator:
+    """Test claim / commit / release and metrics."""
+
+    def test_second_delivery_dropped(self):
+        """Test a committed key drops later copies and counts them."""
+        dedup = EmailDeduplicator(expected_per_day=1000)
+        before = REGISTRY.get_sample_value(
+            "email_duplicates_dropped_total", {"key_type": "message_id"}
+        ) or 0.0
+
+        claim = dedup.claim(make_event())
+        dedup.commit(claim)
+
+        assert dedup.claim(make_event()) is None
+        assert dedup.claim(make_event("order-2@example.com")) is not None
+        stats = dedup.get_stats()
+        assert stats["duplicates_dropped"] == 1
+        assert stats["duplicates_by_message_id"] == 1
+        assert stats["exact_lookups"] == 1
+        assert REGISTRY.get_sample_value(
+            "email_duplicates_dropped_total", {"key_type": "message_id"}
+        ) == before + 1
+
+    def test_in_flight_claim_blocks_concurrent_copy(self):
+        """Test a copy arriving while the first is being published is dropped."""
+        dedup = EmailDeduplicator(expected_per_day=1000)
+        claim = dedup.claim(make_event())
+
+        assert dedup.claim(make_event()) is None
+        dedup.release(claim)
+        assert dedup.claim(make_event()) is not None
+
+    def test_bloom_false_positive_confirmed_by_exact_store(self):
+        """Test a saturated Bloom filter never drops a new email."""
+        dedup = EmailDeduplicator(expected_per_day=10, error_rate=0.5)
+        for i in range(500):
+            dedup.commit(dedup.claim(make_event(f"m{i}@example.com")))
+
+        new_claims = [dedup.claim(make_event(f"new{i}@example.com")) for i in range(100)]
+
+        assert all(claim is not None for claim in new_claims)
+        assert dedup.get_stats()["bloom_false_positives"] > 0
+
+    def test_window_expiry(self):
+        """Test a key is accepted again once the dedup window has passed."""
+        clock = FakeClock()
+        dedup = EmailDeduplicator(expected_per_day=1000, ttl_seconds=100, clock=clock)
+        dedup.commit(dedup.claim(make_event()))
+
+        clock.now = 99
+        assert dedup.claim(make_event()) is None
+        clock.now = 201
+        assert dedup.claim(make_event()) is not None
+        assert dedup.get_stats()["exact_entries"] == 0
+
+
+class TestListenerDedup:
+    """Test the dedup stage in IMAPListenerService."""
+
+    @pytest.mark.asyncio
+    async def test_shared_deduplicator_across_mailboxes(self):
+        """Test the same email seen by two mailbox listeners is published once."""
+        dedup = EmailDeduplicator(expected_per_day=1000)
+        sales = IMAPListenerService(mailbox="sales", deduplicator=dedup)
+        info = IMAPListenerService(mailbox="info", deduplicator=dedup)
+        for listener in (sales, info):
+            listener.publish_to_kafka = AsyncMock()
+
+        await sales.process_event(make_event())
+        await info.process_event(make_event())
+        await sales.process_event(make_event())
+
+        assert sales.publish_to_kafka.await_count == 1
+        assert info.publish_to_kafka.await_count == 0
+        assert sales.get_stats()["duplicates_dropped"] == 1
+        assert info.get_stats()["duplicates_dropped"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_publish_is_not_remembered(self):
+        """Test a producer failure lets the retried delivery through."""
+        dedup = EmailDeduplicator(expected_per_day=1000)
+        listener = IMAPListenerService(deduplicator=dedup)
+        listener.publish_to_kafka = AsyncMock(side_effect=[RuntimeError("broker down"), None])
+
+        await listener.process_event(make_event())
+        await listener.process_event(make_event())
+
+        assert listener.publish_to_kafka.await_count == 2
+        assert dedup.get_stats()["unique"] == 1
@@ -0,0 +1,272 @@
+"""
+Unit Tests for Embedding Backfill Job
+Tests: keyset pagination, bounded concurrency, multi-row UPDATE, checkpoints,
+re-projection
+"""
+
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.services.embedding_backfill import EmbeddingBackfillJob
+from app.services.embedding_projection import EmbeddingProjection
+from app.services.embedding_service import EmbeddingService
+from app.services.ollama_client import OllamaClient
+
+DIMS = 768
+
+
+# ==============================================================================
+# Helpers
+# ==============================================================================
+
+class FakeEmbedResponse:
+    """Эмуляция ответа Ollama /api/embed"""
+
+    def __init__(self, embeddings, status=200):
+        self.status = status
+        self.embeddings = embeddings
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def json(self):
+        return {"model": "nomic-embed-text:latest", "embeddings": self.embeddings}
+
+
+class FakeResult:
+    def __init__(self, rows=None, rowcount=None):
+        self.rows = rows or []
+        self.rowcount = rowcount
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeEmailsTable:
+    """In-memory таблица emails: keyset SELECT и UPDATE ... FROM (VALUES ...)"""
+
+    def __init__(self, count):
+        self.rows = {
+            i: {'subject': f"Subject {i}", 'body_text': "x" * i, 'embedding': None, 'version': None}
+            for i in range(1, count + 1)
+        }
+        self.selects = []
+        self.updates = []
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        if sql.strip().startswith("SELECT"):
+            self.selects.append(params)
+            if 'version' in params:
+                def match(row):
+                    return row['embedding'] is not None and row['version'] != params['version']
+            else:
+                def match(row):
+                    return row['embedding'] is None
+            ids = sorted(
+                i for i, row in self.rows.items()
+                if match(row) and i > params['last_id']
+            )[:params['chunk_size']]
+            return FakeResult([
+                (i, self.rows[i]['subject'], self.rows[i]['body_text'],
+                 self.rows[i]['embedding'], self.rows[i]['version'])
+                for i in ids
+            ])
+
+        self.updates.append((sql, params))
+        count = 0
+        while f"id_{count}" in params:
+            row = self.rows[params[f"id_{count}"]]
+            row['embedding'] = params[f"embedding_{count}"]
+            row['version'] = params['version']
+            count += 1
+        return FakeResult(rowcount=count)
+
+    async def commit(self):
+        pass
+
+    def get_session(self):
+        table = self
+
+        class _Ctx:
+            async def __aenter__(self):
+                return table
+
+            async def __aexit__(self, *args):
+                return False
+
+        return _Ctx()
+
+
+@pytest.fixture
+def ollama_client():
+    """OllamaClient с mocked pooled session"""
+    client = OllamaClient(host="http://localhost:11434", model="mistral:7b")
+    client.session = MagicMock()
+    client.session.post = MagicMock(
+        side_effect=lambda url, json=None, **kw: FakeEmbedResponse([[1.0] * DIMS for _ in json["input"]])
+    )
+    return client
+
+
+def make_job(table, ollama_client, projection=None, **kwargs):
+    service = EmbeddingService(
+        db_service=table,
+        ollama_client=ollama_client,
+        max_batch_size=8,
+        projection=projection
+    )
+    return EmbeddingBackfillJob(service, table, **kwargs)
+
+
+# ==============================================================================
+# TEST: Backfill
+# ==============================================================================
+
+@pytest.mark.asyncio
+async def test_backfill_fills_all_rows_with_one_update_per_chunk(ollama_client):
+    """Все письма получают embedding, один UPDATE на chunk"""
+    table = FakeEmailsTable(25)
+    job = make_job(table, ollama_client, chunk_size=10, batch_size=4)
+
+    stats = await job.run()
+
+    assert stats['processed'] == 25
+    assert stats['stored'] == 25
+    assert stats['chunks'] == 3
+    assert all(row['embedding'] is not None for row in table.rows.values())
+    assert len(table.updates) == 3
+    assert "FROM (VALUES" in table.updates[0][0]
+    # keyset: следующий SELECT начинается после последнего id chunk
+    assert [s['last_id'] for s in table.selects] == [0, 10, 20, 25]
+
+
+@pytest.mark.asyncio
+async def test_backfill_bounds_embedding_concurrency(ollama_client):
+    """Не больше concurrency одновременных batch запросов"""
+    table = FakeEmailsTable(40)
+    job = make_job(table, ollama_client, chunk_size=40, batch_size=4, concurrency=2)
+
+    in_flight = 0
+    peak = 0
+
+    async def slow_embed(texts, use_cache=True):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return [[1.0] * DIMS for _ in texts]
+
+    job.embedding.embed_batch = slow_embed
+
+    await job.run()
+
+    assert peak == 2
+    assert job.stats['stored'] == 40
+
+
+@pytest.mark.asyncio
+async def test_backfill_skips_failed_embeddings(ollama_client):
+    """Письма без embedding считаются failed и не попадают в UPDATE"""
+    table = FakeEmailsTable(6)
+    job = make_job(table, ollama_client, chunk_size=6, batch_size=6)
+
+    async def partial_embed(texts, use_cache=True):
+        return [None if i % 2 else [1.0] * DIMS for i in range(len(texts))]
+
+    job.embedding.embed_batch = partial_embed
+
+    stats = await job.run()
+
+    assert stats['stored'] == 3
+    assert stats['failed'] == 3
+    assert stats['processed'] == 6
+
+
+@pytest.mark.asyncio
+async def test_backfill_resumes_from_checkpoint(ollama_client, tmp_path):
+    """После остановки backfill продолжается с last_id из checkpoint"""
+    checkpoint = tmp_path / "backfill.json"
+    table = FakeEmailsTable(30)
+
+    first = make_job(table, ollama_client, chunk_size=10, checkpoint_path=str(checkpoint))
+    await first.run(limit=10)
+
+    saved = json.loads(checkpoint.read_text())
+    assert saved['last_id'] == 10
+    assert saved['stored'] == 10
+
+    second = make_job(table, ollama_client, chunk_size=10, checkpoint_path=str(checkpoint))
+    assert second.load_checkpoint() is True
+    stats = await second.run()
+
+    assert table.selects[1]['last_id'] == 10
+    assert stats['stored'] == 30
+    assert all(row['embedding'] is not None for row in table.rows.values())
+
+
+@pytest.mark.asyncio
+async def test_backfill_does_not_pollute_cache(ollama_client):
+    """Backfill не пишет одноразовые тексты в embedding кэш"""
+    from app.services.embedding_cache import EmbeddingCache
+
+    table = FakeEmailsTable(5)
+    service = EmbeddingService(
+        db_service=table,
+        ollama_client=ollama_client,
+        cache=EmbeddingCache(dimensions=DIMS, max_entries=100)
+    )
+    job = EmbeddingBackfillJob(service, table, chunk_size=5)
+
+    await job.run()
+
+    assert len(service.cache.memory) == 0
+
+
+@pytest.mark.asyncio
+async def test_reproject_raw_vectors_without_ollama(ollama_client):
+    """Raw векторы проецируются локально, Ollama не вызывается"""
+    table = FakeEmailsTable(6)
+    for row in table.rows.values():
+        row['embedding'] = "[" + ",".join(["0.5"] * DIMS) + "]"
+
+    job = make_job(
+        table, ollama_client,
+        projection=EmbeddingProjection.truncate(DIMS, 128),
+        chunk_size=4, reproject=True
+    )
+    stats = await job.run()
+
+    assert stats['stored'] == 6
+    assert stats['projected_locally'] == 6
+    ollama_client.session.post.assert_not_called()
+    assert all(row['version'] == 'trunc128' for row in table.rows.values())
+    assert all(len(row['embedding'].strip("[]").split(",")) == 128 for row in table.rows.values())
+
+
+@pytest.mark.asyncio
+async def test_reproject_other_projection_reembeds_text(ollama_client):
+    """Векторы другой проекции (PCA необратима) пересчитываются из текста"""
+    table = FakeEmailsTable(3)
+    for row in table.rows.values():
+        row['embedding'] = "[" + ",".join(["0.5"] * 256) + "]"
+        row['version'] = 'trunc256'
+
+    job = make_job(
+        table, ollama_client,
+        projection=EmbeddingProjection.truncate(DIMS, 128),
+        reproject=True
+    )
+    stats = await job.run()
+
+    assert stats['stored'] == 3
+    assert stats['projected_locally'] == 0
+    ollama_client.session.post.assert_called()
+    assert all(row['version'] == 'trunc128' for row in table.rows.values())
@@ -0,0 +1,100 @@
+"""
+Unit Tests for Embedding Projection
+Tests: Matryoshka truncation, PCA fit, versioning, recall evaluation
+"""
+
+import numpy as np
+import pytest
+
+from app.services.embedding_projection import (
+    EmbeddingProjection,
+    evaluate_recall,
+    load_projection,
+    vector_index_ddl,
+)
+
+DIMS = 64
+
+
+def low_rank_vectors(n, rank=8, seed=0):
+    """Векторы с основной энергией в rank направлениях (как реальные embeddings)"""
+    rng = np.random.default_rng(seed)
+    basis = rng.normal(size=(rank, DIMS))
+    return (rng.normal(size=(n, rank)) @ basis + 0.05 * rng.normal(size=(n, DIMS))).astype(np.float32)
+
+
+# ==============================================================================
+# TEST: Projection
+# ==============================================================================
+
+def test_truncate_keeps_prefix_and_normalizes():
+    """Matryoshka: первые d компонент, L2 норма = 1"""
+
+    projection = EmbeddingProjection.truncate(DIMS, 16)
+    vector = np.arange(1, DIMS + 1, dtype=np.float32)
+
+    projected = projection.apply(vector)
+
+    assert projected.shape == (16,)
+    assert np.linalg.norm(projected) == pytest.approx(1.0, abs=1e-6)
+    assert np.allclose(projected, vector[:16] / np.linalg.norm(vector[:16]))
+    assert projection.version == 'trunc16'
+
+
+def test_pca_preserves_neighbours():
+    """PCA до rank размерности почти не меняет cosine similarity"""
+
+    vectors = low_rank_vectors(500)
+    projection = EmbeddingProjection.fit_pca(vectors, 8)
+
+    projected = projection.apply(vectors)
+    assert projected.shape == (500, 8)
+
+    report = evaluate_recall(vectors, [4, 8], kind='pca', k=3, n_queries=50)
+    assert report[-1]['recall'] >= 0.9
+    assert report[0]['recall'] <= report[-1]['recall']
+
+
+def test_pca_version_is_stable_across_save_load(tmp_path):
+    """Версия зависит от матрицы и сохраняется вместе с ней"""
+
+    vectors = low_rank_vectors(200)
+    projection = EmbeddingProjection.fit_pca(vectors, 8)
+    path = str(tmp_path / "pca8.npz")
+    projection.save(path)
+
+    loaded = load_projection(path, input_dim=DIMS)
+
+    assert loaded.version == projection.version
+    assert loaded.version.startswith('pca8_')
+    assert np.allclose(loaded.apply(vectors[:5]), projection.apply(vectors[:5]))
+
+    other = EmbeddingProjection.fit_pca(low_rank_vectors(200, seed=1), 8)
+    assert other.version != projection.version
+
+
+def test_load_projection_spec():
+    """EMBEDDING_PROJECTION: пусто / truncate:N / путь к .npz"""
+
+    assert load_projection(None) is None
+    assert load_projection("truncate:256").output_dim == 256
+
+
+def test_invalid_projection_arguments():
+    with pytest.raises(ValueError):
+        EmbeddingProjection.truncate(DIMS, DIMS + 1)
+    with pytest.raises(ValueError):
+        EmbeddingProjection('pca', DIMS, 8)
+    with pytest.raises(ValueError):
+        EmbeddingProjection('truncate', DIMS, 8, version="x'; DROP TABLE emails; --")
+
+
+def test_vector_index_ddl_per_version():
+    """Индекс по выражению vector(dims) и частичный по версии"""
+
+    ddl = vector_index_ddl('trunc256', 256)
+
+    assert "ix_emails_embedding_trunc256" in ddl
+    assert "(embedding::vector(256))" in ddl
+    assert "embedding_version = 'trunc256'" in ddl
+    assert "embedding_version IS NULL" in vector_index_ddl(None, 768)
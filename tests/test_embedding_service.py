@@ -0,0 +1,604 @@
+"""
+Unit Tests for Embedding Service
+Tests: pooled session reuse, batch embeddings, micro-batching, embedding cache,
+hot index tier
+"""
+
+import asyncio
+import os
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_projection import EmbeddingProjection
+from app.services.embedding_service import EmbeddingService
+from app.services.ollama_client import OllamaClient
+from app.services.vector_codec import decode_vector, encode_vector
+from app.services.vector_index import IVFFlatIndex, QuantizedIndex
+
+DIMS = 768
+
+
+# ==============================================================================
+# Helpers
+# ==============================================================================
+
+class FakeEmbedResponse:
+    """Эмуляция ответа Ollama /api/embed"""
+
+    def __init__(self, embeddings, status=200):
+        self.status = status
+        self.embeddings = embeddings
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def json(self):
+        return {"model": "nomic-embed-text:latest", "embeddings": self.embeddings}
+
+
+def vector_for(text):
+    """Детерминированный вектор для текста"""
+    value = float(len(text))
+    return [value] * DIMS
+
+
+def embed_endpoint(url, json=None, **kwargs):
+    """Fake /api/embed: по вектору на каждый input"""
+    return FakeEmbedResponse([vector_for(t) for t in json["input"]])
+
+
+@pytest.fixture
+def ollama_client():
+    """OllamaClient с mocked pooled session"""
+    client = OllamaClient(host="http://localhost:11434", model="mistral:7b")
+    client.session = MagicMock()
+    client.session.post = MagicMock(side_effect=embed_endpoint)
+    return client
+
+
+@pytest.fixture
+def embedding_service(ollama_client):
+    """EmbeddingService с mocked DB"""
+    return EmbeddingService(db_service=MagicMock(), ollama_client=ollama_client)
+
+
+# ==============================================================================
+# TEST: Session reuse and batch endpoint
+# ==============================================================================
+
+@pytest.mark.asyncio
+async def test_embed_text_uses_pooled_session(embedding_service, ollama_client):
+    """embed_text использует session OllamaClient и /api/embed"""
+
+    embedding = await embedding_service.embed_text("hello")
+
+    assert embedding.dtype == np.float32
+    assert embedding.tolist() == vector_for("hello")
+    url = ollama_client.session.post.call_args[0][0]
+    payload = ollama_client.session.post.call_args[1]["json"]
+    assert url == "http://localhost:11434/api/embed"
+    assert payload["input"] == ["hello"]
+    assert payload["model"] == "nomic-embed-text:latest"
+
+
+@pytest.mark.asyncio
+async def test_embed_batch_splits_into_chunks(embedding_service, ollama_client):
+    """embed_batch режет вход на запросы по max_batch_size"""
+
+    embedding_service.max_batch_size = 4
+    texts = [f"text-{'x' * i}" for i in range(10)]
+
+    embeddings = await embedding_service.embed_batch(texts)
+
+    assert [e.tolist() for e in embeddings] == [vector_for(t) for t in texts]
+    assert ollama_client.session.post.call_count == 3
+    assert embedding_service.get_stats()["texts_embedded"] == 10
+
+
+@pytest.mark.asyncio
+async def test_embed_batch_error_status(embedding_service, ollama_client):
+    """Ошибка Ollama → None для каждого текста"""
+
+    ollama_client.session.post = MagicMock(return_value=FakeEmbedResponse([], status=500))
+
+    embeddings = await embedding_service.embed_batch(["a", "b"])
+
+    assert embeddings == [None, None]
+    assert embedding_service.get_stats()["failed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_embed_batch_invalid_dimensions(embedding_service, ollama_client):
+    """Вектор неверной размерности отбрасывается"""
+
+    ollama_client.session.post = MagicMock(
+        return_value=FakeEmbedResponse([[0.1] * DIMS, [0.1] * 10])
+    )
+
+    embeddings = await embedding_service.embed_batch(["ok", "bad"])
+
+    assert embeddings[0] is not None
+    assert embeddings[1] is None
+
+
+# ==============================================================================
+# TEST: Micro-batching
+# ==============================================================================
+
+@pytest.mark.asyncio
+async def test_concurrent_embed_text_is_micro_batched(embedding_service, ollama_client):
+    """Конкурентные вызовы embed_text объединяются в один запрос"""
+
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+
+    embeddings = await asyncio.gather(*[embedding_service.embed_text(t) for t in texts])
+
+    assert [e.tolist() for e in embeddings] == [vector_for(t) for t in texts]
+    assert ollama_client.session.post.call_count == 1
+    assert ollama_client.session.post.call_args[1]["json"]["input"] == texts
+    assert embedding_service.get_stats()["avg_batch_size"] == 5.0
+
+
+@pytest.mark.asyncio
+async def test_micro_batch_flushes_at_max_size(embedding_service, ollama_client):
+    """Batch отправляется сразу при достижении max_batch_size"""
+
+    embedding_service.max_batch_size = 2
+    embedding_service.batch_window_ms = 10_000  # таймер не должен понадобиться
+
+    embeddings = await asyncio.wait_for(
+        asyncio.gather(*[embedding_service.embed_text(t) for t in ["a", "bb", "ccc", "dddd"]]),
+        timeout=1
+    )
+
+    assert all(e is not None for e in embeddings)
+    assert ollama_client.session.post.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_micro_batching_disabled(embedding_service, ollama_client):
+    """batch_window_ms = 0 → каждый текст отправляется отдельно"""
+
+    embedding_service.batch_window_ms = 0
+
+    await asyncio.gather(embedding_service.embed_text("a"), embedding_service.embed_text("b"))
+
+    assert ollama_client.session.post.call_count == 2
+
+
+# ==============================================================================
+# TEST: Embedding cache
+# ==============================================================================
+
+@pytest.fixture
+def cached_service(ollama_client):
+    """EmbeddingService с in-memory кэшем"""
+    return EmbeddingService(
+        db_service=MagicMock(),
+        ollama_client=ollama_client,
+        cache=EmbeddingCache(max_entries=100)
+    )
+
+
+def test_cache_key_normalizes_whitespace():
+    """Ключ не зависит от пробелов, но зависит от модели"""
+
+    key = EmbeddingCache.key_for("Invoice  INV-1\n\n total", "nomic")
+
+    assert key == EmbeddingCache.key_for(" Invoice INV-1 total ", "nomic")
+    assert key != EmbeddingCache.key_for("Invoice INV-1 total", "other-model")
+    assert len(key) == 16
+
+
+def test_cache_stores_float16_and_evicts_lru():
+    """Векторы хранятся как float16, LRU ограничен max_entries"""
+
+    cache = EmbeddingCache(dimensions=DIMS, max_entries=2)
+    keys = [EmbeddingCache.key_for(t) for t in ["a", "b", "c"]]
+
+    for key in keys:
+        cache.put(key, [0.5] * DIMS)
+
+    assert cache.get(keys[0]) is None
+    vector = cache.get(keys[2])
+    assert vector.dtype == np.float16
+    assert vector.nbytes == DIMS * 2
+
+    stats = cache.get_stats()
+    assert stats['memory_entries'] == 2
+    assert stats['evictions'] == 1
+    assert stats['misses'] == 1
+    assert stats['memory_bytes'] == 2 * DIMS * 2
+
+
+def test_disk_store_survives_restart(tmp_path):
+    """Memory-mapped store переживает перезапуск и вытесняет старые записи"""
+
+    cache = EmbeddingCache(dimensions=4, max_entries=1, disk_path=str(tmp_path), disk_capacity=2)
+    keys = [EmbeddingCache.key_for(t) for t in ["a", "b", "c"]]
+    for i, key in enumerate(keys):
+        cache.put(key, [float(i)] * 4)
+    cache.flush()
+
+    reopened = EmbeddingCache(dimensions=4, max_entries=1, disk_path=str(tmp_path), disk_capacity=2)
+
+    assert reopened.get(keys[0]) is None
+    assert reopened.get(keys[1]).tolist() == [1.0] * 4
+    assert reopened.get(keys[2]).tolist() == [2.0] * 4
+    assert reopened.get_stats()['disk_hits'] == 2
+
+    # Кольцевой буфер продолжает с правильной позиции
+    reopened.put(EmbeddingCache.key_for("d"), [3.0] * 4)
+    assert reopened.disk.get(keys[1]) is None
+    assert reopened.disk.get(keys[2]) is not None
+
+
+@pytest.mark.parametrize("new_capacity, kept", [(5, ["b", "c", "d"]), (2, ["c", "d"])])
+def test_disk_store_reopened_with_new_capacity(tmp_path, new_capacity, kept):
+    """Смена disk_capacity: файлы пересоздаются, новые записи сохраняются"""
+
+    cache = EmbeddingCache(dimensions=4, max_entries=1, disk_path=str(tmp_path), disk_capacity=3)
+    keys = {t: EmbeddingCache.key_for(t) for t in ["a", "b", "c", "d"]}
+    for i, key in enumerate(keys.values()):
+        cache.put(key, [float(i)] * 4)
+    cache.flush()
+    del cache
+
+    reopened = EmbeddingCache(dimensions=4, max_entries=1, disk_path=str(tmp_path), disk_capacity=new_capacity)
+
+    assert reopened.disk.vectors.shape == (new_capacity, 4)
+    assert sorted(t for t, key in keys.items() if reopened.disk.get(key) is not None) == kept
+    assert reopened.disk.get(keys["d"]).tolist() == [3.0] * 4
+
+    # Запись продолжается после самой новой записи, вытесняя самую старую
+    for i in range(new_capacity - len(kept) + 1):
+        reopened.disk.put(EmbeddingCache.key_for(f"new{i}"), [9.0] * 4)
+    assert reopened.disk.get(keys["d"]) is not None
+    assert reopened.disk.get(keys[kept[0]]) is None
+
+
+
+@pytest.mark.parametrize("new_capacity, damaged", [(3, "vectors"), (5, "vectors"), (5, "index")])
+def test_disk_store_damaged_files_recreated(tmp_path, new_capacity, damaged):
+    """Обрезанный vectors/index файл: store пересоздается пустым"""
+
+    cache = EmbeddingCache(dimensions=4, max_entries=1, disk_path=str(tmp_path), disk_capacity=3)
+    cache.put(EmbeddingCache.key_for("a"), [1.0] * 4)
+    cache.flush()
+    del cache
+
+    damaged_path = tmp_path / ("vectors_4.f16" if damaged == "vectors" else "index_4.bin")
+    with open(damaged_path, "r+b") as f:
+        f.truncate(os.path.getsize(damaged_path) - 3)
+
+    reopened = EmbeddingCache(dimensions=4, max_entries=1, disk_path=str(tmp_path), disk_capacity=new_capacity)
+
+    assert len(reopened.disk) == 0
+    assert reopened.disk.vectors.shape == (new_capacity, 4)
+    assert os.path.getsize(tmp_path / "vectors_4.f16") == new_capacity * 4 * 2
+    reopened.put(EmbeddingCache.key_for("b"), [2.0] * 4)
+    assert reopened.disk.get(EmbeddingCache.key_for("b")).tolist() == [2.0] * 4
+
+@pytest.mark.asyncio
+async def test_embed_text_served_from_cache(cached_service, ollama_client):
+    """Повторный embed_text не обращается к Ollama"""
+
+    first = await cached_service.embed_text("Invoice INV-1")
+    second = await cached_service.embed_text("Invoice   INV-1")
+
+    assert np.array_equal(first, second)
+    assert ollama_client.session.post.call_count == 1
+    assert cached_service.get_stats()['cache']['hit_rate'] == 50.0
+
+
+@pytest.mark.asyncio
+async def test_embed_batch_requests_only_misses(cached_service, ollama_client):
+    """embed_batch запрашивает только промахи, повторы схлопываются"""
+
+    await cached_service.embed_text("cached")
+    ollama_client.session.post.reset_mock()
+
+    embeddings = await cached_service.embed_batch(["cached", "new", "new", "other"])
+
+    assert [e.tolist() for e in embeddings] == [vector_for(t) for t in ["cached", "new", "new", "other"]]
+    assert ollama_client.session.post.call_count == 1
+    assert ollama_client.session.post.call_args[1]["json"]["input"] == ["new", "other"]
+
+
+# ==============================================================================
+# TEST: Hot index tier
+# ==============================================================================
+
+@pytest.fixture
+def hot_service(ollama_client):
+    """EmbeddingService с hot index и pgvector fallback"""
+    service = EmbeddingService(
+        db_service=MagicMock(),
+        ollama_client=ollama_client,
+        hot_index=IVFFlatIndex(dimensions=DIMS, capacity=100),
+        hot_index_min_size=3
+    )
+    service._search_db = AsyncMock(return_value=[{'id': 'db'}])
+    return service
+
+
+def _labelled(i, category="invoice"):
+    return {
+        'message_id': f'msg-{i}',
+        'from_email': f'sender{i}@example.com',
+        'subject': f'Subject {i}',
+        'body_text': 'x' * 500,
+        'category': category,
+        'confidence': 0.9,
+        'received_at': None
+    }
+
+
+@pytest.mark.asyncio
+async def test_hot_index_cold_start_falls_back_to_db(hot_service):
+    """Пока индекс меньше hot_index_min_size - поиск в pgvector"""
+
+    hot_service.index_labelled_email(1, vector_for("query"), _labelled(1))
+
+    result = await hot_service.find_similar_emails("query", k=1)
+
+    assert result == [{'id': 'db'}]
+    hot_service._search_db.assert_called_once()
+    assert hot_service.get_stats()['similarity_search']['hot_misses'] == 0
+
+
+@pytest.mark.asyncio
+async def test_hot_index_answers_top_k(hot_service):
+    """Прогретый индекс отвечает без pgvector"""
+
+    for i in range(3):
+        hot_service.index_labelled_email(i, vector_for("query"), _labelled(i))
+
+    result = await hot_service.find_similar_emails("query", k=3, threshold=0.3)
+
+    assert len(result) == 3
+    assert result[0]['similarity'] == 1.0
+    assert len(result[0]['body_text']) == 200
+    hot_service._search_db.assert_not_called()
+    assert hot_service.get_stats()['similarity_search']['hot_hits'] == 1
+
+
+@pytest.mark.asyncio
+async def test_hot_index_miss_falls_back_to_db(hot_service):
+    """Меньше k результатов выше threshold → pgvector"""
+
+    orthogonal = [0.0] * DIMS
+    orthogonal[0] = 1.0
+    for i in range(3):
+        hot_service.index_labelled_email(i, orthogonal, _labelled(i))
+
+    result = await hot_service.find_similar_emails("query", k=3, threshold=0.3)
+
+    assert result == [{'id': 'db'}]
+    assert hot_service.get_stats()['similarity_search']['hot_misses'] == 1
+
+
+@pytest.mark.asyncio
+async def test_quantized_hot_index(ollama_client):
+    """Hot tier на int8 + 1-bit кодах"""
+
+    service = EmbeddingService(
+        db_service=MagicMock(),
+        ollama_client=ollama_client,
+        hot_index=QuantizedIndex(dimensions=DIMS, capacity=100, mode='binary+int8'),
+        hot_index_min_size=3
+    )
+    service._search_db = AsyncMock(return_value=[])
+    for i in range(3):
+        service.index_labelled_email(i, vector_for("query"), _labelled(i))
+
+    result = await service.find_similar_emails("query", k=3, threshold=0.3)
+
+    assert len(result) == 3
+    assert result[0]['similarity'] == pytest.approx(1.0, abs=0.01)
+    service._search_db.assert_not_called()
+    assert service.get_stats()['similarity_search']['hot_index_bytes_per_vector'] == DIMS + 4 + 96
+
+
+@pytest.mark.asyncio
+async def test_embed_and_store_indexes_labelled_email(hot_service):
+    """embed_and_store с labelled добавляет письмо в hot index"""
+
+    hot_service.store_embedding = AsyncMock(return_value=True)
+
+    assert await hot_service.embed_and_store(42, "invoice text", labelled=_labelled(42))
+    assert len(hot_service.hot_index) == 1
+
+    assert await hot_service.embed_and_store(43, "unlabelled text")
+    assert len(hot_service.hot_index) == 1
+
+
+# ==============================================================================
+# TEST: pgvector query
+# ==============================================================================
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeDBSession:
+    """Записывает выполненные SQL запросы"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    async def execute(self, statement, params=None):
+        self.executed.append((str(statement), params or {}))
+        return FakeResult(self.rows)
+
+    async def commit(self):
+        pass
+
+
+class FakeDB:
+    def __init__(self, session):
+        self.session = session
+
+    def get_session(self):
+        session = self.session
+
+        class _Ctx:
+            async def __aenter__(self):
+                return session
+
+            async def __aexit__(self, *args):
+                return False
+
+        return _Ctx()
+
+
+def _db_row(i, distance):
+    return (i, f"msg-{i}", f"s{i}@example.com", f"Subject {i}", "body", "invoice", 0.9, None, distance)
+
+
+@pytest.mark.asyncio
+async def test_db_search_is_index_friendly(ollama_client):
+    """ORDER BY embedding <=> q LIMIT k, threshold применяется после"""
+
+    session = FakeDBSession([_db_row(1, 0.1), _db_row(2, 0.5), _db_row(3, 0.8)])
+    service = EmbeddingService(db_service=FakeDB(session), ollama_client=ollama_client)
+
+    result = await service.find_similar_emails("query", k=3, threshold=0.3)
+
+    assert [r['id'] for r in result] == [1, 2]
+    assert result[0]['similarity'] == 0.9
+
+    sql, params = session.executed[-1]
+    assert "ORDER BY CAST(embedding AS vector(768)) <=> CAST(:embedding AS vector(768))" in sql
+    assert "embedding_version IS NULL" in sql
+    assert "LIMIT :k" in sql
+    assert ":threshold" not in sql
+    assert params["k"] == 3
+
+
+@pytest.mark.asyncio
+async def test_db_search_sets_ef_search_per_query(ollama_client):
+    """hnsw.ef_search задается на транзакцию, per-query override"""
+
+    session = FakeDBSession([])
+    service = EmbeddingService(
+        db_service=FakeDB(session), ollama_client=ollama_client, ivfflat_probes=10
+    )
+
+    await service.find_similar_emails("query", k=3, ef_search=100)
+
+    settings = {params["value"]: sql for sql, params in session.executed if "set_config" in sql}
+    assert "hnsw.ef_search" in settings["100"]
+    assert "ivfflat.probes" in settings["10"]
+
+    session.executed.clear()
+    await service.find_similar_emails("query", k=3)
+
+    ef_values = [params["value"] for sql, params in session.executed if "hnsw.ef_search" in sql]
+    assert ef_values == ["40"]
+
+
+# ==============================================================================
+# TEST: Binary vector transport
+# ==============================================================================
+
+def test_vector_codec_roundtrip():
+    """encode/decode pgvector binary формата"""
+
+    vector = np.random.default_rng(0).normal(size=DIMS).astype(np.float32)
+
+    data = encode_vector(vector)
+    decoded = decode_vector(data)
+
+    assert len(data) == 4 + DIMS * 4
+    assert data[:4] == DIMS.to_bytes(2, 'big') + b"\x00\x00"
+    assert decoded.dtype == np.float32
+    assert np.array_equal(decoded, vector)
+
+
+@pytest.mark.asyncio
+async def test_binary_vectors_passed_as_numpy(ollama_client):
+    """binary_vectors=True → bind-параметр NumPy array, не строка"""
+
+    session = FakeDBSession([])
+    service = EmbeddingService(
+        db_service=FakeDB(session), ollama_client=ollama_client, binary_vectors=True
+    )
+
+    await service.find_similar_emails("query", k=3)
+    await service.store_embedding(1, np.ones(DIMS, dtype=np.float32))
+
+    vector_params = [params["embedding"] for _, params in session.executed if "embedding" in params]
+    assert len(vector_params) == 2
+    assert all(isinstance(v, np.ndarray) for v in vector_params)
+
+
+@pytest.mark.asyncio
+async def test_text_vectors_fallback(ollama_client):
+    """Без binary codec vector передается текстом pgvector"""
+
+    session = FakeDBSession([])
+    service = EmbeddingService(db_service=FakeDB(session), ollama_client=ollama_client)
+
+    await service.store_embedding(1, np.array([0.5, 1.0], dtype=np.float32))
+
+    assert session.executed[-1][1]["embedding"] == "[0.5,1.0]"
+
+
+# ==============================================================================
+# TEST: Dimensionality reduction
+# ==============================================================================
+
+@pytest.mark.asyncio
+async def test_projection_applied_before_cache_and_storage(ollama_client):
+    """Векторы проецируются до кэша и записи, версия пишется рядом"""
+
+    session = FakeDBSession([])
+    service = EmbeddingService(
+        db_service=FakeDB(session),
+        ollama_client=ollama_client,
+        cache=EmbeddingCache(dimensions=256, max_entries=10),
+        projection=EmbeddingProjection.truncate(DIMS, 256),
+        batch_window_ms=0
+    )
+
+    embedding = await service.embed_text("hello")
+
+    assert embedding.shape == (256,)
+    assert np.linalg.norm(embedding) == pytest.approx(1.0, abs=1e-5)
+    assert service.cache.key_for("hello", "nomic-embed-text:latest@trunc256") in service.cache.memory
+
+    await service.store_embedding(1, embedding)
+    sql, params = session.executed[-1]
+    assert "embedding_version = :version" in sql
+    assert params["version"] == "trunc256"
+
+
+@pytest.mark.asyncio
+async def test_projected_search_uses_version_index(ollama_client):
+    """Поиск по выражению vector(dims) и только среди векторов этой версии"""
+
+    session = FakeDBSession([])
+    service = EmbeddingService(
+        db_service=FakeDB(session),
+        ollama_client=ollama_client,
+        projection=EmbeddingProjection.truncate(DIMS, 256)
+    )
+
+    await service.find_similar_emails("query", k=3)
+
+    sql, _ = session.executed[-1]
+    assert "ORDER BY CAST(embedding AS vector(256)) <=> CAST(:embedding AS vector(256))" in sql
+    assert "embedding_version = 'trunc256'" in sql
+    assert service.get_stats()['projection']['output_dim'] == 256
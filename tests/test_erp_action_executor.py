@@ -499,6 +499,42 @@ class TestTextParsing:
 
         assert items == []
 
+    @pytest.mark.asyncio
+    async def test_lazy_attachments_read_only_when_parsed(
+        self,
+        mock_erp_client: AsyncMock,
+        mock_db_session: AsyncMock,
+    ) -> None:
+        """Test lazy handles are read only for Excel/CSV/PDF attachments."""
+        email = Email()
+        email.id = 1
+        email.body = ""
+
+        pdf_handle = MagicMock()
+        pdf_handle.read = AsyncMock(return_value=b"%PDF-1.4")
+        image_handle = MagicMock()
+        image_handle.read = AsyncMock(return_value=b"\x89PNG")
+
+        executor = ERPActionExecutor(
+            erp_client=mock_erp_client,
+            db_session=mock_db_session,
+        )
+        executor._parse_from_pdf = MagicMock(return_value=[])
+
+        await executor._parse_order_items(
+            email,
+            {
+                "attachments": [
+                    {"filename": "order.pdf", "handle": pdf_handle},
+                    {"filename": "logo.png", "handle": image_handle},
+                ]
+            },
+        )
+
+        pdf_handle.read.assert_awaited_once()
+        image_handle.read.assert_not_called()
+        executor._parse_from_pdf.assert_called_once_with(b"%PDF-1.4")
+
 
 # ============================================================================
 # Tests: EmailAction model
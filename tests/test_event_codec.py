@@ -0,0 +1,259 @@
+"""
+Unit Tests for Email Event Binary Codec
+Tests: roundtrip, timestamps, compression, versioning, fast decode, producer
+"""
+
+import asyncio
+import json
+from datetime import UTC, datetime, timedelta, timezone
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.services.event_codec import (
+    FORMAT_VERSION,
+    MAGIC,
+    decode_email_received,
+    decode_event,
+    encode_event,
+    event_serializer,
+)
+from app.services.imap_listener import EmailReceivedEvent
+from app.services.kafka_producer import EmailEvent, KafkaConfig, KafkaEmailProducer
+
+BODY = (
+    "Добрый день!\n\nПрошу выставить счет INV-2026-0098 на сумму 1500 EUR.\n"
+    "Оплата в течение 30 дней.\n"
+) * 4
+
+
+def email_received(**overrides) -> EmailReceivedEvent:
+    fields = {
+        "message_id": "m1@client.com",
+        "from_email": "anna@client.com",
+        "to_email": ["billing@example.com", "sales@example.com"],
+        "subject": "Счет INV-2026-0098",
+        "body_text": BODY,
+        "new_content": BODY.strip(),
+        "attachments": [{
+            "filename": "invoice.pdf",
+            "content_type": "application/pdf",
+            "size_bytes": 48213,
+            "blob": "sha256:" + "ab" * 32,
+        }],
+        "received_at": datetime(2026, 10, 19, 10, 0, 0, 123456, tzinfo=UTC),
+        "raw_message_ref": "sha256:" + "cd" * 32,
+        "size_bytes": 52000,
+        "sent_at": datetime(2026, 10, 19, 12, 59, 58, tzinfo=timezone(timedelta(hours=3))),
+        "in_reply_to": "m0@example.com",
+        "references": ["m0@example.com"],
+    }
+    fields.update(overrides)
+    return EmailReceivedEvent(**fields)
+
+
+def kafka_event(email: EmailReceivedEvent) -> dict:
+    """Value, которое публикует KafkaEmailProducer"""
+    email_data = email.model_dump(mode="json")
+    return EmailEvent(
+        event_id="0b6f1f5e-3c1f-4c55-9a55-2f1c0c3b7e41",
+        timestamp="2026-10-19T10:00:01.250000",
+        email_data=email_data,
+        metadata={"source_host": "kafka:9092", "from_email": email_data["from_email"], "batch_size": 100},
+    ).dict()
+
+
+# ==============================================================================
+# TEST: Roundtrip
+# ==============================================================================
+
+def test_event_roundtrip_matches_json():
+    """decode_event возвращает то же, что json.loads JSON сообщения"""
+
+    event = kafka_event(email_received())
+
+    data = encode_event(event)
+
+    assert data[:2] == MAGIC
+    assert data[2] == FORMAT_VERSION
+    assert decode_event(data) == json.loads(json.dumps(event))
+
+
+def test_binary_smaller_than_json():
+    """Без имен полей и строковых timestamp сообщение меньше JSON"""
+
+    event = kafka_event(email_received(body_text="OK", new_content="OK"))
+
+    binary = encode_event(event)
+    text = json.dumps(event).encode("utf-8")
+
+    assert len(binary) < len(text) * 0.7
+
+
+def test_generic_values_and_unknown_keys():
+    """Значения и ключи вне схемы кодируются без потерь"""
+
+    event = {
+        "event_id": "e1",
+        "metadata": {"custom_key": [1, -2, 2**70, -(2**70), 3.25, None, True, False, b"\x00\xff", {"k": "v"}]},
+        "email_data": {},
+    }
+
+    assert decode_event(encode_event(event)) == event
+
+
+@pytest.mark.parametrize("value", [
+    "2026-10-19T10:00:00",
+    "2026-10-19T10:00:00.123456Z",
+    "2026-10-19T10:00:00+03:00",
+    "2026-10-19T10:00:00-05:30",
+    "2026-10-19T10:00:00+00:00",
+    "2026-10-19T10:00:00.5",
+    "2026-10-19",
+    "not a timestamp",
+])
+def test_timestamp_strings_preserved(value):
+    """Timestamp строки восстанавливаются посимвольно (или хранятся строкой)"""
+
+    event = {"timestamp": value, "email_data": {"sent_at": value, "date": value}}
+
+    assert decode_event(encode_event(event)) == event
+
+
+def test_timestamps_are_compact():
+    """Timestamp хранится как varint, а не ISO строка"""
+
+    as_string = encode_event({"subject": "2026-10-19T10:00:00.123456Z"})
+    as_timestamp = encode_event({"received_at": "2026-10-19T10:00:00.123456Z"})
+
+    assert len(as_timestamp) < len(as_string) - 15
+
+
+# ==============================================================================
+# TEST: Compression and versions
+# ==============================================================================
+
+def test_zlib_compression():
+    """zlib сжимает тело; мелкие события не сжимаются"""
+
+    event = kafka_event(email_received())
+
+    compressed = encode_event(event, "zlib")
+    small = encode_event({"event_id": "e1"}, "zlib")
+
+    assert compressed[3] == 1
+    assert len(compressed) < len(encode_event(event))
+    assert decode_event(compressed) == decode_event(encode_event(event))
+    assert small[3] == 0
+
+
+@pytest.mark.parametrize("compression, module", [("zstd", "zstandard"), ("lz4", "lz4.frame")])
+def test_optional_compression(compression, module):
+    """zstd / lz4 при установленной библиотеке"""
+
+    pytest.importorskip(module)
+    event = kafka_event(email_received())
+
+    data = event_serializer("binary", compression)(event)
+
+    assert data[3] != 0
+    assert decode_event(data) == json.loads(json.dumps(event))
+
+
+@pytest.mark.parametrize("compression, module", [("zstd", "zstandard"), ("lz4", "lz4")])
+def test_missing_compression_library_fails_fast(compression, module):
+    """Без библиотеки ошибка при создании сериализатора"""
+
+    try:
+        __import__(module)
+        pytest.skip(f"{module} installed")
+    except ImportError:
+        pass
+
+    with pytest.raises(RuntimeError, match=module):
+        event_serializer("binary", compression)
+
+
+def test_unknown_serialization_options():
+    """Неизвестные serialization / compression"""
+
+    with pytest.raises(ValueError):
+        event_serializer("avro")
+    with pytest.raises(ValueError):
+        event_serializer("binary", "brotli")
+
+
+def test_newer_format_version_rejected():
+    """Сообщение новой версии формата не декодируется молча"""
+
+    data = bytearray(encode_event({"event_id": "e1"}))
+    data[2] = FORMAT_VERSION + 1
+
+    with pytest.raises(ValueError, match="version"):
+        decode_event(bytes(data))
+
+
+def test_json_messages_still_decoded():
+    """Смешанный топик при миграции: JSON сообщения без заголовка"""
+
+    event = kafka_event(email_received())
+
+    assert decode_event(json.dumps(event).encode("utf-8")) == json.loads(json.dumps(event))
+
+
+# ==============================================================================
+# TEST: Fast decode path
+# ==============================================================================
+
+def test_decode_email_received_fast_path():
+    """Binary → EmailReceivedEvent без валидации совпадает с валидированной моделью"""
+
+    email = email_received()
+    data = encode_event(kafka_event(email))
+
+    decoded = decode_email_received(data)
+
+    assert isinstance(decoded, EmailReceivedEvent)
+    assert decoded.model_dump() == email.model_dump()
+    assert decoded.sent_at.utcoffset() == timedelta(hours=3)
+
+
+def test_decode_email_received_from_json():
+    """JSON сообщения проходят полную валидацию"""
+
+    email = email_received(raw_message=b"From: a@b.c\r\n\r\nbody", raw_message_ref=None)
+
+    decoded = decode_email_received(json.dumps(kafka_event(email)).encode("utf-8"))
+    decoded_binary = decode_email_received(encode_event(kafka_event(email)))
+
+    assert decoded.model_dump() == email.model_dump()
+    assert decoded_binary.raw_message == email.raw_message
+
+
+# ==============================================================================
+# TEST: Producer
+# ==============================================================================
+
+@pytest.mark.asyncio
+async def test_producer_publishes_binary_events():
+    """serialization=binary: в Kafka уходит бинарное событие"""
+
+    producer = KafkaEmailProducer(KafkaConfig(batch_size=1, serialization="binary", event_compression="zlib"))
+    producer.producer = AsyncMock()
+    producer.is_running = True
+    sent = []
+
+    async def send(topic, value=None, key=None):
+        sent.append(value)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+    producer.producer.send = send
+    email_data = email_received().model_dump(mode="json")
+
+    assert await producer.publish(email_data)
+
+    assert sent[0][:2] == MAGIC
+    assert decode_event(sent[0])["email_data"] == email_data
+    assert producer.stats["total_bytes"] == len(sent[0])
@@ -0,0 +1,275 @@
+"""
+Unit Tests for Event Spool (WAL)
+Tests: append/drain order, recovery, torn writes, segments, group commit,
+producer fallback and drain
+"""
+
+import asyncio
+import json
+import os
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.services.event_spool import EventSpool
+from app.services.kafka_producer import KafkaConfig, KafkaEmailProducer
+
+
+async def append_all(spool, count, start=0):
+    for i in range(start, start + count):
+        await spool.append(f"key{i}".encode(), f"value{i}".encode())
+
+
+# ==============================================================================
+# TEST: Spool
+# ==============================================================================
+
+@pytest.mark.asyncio
+async def test_append_read_commit_in_order(tmp_path):
+    """Записи читаются в порядке записи; commit сдвигает cursor"""
+
+    spool = EventSpool(str(tmp_path))
+    await append_all(spool, 5)
+
+    first = await spool.read_batch(3)
+    assert [r.value for r in first] == [b"value0", b"value1", b"value2"]
+    assert first[0].key == b"key0"
+
+    await spool.commit(first)
+    rest = await spool.read_batch(10)
+
+    assert [r.value for r in rest] == [b"value3", b"value4"]
+    assert spool.depth == 2
+    assert spool.bytes == sum(r.size for r in rest)
+    await spool.close()
+
+
+@pytest.mark.asyncio
+async def test_pending_records_survive_restart(tmp_path):
+    """После рестарта spool продолжает с сохраненного cursor"""
+
+    spool = EventSpool(str(tmp_path))
+    await append_all(spool, 4)
+    await spool.commit(await spool.read_batch(2))
+    await spool.close()
+
+    reopened = EventSpool(str(tmp_path))
+
+    assert reopened.depth == 2
+    assert reopened.oldest_age() > 0
+    assert [r.value for r in await reopened.read_batch(10)] == [b"value2", b"value3"]
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_torn_write_truncated(tmp_path):
+    """Оборванная последняя запись отбрасывается при открытии"""
+
+    spool = EventSpool(str(tmp_path))
+    await append_all(spool, 2)
+    await spool.close()
+
+    segment = os.path.join(tmp_path, sorted(os.listdir(tmp_path))[0])
+    with open(segment, "ab") as f:
+        f.write(b"\x00\x00\x01\x00partial")
+
+    reopened = EventSpool(str(tmp_path))
+    await append_all(reopened, 1, start=2)
+
+    assert reopened.stats["truncated_bytes"] == 11
+    assert [r.value for r in await reopened.read_batch(10)] == [b"value0", b"value1", b"value2"]
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_segments_roll_and_are_deleted(tmp_path):
+    """Новый сегмент по размеру; отправленные сегменты удаляются"""
+
+    spool = EventSpool(str(tmp_path), segment_max_bytes=60)
+    await append_all(spool, 6)
+
+    segments = [name for name in os.listdir(tmp_path) if name.endswith(".seg")]
+    assert len(segments) == 3
+
+    await spool.commit(await spool.read_batch(5))
+
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".seg")]) == 1
+    assert spool.stats["segments_deleted"] == 2
+    assert [r.value for r in await spool.read_batch(10)] == [b"value5"]
+    with open(tmp_path / "cursor.json") as f:
+        assert json.load(f)["segment"] == 3
+    await spool.close()
+
+
+@pytest.mark.asyncio
+async def test_group_commit(tmp_path):
+    """Параллельные append() делят один fsync"""
+
+    spool = EventSpool(str(tmp_path))
+
+    await asyncio.gather(*(spool.append(b"k", f"v{i}".encode()) for i in range(50)))
+
+    assert spool.stats["appended"] == 50
+    assert spool.stats["fsyncs"] <= 2
+    assert len(await spool.read_batch(100)) == 50
+    await spool.close()
+
+
+@pytest.mark.asyncio
+async def test_append_many_single_fsync(tmp_path):
+    """append_many: один fsync на список, даже с переходом на новый сегмент"""
+
+    spool = EventSpool(str(tmp_path), segment_max_bytes=2000)
+
+    await spool.append_many([(b"k", f"v{i}".encode()) for i in range(100)])
+
+    assert spool.stats["fsyncs"] == 1
+    assert [r.value for r in await spool.read_batch(200)] == [f"v{i}".encode() for i in range(100)]
+    await spool.close()
+
+
+@pytest.mark.asyncio
+async def test_reader_sees_only_synced_records(tmp_path):
+    """Drainer не читает записи до fsync"""
+
+    spool = EventSpool(str(tmp_path), fsync_interval_seconds=10, fsync_batch=1000)
+
+    pending = asyncio.create_task(spool.append(b"k", b"v"))
+    await asyncio.sleep(0.01)
+    assert await spool.read_batch(10) == []
+
+    await spool.sync()
+    await pending
+    assert len(await spool.read_batch(10)) == 1
+    await spool.close()
+
+
+# ==============================================================================
+# TEST: Producer fallback
+# ==============================================================================
+
+class Broker:
+    """send() с переключаемой доступностью брокера"""
+
+    def __init__(self, latency=0.0):
+        self.available = False
+        self.latency = latency
+        self.delivered = []
+
+    async def send(self, topic, value=None, key=None):
+        await asyncio.sleep(self.latency)
+        future = asyncio.get_running_loop().create_future()
+        if self.available:
+            self.delivered.append(json.loads(value)["email_data"]["imap_id"])
+            future.set_result(None)
+        else:
+            future.set_exception(ConnectionError("broker down"))
+        return future
+
+
+def spool_producer(spool_dir, broker):
+    producer = KafkaEmailProducer(KafkaConfig(
+        batch_size=2,
+        max_buffered_events=4,
+        spool_dir=str(spool_dir),
+        spool_retry_seconds=0.01,
+    ))
+    producer.producer = broker
+    producer.is_running = True
+    return producer
+
+
+@pytest.mark.asyncio
+async def test_outage_spools_and_drains_in_order(tmp_path):
+    """Брокер недоступен: события в spool, после восстановления - в порядке"""
+
+    broker = Broker()
+    producer = spool_producer(tmp_path, broker)
+
+    results = [
+        await producer.publish({"from_email": "a@example.com", "imap_id": str(i)})
+        for i in range(10)
+    ]
+
+    # IMAP не блокируется и ничего не теряет
+    assert all(results)
+    assert producer.stats["rejected"] == 0
+    assert producer.spool.depth == 10
+    assert REGISTRY.get_sample_value("kafka_spool_depth_events") == 10
+
+    broker.available = True
+    await asyncio.wait_for(producer.drainer, timeout=5)
+
+    assert broker.delivered == [str(i) for i in range(10)]
+    assert producer.spool.depth == 0
+    assert producer.get_stats()["spool"]["oldest_age_seconds"] == 0
+
+    # Spool пуст: снова обычный batch в памяти
+    await producer.publish({"from_email": "a@example.com", "imap_id": "10"})
+    assert len(producer.batch) == 1
+    producer.batch_timer.cancel()
+    await producer.spool.close()
+
+
+@pytest.mark.asyncio
+async def test_spool_replays_in_publish_order_with_batch_in_flight(tmp_path):
+    """Batch в полете и в памяти падает после перехода в spool: порядок publish сохраняется"""
+
+    broker = Broker(latency=0.05)
+    producer = spool_producer(tmp_path, broker)
+
+    # 0-1 в полете, 2-3 в batch, 4-5 уже не помещаются в буфер
+    assert all(await asyncio.gather(*(
+        producer.publish({"from_email": "a@example.com", "imap_id": str(i)})
+        for i in range(6)
+    )))
+    assert producer.batch == []
+    assert producer.spool.depth == 6
+
+    broker.available = True
+    await asyncio.wait_for(producer.drainer, timeout=5)
+
+    assert broker.delivered == [str(i) for i in range(6)]
+    await producer.spool.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_spooled_with_one_fsync(tmp_path):
+    """Неотправленный batch пишется в spool одним fsync"""
+
+    producer = spool_producer(tmp_path, Broker())
+    producer.config.batch_size = 50
+    producer.config.max_buffered_events = 100
+    producer.is_running = False  # без drainer
+
+    for i in range(50):
+        await producer.publish({"from_email": "a@example.com", "imap_id": str(i)})
+
+    assert producer.stats["events_spooled"] == 50
+    assert producer.spool.stats["fsyncs"] == 1
+    await producer.spool.close()
+
+
+@pytest.mark.asyncio
+async def test_spool_replayed_after_restart(tmp_path):
+    """События в spool отправляются после рестарта producer"""
+
+    producer = spool_producer(tmp_path, Broker())
+    for i in range(3):
+        await producer.publish({"from_email": "a@example.com", "imap_id": str(i)})
+    producer.drainer.cancel()
+    producer.is_running = False
+    await producer.spool.close()
+
+    broker = Broker()
+    broker.available = True
+    with patch("app.services.kafka_producer.AIOKafkaProducer", return_value=broker):
+        broker.start = AsyncMock()
+        restarted = KafkaEmailProducer(KafkaConfig(spool_dir=str(tmp_path)))
+        assert await restarted.init()
+
+    await asyncio.wait_for(restarted.drainer, timeout=5)
+
+    assert broker.delivered == ["0", "1", "2"]
+    await restarted.spool.close()
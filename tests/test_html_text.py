@@ -0,0 +1,182 @@
+"""
+Tests for HTML to text extraction
+
+Tests:
+- Visible text, block structure and whitespace
+- Scripts, styles, hidden preheaders and tracking markup dropped
+- Output cap
+- HTML-only emails get body_text in the listener and the parser pool
+"""
+
+from datetime import datetime
+from email.message import EmailMessage
+from unittest.mock import AsyncMock
+
+import pytest
+from imap_stand_in import IMAPStandIn
+from prometheus_client import REGISTRY
+
+from app.models.email_models import EmailCategory, EmailDocument
+from app.services.html_text import html_to_text
+from app.services.imap_listener import IMAPListenerService
+from app.services.mime_worker import MimeParserPool, fill_text_from_html, parse_message
+from app.services.rules_classifier import RulesEngine
+from app.services.rules_loader import RulesConfiguration
+
+NOTIFICATION_HTML = """<!DOCTYPE html>
+<html><head><title>Invoice</title><style>td { color: #333; }</style></head>
+<body>
+<div style="display:none;max-height:0;overflow:hidden">Your invoice is ready&zwnj;&nbsp;&zwnj;&nbsp;</div>
+<!--[if mso]><table><tr><td>Outlook only</td></tr></table><![endif]-->
+<h1>Invoice&nbsp;INV-2024-0098</h1>
+<p>Dear customer,<br>please find   your
+   invoice below.</p>
+<table>
+  <tr><th>Item</th><th>Amount</th></tr>
+  <tr><td>Consulting</td><td>1500 EUR</td></tr>
+</table>
+<p>Total amount: &euro;1500. VAT 20%. Payment due within 30 days.</p>
+<ul><li>Pay online</li><li>Pay by <b>bank</b> transfer</li></ul>
+<img src="https://t.example.com/open.gif" width="1" height="1" alt="">
+<script>track("open")</script>
+</body></html>"""
+
+
+def make_html_only_message(i: int) -> bytes:
+    message = EmailMessage()
+    message["From"] = "billing@example.com"
+    message["To"] = "accounts@example.com"
+    message["Subject"] = f"Your invoice INV-2024-{i:04d}"
+    message["Message-ID"] = f"<invoice{i}@example.com>"
+    message.set_content(NOTIFICATION_HTML, subtype="html")
+    return message.as_bytes()
+
+
+def sample(name: str) -> float:
+    return REGISTRY.get_sample_value(name) or 0.0
+
+
+class TestHtmlToText:
+    """Test the converter."""
+
+    def test_visible_text_and_structure(self):
+        """Test headings, paragraphs, table rows and list items become lines."""
+        text = html_to_text(NOTIFICATION_HTML)
+
+        assert text == (
+            "Invoice INV-2024-0098\n\n"
+            "Dear customer,\nplease find your invoice below.\n\n"
+            "Item Amount\nConsulting 1500 EUR\n\n"
+            "Total amount: €1500. VAT 20%. Payment due within 30 days.\n\n"
+            "- Pay online\n- Pay by bank transfer"
+        )
+
+    def test_hidden_and_non_text_markup_dropped(self):
+        """Test scripts, styles, preheaders, MSO comments and pixels leave no text."""
+        text = html_to_text(NOTIFICATION_HTML)
+
+        for fragment in ("track", "color", "Your invoice is ready", "Outlook only", "open.gif", "\u200c"):
+            assert fragment not in text
+
+    def test_nested_hidden_elements(self):
+        """Test a hidden element ends at its own closing tag, not the first inner one."""
+        html = '<div hidden><div>inner</div>still hidden</div><div>visible</div>'
+
+        assert html_to_text(html) == "visible"
+
+    def test_output_is_capped(self):
+        """Test conversion stops at max_chars even for very large bodies."""
+        html = "<p>" + "word " * 200_000 + "</p>"
+
+        text = html_to_text(html, max_chars=100)
+
+        assert len(text) == 100
+        assert text.startswith("word word")
+
+    def test_fragments_and_empty_input(self):
+        """Test plain fragments and empty bodies."""
+        assert html_to_text("Hello <i>there</i>!") == "Hello there!"
+        assert html_to_text("") == ""
+        assert html_to_text("<style>p {}</style>") == ""
+
+    def test_fill_text_from_html_keeps_existing_text(self):
+        """Test only emails without a text part are converted."""
+        with_text = {"body_text": "Plain", "body_html": "<p>Rich</p>"}
+        html_only = {"body_text": None, "body_html": "<p>Rich</p>"}
+
+        assert fill_text_from_html(with_text) == 0.0
+        assert fill_text_from_html(html_only) > 0.0
+        assert with_text["body_text"] == "Plain"
+        assert html_only["body_text"] == "Rich"
+
+    def test_converted_text_is_settled_by_rules(self):
+        """Test an HTML-only invoice classifies as INVOICE without the LLM."""
+        engine = RulesEngine(RulesConfiguration("config/classification_rules.yaml"))
+        parsed = parse_message(make_html_only_message(98))
+        empty = EmailDocument(
+            message_id="invoice98@example.com",
+            from_email="billing@example.com",
+            to_email="accounts@example.com",
+            subject="Invoice notification",
+            body_text=parsed["body_text"] or "",
+            received_at=datetime.utcnow(),
+        )
+        fill_text_from_html(parsed)
+        converted = empty.model_copy(update={"body_text": parsed["body_text"]})
+
+        assert empty.body_text == ""
+        result = engine.classify(converted)
+        assert result is not None
+        assert result.category == EmailCategory.INVOICE
+        baseline = engine.classify(empty)
+        assert baseline is None or baseline.category != EmailCategory.INVOICE
+
+
+class TestIngestion:
+    """Test HTML-only emails on both listener fetch paths and in the pool."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("lazy_attachments", [True, False])
+    async def test_listener_fills_body_text(self, lazy_attachments):
+        """Test events of HTML-only emails carry converted body_text and keep body_html."""
+        before = sample("email_html_to_text_seconds_count")
+        server = await IMAPStandIn().start()
+        server.add_message(make_html_only_message(1))
+
+        listener = IMAPListenerService(
+            host="127.0.0.1",
+            port=server.port,
+            user=server.user,
+            password=server.password,
+            use_ssl=False,
+            initial_sync="all",
+            lazy_attachments=lazy_attachments,
+        )
+        listener.publish_to_kafka = AsyncMock()
+
+        try:
+            await listener.connect()
+            await listener.fetch_new_emails()
+            await listener.disconnect()
+        finally:
+            await server.stop()
+
+        event = listener.publish_to_kafka.call_args.args[0]
+        assert event.body_text == html_to_text(NOTIFICATION_HTML)
+        assert "<table>" in event.body_html
+        assert sample("email_html_to_text_seconds_count") == before + 1
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("kind", ["thread", "process"])
+    async def test_pool_converts_in_worker(self, kind):
+        """Test the pool returns converted text and records conversion time."""
+        before = sample("email_html_to_text_seconds_count")
+        pool = MimeParserPool(max_workers=1, kind=kind)
+        try:
+            parsed = await pool.parse(make_html_only_message(2))
+        finally:
+            pool.close()
+
+        assert parsed["body_text"].startswith("Invoice INV-2024-0098")
+        assert pool.get_stats()["html_converted"] == 1
+        assert sample("email_html_to_text_seconds_count") == before + 1
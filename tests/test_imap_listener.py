@@ -5,12 +5,72 @@ Tests:
 - Email parsing (text, HTML, attachments)
 - Kafka publishing with retries
 - IMAP connection and error handling
+- IDLE push, batched UID FETCH and UID checkpoints (local IMAP stand-in)
+- BODYSTRUCTURE-first fetching and lazy attachment handles
 """
 
+import asyncio
+import functools
 import pytest
 from datetime import UTC, datetime
-
-from app.services.imap_listener import EmailReceivedEvent, IMAPListenerService
+from email.message import EmailMessage
+from unittest.mock import AsyncMock
+
+from app.services.imap_listener import (
+    EmailReceivedEvent,
+    IMAPListenerService,
+    UIDCheckpointStore,
+    uid_set,
+)
+from app.services.imap_structure import parse_bodystructure, parse_fetch_response
+from imap_stand_in import IMAPStandIn
+
+
+def make_message(i: int) -> bytes:
+    return (
+        f"From: sender{i}@example.com\r\n"
+        f"To: recipient@example.com\r\n"
+        f"Subject: Message {i}\r\n"
+        f"Message-ID: <msg{i}@example.com>\r\n"
+        f"\r\n"
+        f"Body {i}\r\n"
+    ).encode()
+
+
+@pytest.fixture
+async def imap_server():
+    server = await IMAPStandIn().start()
+    yield server
+    await server.stop()
+
+
+def make_listener(server, **kwargs) -> IMAPListenerService:
+    listener = IMAPListenerService(
+        host="127.0.0.1",
+        port=server.port,
+        user=server.user,
+        password=server.password,
+        use_ssl=False,
+        **kwargs,
+    )
+    listener.publish_to_kafka = AsyncMock()
+    return listener
+
+
+def processed_subjects(listener) -> list[str]:
+    return [call.args[0].subject for call in listener.publish_to_kafka.call_args_list]
+
+
+def make_order_message() -> bytes:
+    message = EmailMessage()
+    message["From"] = "customer@example.com"
+    message["To"] = "orders@example.com"
+    message["Subject"] = "Order"
+    message["Message-ID"] = "<order@example.com>"
+    message.set_content("Please see the attached order.")
+    message.add_alternative("<p>Please see the attached order.</p>", subtype="html")
+    message.add_attachment(b"%PDF-1.4 " * 500, maintype="application", subtype="pdf", filename="order.pdf")
+    return message.as_bytes()
 
 
 class TestEmailParsing:
@@ -130,14 +190,25 @@ class TestIMAPConnection:
         assert listener.use_ssl is True
 
     @pytest.mark.asyncio
-    async def test_connect_stub(self):
-        """Test IMAP connection (stub - no real server)."""
-        listener = IMAPListenerService()
+    async def test_connect_selects_mailbox(self, imap_server):
+        """Test IMAP connection against the local stand-in."""
+        listener = make_listener(imap_server)
 
-        # In stub mode, should return True (no actual connection)
-        # TODO: Mock aioimaplib when implementing real connection
         connected = await listener.connect()
+
         assert connected is True
+        assert listener.uidvalidity == imap_server.uidvalidity
+        assert "SELECT INBOX" in imap_server.commands
+        await listener.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_connect_bad_credentials(self, imap_server):
+        """Test failed LOGIN returns False."""
+        listener = make_listener(imap_server)
+        listener.password = "wrong"
+
+        assert await listener.connect() is False
+        assert listener.imap_client is None
 
     @pytest.mark.asyncio
     async def test_disconnect(self):
@@ -202,3 +273,278 @@ class TestEmailReceivedEvent:
         assert isinstance(event.received_at, datetime)
         # Should be recent (within last minute)
         assert (datetime.now(UTC) - event.received_at).total_seconds() < 60
+
+
+class TestUIDSync:
+    """Test UID checkpoint, batched UID FETCH and IDLE push."""
+
+    def test_uid_set_compression(self):
+        """Test sorted UIDs are compressed into ranges."""
+        assert uid_set([1, 2, 3, 7, 9, 10]) == "1:3,7,9:10"
+        assert uid_set([5]) == "5"
+
+    @pytest.mark.asyncio
+    async def test_fetch_in_batches(self, imap_server):
+        """Test new mail is pulled with one UID FETCH per batch."""
+        for i in range(7):
+            imap_server.add_message(make_message(i))
+
+        listener = make_listener(
+            imap_server, initial_sync="all", fetch_batch_size=3, lazy_attachments=False
+        )
+        await listener.connect()
+
+        fetched = await listener.fetch_new_emails()
+
+        assert fetched == 7
+        assert processed_subjects(listener) == [f"Message {i}" for i in range(7)]
+        assert imap_server.fetch_commands() == [
+            "UID FETCH 1:3 (UID BODY.PEEK[])",
+            "UID FETCH 4:6 (UID BODY.PEEK[])",
+            "UID FETCH 7 (UID BODY.PEEK[])",
+        ]
+        assert listener.last_uid == 7
+        await listener.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_checkpoint_survives_restart(self, imap_server, tmp_path):
+        """Test already-seen mail is not re-downloaded after restart."""
+        checkpoint = str(tmp_path / "imap.json")
+        for i in range(3):
+            imap_server.add_message(make_message(i))
+
+        first = make_listener(
+            imap_server, initial_sync="all", checkpoint_path=checkpoint, lazy_attachments=False
+        )
+        await first.connect()
+        await first.fetch_new_emails()
+        await first.disconnect()
+
+        imap_server.add_message(make_message(3))
+        imap_server.commands.clear()
+
+        second = make_listener(
+            imap_server, initial_sync="all", checkpoint_path=checkpoint, lazy_attachments=False
+        )
+        await second.connect()
+        fetched = await second.fetch_new_emails()
+
+        assert fetched == 1
+        assert processed_subjects(second) == ["Message 3"]
+        assert imap_server.fetch_commands() == ["UID FETCH 4 (UID BODY.PEEK[])"]
+        assert UIDCheckpointStore(checkpoint).load(second.checkpoint_key) == (1, 4)
+        await second.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_rejected_publish_does_not_advance_checkpoint(self, imap_server, tmp_path):
+        """Test mail Kafka rejected is refetched instead of skipped."""
+        checkpoint = str(tmp_path / "imap.json")
+        for i in range(3):
+            imap_server.add_message(make_message(i))
+
+        producer = AsyncMock()
+        producer.publish = AsyncMock(return_value=False)
+        listener = IMAPListenerService(
+            host="127.0.0.1",
+            port=imap_server.port,
+            user=imap_server.user,
+            password=imap_server.password,
+            use_ssl=False,
+            kafka_producer=producer,
+            initial_sync="all",
+            checkpoint_path=checkpoint,
+            lazy_attachments=False,
+        )
+        listener.publish_to_kafka = functools.partial(listener.publish_to_kafka, max_retries=1)
+        await listener.connect()
+
+        with pytest.raises(RuntimeError, match="UID 1"):
+            await listener.fetch_new_emails()
+
+        assert UIDCheckpointStore(checkpoint).load(listener.checkpoint_key) == (1, 0)
+        assert listener.stats["errors"] == 1
+
+        producer.publish = AsyncMock(side_effect=[True, False])
+        with pytest.raises(RuntimeError, match="UID 2"):
+            await listener.fetch_new_emails()
+        assert UIDCheckpointStore(checkpoint).load(listener.checkpoint_key) == (1, 1)
+
+        producer.publish = AsyncMock(return_value=True)
+        assert await listener.fetch_new_emails() == 2
+        assert [call.args[0]["subject"] for call in producer.publish.call_args_list] == ["Message 1", "Message 2"]
+        assert UIDCheckpointStore(checkpoint).load(listener.checkpoint_key) == (1, 3)
+        await listener.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_initial_sync_new_skips_backlog(self, imap_server):
+        """Test first start without checkpoint only picks up new mail."""
+        for i in range(5):
+            imap_server.add_message(make_message(i))
+
+        listener = make_listener(imap_server)
+        await listener.connect()
+
+        assert listener.last_uid == 5
+        assert await listener.fetch_new_emails() == 0
+        await listener.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_uidvalidity_change_resyncs(self, imap_server, tmp_path):
+        """Test checkpoint is discarded when UIDVALIDITY changes."""
+        checkpoint = str(tmp_path / "imap.json")
+        for i in range(2):
+            imap_server.add_message(make_message(i))
+
+        first = make_listener(imap_server, initial_sync="all", checkpoint_path=checkpoint)
+        await first.connect()
+        await first.fetch_new_emails()
+        await first.disconnect()
+
+        imap_server.reset_uidvalidity(2)
+
+        second = make_listener(imap_server, initial_sync="all", checkpoint_path=checkpoint)
+        await second.connect()
+
+        assert second.uidvalidity == 2
+        assert await second.fetch_new_emails() == 2
+        await second.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_idle_push_triggers_fetch(self, imap_server):
+        """Test a message delivered during IDLE is fetched within seconds."""
+        listener = make_listener(imap_server)
+        task = asyncio.create_task(listener.listen())
+
+        for _ in range(50):
+            if imap_server.idlers:
+                break
+            await asyncio.sleep(0.02)
+        assert imap_server.idlers
+
+        await imap_server.deliver(make_message(1))
+
+        for _ in range(50):
+            if listener.publish_to_kafka.called:
+                break
+            await asyncio.sleep(0.02)
+
+        assert processed_subjects(listener) == ["Message 1"]
+        assert listener.get_stats()["idle_wakeups"] == 1
+
+        await listener.stop()
+        await asyncio.wait_for(task, timeout=5)
+        assert listener.imap_client is None
+
+
+class TestLazyAttachments:
+    """Test BODYSTRUCTURE-first fetching and lazy attachment handles."""
+
+    def test_parse_bodystructure_sections(self):
+        """Test nested multipart BODYSTRUCTURE is flattened into numbered sections."""
+        lines = [
+            b'1 FETCH (UID 5 RFC822.SIZE 2048 BODYSTRUCTURE ((("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL '
+            b'"7BIT" 10 1)("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE" 20 1) "ALTERNATIVE")'
+            b'("APPLICATION" "PDF" ("NAME" "a.pdf") NIL NIL "BASE64" 1000 NIL ("ATTACHMENT" ("FILENAME" "a.pdf")) NIL) '
+            b'"MIXED"))',
+            b"FETCH completed",
+        ]
+
+        message = parse_fetch_response(lines)[0]
+        parts = parse_bodystructure(message["BODYSTRUCTURE"])
+
+        assert message["UID"] == "5"
+        assert message["RFC822.SIZE"] == "2048"
+        assert [(p.section, p.content_type, p.is_text) for p in parts] == [
+            ("1.1", "text/plain", True),
+            ("1.2", "text/html", True),
+            ("2", "application/pdf", False),
+        ]
+        assert parts[2].filename == "a.pdf"
+        assert parts[2].encoding == "base64"
+
+    @pytest.mark.asyncio
+    async def test_attachment_body_not_fetched_until_read(self, imap_server):
+        """Test only headers, structure and text parts are fetched up front."""
+        imap_server.add_message(make_order_message())
+
+        listener = make_listener(imap_server, initial_sync="all")
+        await listener.connect()
+        await listener.fetch_new_emails()
+
+        event = listener.publish_to_kafka.call_args.args[0]
+        assert event.raw_message is None
+        assert event.body_text.strip() == "Please see the attached order."
+        assert "<p>" in event.body_html
+        assert event.attachments[0]["filename"] == "order.pdf"
+        assert event.attachments[0]["ref"]["section"] == "2"
+        assert imap_server.fetch_commands() == [
+            "UID FETCH 1 (UID RFC822.SIZE BODYSTRUCTURE BODY.PEEK[HEADER])",
+            "UID FETCH 1 (UID BODY.PEEK[1.1] BODY.PEEK[1.2])",
+        ]
+        assert listener.get_stats()["bytes_fetched"] < event.size_bytes / 2
+
+        handle = listener.open_attachment(event.attachments[0])
+        assert not handle.is_loaded
+        assert await handle.read() == b"%PDF-1.4 " * 500
+        await handle.read()
+
+        assert imap_server.fetch_commands()[-1] == "UID FETCH 1 (UID BODY.PEEK[2])"
+        assert len(imap_server.fetch_commands()) == 3
+        assert listener.get_stats()["attachments_fetched"] == 1
+        await listener.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_text_fetch_grouped_by_layout(self, imap_server):
+        """Test messages with the same text sections share one FETCH."""
+        for i in range(3):
+            imap_server.add_message(make_message(i))
+        imap_server.add_message(make_order_message())
+
+        listener = make_listener(imap_server, initial_sync="all")
+        await listener.connect()
+        await listener.fetch_new_emails()
+
+        assert processed_subjects(listener) == ["Message 0", "Message 1", "Message 2", "Order"]
+        assert imap_server.fetch_commands()[1:] == [
+            "UID FETCH 1:3 (UID BODY.PEEK[1])",
+            "UID FETCH 4 (UID BODY.PEEK[1.1] BODY.PEEK[1.2])",
+        ]
+        await listener.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_malformed_messages_skipped_and_checkpointed(self, imap_server, tmp_path):
+        """Test a message without From and one with a bogus charset do not stall the mailbox."""
+        checkpoint = str(tmp_path / "imap.json")
+        imap_server.add_message(make_message(0))
+        imap_server.add_message(b"To: recipient@example.com\r\nSubject: No sender\r\n\r\nBody\r\n")
+        imap_server.add_message(
+            b"From: sender@example.com\r\nTo: recipient@example.com\r\nSubject: Bogus charset\r\n"
+            b"Content-Type: text/plain; charset=x-no-such-charset\r\n\r\nPr\xfcfung\r\n"
+        )
+        imap_server.add_message(make_message(3))
+
+        listener = make_listener(imap_server, initial_sync="all", checkpoint_path=checkpoint)
+        await listener.connect()
+
+        assert await listener.fetch_new_emails() == 4
+
+        assert processed_subjects(listener) == ["Message 0", "Bogus charset", "Message 3"]
+        assert listener.publish_to_kafka.call_args_list[1].args[0].body_text.startswith("Pr�fung")
+        assert listener.stats["errors"] == 1
+        assert UIDCheckpointStore(checkpoint).load(listener.checkpoint_key) == (1, 4)
+        await listener.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_stale_uidvalidity_handle_rejected(self, imap_server):
+        """Test a handle from an older UIDVALIDITY is not served from the new mailbox."""
+        imap_server.add_message(make_order_message())
+
+        listener = make_listener(imap_server, initial_sync="all")
+        await listener.connect()
+        await listener.fetch_new_emails()
+        attachment = listener.publish_to_kafka.call_args.args[0].attachments[0]
+
+        listener.uidvalidity = 99
+        with pytest.raises(LookupError):
+            await listener.open_attachment(attachment).read()
+        await listener.disconnect()
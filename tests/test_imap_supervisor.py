@@ -0,0 +1,269 @@
+"""
+Tests for IMAP Supervisor
+
+Tests:
+- Consistent-hash sharding of mailboxes across pods
+- Per-server connection pool bounds (IDLE + rotating pollers)
+- Jittered reconnect backoff
+- Per-mailbox lag / throughput metrics
+"""
+
+import asyncio
+import json
+import random
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime
+from unittest.mock import AsyncMock
+
+import pytest
+from imap_stand_in import IMAPStandIn
+
+from app.services.imap_listener import reconnect_delay
+from app.services.imap_supervisor import (
+    ConsistentHashRing,
+    IMAPConnectionPool,
+    IMAPSupervisor,
+    MailboxConfig,
+    MailboxMetrics,
+)
+
+
+def make_message(i: int, age_seconds: float = 0) -> bytes:
+    sent_at = datetime.now(UTC) - timedelta(seconds=age_seconds)
+    return (
+        f"From: sender{i}@example.com\r\n"
+        f"To: recipient@example.com\r\n"
+        f"Subject: Message {i}\r\n"
+        f"Message-ID: <msg{i}@example.com>\r\n"
+        f"Date: {format_datetime(sent_at)}\r\n"
+        f"\r\n"
+        f"Body {i}\r\n"
+    ).encode()
+
+
+def mailboxes_for(server: IMAPStandIn, names: list[str]) -> list[MailboxConfig]:
+    return [
+        MailboxConfig(
+            host="127.0.0.1",
+            port=server.port,
+            user=server.user,
+            password=server.password,
+            mailbox=name,
+            use_ssl=False,
+        )
+        for name in names
+    ]
+
+
+def make_supervisor(mailboxes, **kwargs) -> IMAPSupervisor:
+    supervisor = IMAPSupervisor(mailboxes, initial_sync="all", **kwargs)
+    for listener in supervisor.listeners.values():
+        listener.publish_to_kafka = AsyncMock()
+    return supervisor
+
+
+async def wait_until(predicate, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not reached in time")
+        await asyncio.sleep(0.02)
+
+
+@pytest.fixture
+async def imap_server():
+    server = await IMAPStandIn().start()
+    yield server
+    await server.stop()
+
+
+class TestSharding:
+    """Test consistent-hash assignment of mailboxes to pods."""
+
+    def test_every_mailbox_has_exactly_one_owner(self):
+        """Test pods partition the mailbox set."""
+        mailboxes = [
+            MailboxConfig(host=f"imap{d}.example.com", user=f"{name}@d{d}.example.com")
+            for d in range(5)
+            for name in ("sales", "invoices", "support")
+        ]
+        nodes = ["pod-0", "pod-1", "pod-2"]
+
+        owned = [
+            {m.key for m in IMAPSupervisor(mailboxes, node_id=node, nodes=nodes).mailboxes}
+            for node in nodes
+        ]
+
+        assert sum(len(keys) for keys in owned) == len(mailboxes)
+        assert set().union(*owned) == {m.key for m in mailboxes}
+
+    def test_adding_node_moves_few_keys(self):
+        """Test scaling 4 -> 5 pods only reassigns about 1/5 of the mailboxes."""
+        keys = [f"user{i}@example.com/INBOX" for i in range(2000)]
+        before = ConsistentHashRing([f"pod-{i}" for i in range(4)])
+        after = ConsistentHashRing([f"pod-{i}" for i in range(5)])
+
+        moved = sum(before.node_for(k) != after.node_for(k) for k in keys)
+
+        assert moved < len(keys) * 0.3
+        assert all(after.node_for(k) == "pod-4" for k in keys if before.node_for(k) != after.node_for(k))
+
+    def test_unknown_node_rejected(self):
+        """Test a pod name outside the node list is a configuration error."""
+        with pytest.raises(ValueError):
+            IMAPSupervisor([], node_id="pod-9", nodes=["pod-0", "pod-1"])
+
+
+class TestConnectionPool:
+    """Test per-server connection bounds."""
+
+    def test_overflow_mailboxes_are_polled(self, imap_server):
+        """Test mailboxes beyond the pool size share the spare slot."""
+        supervisor = make_supervisor(
+            mailboxes_for(imap_server, ["A", "B", "C", "D"]), max_connections_per_server=3
+        )
+
+        modes = sorted(supervisor.modes.values())
+        assert modes == ["idle", "idle", "poll", "poll"]
+        assert len(supervisor.pools) == 1
+
+    @pytest.mark.asyncio
+    async def test_connections_never_exceed_pool(self, imap_server):
+        """Test all mailboxes catch up while the server sees at most max connections."""
+        for i in range(3):
+            imap_server.add_message(make_message(i))
+
+        supervisor = make_supervisor(
+            mailboxes_for(imap_server, ["A", "B", "C", "D", "E"]),
+            max_connections_per_server=2,
+            poll_interval=0.05,
+        )
+        await supervisor.start()
+
+        await wait_until(
+            lambda: all(m.total == 3 for m in supervisor.metrics.values())
+        )
+        await supervisor.stop()
+
+        assert imap_server.peak_connections <= 2
+        pool = next(iter(supervisor.pools.values()))
+        assert pool.get_stats()["peak_in_use"] <= 2
+        assert pool.get_stats()["in_use"] == 0
+
+    @pytest.mark.asyncio
+    async def test_pool_blocks_when_exhausted(self):
+        """Test acquire waits for a release once max_connections are in use."""
+        pool = IMAPConnectionPool("imap.example.com:993", max_connections=1)
+        await pool.acquire()
+
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        assert pool.get_stats()["waiting"] == 1
+
+        pool.release()
+        await asyncio.wait_for(waiter, timeout=1)
+        assert pool.get_stats()["in_use"] == 1
+
+
+class TestReconnect:
+    """Test jittered reconnect."""
+
+    def test_reconnect_delay_is_jittered_and_capped(self):
+        """Test delays are spread within [0, min(cap, base * 2^attempt)]."""
+        random.seed(1)
+        delays = [reconnect_delay(3, base=1.0, cap=60.0) for _ in range(200)]
+
+        assert all(0 <= d <= 8.0 for d in delays)
+        assert max(delays) - min(delays) > 4.0
+        assert all(reconnect_delay(20, base=1.0, cap=60.0) <= 60.0 for _ in range(50))
+
+    @pytest.mark.asyncio
+    async def test_listener_reconnects_after_server_restart(self):
+        """Test an IDLE mailbox reconnects once the server is back."""
+        server = await IMAPStandIn().start()
+        port = server.port
+        supervisor = make_supervisor(
+            mailboxes_for(server, ["INBOX"]), reconnect_base=0.01, reconnect_max=0.05, timeout=1
+        )
+        await supervisor.start()
+        listener = next(iter(supervisor.listeners.values()))
+        await wait_until(lambda: server.idlers)
+
+        await server.stop()
+        for writer in list(server.idlers):
+            writer.close()
+        await wait_until(lambda: listener.stats["errors"] >= 1)
+
+        restarted = await IMAPStandIn().start(port)
+        restarted.add_message(make_message(1))
+        await wait_until(lambda: listener.stats["connects"] >= 2 and restarted.idlers)
+
+        assert supervisor.metrics[listener.checkpoint_key].total == 1
+
+        await supervisor.stop()
+        await restarted.stop()
+
+
+class TestCheckpoints:
+    """Test checkpoints of many mailboxes in one file."""
+
+    @pytest.mark.asyncio
+    async def test_all_mailboxes_checkpointed_in_shared_file(self, imap_server, tmp_path):
+        """Test every mailbox keeps its checkpoint, including polled ones."""
+        checkpoint = str(tmp_path / "uids.json")
+        for i in range(3):
+            imap_server.add_message(make_message(i))
+
+        supervisor = make_supervisor(
+            mailboxes_for(imap_server, ["A", "B", "C"]),
+            max_connections_per_server=2,
+            poll_interval=0.05,
+            checkpoint_path=checkpoint,
+        )
+        await supervisor.start()
+        await wait_until(lambda: all(m.total == 3 for m in supervisor.metrics.values()))
+        await supervisor.stop()
+
+        with open(checkpoint, encoding="utf-8") as f:
+            saved = json.load(f)
+        assert sorted(saved) == sorted(supervisor.listeners)
+        assert all(entry["last_uid"] == 3 for entry in saved.values())
+
+        restarted = make_supervisor(mailboxes_for(imap_server, ["A", "B", "C"]), checkpoint_path=checkpoint)
+        assert all(restarted.checkpoints.load(key)[1] == 3 for key in restarted.listeners)
+
+
+class TestMetrics:
+    """Test per-mailbox metrics."""
+
+    def test_throughput_window(self):
+        """Test emails/sec only counts the sliding window."""
+        metrics = MailboxMetrics(window=60.0)
+        metrics.started_at -= 120
+        metrics.record(30)
+        metrics._events[0] = (metrics._events[0][0] - 90, 30)
+        metrics.record(60)
+
+        assert metrics.total == 90
+        assert metrics.emails_per_sec() == pytest.approx(1.0, rel=0.01)
+
+    @pytest.mark.asyncio
+    async def test_stats_report_lag_and_throughput(self, imap_server):
+        """Test each mailbox reports emails, lag and backlog."""
+        imap_server.add_message(make_message(1, age_seconds=30))
+
+        supervisor = make_supervisor(mailboxes_for(imap_server, ["A", "B"]))
+        await supervisor.start()
+        await wait_until(lambda: all(m.total == 1 for m in supervisor.metrics.values()))
+
+        stats = supervisor.get_stats()
+        await supervisor.stop()
+
+        assert stats["mailboxes_total"] == 2
+        for mailbox in stats["mailboxes"].values():
+            assert mailbox["mode"] == "idle"
+            assert mailbox["emails"] == 1
+            assert mailbox["emails_per_sec"] > 0
+            assert mailbox["backlog"] == 0
+            assert 29 <= mailbox["lag_seconds"] < 60
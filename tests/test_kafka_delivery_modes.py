@@ -0,0 +1,194 @@
+"""
+Unit Tests for Kafka Producer Delivery Modes
+Tests: idempotent producer, transactional flush, consume-transform-produce,
+against the in-memory broker stand-in (tests/kafka_stand_in.py)
+"""
+
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+from kafka_stand_in import KafkaStandIn
+
+from app.services.kafka_producer import KafkaConfig, KafkaEmailProducer
+
+TOPIC = "emails.raw"
+
+
+async def started_producer(broker: KafkaStandIn, **config) -> KafkaEmailProducer:
+    """KafkaEmailProducer поверх stand-in брокера"""
+    producer = KafkaEmailProducer(KafkaConfig(topic=TOPIC, **config))
+    with patch('app.services.kafka_producer.AIOKafkaProducer', broker.producer):
+        assert await producer.init()
+    return producer
+
+
+def message_ids(values: list) -> list:
+    return [json.loads(value)["email_data"]["message_id"] for value in values]
+
+
+async def publish_all(producer: KafkaEmailProducer, count: int, start: int = 0):
+    for i in range(start, start + count):
+        assert await producer.publish({"message_id": f"m{i}", "from_email": "anna@client.com"})
+
+
+# ==============================================================================
+# TEST: Configuration
+# ==============================================================================
+
+@pytest.mark.asyncio
+async def test_init_passes_delivery_settings():
+    """enable_idempotence / transactional_id передаются в AIOKafkaProducer"""
+
+    broker = KafkaStandIn()
+    producer = await started_producer(broker, transactional_id="email-ingest-0")
+
+    assert producer.producer.idempotent
+    assert producer.producer.transactional_id == "email-ingest-0"
+    assert producer.get_stats()["batch_config"]["delivery"] == "transactional"
+
+    idempotent = await started_producer(broker, enable_idempotence=True)
+    assert idempotent.producer.idempotent
+    assert idempotent.producer.transactional_id is None
+    assert idempotent.get_stats()["batch_config"]["delivery"] == "idempotent"
+
+    await producer.close()
+    await idempotent.close()
+
+
+@pytest.mark.parametrize("config", [{"enable_idempotence": True}, {"transactional_id": "tx-1"}])
+def test_idempotence_requires_acks_all(config):
+    """Idempotent / transactional producer без acks=all - ошибка конфигурации"""
+
+    with pytest.raises(ValueError, match="acks"):
+        KafkaEmailProducer(KafkaConfig(acks="1", **config))
+
+
+@pytest.mark.asyncio
+async def test_publish_transaction_requires_transactional_id():
+    """publish_transaction без transactional_id"""
+
+    producer = await started_producer(KafkaStandIn())
+
+    with pytest.raises(RuntimeError, match="transactional_id"):
+        await producer.publish_transaction([{"message_id": "m0"}], {}, "group")
+
+    await producer.close()
+
+
+# ==============================================================================
+# TEST: Idempotence
+# ==============================================================================
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("enable_idempotence, expected", [
+    (False, ["m0", "m1", "m1", "m2"]),
+    (True, ["m0", "m1", "m2"]),
+])
+async def test_lost_ack_retry(enable_idempotence, expected):
+    """Потерянный ack: внутренний повтор дает дубликат без idempotence"""
+
+    broker = KafkaStandIn()
+    producer = await started_producer(broker, batch_size=3, enable_idempotence=enable_idempotence)
+    broker.fail_next(None, "ack_lost")
+
+    await publish_all(producer, 3)
+
+    assert message_ids(broker.read(TOPIC)) == expected
+    assert producer.stats["events_published"] == 3
+    assert producer.stats["errors"] == 0
+
+    await producer.close()
+
+
+# ==============================================================================
+# TEST: Transactions
+# ==============================================================================
+
+@pytest.mark.asyncio
+async def test_requeue_after_timeout_duplicates_without_transactions():
+    """At-least-once: событие записано, но send упал - повтор дает дубликат"""
+
+    broker = KafkaStandIn()
+    producer = await started_producer(broker, batch_size=3, enable_idempotence=True)
+    broker.fail_next(None, "timeout")
+
+    await publish_all(producer, 3)
+    assert producer.stats["events_requeued"] == 1
+    await producer._flush_batch()
+
+    assert message_ids(broker.read(TOPIC, "read_committed")) == ["m0", "m1", "m2", "m1"]
+
+    await producer.close()
+
+
+@pytest.mark.asyncio
+async def test_transactional_flush_is_exactly_once():
+    """Transactional: ошибка отменяет batch целиком, read_committed видит каждое событие один раз"""
+
+    broker = KafkaStandIn()
+    producer = await started_producer(broker, batch_size=3, transactional_id="email-ingest-0")
+    broker.fail_next(None, "timeout")
+
+    await publish_all(producer, 3)
+
+    assert producer.stats["transactions_aborted"] == 1
+    assert producer.stats["events_requeued"] == 3
+    assert broker.read(TOPIC, "read_committed") == []
+
+    await producer._flush_batch()
+
+    assert message_ids(broker.read(TOPIC, "read_committed")) == ["m0", "m1", "m2"]
+    assert message_ids(broker.read(TOPIC, "read_uncommitted")) == ["m0", "m1", "m2"] * 2
+    assert producer.stats["transactions_committed"] == 1
+    assert producer.stats["events_published"] == 3
+
+    await producer.close()
+
+
+@pytest.mark.asyncio
+async def test_publish_transaction_commits_offsets_atomically():
+    """Consume-transform-produce: события и offsets коммитятся вместе"""
+
+    broker = KafkaStandIn()
+    producer = await started_producer(broker, transactional_id="email-processor-0")
+    outputs = [{"message_id": "out1"}, {"message_id": "out2"}]
+
+    broker.fail_next(None, "error")
+    assert not await producer.publish_transaction(outputs, {("emails.raw", 0): 11}, "processor")
+
+    assert broker.read(TOPIC, "read_committed") == []
+    assert broker.committed_offsets == {}
+
+    assert await producer.publish_transaction(outputs, {("emails.raw", 0): 11}, "processor")
+
+    assert message_ids(broker.read(TOPIC, "read_committed")) == ["out1", "out2"]
+    assert broker.committed_offsets == {"processor": {("emails.raw", 0): 11}}
+    assert producer.stats["transactions_aborted"] == 1
+    assert producer.stats["transactions_committed"] == 1
+    assert producer.stats["events_published"] == 2
+
+    await producer.close()
+
+
+@pytest.mark.asyncio
+async def test_transactions_do_not_overlap():
+    """Flush и publish_transaction одновременно: транзакции по очереди"""
+
+    broker = KafkaStandIn()
+    producer = await started_producer(broker, transactional_id="email-ingest-0")
+    keys = [b"anna@client.com"] * 2
+
+    results = await asyncio.gather(
+        producer._deliver(keys, [b'{"n": 1}', b'{"n": 2}']),
+        producer._deliver(keys, [b'{"n": 3}', b'{"n": 4}']),
+        producer.publish_transaction([{"message_id": "m5"}], {("emails.raw", 0): 1}, "processor"),
+    )
+
+    assert results[:2] == [[None, None], [None, None]]
+    assert results[2] is True
+    assert producer.stats["transactions_committed"] == 3
+    assert len(broker.read(TOPIC, "read_committed")) == 5
+
+    await producer.close()
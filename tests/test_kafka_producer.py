@@ -3,6 +3,7 @@ Unit Tests for Kafka Email Producer
 Tests: initialization, batch publishing, partitioning, stats
 """
 
+import asyncio
 import pytest
 import json
 from datetime import datetime
@@ -33,6 +34,13 @@ def kafka_producer(kafka_config):
     return producer
 
 
+def delivered(*args, **kwargs):
+    """Delivery future отправленного события (как у AIOKafkaProducer.send)"""
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(MagicMock())
+    return future
+
+
 # ==============================================================================
 # TEST: Initialization
 # ==============================================================================
@@ -123,7 +131,7 @@ async def test_publish_batch_auto_flush(kafka_producer):
     """Автоматическая отправка batch при достижении размера"""
     
     kafka_producer.config.batch_size = 2
-    kafka_producer.producer.send_and_wait = AsyncMock()
+    kafka_producer.producer.send = AsyncMock(side_effect=delivered)
     
     email1 = {'from_email': 'test1@example.com', 'subject': 'Test 1', 'imap_id': '1'}
     email2 = {'from_email': 'test2@example.com', 'subject': 'Test 2', 'imap_id': '2'}
@@ -158,7 +166,7 @@ async def test_batch_timeout_flush(kafka_producer):
     """Отправка batch по timeout"""
     
     kafka_producer.config.batch_timeout_seconds = 1
-    kafka_producer.producer.send_and_wait = AsyncMock()
+    kafka_producer.producer.send = AsyncMock(side_effect=delivered)
     
     email = {'from_email': 'test@example.com', 'subject': 'Test', 'imap_id': '1'}
     
@@ -181,14 +189,14 @@ async def test_partition_key_from_email(kafka_producer):
     """Partition key = from_email для ordering"""
     
     kafka_producer.config.batch_size = 1
-    kafka_producer.producer.send_and_wait = AsyncMock()
+    kafka_producer.producer.send = AsyncMock(side_effect=delivered)
     
     email = {'from_email': 'sender@example.com', 'subject': 'Test', 'imap_id': '1'}
     
     await kafka_producer.publish(email)
     
-    # Проверить что send_and_wait вызван с правильным partition key
-    call_args = kafka_producer.producer.send_and_wait.call_args
+    # Проверить что send вызван с правильным partition key
+    call_args = kafka_producer.producer.send.call_args
     assert call_args[1]['key'] == b'sender@example.com'
 
 
@@ -213,7 +221,7 @@ async def test_flush_error_retry(kafka_producer):
     """Retry при ошибке отправки batch"""
     
     kafka_producer.config.batch_size = 1
-    kafka_producer.producer.send_and_wait = AsyncMock(side_effect=Exception("Send failed"))
+    kafka_producer.producer.send = AsyncMock(side_effect=Exception("Send failed"))
     
     email = {'from_email': 'test@example.com', 'subject': 'Test', 'imap_id': '1'}
     
@@ -224,6 +232,189 @@ async def test_flush_error_retry(kafka_producer):
     assert kafka_producer.stats['errors'] > 0
 
 
+@pytest.mark.asyncio
+async def test_flush_retries_only_failed_events(kafka_producer):
+    """В batch возвращаются только неотправленные события, в исходном порядке"""
+    
+    def send(topic, value, key):
+        future = asyncio.get_running_loop().create_future()
+        if json.loads(value)['email_data']['imap_id'] in ('2', '4'):
+            future.set_exception(Exception("NotLeaderForPartition"))
+        else:
+            future.set_result(MagicMock())
+        return future
+    
+    kafka_producer.producer.send = AsyncMock(side_effect=send)
+    for i in range(5):
+        await kafka_producer.publish({'from_email': 'test@example.com', 'imap_id': str(i)})
+    
+    await kafka_producer._flush_batch()
+    
+    assert [event.email_data['imap_id'] for event in kafka_producer.batch] == ['2', '4']
+    assert kafka_producer.stats['events_published'] == 3
+    assert kafka_producer.stats['errors'] == 2
+    assert kafka_producer.stats['events_requeued'] == 2
+    
+    # Повтор отправляет только оставшиеся события
+    kafka_producer.producer.send = AsyncMock(side_effect=delivered)
+    await kafka_producer._flush_batch()
+    
+    assert kafka_producer.producer.send.call_count == 2
+    assert kafka_producer.batch == []
+    assert kafka_producer.stats['events_published'] == 5
+    kafka_producer.batch_timer.cancel()
+
+
+@pytest.mark.asyncio
+async def test_flush_enqueues_before_awaiting_delivery(kafka_producer):
+    """Все события ставятся в очередь до ожидания первой доставки"""
+    
+    pending = []
+    
+    def send(topic, value, key):
+        future = asyncio.get_running_loop().create_future()
+        pending.append(future)
+        return future
+    
+    kafka_producer.producer.send = AsyncMock(side_effect=send)
+    for i in range(3):
+        await kafka_producer.publish({'from_email': f'test{i}@example.com', 'imap_id': str(i)})
+    
+    flush = asyncio.create_task(kafka_producer._flush_batch())
+    await asyncio.sleep(0)
+    
+    # Брокер еще не подтвердил ни одного события, но все уже отправлены
+    assert len(pending) == 3
+    assert not flush.done()
+    
+    for future in pending:
+        future.set_result(MagicMock())
+    await flush
+    
+    assert kafka_producer.stats['events_published'] == 3
+    assert kafka_producer.stats['batches_sent'] == 1
+
+
+# ==============================================================================
+# TEST: Flush Triggers and Backpressure
+# ==============================================================================
+
+class SlowBroker:
+    """send() возвращает futures, которые подтверждаются вручную"""
+    
+    def __init__(self):
+        self.pending = []
+    
+    async def send(self, topic, value=None, key=None):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(future)
+        return future
+    
+    def ack(self, error=None):
+        pending, self.pending = self.pending, []
+        for future in pending:
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(MagicMock())
+
+
+@pytest.mark.asyncio
+async def test_flush_on_batch_bytes(kafka_producer):
+    """Flush при достижении batch_max_bytes раньше batch_size"""
+    
+    kafka_producer.producer.send = AsyncMock(side_effect=delivered)
+    body = 'x' * 600
+    kafka_producer.config.batch_max_bytes = 1000
+    
+    await kafka_producer.publish({'from_email': 'a@example.com', 'imap_id': '1', 'body_text': body})
+    assert kafka_producer.stats['batches_sent'] == 0
+    assert kafka_producer.get_stats()['pending_batch_bytes'] > 600
+    
+    await kafka_producer.publish({'from_email': 'a@example.com', 'imap_id': '2', 'body_text': body})
+    
+    assert kafka_producer.stats['batches_sent'] == 1
+    assert kafka_producer.batch == []
+    assert kafka_producer.batch_bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flush_in_flight(kafka_producer):
+    """Пока flush в полете, новые триггеры не запускают второй flush"""
+    
+    broker = SlowBroker()
+    kafka_producer.producer = broker
+    kafka_producer.config.batch_size = 2
+    
+    await kafka_producer.publish({'from_email': 'a@example.com', 'imap_id': '1'})
+    first = asyncio.create_task(kafka_producer.publish({'from_email': 'a@example.com', 'imap_id': '2'}))
+    await asyncio.sleep(0)
+    assert len(broker.pending) == 2
+    
+    # Batch снова заполнен, таймер тоже срабатывает - но flush уже идет
+    await kafka_producer.publish({'from_email': 'a@example.com', 'imap_id': '3'})
+    await kafka_producer.publish({'from_email': 'a@example.com', 'imap_id': '4'})
+    await kafka_producer._flush_batch()
+    assert len(broker.pending) == 2
+    assert kafka_producer.get_stats()['in_flight'] == 2
+    
+    # После подтверждения тот же flush отправляет следующий batch
+    broker.ack()
+    await asyncio.sleep(0.01)
+    assert len(broker.pending) == 2
+    broker.ack()
+    await first
+    
+    assert kafka_producer.stats['batches_sent'] == 2
+    assert kafka_producer.stats['events_published'] == 4
+    assert kafka_producer.batch == []
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_blocks_publish(kafka_producer):
+    """Заполненный буфер задерживает publish до освобождения места"""
+    
+    broker = SlowBroker()
+    kafka_producer.producer = broker
+    kafka_producer.config.batch_size = 2
+    kafka_producer.config.max_buffered_events = 2
+    
+    await kafka_producer.publish({'from_email': 'a@example.com', 'imap_id': '1'})
+    flush = asyncio.create_task(kafka_producer.publish({'from_email': 'a@example.com', 'imap_id': '2'}))
+    await asyncio.sleep(0)
+    
+    blocked = asyncio.create_task(kafka_producer.publish({'from_email': 'a@example.com', 'imap_id': '3'}))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+    assert kafka_producer.stats['backpressure_waits'] == 1
+    
+    broker.ack()
+    await flush
+    assert await blocked is True
+    assert [event.email_data['imap_id'] for event in kafka_producer.batch] == ['3']
+    kafka_producer.batch_timer.cancel()
+
+
+@pytest.mark.asyncio
+async def test_outage_does_not_grow_buffer(kafka_producer):
+    """При недоступном брокере буфер не растет: publish отклоняется по timeout"""
+    
+    kafka_producer.producer.send = AsyncMock(side_effect=Exception("Broker not available"))
+    kafka_producer.config.batch_size = 2
+    kafka_producer.config.max_buffered_events = 3
+    kafka_producer.config.buffer_full_timeout_seconds = 0.05
+    
+    results = [
+        await kafka_producer.publish({'from_email': 'a@example.com', 'imap_id': str(i)})
+        for i in range(5)
+    ]
+    
+    assert results == [True, True, True, False, False]
+    assert len(kafka_producer.batch) == 3
+    assert kafka_producer.stats['rejected'] == 2
+    kafka_producer.batch_timer.cancel()
+
+
 # ==============================================================================
 # TEST: Statistics
 # ==============================================================================
@@ -255,7 +446,7 @@ async def test_producer_stats(kafka_producer):
 async def test_close_flushes_remaining_events(kafka_producer):
     """Закрытие producer отправляет оставшиеся события"""
     
-    kafka_producer.producer.send_and_wait = AsyncMock()
+    kafka_producer.producer.send = AsyncMock(side_effect=delivered)
     kafka_producer.producer.stop = AsyncMock()
     
     # Добавить события в batch
@@ -276,7 +467,7 @@ async def test_close_flushes_remaining_events(kafka_producer):
 async def test_close_cancels_timer(kafka_producer):
     """Закрытие producer отменяет batch timer"""
     
-    kafka_producer.producer.send_and_wait = AsyncMock()
+    kafka_producer.producer.send = AsyncMock(side_effect=delivered)
     kafka_producer.producer.stop = AsyncMock()
     
     # Создать batch с таймером
@@ -545,3 +545,103 @@ async def test_few_shot_improves_accuracy(llm_classifier, ollama_client, embeddi
     
     # Few-shot should increase confidence
     assert result_with_fs.confidence > result_no_fs.confidence
+
+
+# ==============================================================================
+# TEST: Model Cascade
+# ==============================================================================
+
+@pytest.fixture
+def cascade_classifier(ollama_client, embedding_service):
+    """LLMClassifier с каскадом small → large"""
+    embedding_service.find_similar_emails = AsyncMock(return_value=[])
+    return LLMClassifier(
+        ollama_client,
+        embedding_service,
+        models=["qwen2.5:1.5b", "mistral:7b"],
+        escalation_threshold=0.8
+    )
+
+
+def _cascade_email():
+    return EmailDocument(
+        message_id="test-cascade",
+        from_email="vendor@example.com",
+        to_email="buyer@company.com",
+        subject="Invoice INV-2024-777",
+        body_text="Payment due in 10 days",
+        size_bytes=300,
+        received_at=datetime.utcnow()
+    )
+
+
+@pytest.mark.asyncio
+async def test_cascade_small_model_confident(cascade_classifier, ollama_client):
+    """Уверенный ответ маленькой модели - без эскалации"""
+
+    ollama_client.complete = AsyncMock(return_value=json.dumps({
+        "category": "Invoice", "confidence": 0.93, "reasoning": "Invoice number"
+    }))
+
+    result = await cascade_classifier.classify(_cascade_email(), use_few_shot=False)
+
+    assert result.category == EmailCategory.INVOICE
+    assert ollama_client.complete.call_count == 1
+    assert ollama_client.complete.call_args[1]['model'] == "qwen2.5:1.5b"
+
+    models = cascade_classifier.get_stats()['models']
+    assert models["qwen2.5:1.5b"]['hit_rate'] == 100.0
+    assert models["mistral:7b"]['requests'] == 0
+
+
+@pytest.mark.asyncio
+async def test_cascade_escalates_on_low_confidence(cascade_classifier, ollama_client):
+    """Низкий confidence → эскалация на большую модель"""
+
+    ollama_client.complete = AsyncMock(side_effect=[
+        json.dumps({"category": "Other", "confidence": 0.55, "reasoning": "Unsure"}),
+        json.dumps({"category": "Invoice", "confidence": 0.95, "reasoning": "Invoice"}),
+    ])
+
+    result = await cascade_classifier.classify(_cascade_email(), use_few_shot=False)
+
+    assert result.category == EmailCategory.INVOICE
+    assert [c[1]['model'] for c in ollama_client.complete.call_args_list] == [
+        "qwen2.5:1.5b", "mistral:7b"
+    ]
+
+    models = cascade_classifier.get_stats()['models']
+    assert models["qwen2.5:1.5b"]['escalated'] == 1
+    assert models["qwen2.5:1.5b"]['hit_rate'] == 0
+    assert models["mistral:7b"]['hit_rate'] == 100.0
+
+
+@pytest.mark.asyncio
+async def test_cascade_escalates_on_invalid_json(cascade_classifier, ollama_client):
+    """Невалидный JSON → эскалация на большую модель"""
+
+    ollama_client.complete = AsyncMock(side_effect=[
+        "I think this is an invoice",
+        json.dumps({"category": "Invoice", "confidence": 0.9, "reasoning": "Invoice"}),
+    ])
+
+    result = await cascade_classifier.classify(_cascade_email(), use_few_shot=False)
+
+    assert result.category == EmailCategory.INVOICE
+    assert cascade_classifier.get_stats()['models']["qwen2.5:1.5b"]['invalid'] == 1
+
+
+@pytest.mark.asyncio
+async def test_cascade_keeps_small_answer_if_large_fails(cascade_classifier, ollama_client):
+    """Если большая модель не ответила, используется ответ маленькой"""
+
+    ollama_client.complete = AsyncMock(side_effect=[
+        json.dumps({"category": "Invoice", "confidence": 0.6, "reasoning": "Maybe"}),
+        None,
+    ])
+
+    result = await cascade_classifier.classify(_cascade_email(), use_few_shot=False)
+
+    assert result is not None
+    assert result.confidence == 0.6
+    assert result.requires_review is True
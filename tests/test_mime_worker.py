@@ -0,0 +1,188 @@
+"""
+Tests for off-loop MIME parsing
+
+Tests:
+- Compact, picklable parse result
+- Thread and process pools
+- Bounded queue and histograms
+- Listener integration
+"""
+
+import asyncio
+import pickle
+import threading
+import time
+from email.message import EmailMessage
+from unittest.mock import AsyncMock
+
+import pytest
+from imap_stand_in import IMAPStandIn
+from prometheus_client import REGISTRY
+
+from app.services import mime_worker
+from app.services.imap_listener import IMAPListenerService
+from app.services.mime_worker import MimeParserPool, parse_message
+
+
+def make_message(i: int, attachment_size: int = 1000) -> bytes:
+    message = EmailMessage()
+    message["From"] = f"sender{i}@example.com"
+    message["To"] = "orders@example.com, sales@example.com"
+    message["Subject"] = f"Order {i}"
+    message["Message-ID"] = f"<order{i}@example.com>"
+    message["Date"] = "Mon, 19 Oct 2026 10:00:00 +0000"
+    message.set_content(f"Order number {i}")
+    message.add_attachment(
+        b"x" * attachment_size, maintype="application", subtype="pdf", filename=f"order{i}.pdf"
+    )
+    return message.as_bytes()
+
+
+def sample(name: str) -> float:
+    return REGISTRY.get_sample_value(name) or 0.0
+
+
+class TestParseMessage:
+    """Test the worker-side parse function."""
+
+    def test_compact_picklable_result(self):
+        """Test result carries metadata only and survives pickling."""
+        parsed = parse_message(make_message(1, attachment_size=30000))
+
+        assert pickle.loads(pickle.dumps(parsed)) == parsed
+        assert parsed["subject"] == "Order 1"
+        assert parsed["to_email"] == ["orders@example.com", "sales@example.com"]
+        assert parsed["body_text"].strip() == "Order number 1"
+        assert parsed["sent_at"].year == 2026
+        assert parsed["attachments"][0]["filename"] == "order1.pdf"
+        assert "content" not in parsed["attachments"][0]
+        assert 29000 < parsed["attachments"][0]["size_bytes"] < 31000
+
+
+class TestMimeParserPool:
+    """Test pool execution, backpressure and metrics."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("kind", ["thread", "process"])
+    async def test_pool_matches_inline_parse(self, kind):
+        """Test pool result equals inline parse for both pool kinds."""
+        pool = MimeParserPool(max_workers=2, kind=kind)
+        raw = make_message(2)
+        try:
+            parsed = await pool.parse(raw)
+        finally:
+            pool.close()
+
+        assert parsed == parse_message(raw)
+        assert pool.get_stats()["parsed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_queue_is_bounded(self, monkeypatch):
+        """Test at most max_pending messages are handed to the workers."""
+        lock = threading.Lock()
+        active = 0
+        peak = 0
+
+        def slow_parse(raw, include_attachments=False):
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.05)
+            with lock:
+                active -= 1
+            return {"size_bytes": len(raw)}
+
+        monkeypatch.setattr(mime_worker, "parse_message", slow_parse)
+        pool = MimeParserPool(max_workers=4, kind="thread", max_pending=2)
+        try:
+            await asyncio.gather(*(pool.parse(b"x") for _ in range(6)))
+        finally:
+            pool.close()
+
+        stats = pool.get_stats()
+        assert peak == 2
+        assert stats["parsed"] == 6
+        assert stats["peak_pending"] == 6
+        assert stats["queue_wait_seconds_max"] >= 0.05
+        assert stats["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_histograms_exported(self):
+        """Test parse-time and queue-wait histograms are observed."""
+        parse_before = sample("imap_mime_parse_seconds_count")
+        wait_before = sample("imap_mime_queue_wait_seconds_count")
+
+        pool = MimeParserPool(max_workers=1, kind="thread")
+        try:
+            await asyncio.gather(*(pool.parse(make_message(i)) for i in range(3)))
+        finally:
+            pool.close()
+
+        assert sample("imap_mime_parse_seconds_count") == parse_before + 3
+        assert sample("imap_mime_queue_wait_seconds_count") == wait_before + 3
+
+    @pytest.mark.asyncio
+    async def test_event_loop_stays_responsive(self):
+        """Test the loop keeps running other tasks while large messages parse."""
+        messages = [make_message(i, attachment_size=2_000_000) for i in range(4)]
+        ticks = 0
+        done = False
+
+        async def ticker():
+            nonlocal ticks
+            while not done:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        pool = MimeParserPool(max_workers=2, kind="process")
+        task = asyncio.create_task(ticker())
+        try:
+            parsed = await asyncio.gather(*(pool.parse(raw) for raw in messages))
+        finally:
+            done = True
+            await task
+            pool.close()
+
+        assert [p["subject"] for p in parsed] == [f"Order {i}" for i in range(4)]
+        assert ticks > 1
+
+    def test_unknown_kind_rejected(self):
+        with pytest.raises(ValueError):
+            MimeParserPool(kind="fiber")
+
+
+class TestListenerIntegration:
+    """Test IMAPListenerService with a parser pool."""
+
+    @pytest.mark.asyncio
+    async def test_full_fetch_parses_in_pool(self):
+        """Test the full BODY[] path parses each batch through the pool."""
+        server = await IMAPStandIn().start()
+        for i in range(5):
+            server.add_message(make_message(i))
+
+        pool = MimeParserPool(max_workers=2, kind="thread")
+        listener = IMAPListenerService(
+            host="127.0.0.1",
+            port=server.port,
+            user=server.user,
+            password=server.password,
+            use_ssl=False,
+            initial_sync="all",
+            lazy_attachments=False,
+            parser_pool=pool,
+        )
+        listener.publish_to_kafka = AsyncMock()
+
+        try:
+            await listener.connect()
+            assert await listener.fetch_new_emails() == 5
+            await listener.disconnect()
+        finally:
+            pool.close()
+            await server.stop()
+
+        subjects = [call.args[0].subject for call in listener.publish_to_kafka.call_args_list]
+        assert subjects == [f"Order {i}" for i in range(5)]
+        assert pool.get_stats()["parsed"] == 5
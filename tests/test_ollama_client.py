@@ -0,0 +1,278 @@
+"""
+Unit Tests for Ollama HTTP Client
+Tests: streaming completion, early cancellation, streaming metrics, warm-up
+"""
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.ollama_client import OllamaClient
+
+# ==============================================================================
+# Helpers
+# ==============================================================================
+
+class FakeStreamContent:
+    """Эмуляция aiohttp StreamReader: NDJSON строки"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.consumed = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.consumed >= len(self.lines):
+            raise StopAsyncIteration
+        line = self.lines[self.consumed]
+        self.consumed += 1
+        return line
+
+
+class FakeResponse:
+    """Эмуляция aiohttp ClientResponse как async context manager"""
+
+    def __init__(self, status=200, lines=None):
+        self.status = status
+        self.content = FakeStreamContent(lines or [])
+        self.close = MagicMock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class WarmResponse(FakeResponse):
+    """Ответ на warm-up запрос"""
+
+    async def read(self):
+        return b"{}"
+
+
+def ndjson_chunks(tokens):
+    """Построить NDJSON поток Ollama /api/chat"""
+    lines = [
+        json.dumps({"message": {"role": "assistant", "content": t}, "done": False}).encode() + b"\n"
+        for t in tokens
+    ]
+    lines.append(json.dumps({"message": {"content": ""}, "done": True, "eval_count": len(tokens)}).encode() + b"\n")
+    return lines
+
+
+@pytest.fixture
+def ollama_client():
+    """OllamaClient с mocked session"""
+    client = OllamaClient(host="http://localhost:11434", model="mistral:7b", max_retries=2)
+    client.session = MagicMock()
+    return client
+
+
+# ==============================================================================
+# TEST: Streaming completion
+# ==============================================================================
+
+@pytest.mark.asyncio
+async def test_complete_stream_yields_tokens(ollama_client):
+    """Stream отдает токены по мере поступления"""
+
+    response = FakeResponse(lines=ndjson_chunks(["{", "\"category\"", ": \"Invoice\"", "}"]))
+    ollama_client.session.post = MagicMock(return_value=response)
+
+    tokens = [t async for t in ollama_client.complete_stream("classify", system="sys")]
+
+    assert "".join(tokens) == '{"category": "Invoice"}'
+    payload = ollama_client.session.post.call_args[1]["json"]
+    assert payload["stream"] is True
+    assert payload["messages"][0]["role"] == "system"
+    response.close.assert_not_called()
+
+    stats = ollama_client.get_stats()
+    assert stats["successful"] == 1
+    assert stats["streaming"]["streams"] == 1
+    assert stats["streaming"]["tokens"] == 4
+    assert stats["streaming"]["cancelled"] == 0
+
+
+@pytest.mark.asyncio
+async def test_complete_stream_early_cancellation_closes_response(ollama_client):
+    """Досрочное закрытие генератора закрывает HTTP ответ"""
+
+    response = FakeResponse(lines=ndjson_chunks(["a", "b", "c", "d", "e"]))
+    ollama_client.session.post = MagicMock(return_value=response)
+
+    stream = ollama_client.complete_stream("prompt")
+    received = []
+    async for token in stream:
+        received.append(token)
+        if len(received) == 2:
+            break
+    await stream.aclose()
+
+    assert received == ["a", "b"]
+    response.close.assert_called_once()
+    assert response.content.consumed == 2
+
+    stats = ollama_client.get_stats()
+    assert stats["streaming"]["cancelled"] == 1
+    assert stats["streaming"]["tokens"] == 2
+    assert stats["successful"] == 0
+
+
+@pytest.mark.asyncio
+async def test_complete_stream_without_done_counted_as_failed(ollama_client):
+    """Stream, оборванный до chunk с done: true, - ошибка, а не успех"""
+
+    response = FakeResponse(lines=ndjson_chunks(["a", "b", "c"])[:-1])
+    ollama_client.session.post = MagicMock(return_value=response)
+
+    tokens = [t async for t in ollama_client.complete_stream("prompt")]
+
+    assert tokens == ["a", "b", "c"]
+    stats = ollama_client.get_stats()
+    assert stats["successful"] == 0
+    assert stats["failed"] == 1
+    assert stats["streaming"]["truncated"] == 1
+    assert stats["streaming"]["cancelled"] == 0
+
+
+@pytest.mark.asyncio
+async def test_complete_stream_retries_on_error_status(ollama_client, monkeypatch):
+    """Retry при non-200 статусе до первого токена"""
+
+    async def no_sleep(_):
+        return None
+
+    monkeypatch.setattr("app.services.ollama_client.asyncio.sleep", no_sleep)
+
+    responses = [FakeResponse(status=503), FakeResponse(lines=ndjson_chunks(["ok"]))]
+    ollama_client.session.post = MagicMock(side_effect=responses)
+
+    tokens = [t async for t in ollama_client.complete_stream("prompt")]
+
+    assert tokens == ["ok"]
+    assert ollama_client.session.post.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_complete_stream_gives_up_after_max_retries(ollama_client, monkeypatch):
+    """После max_retries stream завершается без токенов"""
+
+    async def no_sleep(_):
+        return None
+
+    monkeypatch.setattr("app.services.ollama_client.asyncio.sleep", no_sleep)
+    ollama_client.session.post = MagicMock(side_effect=lambda *a, **kw: FakeResponse(status=500))
+
+    tokens = [t async for t in ollama_client.complete_stream("prompt")]
+
+    assert tokens == []
+    assert ollama_client.session.post.call_count == ollama_client.max_retries
+
+
+@pytest.mark.asyncio
+async def test_stream_metrics_ttft_and_throughput(ollama_client):
+    """TTFT и tokens/sec считаются и сбрасываются"""
+
+    ollama_client.session.post = MagicMock(
+        return_value=FakeResponse(lines=ndjson_chunks(["x"] * 10))
+    )
+
+    async for _ in ollama_client.complete_stream("prompt"):
+        pass
+
+    streaming = ollama_client.get_stats()["streaming"]
+    assert streaming["avg_ttft_ms"] >= 0
+    assert streaming["tokens_per_sec"] >= 0
+
+    ollama_client.reset_stats()
+    assert ollama_client.get_stats()["streaming"]["streams"] == 0
+
+
+# ==============================================================================
+# TEST: Warm-up and keep-alive
+# ==============================================================================
+
+@pytest.mark.asyncio
+async def test_warmup_loads_chat_and_embedding_models(ollama_client):
+    """Warm-up загружает обе модели и передает keep_alive"""
+
+    ollama_client.keep_alive = "30m"
+    ollama_client.session.post = MagicMock(side_effect=lambda *a, **kw: WarmResponse(200))
+
+    assert ollama_client.models_warm is False
+    assert await ollama_client.warmup() is True
+    assert ollama_client.models_warm is True
+
+    calls = {c[0][0]: c[1]["json"] for c in ollama_client.session.post.call_args_list}
+    assert calls["http://localhost:11434/api/generate"]["model"] == "mistral:7b"
+    assert calls["http://localhost:11434/api/embed"]["model"] == "nomic-embed-text:latest"
+    assert all(p["keep_alive"] == "30m" for p in calls.values())
+
+
+@pytest.mark.asyncio
+async def test_warmup_failure_keeps_models_cold(ollama_client):
+    """Если одна из моделей не загрузилась, models_warm = False"""
+
+    def post(url, **kwargs):
+        return WarmResponse(404 if url.endswith("/api/embed") else 200)
+
+    ollama_client.session.post = MagicMock(side_effect=post)
+
+    assert await ollama_client.warmup() is False
+    assert ollama_client.get_stats()["models_warm"] is False
+
+
+@pytest.mark.asyncio
+async def test_keep_alive_sent_with_completion(ollama_client):
+    """keep_alive добавляется в chat payload"""
+
+    ollama_client.keep_alive = "24h"
+    ollama_client.session.post = MagicMock(return_value=FakeResponse(lines=ndjson_chunks(["ok"])))
+
+    async for _ in ollama_client.complete_stream("prompt"):
+        pass
+
+    assert ollama_client.session.post.call_args[1]["json"]["keep_alive"] == "24h"
+
+
+@pytest.mark.asyncio
+async def test_keep_warm_task_cancelled_on_close(ollama_client):
+    """Фоновый keep-warm task останавливается при close()"""
+
+    ollama_client.keep_warm_interval = 3600
+    ollama_client.session.post = MagicMock(side_effect=lambda *a, **kw: WarmResponse(200))
+    ollama_client.session.close = AsyncMock()
+
+    ollama_client.keep_warm_task = asyncio.create_task(ollama_client._keep_warm_loop())
+    await asyncio.sleep(0.01)
+
+    assert ollama_client.models_warm is True
+
+    await ollama_client.close()
+
+    assert ollama_client.keep_warm_task.done()
+
+
+@pytest.mark.asyncio
+async def test_failed_warmup_retried_until_models_load(ollama_client):
+    """Ollama еще стартует: warm-up повторяется и без keep_warm_interval"""
+
+    ollama_client.keep_warm_interval = 0
+    ollama_client.warmup_retry_seconds = 0.001
+    responses = iter([503, 503, 503, 503])
+
+    def post(url, **kwargs):
+        return WarmResponse(next(responses, 200))
+
+    ollama_client.session.post = MagicMock(side_effect=post)
+
+    await asyncio.wait_for(ollama_client._keep_warm_loop(), timeout=5)
+
+    assert ollama_client.models_warm is True
+    assert ollama_client.session.post.call_count == 6
@@ -0,0 +1,242 @@
+"""
+Tests for quoted-reply and signature stripping
+
+Tests:
+- Quoted history (">" prefixes, "On ... wrote:", Outlook and Russian headers)
+- Signatures, sign-offs and disclaimers
+- Forwards and prose after a sign-off are kept
+- new_content on ingested events, size metrics, downstream use
+"""
+
+from datetime import datetime
+from email.message import EmailMessage
+from unittest.mock import AsyncMock
+
+import pytest
+from imap_stand_in import IMAPStandIn
+from prometheus_client import REGISTRY
+
+from app.models.email_models import EmailCategory, EmailDocument
+from app.services.imap_listener import IMAPListenerService
+from app.services.mime_worker import MimeParserPool, parse_message
+from app.services.reply_stripper import strip_reply
+from app.services.rules_classifier import RulesEngine
+from app.services.rules_loader import RulesConfiguration
+
+SUPPORT_REPLY = """Hello, the web portal is not working, I cannot log in.
+Error 500 since this morning. Please help.
+
+Best regards,
+Anna Smirnova
+Client Services, Acme LLC
++7 495 123-45-67
+
+On Mon, Oct 19, 2026 at 10:00 AM Billing <billing@example.com> wrote:
+> Invoice INV-2024-0098
+> Total amount: €1500. VAT 20%. Payment due within 30 days.
+> Please see attached invoice for amount $5000.
+"""
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestStripReply:
+    """Test new content extraction."""
+
+    def test_top_posted_reply(self):
+        """Test text above "On ... wrote:" is kept, signature and history go."""
+        assert strip_reply(SUPPORT_REPLY) == (
+            "Hello, the web portal is not working, I cannot log in.\n"
+            "Error 500 since this morning. Please help."
+        )
+
+    def test_wrapped_gmail_header(self):
+        """Test an "On ... wrote:" header wrapped over two lines."""
+        body = "Looks good.\n\nOn Mon, Oct 19, 2026 at 10:00 AM John Smith <john@example.com>\nwrote:\n> earlier\n"
+
+        assert strip_reply(body) == "Looks good."
+
+    def test_outlook_original_message(self):
+        """Test "-----Original Message-----" and Russian sign-off."""
+        body = (
+            "Добрый день!\n\nПрошу выставить счет по заказу №55.\n\nС уважением,\nМария\n\n"
+            "-----Original Message-----\nFrom: Sales\nSent: Monday, October 19, 2026 10:00 AM\n"
+            "Subject: Quote\nOld quote text\n"
+        )
+
+        assert strip_reply(body) == "Добрый день!\n\nПрошу выставить счет по заказу №55."
+
+    def test_russian_outlook_header_block(self):
+        """Test От:/Отправлено: header block without a separator line."""
+        body = (
+            "Спасибо, получили.\n\nОт: Иван Иванов <ivan@example.com>\n"
+            "Отправлено: 19 октября 2026 г. 10:00\nКому: sales@example.com\nТема: Заказ\nСтарый текст\n"
+        )
+
+        assert strip_reply(body) == "Спасибо, получили."
+
+    def test_russian_gmail_header(self):
+        """Test "пн, 19 окт. 2026 г. в 10:00, Иван <...>:" header."""
+        body = "Оплату подтверждаю.\n\nпн, 19 окт. 2026 г. в 10:00, Иван <ivan@example.com>:\n> Отправляю счет\n"
+
+        assert strip_reply(body) == "Оплату подтверждаю."
+
+    def test_inline_answers_kept(self):
+        """Test answers interleaved with ">" quotes survive."""
+        body = (
+            "On Mon, Oct 19, 2026 John <john@example.com> wrote:\n"
+            "> What is the price?\n100 EUR.\n> And delivery?\nTwo weeks.\n"
+        )
+
+        assert strip_reply(body) == "100 EUR.\nTwo weeks."
+
+    def test_signature_separator_and_disclaimer(self):
+        """Test "-- " signatures, mobile footers and disclaimers are cut."""
+        assert strip_reply("Счет получили, оплатим завтра.\n-- \nИван\n+7 999 000-00-00") == (
+            "Счет получили, оплатим завтра."
+        )
+        assert strip_reply("Approved.\n\nSent from my iPhone") == "Approved."
+        assert strip_reply(
+            "Please review the attached contract.\n\n"
+            "This email and any attachments are confidential and intended solely for the addressee."
+        ) == "Please review the attached contract."
+
+    def test_prose_after_sign_off_kept(self):
+        """Test "Thanks!" followed by sentences is not a signature."""
+        body = "Hi,\nThanks!\nWe received the goods but 3 items are broken.\nPlease advise."
+
+        assert strip_reply(body) == body
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            "Hi Anna,\nThanks!\nPlease find invoice #4521 attached, total 1500 USD.\nPayment due 2026-11-01.",
+            "Добрый день,\nСпасибо!\nСчет № 4521 во вложении, сумма 1500 руб.\nОплата до 01.11.2026.",
+            "Hello team,\nThank you.\nOrder PO-778: 40 units of SKU 1120, delivery to Berlin\nShip by 2026-11-05",
+        ],
+    )
+    def test_numbers_after_early_sign_off_kept(self, body):
+        """Test invoice/PO numbers after an early "Thanks" are content, not a signature."""
+        assert strip_reply(body) == body
+
+    def test_contact_lines_after_sign_off_cut(self):
+        """Test phone, email and URL lines still count as a signature."""
+        body = (
+            "Invoice 4521 is paid.\n\nBest regards,\nAnna Smirnova\nHead of Accounts Payable\n"
+            "Tel: 495 123-45-67\nanna.smirnova@client.com\nhttps://client.com"
+        )
+
+        assert strip_reply(body) == "Invoice 4521 is paid."
+
+    def test_forward_kept(self):
+        """Test forwarded messages stay: the forward is the content."""
+        body = (
+            "FYI\n\n---------- Forwarded message ---------\nFrom: Vendor <v@example.com>\n"
+            "Date: Mon, Oct 19, 2026\nSubject: Invoice\n\nInvoice INV-2024-0098, total 1500 EUR.\n"
+        )
+
+        assert "INV-2024-0098" in strip_reply(body)
+
+    def test_only_quotes_falls_back_to_body(self):
+        """Test an email that is nothing but a quote keeps its body."""
+        assert strip_reply("> quoted only\n") == "> quoted only"
+        assert strip_reply("") == ""
+
+
+class TestNewContentDownstream:
+    """Test new_content on events, metrics and in classification."""
+
+    def test_parse_message_sets_new_content(self):
+        """Test the worker parse result carries both the full body and new content."""
+        message = EmailMessage()
+        message["From"] = "anna@client.com"
+        message["To"] = "support@example.com"
+        message["Subject"] = "Re: Invoice INV-2024-0098"
+        message.set_content(SUPPORT_REPLY)
+
+        parsed = parse_message(message.as_bytes())
+
+        assert parsed["body_text"].strip() == SUPPORT_REPLY.strip()
+        assert parsed["new_content"] == strip_reply(SUPPORT_REPLY)
+
+    @pytest.mark.asyncio
+    async def test_html_only_reply_gets_new_content(self):
+        """Test new_content is extracted after HTML conversion in the pool."""
+        message = EmailMessage()
+        message["From"] = "anna@client.com"
+        message["To"] = "support@example.com"
+        message["Subject"] = "Re: Order"
+        message.set_content(
+            "<p>Confirmed.</p><div>On Mon, Oct 19, 2026 Sales &lt;s@example.com&gt; wrote:</div>"
+            "<blockquote>Old order details</blockquote>",
+            subtype="html",
+        )
+
+        pool = MimeParserPool(max_workers=1, kind="thread")
+        try:
+            parsed = await pool.parse(message.as_bytes())
+        finally:
+            pool.close()
+
+        assert "Old order details" in parsed["body_text"]
+        assert parsed["new_content"] == "Confirmed."
+
+    @pytest.mark.asyncio
+    async def test_listener_records_size_metrics(self):
+        """Test published events carry new_content and sizes are counted."""
+        body_before = sample("email_body_chars_total", stage="body")
+        new_before = sample("email_body_chars_total", stage="new_content")
+
+        message = EmailMessage()
+        message["From"] = "anna@client.com"
+        message["To"] = "support@example.com"
+        message["Subject"] = "Re: Invoice INV-2024-0098"
+        message["Message-ID"] = "<reply1@client.com>"
+        message.set_content(SUPPORT_REPLY)
+
+        server = await IMAPStandIn().start()
+        server.add_message(message.as_bytes())
+        listener = IMAPListenerService(
+            host="127.0.0.1",
+            port=server.port,
+            user=server.user,
+            password=server.password,
+            use_ssl=False,
+            kafka_producer=AsyncMock(),
+            initial_sync="all",
+        )
+        listener.producer.publish.return_value = True
+
+        try:
+            await listener.connect()
+            await listener.fetch_new_emails()
+            await listener.disconnect()
+        finally:
+            await server.stop()
+
+        event = listener.producer.publish.call_args.args[0]
+        stats = listener.get_stats()
+        assert event["new_content"] == strip_reply(SUPPORT_REPLY)
+        assert stats["new_content_chars"] == len(event["new_content"])
+        assert stats["body_chars"] > 3 * stats["new_content_chars"]
+        assert sample("email_body_chars_total", stage="body") == body_before + stats["body_chars"]
+        assert sample("email_body_chars_total", stage="new_content") == new_before + stats["new_content_chars"]
+
+    def test_rules_ignore_quoted_history(self):
+        """Test a support reply quoting an invoice is not classified as an invoice."""
+        engine = RulesEngine(RulesConfiguration("config/classification_rules.yaml"))
+        email = EmailDocument(
+            message_id="reply1@client.com",
+            from_email="anna@client.com",
+            to_email="support@company.com",
+            subject="Re: your portal",
+            body_text=SUPPORT_REPLY,
+            received_at=datetime.utcnow(),
+        )
+        stripped = email.model_copy(update={"new_content": strip_reply(SUPPORT_REPLY)})
+
+        assert email.content_text == SUPPORT_REPLY
+        assert engine.classify(email).category == EmailCategory.INVOICE
+        assert engine.classify(stripped).category == EmailCategory.SUPPORT
@@ -0,0 +1,278 @@
+"""
+Tests for thread-aware classification
+
+Tests:
+- In-Reply-To / References parsing and thread roots
+- ThreadIndex LRU, expiry and DB fallback
+- EmailClassifierService inheriting the thread category (Stage 0)
+- Pipeline passing thread roots from ingested events
+"""
+
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from email.message import EmailMessage
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.api.email_pipelines import EmailPipelineService
+from app.services.email_classifier import Classification, EmailCategory, EmailClassifierService
+from app.services.imap_listener import EmailReceivedEvent
+from app.services.mime_worker import parse_message
+from app.services.thread_index import ThreadIndex, parse_message_ids, thread_root
+
+INVOICE_TEXT = "Please find attached invoice INV-123456. Total amount: $1,234.56. Payment due 2026-11-30."
+
+
+class ThreadTable:
+    """email_threads stand-in behind a get_session() provider."""
+
+    def __init__(self):
+        self.rows = {}
+        self.fail = False
+
+    @asynccontextmanager
+    async def get_session(self):
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        session = AsyncMock()
+        session.execute.side_effect = self._execute
+        yield session
+
+    async def _execute(self, statement, params):
+        sql = str(statement)
+        result = AsyncMock()
+        if sql.strip().startswith("SELECT"):
+            row = self.rows.get(params["root"])
+            result.fetchone = lambda: row
+            return result
+
+        previous = self.rows.get(params["root"])
+        self.rows[params["root"]] = (
+            params["category"],
+            params["confidence"],
+            params["message_id"],
+            previous[3] + 1 if previous else 1,
+            params["updated_at"],
+        )
+        return result
+
+
+def reply_message(message_id: str, parent: str, references: list[str]) -> bytes:
+    message = EmailMessage()
+    message["From"] = "customer@example.com"
+    message["To"] = "billing@example.com"
+    message["Subject"] = "Re: Invoice INV-123456"
+    message["Message-ID"] = f"<{message_id}>"
+    message["In-Reply-To"] = f"<{parent}>"
+    message["References"] = " ".join(f"<{ref}>" for ref in references)
+    message.set_content("Thanks, we will pay on Friday.")
+    return message.as_bytes()
+
+
+class TestThreadHeaders:
+    """Test header parsing and thread roots."""
+
+    def test_parse_message_ids(self):
+        """Test bracketed, folded and bracket-less header values."""
+        assert parse_message_ids("<a@x>\n <b@y>  <c@z>") == ["a@x", "b@y", "c@z"]
+        assert parse_message_ids("bare@x") == ["bare@x"]
+        assert parse_message_ids(None) == []
+
+    def test_thread_root(self):
+        """Test References[0] wins, then In-Reply-To, then the email itself."""
+        assert thread_root("c@x", "b@x", ["a@x", "b@x"]) == "a@x"
+        assert thread_root("c@x", "b@x", []) == "b@x"
+        assert thread_root("c@x") == "c@x"
+
+    def test_ingestion_captures_threading_headers(self):
+        """Test parse_message puts In-Reply-To and References on the event."""
+        parsed = parse_message(reply_message("m3@example.com", "m2@example.com", ["m1@example.com", "m2@example.com"]))
+        event = EmailReceivedEvent(**parsed)
+
+        assert event.in_reply_to == "m2@example.com"
+        assert event.references == ["m1@example.com", "m2@example.com"]
+
+
+class TestThreadIndex:
+    """Test the LRU and its DB backing."""
+
+    @pytest.mark.asyncio
+    async def test_lru_is_bounded(self):
+        """Test the least recently used thread is evicted at capacity."""
+        index = ThreadIndex(capacity=2)
+        await index.record("a", "invoice", 0.9)
+        await index.record("b", "invoice", 0.9)
+        await index.get("a")
+        await index.record("c", "invoice", 0.9)
+
+        assert list(index.threads) == ["a", "c"]
+        assert await index.get("b") is None
+        assert index.get_stats()["evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_record_counts_messages(self):
+        """Test each record updates the category and counts thread messages."""
+        index = ThreadIndex()
+        await index.record("root", "invoice", 0.9, "m1")
+        await index.record("root", "support_request", 0.95, "m2")
+
+        thread = await index.get("root")
+        assert (thread.category, thread.last_message_id, thread.message_count) == ("support_request", "m2", 2)
+
+    @pytest.mark.asyncio
+    async def test_idle_threads_are_not_inherited(self):
+        """Test threads older than max_age_days are ignored."""
+        index = ThreadIndex(max_age_days=30)
+        await index.record("root", "invoice", 0.9)
+        index.threads["root"].updated_at = datetime.now(UTC) - timedelta(days=31)
+
+        assert await index.get("root") is None
+        assert index.get_stats()["expired"] == 1
+
+    @pytest.mark.asyncio
+    async def test_db_survives_restart(self):
+        """Test a new index (empty LRU) finds the thread in the table."""
+        table = ThreadTable()
+        await ThreadIndex(db=table).record("root", "invoice", 0.9, "m1")
+
+        index = ThreadIndex(db=table)
+        thread = await index.get("root")
+
+        assert thread.category == "invoice"
+        assert index.get_stats()["db_hits"] == 1
+        await index.get("root")
+        assert index.get_stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_db_errors_are_misses(self):
+        """Test an unavailable DB degrades to the in-memory index."""
+        table = ThreadTable()
+        table.fail = True
+        index = ThreadIndex(db=table)
+
+        await index.record("root", "invoice", 0.9)
+        assert await index.get("other") is None
+        assert (await index.get("root")).category == "invoice"
+        assert index.get_stats()["db_errors"] == 2
+
+
+def invoice_rules(classifier: EmailClassifierService) -> EmailClassifierService:
+    """Make Stage 1 return a confident invoice classification."""
+    classifier.rules_classify = MagicMock(
+        return_value=Classification(
+            category=EmailCategory.INVOICE,
+            confidence=0.95,
+            method="rules",
+            requires_erp_action=True,
+            erp_action_type="update_invoice",
+        )
+    )
+    return classifier
+
+
+class TestThreadInheritance:
+    """Test Stage 0 in EmailClassifierService."""
+
+    @pytest.mark.asyncio
+    async def test_reply_inherits_thread_category(self):
+        """Test a follow-up skips rules and LLM and keeps the thread category."""
+        classifier = invoice_rules(EmailClassifierService(thread_index=ThreadIndex()))
+        first = await classifier.classify(INVOICE_TEXT, "Invoice INV-123456", thread_root="m1", message_id="m1")
+
+        classifier.rules_classify.side_effect = AssertionError("rules must not run")
+        classifier.llm_classify = AsyncMock(side_effect=AssertionError("LLM must not run"))
+        reply = await classifier.classify("Thanks, we will pay on Friday.", "Re: Invoice", thread_root="m1", message_id="m2")
+
+        assert first.method == "rules"
+        assert reply.method == "thread"
+        assert reply.category == EmailCategory.INVOICE
+        assert reply.confidence == first.confidence
+        # No new entities in the reply: the thread's ERP action is not repeated
+        assert reply.requires_erp_action is False
+        assert classifier.get_stats()["by_method"] == {"thread": 1, "rules": 1, "llm": 0}
+        assert classifier.get_stats()["thread_index"]["threads_cached"] == 1
+
+    @pytest.mark.asyncio
+    async def test_reply_with_entities_requests_erp_action(self):
+        """Test an inherited follow-up carrying a new document number triggers ERP."""
+        classifier = invoice_rules(EmailClassifierService(thread_index=ThreadIndex()))
+        await classifier.classify(INVOICE_TEXT, "Invoice INV-123456", thread_root="m1")
+
+        reply = await classifier.classify("Corrected invoice INV-123457 attached.", "Re: Invoice", thread_root="m1")
+
+        assert reply.method == "thread"
+        assert reply.entities["invoice_number"] == "INV-123457"
+        assert reply.requires_erp_action is True
+        assert reply.erp_action_type == "update_invoice"
+
+    @pytest.mark.asyncio
+    async def test_low_confidence_thread_is_reclassified(self):
+        """Test threads classified below the threshold are not inherited."""
+        index = ThreadIndex()
+        await index.record("m1", "sales_inquiry", 0.6)
+        classifier = invoice_rules(EmailClassifierService(thread_index=index))
+
+        reply = await classifier.classify(INVOICE_TEXT, "Invoice INV-123456", thread_root="m1")
+
+        assert reply.method == "rules"
+        assert (await index.get("m1")).category == "invoice"
+
+    @pytest.mark.asyncio
+    async def test_threshold_is_configurable(self):
+        """Test thread_confidence_threshold lets LLM-grade threads be inherited."""
+        index = ThreadIndex()
+        await index.record("m1", "sales_inquiry", 0.75)
+        classifier = EmailClassifierService(thread_index=index, thread_confidence_threshold=0.7)
+
+        reply = await classifier.classify("Sounds good, send the contract.", "Re: Pricing", thread_root="m1")
+
+        assert reply.method == "thread"
+        assert reply.category == EmailCategory.SALES_INQUIRY
+
+    @pytest.mark.asyncio
+    async def test_forward_is_reclassified(self):
+        """Test forwards inside a thread go through rules."""
+        index = ThreadIndex()
+        await index.record("m1", "support_request", 0.9)
+        classifier = invoice_rules(EmailClassifierService(thread_index=index))
+
+        result = await classifier.classify(INVOICE_TEXT, "Fwd: Invoice INV-123456", thread_root="m1")
+
+        assert result.method == "rules"
+        assert result.category == EmailCategory.INVOICE
+
+    @pytest.mark.asyncio
+    async def test_without_thread_index_nothing_changes(self):
+        """Test the classifier behaves as before when no index is configured."""
+        classifier = invoice_rules(EmailClassifierService())
+
+        first = await classifier.classify(INVOICE_TEXT, "Invoice", thread_root="m1")
+        second = await classifier.classify("Thanks.", "Re: Invoice", thread_root="m1")
+
+        assert first.method == second.method == "rules"
+        assert "thread_index" not in classifier.get_stats()
+
+    @pytest.mark.asyncio
+    async def test_pipeline_threads_ingested_events(self):
+        """Test the pipeline roots replies at References[0] so they inherit."""
+        classifier = invoice_rules(EmailClassifierService(thread_index=ThreadIndex()))
+        pipeline = EmailPipelineService(classifier=classifier, erp_executor=AsyncMock())
+        first = EmailReceivedEvent(
+            message_id="m1@example.com",
+            from_email="billing@example.com",
+            to_email=["customer@example.com"],
+            subject="Invoice INV-123456",
+            body_text=INVOICE_TEXT,
+            size_bytes=100,
+        )
+        reply = EmailReceivedEvent(
+            **parse_message(reply_message("m3@example.com", "m2@example.com", ["m1@example.com", "m2@example.com"]))
+        )
+
+        await pipeline.process(first)
+        result = await pipeline.process(reply)
+
+        assert result["classification"].method == "thread"
+        assert result["classification"].category == EmailCategory.INVOICE
+        assert classifier.rules_classify.call_count == 1
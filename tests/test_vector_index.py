@@ -0,0 +1,219 @@
+"""
+Unit Tests for In-Process Vector Index
+Tests: brute-force and IVF search, threshold semantics, bounded size,
+int8 / 1-bit quantization
+"""
+
+import numpy as np
+import pytest
+
+from app.services.vector_index import IVFFlatIndex, QuantizedIndex, recall_at_k
+
+DIMS = 32
+
+
+def random_vectors(n, seed=0):
+    """Случайные векторы"""
+    return np.random.default_rng(seed).normal(size=(n, DIMS)).astype(np.float32)
+
+
+def exact_top_k(vectors, query, k):
+    """Точный top-k по cosine similarity"""
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    sims = normed @ (query / np.linalg.norm(query))
+    return list(np.argsort(-sims)[:k])
+
+
+# ==============================================================================
+# TEST: Search
+# ==============================================================================
+
+def test_flat_search_matches_exact():
+    """До обучения поиск точный (brute-force)"""
+
+    vectors = random_vectors(200)
+    index = IVFFlatIndex(dimensions=DIMS, capacity=1000, n_lists=8)
+    for i, v in enumerate(vectors):
+        index.add(i, v, {'id': i})
+
+    assert not index.is_trained
+
+    query = vectors[17] + 0.01
+    results = index.search(query, k=3, threshold=-1.0)
+
+    assert [payload['id'] for _, payload in results] == exact_top_k(vectors, query, 3)
+    assert results[0][0] >= results[1][0] >= results[2][0]
+
+
+def test_threshold_semantics():
+    """Возвращаются только similarity > threshold"""
+
+    index = IVFFlatIndex(dimensions=DIMS, capacity=10)
+    base = np.zeros(DIMS, dtype=np.float32)
+    base[0] = 1.0
+    orthogonal = np.zeros(DIMS, dtype=np.float32)
+    orthogonal[1] = 1.0
+
+    index.add(1, base, {'id': 1})
+    index.add(2, orthogonal, {'id': 2})
+
+    results = index.search(base, k=3, threshold=0.3)
+
+    assert [payload['id'] for _, payload in results] == [1]
+    assert results[0][0] == pytest.approx(1.0)
+
+
+def test_ivf_search_recall():
+    """После обучения IVF находит ближайших соседей"""
+
+    vectors = random_vectors(2000, seed=1)
+    index = IVFFlatIndex(dimensions=DIMS, capacity=5000, n_lists=16, n_probe=8)
+    for i, v in enumerate(vectors):
+        index.add(i, v, {'id': i})
+
+    assert index.is_trained
+
+    hits = 0
+    for q in range(50):
+        query = vectors[q] + np.random.default_rng(q).normal(scale=0.05, size=DIMS)
+        found = [payload['id'] for _, payload in index.search(query, k=1, threshold=-1.0)]
+        hits += found == exact_top_k(vectors, query, 1)
+
+    assert hits / 50 >= 0.9
+
+
+# ==============================================================================
+# TEST: Incremental inserts and bounded size
+# ==============================================================================
+
+def test_bounded_capacity_evicts_oldest():
+    """При переполнении вытесняются самые старые векторы"""
+
+    vectors = random_vectors(5)
+    index = IVFFlatIndex(dimensions=DIMS, capacity=3)
+    for i, v in enumerate(vectors):
+        index.add(i, v, {'id': i})
+
+    assert len(index) == 3
+    assert set(index.slot_of) == {2, 3, 4}
+
+    results = index.search(vectors[0], k=3, threshold=0.99)
+    assert all(payload['id'] != 0 for _, payload in results)
+
+
+def test_reinsert_updates_in_place():
+    """Повторное добавление того же ID обновляет запись"""
+
+    vectors = random_vectors(2)
+    index = IVFFlatIndex(dimensions=DIMS, capacity=10)
+    index.add(7, vectors[0], {'id': 7, 'category': 'invoice'})
+    index.add(7, vectors[1], {'id': 7, 'category': 'support'})
+
+    assert len(index) == 1
+    _, payload = index.search(vectors[1], k=1)[0]
+    assert payload['category'] == 'support'
+
+
+def test_rejects_invalid_vectors():
+    """Нулевой вектор и неверная размерность не добавляются"""
+
+    index = IVFFlatIndex(dimensions=DIMS, capacity=10)
+
+    assert index.add(1, np.zeros(DIMS), {}) is False
+    assert index.add(2, np.ones(DIMS + 1), {}) is False
+    assert len(index) == 0
+
+
+# ==============================================================================
+# TEST: Quantized index
+# ==============================================================================
+
+def _filled(mode, vectors, **kwargs):
+    index = QuantizedIndex(dimensions=DIMS, capacity=len(vectors), mode=mode, **kwargs)
+    for i, v in enumerate(vectors):
+        index.add(i, v, {'id': i})
+    return index
+
+
+def test_quantized_memory_per_vector():
+    """int8: dims + scale, 1-bit коды: dims / 8 (дополнено до uint64)"""
+
+    vectors = random_vectors(10)
+
+    assert _filled('int8', vectors).bytes_per_vector == DIMS + 4
+    assert _filled('binary+int8', vectors).bytes_per_vector == DIMS + 4 + 8
+    assert IVFFlatIndex(dimensions=DIMS).bytes_per_vector == DIMS * 4 + 4
+
+
+def test_int8_similarity_close_to_float():
+    """int8 similarity отличается от float32 не больше чем на ~1%"""
+
+    vectors = random_vectors(100)
+    index = _filled('int8', vectors)
+
+    query = vectors[3]
+    sim, payload = index.search(query, k=1, threshold=-1.0)[0]
+
+    assert payload['id'] == 3
+    assert sim == pytest.approx(1.0, abs=0.01)
+
+
+@pytest.mark.parametrize("mode,min_recall", [('int8', 0.95), ('binary+int8', 0.85)])
+def test_quantized_recall_at_3(mode, min_recall):
+    """Recall@3 относительно точного float32 поиска"""
+
+    vectors = random_vectors(2000, seed=2)
+    rng = np.random.default_rng(3)
+    queries = vectors[:50] + rng.normal(scale=0.3, size=(50, DIMS)).astype(np.float32)
+
+    index = _filled(mode, vectors, rerank_candidates=128)
+
+    assert recall_at_k(index, vectors, queries, k=3) >= min_recall
+
+
+def test_binary_prefilter_finds_near_duplicates():
+    """Hamming prefilter + re-ranking находит почти-дубликат"""
+
+    vectors = random_vectors(500, seed=4)
+    index = _filled('binary+int8', vectors, rerank_candidates=16)
+
+    query = vectors[42] + 0.01
+    results = index.search(query, k=3, threshold=-1.0)
+
+    assert results[0][1]['id'] == 42
+    assert results[0][0] >= results[1][0] >= results[2][0]
+
+
+def test_binary_rerank_scores_are_cosine():
+    """После Hamming prefilter similarity - cosine по int8, threshold применим"""
+
+    vectors = random_vectors(500, seed=5)
+    index = _filled('binary+int8', vectors, rerank_candidates=16)
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    query = vectors[7] + 0.01
+    exact = normed @ (query / np.linalg.norm(query))
+
+    for sim, payload in index.search(query, k=3, threshold=-1.0):
+        assert sim == pytest.approx(exact[payload['id']], abs=0.01)
+    assert index.search(query, k=3, threshold=0.9)[0][1]['id'] == 7
+
+
+def test_quantized_bounded_capacity_and_threshold():
+    """Кольцевой буфер и threshold работают как в IVFFlatIndex"""
+
+    vectors = random_vectors(5)
+    index = QuantizedIndex(dimensions=DIMS, capacity=3, mode='binary+int8')
+    for i, v in enumerate(vectors):
+        index.add(i, v, {'id': i})
+
+    assert len(index) == 3
+    assert set(index.slot_of) == {2, 3, 4}
+    assert index.search(vectors[4], k=3, threshold=0.99)[0][1]['id'] == 4
+    assert index.add(9, np.zeros(DIMS), {}) is False
+
+
+@pytest.mark.parametrize("mode", ['pq', 'binary'])
+def test_unknown_quantization_mode(mode):
+    with pytest.raises(ValueError):
+        QuantizedIndex(dimensions=DIMS, mode=mode)